@@ -1,19 +1,83 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
-import os.path
+from werkzeug.contrib.fixers import ProxyFix
+from werkzeug.local import LocalProxy
+from database import RoutingSQLAlchemy
 
-#Initializes a Flask app and creates the SVN_Parser with the xml list and log. Used to populate index.html with the project_list
-#Builds the DATABASE path to be used in querying the database
-app = Flask(__name__)
-app.config.from_object('config')
-app_db = SQLAlchemy(app)
+'''
+The app factory. The database, the login manager and the mail client are made here without an app and set up for each
+app create_app makes. Nothing connects anywhere until it is first used: engines are created by the first query,
+password hashing threads by the first hash and memcached connections by the first cache lookup. The routes are the
+pages blueprint in views.py, the api blueprint in api.py and the fingerprinted static files of assets.py.
+
+Modules never import the app itself, which would not exist yet while create_app imports them, but read their settings
+through active_app. The app below is the default one that run.py, gunicorn, the scripts and the tests use. gunicorn
+preloads it in the master process and forks the workers from it, see gunicorn.conf.py, so before_fork and after_fork
+make sure no database connection, socket or thread made in the master is shared with a worker.
+
+Behind proxies, like the Heroku router, every request comes from a proxy's address. With TRUSTED_PROXIES set to the
+number of proxies in front of the app, the client address, host and scheme are read from the X-Forwarded headers they
+add, so admission control limits each client rather than the router and /metrics checks the address of the scraper.'''
+
+app_db = RoutingSQLAlchemy()
 login_manager = LoginManager()
+login_manager.login_view = 'pages.login'
+mail = Mail()
+
+#The app of the current app or request context, and outside of one the default app, see get_app in database.py.
+active_app = LocalProxy(lambda: app_db.get_app())
+
+#Make an app from a config object or module name, with any settings given overriding the config. The first app made
+#is the default app, which the database uses outside of an app context.
+def create_app(config='config', **settings):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config.update(settings)
+    app_db.init_app(app)
+    login_manager.init_app(app)
+    mail.init_app(app)
+    from app import views, api, models, live
+    from metrics import init_metrics
+    from admission import init_admission
+    from assets import assets, init_assets
+    from compression import init_compression
+    init_metrics(app)
+    init_admission(app)
+    init_assets(app)
+    init_compression(app)
+    app.register_blueprint(views.pages)
+    app.register_blueprint(api.api)
+    app.register_blueprint(assets)
+    if app.config.get('TRUSTED_PROXIES'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, app.config['TRUSTED_PROXIES'])
+    if app_db.app is None:
+        app_db.app = app
+        _init_process(app)
+    return app
+
+#Set up the components each process keeps for itself, whatever app it serves, from the config of the default app: the
+#page and user caches, the password hashing threads and the live feed hub with its publish socket.
+def _init_process(app):
+    from app import page_cache, identity_cache, passwords, live
+    page_cache.init_cache(app)
+    identity_cache.init_cache(app)
+    passwords.init_pool(app)
+    live.init_live(app)
 
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+#Get the process ready to fork workers: compile every template once, so the workers share them instead of each
+#compiling them on its first requests, and close every database connection, so none is open when it forks.
+def before_fork(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    app_db.session.remove()
+    app_db.dispose_engines(app)
 
-mail = Mail(app)
+#Start a forked process afresh: it forgets the session and empties the pools it inherited, so it never runs a statement
+#on a connection of its parent, and makes its per process components again.
+def after_fork(app):
+    app_db.session.registry.clear()
+    app_db.dispose_engines(app)
+    _init_process(app)
 
-from app import views, models
\ No newline at end of file
+app = create_app()
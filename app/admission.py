@@ -0,0 +1,270 @@
+from app import active_app
+from flask import g, request, jsonify
+from flask_login import current_user
+from metrics import COLLECTORS
+from contextlib import contextmanager
+import atexit
+import errno
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+'''
+Admission control of the expensive routes: logging in and registering, which hash a password, giving High5's and the
+team page. Each route in ADMISSION_ROUTES has a number of requests it serves at once across all the worker processes
+of a host, and a request over that is turned away at once with 503 and Retry-After, so a rush queues up nowhere and
+the requests already let in finish at their usual speed. A route can also give each user a token bucket, a rate of
+requests per second with a burst on top, and a user over it gets 429 with Retry-After saying when their next token
+comes. A request turned away as busy gives its token back. Users who are not logged in are limited by address.
+
+The workers of a host share the limits through SharedStore, a file at ADMISSION_STORE that every worker maps into
+memory, so checking a request costs a file lock and a few reads rather than a round trip to a server. The store also
+counts the requests let in, turned away as busy and turned away as limited for each route, which /metrics reports along
+with how many are being served and the capacity, for tuning ADMISSION_ROUTES.'''
+
+#Entries looked at for a user's bucket before the stalest one is reused.
+PROBES = 8
+
+_SLOT = struct.Struct('=i')
+_COUNTERS = struct.Struct('=3Q')
+_BUCKET = struct.Struct('=Qd')
+
+#Outcomes the store counts, in the order of its counters.
+OUTCOMES = ('admitted', 'busy', 'limited')
+
+#Whether a process is still running, so a slot it holds is not freed under it.
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno != errno.ESRCH
+    return True
+
+#A new directory for the store of an app made without ADMISSION_STORE, removed when the process that made it exits.
+#Worker processes forked from that process share it, and another run of the app, like the next run of the tests,
+#starts with empty buckets.
+def _private_store():
+    directory = tempfile.mkdtemp(prefix='high5_admission-')
+    pid = os.getpid()
+    atexit.register(lambda: os.getpid() == pid and shutil.rmtree(directory, True))
+    return os.path.join(directory, 'admission')
+
+'''
+The admission slots, counters and token buckets of the limited routes, in a file shared by the workers of a host. The
+file has the pid of the process serving a request in each taken slot, the counters of each route and a table of
+buckets, each the key of a user on a route and the time their bucket is full again, with the generic cell rate
+algorithm. A slot whose process died without freeing it is taken back when the route is full. The file name holds a
+digest of the layout, so workers of an old and a new deploy with other routes never read each other's file.'''
+class SharedStore(object):
+    def __init__(self, path, routes, buckets):
+        self.routes = sorted(routes)
+        self.buckets = buckets
+        self._slots = {}
+        self._counters = {}
+        offset = 0
+        for endpoint, concurrency in self.routes:
+            self._slots[endpoint] = (offset, concurrency)
+            offset += _SLOT.size * concurrency
+        for endpoint, _ in self.routes:
+            self._counters[endpoint] = offset
+            offset += _COUNTERS.size
+        self._buckets = offset
+        self._thread_lock = threading.Lock()
+        size = offset + _BUCKET.size * buckets
+        layout = hashlib.sha1(repr((self.routes, buckets)).encode('utf-8')).hexdigest()[:12]
+        self.path = '%s-%s' % (path, layout)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    #Hold the file lock, which is per process, and a lock for the threads of this process.
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _count(self, endpoint, outcome):
+        offset = self._counters[endpoint] + 8 * OUTCOMES.index(outcome)
+        struct.pack_into('=Q', self._map, offset, struct.unpack_from('=Q', self._map, offset)[0] + 1)
+
+    #Take a slot of the route for this process. Returns the slot to free, or None when the route is full.
+    def acquire(self, endpoint):
+        start, concurrency = self._slots[endpoint]
+        with self._locked():
+            pids = struct.unpack_from('=%di' % concurrency, self._map, start)
+            free = [n for n, pid in enumerate(pids) if pid == 0] or \
+                   [n for n, pid in enumerate(pids) if not _alive(pid)]
+            if not free:
+                self._count(endpoint, 'busy')
+                return None
+            slot = start + _SLOT.size * free[0]
+            _SLOT.pack_into(self._map, slot, os.getpid())
+            self._count(endpoint, 'admitted')
+            return slot
+
+    def release(self, slot):
+        with self._locked():
+            _SLOT.pack_into(self._map, slot, 0)
+
+    def _bucket_key(self, endpoint, user_key):
+        return int(hashlib.sha1(('%s %s' % (endpoint, user_key)).encode('utf-8')).hexdigest()[:16], 16) | 1
+
+    def _bucket_offsets(self, key):
+        return [self._buckets + _BUCKET.size * ((key + probe) % self.buckets) for probe in range(PROBES)]
+
+    #Take a token from a user's bucket on the route, refilled at rate per second up to burst. Returns 0 when there
+    #was one, otherwise the seconds until there is.
+    def take(self, endpoint, user_key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        key = self._bucket_key(endpoint, user_key)
+        interval = 1.0 / rate
+        with self._locked():
+            found = reusable = stalest = None
+            for offset in self._bucket_offsets(key):
+                entry_key, full_at = _BUCKET.unpack_from(self._map, offset)
+                if entry_key == key:
+                    found = (offset, full_at)
+                    break
+                if reusable is None and (entry_key == 0 or full_at <= now):
+                    reusable = offset
+                if stalest is None or full_at < stalest[1]:
+                    stalest = (offset, full_at)
+            offset, full_at = found or (reusable if reusable is not None else stalest[0], now)
+            full_at = max(full_at, now) + interval
+            if full_at - now > burst * interval:
+                self._count(endpoint, 'limited')
+                return full_at - now - burst * interval
+            _BUCKET.pack_into(self._map, offset, key, full_at)
+            return 0
+
+    #Give back a token taken from a user's bucket on the route, for a request that was turned away after all.
+    def refund(self, endpoint, user_key, rate):
+        key = self._bucket_key(endpoint, user_key)
+        with self._locked():
+            for offset in self._bucket_offsets(key):
+                entry_key, full_at = _BUCKET.unpack_from(self._map, offset)
+                if entry_key == key:
+                    _BUCKET.pack_into(self._map, offset, key, full_at - 1.0 / rate)
+                    return
+
+    #Get the capacity, the requests being served and the counters of each route.
+    def stats(self):
+        with self._locked():
+            stats = {}
+            for endpoint, (start, concurrency) in self._slots.items():
+                pids = struct.unpack_from('=%di' % concurrency, self._map, start)
+                stats[endpoint] = dict(zip(OUTCOMES, _COUNTERS.unpack_from(self._map, self._counters[endpoint])),
+                                       capacity=concurrency, in_flight=sum(1 for pid in pids if pid))
+            return stats
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+'''
+The limits of one app from its config, checked before each request to a limited route. The store is opened by the
+first such request, so a preloaded master never opens it, but its path is settled when the app is made, so the workers
+forked from the master all open the same one.'''
+class Admission(object):
+    def __init__(self, app):
+        self.config = app.config
+        self.path = app.config['ADMISSION_STORE'] or _private_store()
+        self.routes = dict((endpoint, (set(methods) if methods else None, concurrency, rate, burst))
+                           for endpoint, (methods, concurrency, rate, burst) in app.config['ADMISSION_ROUTES'].items())
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = SharedStore(self.path,
+                                              [(endpoint, route[1] or 0) for endpoint, route in self.routes.items()],
+                                              self.config['ADMISSION_BUCKETS'])
+        return self._store
+
+    #Let the request in, holding a slot of its route until it ends, or get the response turning it away.
+    def admit(self):
+        route = self.routes.get(request.endpoint)
+        if route is None or not self.config['ADMISSION_ENABLED']:
+            return None
+        methods, concurrency, rate, burst = route
+        if methods is not None and request.method not in methods:
+            return None
+        if rate:
+            user_key = 'user %s' % current_user.id if current_user.is_authenticated else 'addr %s' % request.remote_addr
+            wait = self.store.take(request.endpoint, user_key, rate, burst or 1)
+            if wait:
+                return _refuse(429, 'Too many requests, try again in a moment.', wait)
+        if concurrency:
+            slot = self.store.acquire(request.endpoint)
+            if slot is None:
+                if rate:
+                    self.store.refund(request.endpoint, user_key, rate)
+                return _refuse(503, 'Too busy right now, try again in a moment.', self.config['ADMISSION_RETRY_AFTER'])
+            g.admission_slot = slot
+        return None
+
+    def release(self):
+        slot = getattr(g, 'admission_slot', None)
+        if slot is not None:
+            g.admission_slot = None
+            self.store.release(slot)
+
+def _refuse(status, message, retry_after):
+    if request.blueprint == 'api':
+        response = jsonify(error=message)
+    else:
+        response = active_app.response_class(message, mimetype='text/plain')
+    response.status_code = status
+    response.headers['Retry-After'] = str(int(math.ceil(retry_after)))
+    return response
+
+#Check the app's limited routes before each request.
+def init_admission(app):
+    admission = app.extensions['admission'] = Admission(app)
+
+    @app.before_request
+    def admit_request():
+        return admission.admit()
+
+    @app.teardown_request
+    def release_request(error=None):
+        admission.release()
+
+#The admission metrics of the current app's limited routes in the Prometheus text format, see metrics.py.
+def render_admission():
+    admission = active_app.extensions.get('admission')
+    if admission is None or not admission.routes:
+        return []
+    stats = sorted(admission.store.stats().items())
+    limited = [(endpoint, route) for endpoint, route in stats if route['capacity']]
+    lines = ['# HELP high5_admission_capacity Requests a limited route serves at once on this host.',
+             '# TYPE high5_admission_capacity gauge']
+    lines += ['high5_admission_capacity{endpoint="%s"} %d' % (endpoint, route['capacity'])
+              for endpoint, route in limited]
+    lines += ['# HELP high5_admission_in_flight Requests a limited route is serving now on this host.',
+              '# TYPE high5_admission_in_flight gauge']
+    lines += ['high5_admission_in_flight{endpoint="%s"} %d' % (endpoint, route['in_flight'])
+              for endpoint, route in limited]
+    lines += ['# HELP high5_admission_requests_total Requests to a limited route let in, turned away as busy with 503 '
+              'and turned away as limited with 429 on this host.', '# TYPE high5_admission_requests_total counter']
+    lines += ['high5_admission_requests_total{endpoint="%s",outcome="%s"} %d' % (endpoint, outcome, route[outcome])
+              for endpoint, route in stats for outcome in OUTCOMES]
+    return lines
+
+COLLECTORS.append(render_admission)
@@ -0,0 +1,183 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import current_user
+from app import app_db
+from models import User, Team, High5, members
+from stats import record_high5s, top_receivers, top_scorers, top_givers, user_team_totals
+from pagination import keyset_page, high5_to_dict
+from outbox import enqueue_high5
+from page_cache import bump_team_version, cached_fragment
+from bulk_import import COLUMNS, read_csv, import_rows
+import datetime
+import functools
+import json
+import numbers
+
+'''
+JSON API for integrations, under /api. One request gives many High5's on a team in one transaction, reporting for
+each whether it was given or why not, and one request fetches the newest High5's and the leaderboards of several
+teams. Requests are made as the user logged in with the session cookie, like the pages, who must be a member of the
+teams. Bodies must be sent as application/json, which a form on another site cannot send, so the API needs no CSRF
+token. Errors are JSON too, with a message under error and the HTTP status.'''
+
+api = Blueprint('api', __name__)
+
+#The most characters of a High5 message, the length of the message column.
+MESSAGE_MAX = 250
+
+def _error(status, message):
+    response = jsonify(error=message)
+    response.status_code = status
+    return response
+
+#Like login_required, but answers with a JSON 401 instead of redirecting to the login page.
+def api_login_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return _error(401, 'Log in first.')
+        return view(*args, **kwargs)
+    return wrapper
+
+#Get the teams with the given names that the current user is a member of, by name.
+def _member_teams(team_names):
+    return dict((team.name, team) for team in Team.query.join(members, members.c.team_id == Team.id).
+                filter(members.c.user_id == current_user.id).filter(Team.name.in_(team_names)))
+
+#Check one High5 of a batch. Returns the errors by field, empty when it can be given.
+def _validate(item, receivers):
+    if not isinstance(item, dict):
+        return dict(high5='Must be an object with receiver, message and level.')
+    errors = {}
+    receiver = item.get('receiver')
+    if not receiver:
+        errors['receiver'] = 'Required.'
+    elif not isinstance(receiver, type(u'')):
+        errors['receiver'] = 'Must be a user name.'
+    elif receiver not in receivers:
+        errors['receiver'] = 'No user named %s.' % receiver
+    elif receiver == current_user.user_name:
+        errors['receiver'] = 'Cannot give yourself a High5.'
+    message = item.get('message')
+    if not message or not isinstance(message, type(u'')):
+        errors['message'] = 'Required.'
+    elif len(message) > MESSAGE_MAX:
+        errors['message'] = 'At most %d characters.' % MESSAGE_MAX
+    level = item.get('level')
+    if level is None:
+        errors['level'] = 'Required.'
+    elif isinstance(level, bool) or not isinstance(level, numbers.Integral):
+        errors['level'] = 'Must be a whole number, 1 to 5.'
+    return errors
+
+"""Give many High5's on a team in one transaction. The body is {"high5s": [{"receiver": user name, "message": text,
+"level": 1 to 5}, ...]}, up to API_BATCH_MAX of them, and optionally "atomic": true to give none unless every one is
+valid. Whole number levels outside 1 to 5, 0 included, are moved to the nearest end, like the give High5 page does, and
+other levels are invalid. Answers 201 with {"created": count, "results": [...]} where each result has the index of the
+High5 in the request and either its new id or its errors by field, or 400 with the same body when nothing was given."""
+
+@api.route('/api/teams/<team_name>/high5s', methods=['POST'])
+@api_login_required
+def api_give_high5s(team_name):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('high5s'), list) or not body['high5s']:
+        return _error(400, 'Send a JSON object with a non empty list of High5\'s under high5s.')
+    items = body['high5s']
+    if len(items) > current_app.config['API_BATCH_MAX']:
+        return _error(413, 'At most %d High5\'s per request.' % current_app.config['API_BATCH_MAX'])
+    team = _member_teams([team_name]).get(team_name)
+    if team is None:
+        return _error(404, 'You are not a member of a team named %s.' % team_name)
+    names = set(item['receiver'] for item in items
+                if isinstance(item, dict) and isinstance(item.get('receiver'), type(u'')) and item['receiver'])
+    receivers = dict((user.user_name, user) for user in User.query.filter(User.user_name.in_(names)))
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        errors = _validate(item, receivers)
+        results.append(dict(index=index, errors=errors) if errors else dict(index=index))
+        if not errors:
+            valid.append((index, item))
+    if body.get('atomic') and len(valid) < len(items):
+        valid = []
+    if valid:
+        now = datetime.datetime.utcnow()
+        high5s = [High5(receiver_id=receivers[item['receiver']].id, giver_id=current_user.id,
+                        message=item['message'], time_posted=now, level=min(max(item['level'], 1), 5), team=team)
+                  for _, item in valid]
+        app_db.session.add_all(high5s)
+        record_high5s(team.id, [(high5.giver_id, high5.receiver_id, high5.level, now) for high5 in high5s])
+        for high5 in high5s:
+            enqueue_high5(team.name, current_user.user_name, high5.receiver_id, high5.message, now)
+        bump_team_version(team.id)
+        app_db.session.flush()
+        for (index, _), high5 in zip(valid, high5s):
+            results[index]['id'] = high5.id
+        app_db.session.commit()
+    response = jsonify(created=len(valid), results=results)
+    response.status_code = 201 if valid else 400
+    return response
+
+"""Fetch several teams in one request: for each team named by a team query argument (up to API_TEAMS_MAX), the first
+page of its High5's newest first with the cursor for the next page of the feed route, and its all time leaderboards.
+Answers {"teams": [...], "unknown": [...]} with the teams in the order asked for, and under unknown the names of teams
+that do not exist or the user is not a member of. Each team is cached per team version, see page_cache.py."""
+
+@api.route('/api/teams')
+@api_login_required
+def api_teams():
+    team_names = request.args.getlist('team')
+    if not team_names:
+        return _error(400, 'Name the teams with team query arguments.')
+    if len(team_names) > current_app.config['API_TEAMS_MAX']:
+        return _error(413, 'At most %d teams per request.' % current_app.config['API_TEAMS_MAX'])
+    teams = _member_teams(team_names)
+    return jsonify(teams=[json.loads(cached_fragment(teams[name], 'api_team', [], lambda: _team_json(teams[name])))
+                          for name in team_names if name in teams],
+                   unknown=[name for name in team_names if name not in teams])
+
+#Build the JSON of one team for api_teams.
+def _team_json(team):
+    high5s, next_cursor = keyset_page(High5.query.filter(High5.team_id == team.id))
+    return json.dumps(dict(name=team.name, version=team.version, high5s=[high5_to_dict(high5) for high5 in high5s],
+                           next=next_cursor, top_receivers=top_receivers(team.id), top_scorers=top_scorers(team.id),
+                           top_givers=top_givers(team.id)))
+
+"""The profile of the logged in user across all their teams: for each team by name the all time score, the High5's
+received and the High5's given, and the same summed over every team under totals. Answered from the stat rows with one
+query whatever the number of teams."""
+
+@api.route('/api/profile')
+@api_login_required
+def api_profile():
+    teams = [dict(name=name, score=score, received=received, given=given)
+             for name, score, received, given in user_team_totals(current_user.id)]
+    return jsonify(user=current_user.user_name, teams=teams,
+                   totals=dict((total, sum(team[total] for team in teams)) for total in ['score', 'received', 'given']))
+
+"""Import users, teams or team members from a CSV file sent as text/csv, see bulk_import.py for the columns of each
+kind. Only the users named in IMPORT_ADMINS can import, at most IMPORT_MAX_ROWS rows at a time, or IMPORT_MAX_USERS
+for users, whose passwords are hashed before the request answers and must be done within gunicorn's timeout (see
+gunicorn.conf.py); import_csv.py takes files of any size. Answers with the rows read and imported, the time taken and
+the line number and problems of each row that was not imported."""
+
+@api.route('/api/import/<kind>', methods=['POST'])
+@api_login_required
+def api_import(kind):
+    if current_user.user_name not in current_app.config['IMPORT_ADMINS']:
+        return _error(403, 'Only the import admins can import.')
+    if kind not in COLUMNS:
+        return _error(404, 'Import users, teams or members.')
+    if request.mimetype != 'text/csv':
+        return _error(400, 'Send the CSV file as text/csv.')
+    try:
+        rows = read_csv(kind, request.get_data())
+    except UnicodeDecodeError:
+        return _error(400, 'Send the CSV file as UTF-8.')
+    except ValueError as error:
+        return _error(400, str(error))
+    limit = current_app.config['IMPORT_MAX_USERS' if kind == 'users' else 'IMPORT_MAX_ROWS']
+    if len(rows) > limit:
+        return _error(413, 'At most %d rows per request.' % limit)
+    report = import_rows(kind, rows)
+    app_db.session.commit()
+    return jsonify(report.to_dict())
@@ -0,0 +1,199 @@
+from flask import Blueprint, request, send_file, url_for, abort, current_app
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+'''
+Fingerprinted static assets. build_assets.py copies every file under app/static to ASSET_BUILD_DIR with a digest of its
+content in its name, default.css as default.<digest>.css, rewriting the url()s of each stylesheet to the fingerprinted
+fonts and images, so a file never changes under its name and browsers may keep it for good. Each file that compresses
+gets a gzip variant next to it and a brotli one when the brotli package is installed, and each image wider than a width
+in ASSET_IMAGE_WIDTHS gets a smaller rendition when Pillow is installed. manifest.json maps the name of each file under
+app/static to what was built for it. No page shows an image of app/static yet; one that does links the rendition for
+the width it shows the image at with asset_url(name, width).
+
+Templates link assets through asset_url, which gives the fingerprinted URL from the manifest, or the plain /static URL
+when no build was made, so a checkout runs without one. The assets route serves the fingerprinted files with a far
+future, immutable Cache-Control and the smallest variant the browser accepts. A build never deletes older files, so
+pages rendered before a deploy keep working.'''
+
+MANIFEST = 'manifest.json'
+
+#File types worth compressing. woff, jpg and png are compressed already.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.eot', '.otf', '.json', '.txt', '.html')
+
+#File types rendered smaller for ASSET_IMAGE_WIDTHS.
+IMAGES = ('.jpg', '.jpeg', '.png')
+
+#Encodings the assets route can serve, best first, with the suffix of their files.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+#The name of a built file: the digest of its content before the extension, and the width for an image rendition.
+def fingerprint(name, content, width=None):
+    stem, extension = os.path.splitext(name)
+    digest = hashlib.sha1(content).hexdigest()[:12]
+    return '%s%s.%s%s' % (stem, '.%dw' % width if width else '', digest, extension)
+
+def _gzip(content):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=buffer, compresslevel=9, mtime=0) as compressed:
+        compressed.write(content)
+    return buffer.getvalue()
+
+#Point the url()s of a stylesheet at the built files, keeping any query or fragment. URLs of files that are not
+#under app/static, like the missing images/bg01.jpg, are left alone.
+def _rewrite_css(name, content, files):
+    directory = os.path.dirname(name)
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = os.path.normpath(os.path.join(directory, path)).replace(os.sep, '/')
+        if '://' in url or url.startswith(('/', 'data:')) or target not in files:
+            return match.group(0)
+        built = os.path.relpath(files[target]['path'], directory or '.').replace(os.sep, '/')
+        return 'url(%s%s%s%s)' % (quote, built, suffix, quote)
+    return _CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+#Smaller renditions of an image, as (width, content) for each width narrower than the image that saves bytes.
+def _renditions(name, content, widths):
+    if Image is None or not name.lower().endswith(IMAGES):
+        return []
+    image = Image.open(io.BytesIO(content))
+    renditions = []
+    for width in sorted(widths):
+        if width >= image.size[0]:
+            continue
+        resized = image.resize((width, max(1, image.size[1] * width // image.size[0])), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, image.format, quality=85, optimize=True)
+        if buffer.tell() < len(content):
+            renditions.append((width, buffer.getvalue()))
+    return renditions
+
+def _write(build_dir, name, content):
+    path = os.path.join(build_dir, name)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'wb') as output:
+            output.write(content)
+        os.rename(path + '.tmp', path)
+
+#Write the fingerprinted file, and its compressed variants that are smaller, returning the encodings written.
+def _write_variants(build_dir, name, content):
+    _write(build_dir, name, content)
+    encodings = []
+    if name.lower().endswith(COMPRESSIBLE):
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            compressed = brotli.compress(content, quality=11) if encoding == 'br' else _gzip(content)
+            if len(compressed) < len(content) * 0.9:
+                _write(build_dir, name + suffix, compressed)
+                encodings.append(encoding)
+    return encodings
+
+#Build every file under static_dir into build_dir and write the manifest, returning it. Stylesheets are built last so
+#the files they link are fingerprinted first.
+def build_assets(static_dir, build_dir, widths=()):
+    names = []
+    for directory, _, file_names in os.walk(static_dir):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            if not os.path.abspath(path).startswith(os.path.abspath(build_dir) + os.sep):
+                names.append(os.path.relpath(path, static_dir).replace(os.sep, '/'))
+    files = {}
+    for name in sorted(names, key=lambda name: (name.lower().endswith('.css'), name)):
+        with open(os.path.join(static_dir, name), 'rb') as source:
+            content = source.read()
+        if name.lower().endswith('.css'):
+            content = _rewrite_css(name, content, files)
+        entry = files[name] = dict(path=fingerprint(name, content), size=len(content))
+        entry['encodings'] = _write_variants(build_dir, entry['path'], content)
+        entry['widths'] = {}
+        for width, rendition in _renditions(name, content, widths):
+            entry['widths'][str(width)] = fingerprint(name, rendition, width)
+            _write(build_dir, entry['widths'][str(width)], rendition)
+    manifest = dict(files=files)
+    _write_manifest(build_dir, manifest)
+    return manifest
+
+def _write_manifest(build_dir, manifest):
+    path = os.path.join(build_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as output:
+        json.dump(manifest, output, indent=1, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+'''
+The manifest of one app's build, read once when the app is made, so a preloaded master reads it for every worker.
+Empty when ASSET_BUILD_DIR has no build.'''
+class Assets(object):
+    def __init__(self, app):
+        self.build_dir = app.config['ASSET_BUILD_DIR']
+        self.max_age = app.config['ASSET_MAX_AGE']
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST)) as manifest:
+                self.files = json.load(manifest)['files']
+        except IOError:
+            self.files = {}
+        #The encodings of each built file, renditions having none.
+        self.paths = {}
+        for entry in self.files.values():
+            self.paths[entry['path']] = entry['encodings']
+            self.paths.update((path, []) for path in entry['widths'].values())
+
+    #The URL of a file under app/static, the rendition of an image for the narrowest width at least the one given.
+    def url(self, name, width=None):
+        entry = self.files.get(name)
+        if entry is None:
+            return url_for('static', filename=name)
+        path = entry['path']
+        if width:
+            wider = sorted(int(size) for size in entry['widths'] if int(size) >= width)
+            if wider:
+                path = entry['widths'][str(wider[0])]
+        return url_for('assets.asset', filename=path)
+
+assets = Blueprint('assets', __name__)
+
+"""Serve a fingerprinted file for good, as brotli or gzip when the browser accepts it and the build made the variant.
+Only files in the manifest are served, so a name never maps outside ASSET_BUILD_DIR."""
+
+@assets.route('/assets/<path:filename>')
+def asset(filename):
+    built = current_app.extensions['assets']
+    if filename not in built.paths:
+        abort(404)
+    path, encoding = os.path.join(built.build_dir, filename), None
+    for candidate, suffix in ENCODINGS:
+        if candidate in built.paths[filename] and request.accept_encodings[candidate]:
+            path, encoding = path + suffix, candidate
+            break
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         conditional=True, cache_timeout=built.max_age)
+    response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % built.max_age
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+#Read the app's manifest and give templates asset_url.
+def init_assets(app):
+    built = app.extensions['assets'] = Assets(app)
+    app.add_template_global(built.url, 'asset_url')
@@ -0,0 +1,202 @@
+from app import active_app, app_db
+from models import User, Team, MemberStat, members, NOTIFY_PREFS
+from stats import add_member_stats
+from passwords import hash_passwords, hash_passwords_threaded
+from page_cache import bump_team_version
+from random import SystemRandom
+import csv
+import io
+import time
+
+'''
+Bulk imports from CSV for onboarding whole departments at once, used by import_csv.py and the /api/import route. Each
+kind of import takes a CSV file with a header row naming at least these columns, in any order:
+    users     user_name, name, email, password and optionally notify_pref
+    teams     name, admin (the user name of the admin, who becomes the team's first member)
+    members   team, user_name
+Every row is checked first and the rows with problems are reported with their line number and the problem with each
+field, while the others are imported. Names are turned into ids, and existing users, teams and members found, with a
+few IN lookups for the whole file rather than a query per row. Given a number of processes, as import_csv.py does,
+passwords are hashed on a pool of that many processes, see hash_passwords in passwords.py; without one, as in a
+request, they are hashed on the worker's hashing threads. Rows go in with multi-row inserts of IMPORT_BATCH_SIZE. Like
+membership.py the imports only add statements to the current session, so the caller commits them.'''
+
+#The import kinds with the columns each needs.
+COLUMNS = dict(users=['user_name', 'name', 'email', 'password'], teams=['name', 'admin'], members=['team', 'user_name'])
+
+#Values per IN list, safely below SQLite's limit on bound parameters.
+LOOKUP_CHUNK = 500
+
+'''
+The result of an import: the rows read, the rows imported, each rejected row with its problems and the time taken.'''
+class ImportReport(object):
+    def __init__(self, kind, rows):
+        self.kind = kind
+        self.rows = rows
+        self.created = 0
+        self.errors = {}
+        self.started = time.time()
+        self.seconds = 0.0
+
+    #Note a problem with one field of a row, given by its line number in the file.
+    def reject(self, line, field, message):
+        self.errors.setdefault(line, {})[field] = message
+
+    def finish(self, created):
+        self.created = created
+        self.seconds = time.time() - self.started
+        return self
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return dict(kind=self.kind, rows=self.rows, created=self.created, seconds=round(self.seconds, 3),
+                    rows_per_second=round(self.rows_per_second(), 1),
+                    errors=[dict(line=line, errors=self.errors[line]) for line in sorted(self.errors)])
+
+#Read CSV bytes into a list of (line number, row) pairs, each row a dict of the stripped text in every column, keyed
+#by lower case column name and empty for columns the row is short of. Raises ValueError if a column the kind needs is
+#missing from the header.
+def read_csv(kind, data):
+    if bytes is str:
+        reader = csv.reader(io.BytesIO(data))
+        decode = lambda value: value.decode('utf-8')
+    else:
+        reader = csv.reader(io.StringIO(data.decode('utf-8')))
+        decode = lambda value: value
+    header = [decode(column).strip().lstrip(u'\ufeff').lower() for column in next(reader, [])]
+    missing = [column for column in COLUMNS[kind] if column not in header]
+    if missing:
+        raise ValueError('The header is missing the %s column%s.' % (', '.join(missing), 's' if len(missing) > 1
+                                                                      else ''))
+    return [(reader.line_num, dict(zip(header, [decode(value).strip() for value in row] + [u''] * len(header))))
+            for row in reader if any(value.strip() for value in row)]
+
+#Import the rows of the kind and return the report.
+def import_rows(kind, rows, processes=None):
+    return dict(users=import_users, teams=import_teams, members=import_members)[kind](rows, processes)
+
+#Map the values of a unique column to ids with a few IN lookups.
+def _ids(column, id_column, values):
+    values = list(set(values))
+    found = {}
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        found.update(app_db.session.query(column, id_column).filter(column.in_(values[start:start + LOOKUP_CHUNK])))
+    return found
+
+def _insert(table, rows):
+    batch_size = active_app.config['IMPORT_BATCH_SIZE']
+    for start in range(0, len(rows), batch_size):
+        app_db.session.execute(table.insert(), rows[start:start + batch_size])
+    return len(rows)
+
+#Check that a row has a value for the field no longer than the column allows. Returns the value, or None.
+def _required(report, line, row, field, length):
+    value = row.get(field) or u''
+    if not value:
+        report.reject(line, field, 'Required.')
+    elif len(value) > length:
+        report.reject(line, field, 'At most %d characters.' % length)
+    else:
+        return value
+    return None
+
+#Reject the rows whose value for the field is already taken: by another row of the file or by the ids found for it.
+def _reject_taken(report, rows, field, existing, message):
+    seen = set()
+    for line, row in rows:
+        value = row.get(field)
+        if not value:
+            continue
+        if value in existing:
+            report.reject(line, field, message)
+        elif value in seen:
+            report.reject(line, field, 'Repeated in the file.')
+        seen.add(value)
+
+#Create a user for each row that is valid and whose user name and email are not taken yet.
+def import_users(rows, processes=None):
+    report = ImportReport('users', len(rows))
+    for line, row in rows:
+        _required(report, line, row, 'user_name', 50)
+        _required(report, line, row, 'name', 50)
+        if _required(report, line, row, 'email', 120) and '@' not in row['email']:
+            report.reject(line, 'email', 'Not an email address.')
+        _required(report, line, row, 'password', 1024)
+        if row.get('notify_pref') and row['notify_pref'] not in NOTIFY_PREFS:
+            report.reject(line, 'notify_pref', 'One of %s.' % ', '.join(NOTIFY_PREFS))
+    _reject_taken(report, rows, 'user_name', _ids(User.user_name, User.id, [row['user_name'] for _, row in rows]),
+                  'Already taken.')
+    _reject_taken(report, rows, 'email', _ids(User.email, User.id, [row['email'] for _, row in rows]),
+                  'Already taken.')
+    valid = [row for line, row in rows if line not in report.errors]
+    random = SystemRandom()
+    salts = [bytes(random.getrandbits(128)) for _ in valid]
+    pairs = [(row['password'], salt) for row, salt in zip(valid, salts)]
+    passwords = hash_passwords(pairs, processes) if processes else hash_passwords_threaded(pairs)
+    return report.finish(_insert(User.__table__, [
+        dict(user_name=row['user_name'], name=row['name'], email=row['email'], _salt=salt, _password=password,
+             notify_pref=row.get('notify_pref') or 'immediate', version=1)
+        for row, salt, password in zip(valid, salts, passwords)]))
+
+#Create a team for each row that is valid, whose name is not taken and whose admin exists, with the admin as its only
+#member.
+def import_teams(rows, processes=None):
+    report = ImportReport('teams', len(rows))
+    for line, row in rows:
+        _required(report, line, row, 'name', 100)
+        _required(report, line, row, 'admin', 50)
+    _reject_taken(report, rows, 'name', _ids(Team.name, Team.id, [row['name'] for _, row in rows]),
+                  'A team with this name exists.')
+    admins = _ids(User.user_name, User.id, [row['admin'] for line, row in rows if line not in report.errors])
+    for line, row in rows:
+        if line not in report.errors and row['admin'] not in admins:
+            report.reject(line, 'admin', 'No user named %s.' % row['admin'])
+    valid = [row for line, row in rows if line not in report.errors]
+    created = _insert(Team.__table__, [dict(name=row['name'], admin_id=admins[row['admin']]) for row in valid])
+    team_ids = _ids(Team.name, Team.id, [row['name'] for row in valid])
+    rosters = [dict(team_id=team_ids[row['name']], user_id=admins[row['admin']]) for row in valid]
+    _insert(members, rosters)
+    _insert(MemberStat.__table__, [dict(roster, score=0, received=0, given=0) for roster in rosters])
+    return report.finish(created)
+
+#Add each user to each team named in a valid row, unless they are already a member. The stat rows of the new members
+#are made a team at a time, which costs a few statements per team rather than per row.
+def import_members(rows, processes=None):
+    report = ImportReport('members', len(rows))
+    for line, row in rows:
+        _required(report, line, row, 'team', 100)
+        _required(report, line, row, 'user_name', 50)
+    team_ids = _ids(Team.name, Team.id, [row['team'] for line, row in rows if line not in report.errors])
+    user_ids = _ids(User.user_name, User.id, [row['user_name'] for line, row in rows if line not in report.errors])
+    for line, row in rows:
+        if line in report.errors:
+            continue
+        if row['team'] not in team_ids:
+            report.reject(line, 'team', 'No team named %s.' % row['team'])
+        if row['user_name'] not in user_ids:
+            report.reject(line, 'user_name', 'No user named %s.' % row['user_name'])
+    current = set()
+    ids = list(set(team_ids.values()))
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        current.update(tuple(pair) for pair in app_db.session.query(members.c.team_id, members.c.user_id).
+                       filter(members.c.team_id.in_(ids[start:start + LOOKUP_CHUNK])))
+    added = {}
+    for line, row in rows:
+        if line in report.errors:
+            continue
+        pair = (team_ids[row['team']], user_ids[row['user_name']])
+        if pair in current:
+            report.reject(line, 'user_name', 'Already a member of %s.' % row['team'])
+        elif pair[1] in added.get(pair[0], ()):
+            report.reject(line, 'user_name', 'Repeated in the file.')
+        else:
+            added.setdefault(pair[0], []).append(pair[1])
+    created = _insert(members, [dict(team_id=team_id, user_id=user_id)
+                                for team_id, new_members in sorted(added.items()) for user_id in new_members])
+    for team_id, new_members in sorted(added.items()):
+        for start in range(0, len(new_members), LOOKUP_CHUNK):
+            add_member_stats(team_id, new_members[start:start + LOOKUP_CHUNK])
+        bump_team_version(team_id)
+    return report.finish(created)
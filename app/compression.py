@@ -0,0 +1,67 @@
+from flask import request
+import gzip
+import io
+import zlib
+
+'''
+gzip compression of the responses of an app, for the browsers that accept it. A response given in one piece is
+compressed whole when it is at least COMPRESS_MIN_SIZE bytes. A streamed response, like the team and user pages (see
+streaming.py) and the exports, is compressed as it goes: each chunk is compressed and flushed on its own, so the
+browser can use what it was sent before the rest is ready, at the cost of a few bytes for each chunk. Only the types in
+COMPRESS_MIMETYPES are compressed. Files sent with send_file and responses that already have a Content-Encoding, like
+the precompressed files of assets.py, are left alone.
+
+A compressed response keeps its ETag but made weak, since its bytes differ from the uncompressed one's. The ETags of
+the team and user pages are weak already, so they match whether the browser was sent the page compressed or not, see
+conditional_page in page_cache.py.'''
+
+def _gzip(data, level):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=buffer, compresslevel=level, mtime=0) as compressed:
+        compressed.write(data)
+    return buffer.getvalue()
+
+#Compress the chunks of a streamed response into one gzip stream, flushed after every chunk.
+def _gzip_chunks(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode('utf-8')
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+#Compress the response when the browser accepts gzip and the settings of the app allow it.
+def compress_response(config, response):
+    if not config['COMPRESS_ENABLED'] or response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or \
+            response.status_code in (204, 304) or response.status_code < 200 or \
+            not request.accept_encodings['gzip']:
+        return response
+    if response.is_streamed:
+        response.response = _gzip_chunks(response.response, config['COMPRESS_LEVEL'])
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(_gzip(data, config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.headers['ETag'] = 'W/"%s"' % etag
+    return response
+
+#Compress the responses of the app. Installed after the other hooks, so it runs before them and they see the
+#compressed response.
+def init_compression(app):
+    @app.after_request
+    def compress(response):
+        return compress_response(app.config, response)
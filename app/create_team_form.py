@@ -1,10 +1,11 @@
 from flask_wtf import Form
-from wtforms import StringField, SelectMultipleField
+from wtforms import StringField
 from wtforms.validators import DataRequired
+from user_ids_field import UserIdsField
 
 '''
 Create a new team form. Requires user to enter team name and allows them to select usernames of
-members to add to the team. The team creator will be the team admin.'''
+members to add to the team, found by searching. The team creator will be the team admin.'''
 class TeamForm(Form):
     team_name = StringField('team_name', validators=[DataRequired()])
-    team_members = SelectMultipleField(u'Team Members', coerce=int)
\ No newline at end of file
+    team_members = UserIdsField(u'Team Members')
\ No newline at end of file
@@ -0,0 +1,171 @@
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, connection_stack
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Select, CompoundSelect
+import os
+import threading
+
+'''
+The database layer behind app_db. Read queries go to a pool of read connections and everything that writes goes
+through the writer engine, so readers never wait behind a write.
+
+With SQLite the writer engine has a single connection, so writes queue up in the pool, waiting at most
+SQLITE_WRITE_TIMEOUT seconds, instead of failing with "database is locked". Every connection is opened with WAL
+journaling, so readers see the last commit while a write is in progress, along with a busy timeout and memory mapped
+I/O. Read connections open the same file with query_only set, so they refuse to write. With a server database the engine settings are left to the
+SQLALCHEMY_* config values, and reads go to SQLALCHEMY_READ_DATABASE_URI, a replica, when one is set. Otherwise
+every query uses the one engine. SQLALCHEMY_ROUTE_READS turns the read routing off.
+
+A session that has written sends every later statement to the writer until it commits or rolls back, so a request
+always reads its own writes.
+
+Connections are never shared between processes: a connection made before a fork is thrown away the first time the
+child checks it out and a new one is opened instead, and dispose_engines closes every connection of the process, which
+gunicorn.conf.py does before forking the workers.'''
+
+
+#Whether a statement only reads. Text statements could do anything, so they count as writes.
+def _is_read(clause):
+    return isinstance(clause, (Select, CompoundSelect))
+
+#Set the SQLite pragmas from the config on every new connection of an engine, and make the connections of a read
+#engine refuse to write.
+def _tune_sqlite(engine, config, read_only=False):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA busy_timeout=%d' % config['SQLITE_BUSY_TIMEOUT'])
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA mmap_size=%d' % config['SQLITE_MMAP_SIZE'])
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+#Make a pool's connections belong to the process that opened them.
+def _guard_pid(engine):
+    @event.listens_for(engine, 'connect')
+    def remember_pid(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def check_pid(dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info.get('pid') != os.getpid():
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError('Connection opened by process %s, not this one' %
+                                         connection_record.info.get('pid'))
+
+'''
+Session that picks the read or the writer engine for each statement, see the module docstring.'''
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self._db = db
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self.info.get('wrote') and not self._flushing and _is_read(clause):
+            reader = self._db.get_read_engine(self.app)
+            if reader is not None:
+                return reader
+        if clause is not None or self._flushing:
+            self.info['wrote'] = True
+        return SignallingSession.get_bind(self, mapper, clause)
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+'''
+Flask-SQLAlchemy with the read and writer engines described in the module docstring.'''
+class RoutingSQLAlchemy(SQLAlchemy):
+    def __init__(self, *args, **kwargs):
+        self._read_engines = {}
+        self._read_lock = threading.Lock()
+        self._prepared = set()
+        SQLAlchemy.__init__(self, *args, **kwargs)
+
+    #The app of the current context, and outside of one the app set as the default, while Flask-SQLAlchemy would
+    #always pick the default. This lets another app made by create_app use its own database.
+    def get_app(self, reference_app=None):
+        if reference_app is None and connection_stack.top is not None:
+            return connection_stack.top.app
+        return SQLAlchemy.get_app(self, reference_app)
+
+    def create_session(self, options):
+        return RoutingSession(self, **options)
+
+    #Give the writer engine of a SQLite file a single connection that every thread can use.
+    def apply_driver_hacks(self, app, info, options):
+        SQLAlchemy.apply_driver_hacks(self, app, info, options)
+        if info.drivername == 'sqlite' and info.database not in (None, '', ':memory:'):
+            if app.config.get('SQLALCHEMY_ROUTE_READS', True):
+                options.pop('poolclass', None)
+                options.update(poolclass=QueuePool, pool_size=1, max_overflow=0,
+                               pool_timeout=app.config.get('SQLITE_WRITE_TIMEOUT', 30),
+                               connect_args={'check_same_thread': False})
+
+    def get_engine(self, app, bind=None):
+        engine = SQLAlchemy.get_engine(self, app, bind)
+        if engine not in self._prepared:
+            with self._read_lock:
+                if engine not in self._prepared:
+                    _guard_pid(engine)
+                    if engine.dialect.name == 'sqlite':
+                        _tune_sqlite(engine, _sqlite_config(app))
+                    self._prepared.add(engine)
+        return engine
+
+    #Close the connections of the app's writer engines and of every read engine. They are opened again when needed.
+    def dispose_engines(self, app):
+        state = app.extensions.get('sqlalchemy')
+        for connector in list(state.connectors.values()) if state is not None else []:
+            if connector._engine is not None:
+                connector._engine.dispose()
+        with self._read_lock:
+            for engine in self._read_engines.values():
+                engine.dispose()
+
+    #Get the engine for read queries, or None when reads should use the writer engine.
+    def get_read_engine(self, app):
+        if not app.config.get('SQLALCHEMY_ROUTE_READS', True):
+            return None
+        uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+        if not uri:
+            info = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+            if info.drivername != 'sqlite' or info.database in (None, '', ':memory:'):
+                return None
+            #Same file as the writer, the path made absolute the way Flask-SQLAlchemy does
+            self.apply_driver_hacks(app, info, {})
+            uri = str(info)
+        engine = self._read_engines.get(uri)
+        if engine is None:
+            with self._read_lock:
+                engine = self._read_engines.get(uri)
+                if engine is None:
+                    engine = self._create_read_engine(app, uri)
+                    self._read_engines[uri] = engine
+        return engine
+
+    def _create_read_engine(self, app, uri):
+        info = make_url(uri)
+        options = dict(convert_unicode=True, echo=app.config.get('SQLALCHEMY_ECHO', False))
+        if info.drivername == 'sqlite':
+            options.update(poolclass=QueuePool, pool_size=app.config.get('SQLITE_READ_POOL_SIZE', 8),
+                           max_overflow=app.config.get('SQLITE_READ_POOL_OVERFLOW', 8),
+                           connect_args={'check_same_thread': False})
+        else:
+            self.apply_pool_defaults(app, options)
+        engine = create_engine(info, **options)
+        _guard_pid(engine)
+        if info.drivername == 'sqlite':
+            _tune_sqlite(engine, _sqlite_config(app), read_only=True)
+        return engine
+
+#The SQLite settings from the config, with defaults for the ones not set.
+def _sqlite_config(app):
+    return dict(SQLITE_WAL=app.config.get('SQLITE_WAL', True),
+                SQLITE_BUSY_TIMEOUT=app.config.get('SQLITE_BUSY_TIMEOUT', 5000),
+                SQLITE_MMAP_SIZE=app.config.get('SQLITE_MMAP_SIZE', 0))
@@ -32,18 +32,19 @@ def create_running_team():
     user6 = User.query.filter(User.user_name == 'Aubs75').one()
     user7 = User.query.filter(User.user_name == 'Josie1').one()
     user8 = User.query.filter(User.user_name == 'LaurenL').one()
-    team = Team(name='UIUC Girls Running Club', admin='VPeterson')
-    high5_1 = High5(receiver='VPeterson', giver='Kathy', message='Veronica organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
-    high5_2 = High5(receiver='VPeterson', giver='RaychHeinz', message='Veronica brought me my racing flats from my apartment when I realized I forgot them right before race time.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_3 = High5(receiver='Aubs75', giver='Kathy', message='Aubrey organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
-    high5_4 = High5(receiver='LaurenL', giver='Aubs75', message='Lauren drove all the freshmen members home from their service event even though she did not have to go.', time_posted=datetime.datetime.utcnow(), level=3, team=team)
-    high5_5 = High5(receiver='Snewell', giver='Kathy', message='Sarah brought extra Gatorade to practice this week for everyone', time_posted=datetime.datetime.utcnow(), level=2, team=team)
-    high5_6 = High5(receiver='Kathy', giver='Aubs75', message='Kathleen stayed after practice to help me organize the uniforms to pass out next week.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_7 = High5(receiver='VPeterson', giver='Aubs75', message='Veronica helped clean up the fitness center after we got it all muddy from the rainy day.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_8 = High5(receiver='Hunter1994', giver='RaychHeinz', message='Sam organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
-    high5_9 = High5(receiver='Josie1', giver='Hunter1994', message='Josie talked to the university about donating space in the Union for us to host our philanthropy event.', time_posted=datetime.datetime.utcnow(), level=2, team=team)
-    high5_10 = High5(receiver='Josie1', giver='Kathy', message='Josie went door to door around Champaign asking for donations for the philanthropy event.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
-    high5_11 = High5(receiver='Aubs75', giver='VPeterson', message='Aubrey made posters to cheer on all the runners for the hometown classic!', time_posted=datetime.datetime.utcnow(), level=2, team=team)
+    users = dict((user.get_user_name(), user) for user in [user1, user2, user3, user4, user5, user6, user7, user8])
+    team = Team(name='UIUC Girls Running Club', admin=user1)
+    high5_1 = High5(receiver=users['VPeterson'], giver=users['Kathy'], message='Veronica organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
+    high5_2 = High5(receiver=users['VPeterson'], giver=users['RaychHeinz'], message='Veronica brought me my racing flats from my apartment when I realized I forgot them right before race time.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_3 = High5(receiver=users['Aubs75'], giver=users['Kathy'], message='Aubrey organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
+    high5_4 = High5(receiver=users['LaurenL'], giver=users['Aubs75'], message='Lauren drove all the freshmen members home from their service event even though she did not have to go.', time_posted=datetime.datetime.utcnow(), level=3, team=team)
+    high5_5 = High5(receiver=users['Snewell'], giver=users['Kathy'], message='Sarah brought extra Gatorade to practice this week for everyone', time_posted=datetime.datetime.utcnow(), level=2, team=team)
+    high5_6 = High5(receiver=users['Kathy'], giver=users['Aubs75'], message='Kathleen stayed after practice to help me organize the uniforms to pass out next week.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_7 = High5(receiver=users['VPeterson'], giver=users['Aubs75'], message='Veronica helped clean up the fitness center after we got it all muddy from the rainy day.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_8 = High5(receiver=users['Hunter1994'], giver=users['RaychHeinz'], message='Sam organized an awesome Halloween themed pasta party for all the racers this weekend!', time_posted=datetime.datetime.utcnow(), level=5, team=team)
+    high5_9 = High5(receiver=users['Josie1'], giver=users['Hunter1994'], message='Josie talked to the university about donating space in the Union for us to host our philanthropy event.', time_posted=datetime.datetime.utcnow(), level=2, team=team)
+    high5_10 = High5(receiver=users['Josie1'], giver=users['Kathy'], message='Josie went door to door around Champaign asking for donations for the philanthropy event.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
+    high5_11 = High5(receiver=users['Aubs75'], giver=users['VPeterson'], message='Aubrey made posters to cheer on all the runners for the hometown classic!', time_posted=datetime.datetime.utcnow(), level=2, team=team)
     team.members.append(user1)
     team.members.append(user2)
     team.members.append(user3)
@@ -75,15 +76,16 @@ def create_project_team():
     user3 = User.query.filter(User.user_name == 'Jane').one()
     user4 = User.query.filter(User.user_name == 'Tom').one()
     user5 = User.query.filter(User.user_name == 'Pat').one()
-    team = Team(name='CS465 Group 17', admin='VPeterson')
-    high5_1 = High5(receiver='VPeterson', giver='John', message='Veronica reminded everyone to turn in their peer evaluations.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_2 = High5(receiver='VPeterson', giver='Jane', message='Veronica drove me home from the group meeting when it was raining.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_4 = High5(receiver='Jane', giver='VPterson', message='Jane let me borrow her laptop to code when mine broke.', time_posted=datetime.datetime.utcnow(), level=2, team=team)
-    high5_5 = High5(receiver='Jane', giver='Tom', message='Jane brought candy to our meeting on Halloween!', time_posted=datetime.datetime.utcnow(), level=1, team=team)
-    high5_6 = High5(receiver='Jane', giver='VPeterson', message='Jane met with extra users for the research checkpoint.', time_posted=datetime.datetime.utcnow(), level=5, team=team)
-    high5_7 = High5(receiver='Tom', giver='John', message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=team)
-    high5_8 = High5(receiver='Pat', giver='Tom', message='Pat went to the store to get supplies to make paper prototypes.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
-    high5_9 = High5(receiver='Pat', giver='Jane', message='Pat let us use his apartment to meet for user interviews.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
+    users = dict((user.get_user_name(), user) for user in [user1, user2, user3, user4, user5])
+    team = Team(name='CS465 Group 17', admin=user1)
+    high5_1 = High5(receiver=users['VPeterson'], giver=users['John'], message='Veronica reminded everyone to turn in their peer evaluations.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_2 = High5(receiver=users['VPeterson'], giver=users['Jane'], message='Veronica drove me home from the group meeting when it was raining.', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_4 = High5(receiver=users['Jane'], giver=users['VPeterson'], message='Jane let me borrow her laptop to code when mine broke.', time_posted=datetime.datetime.utcnow(), level=2, team=team)
+    high5_5 = High5(receiver=users['Jane'], giver=users['Tom'], message='Jane brought candy to our meeting on Halloween!', time_posted=datetime.datetime.utcnow(), level=1, team=team)
+    high5_6 = High5(receiver=users['Jane'], giver=users['VPeterson'], message='Jane met with extra users for the research checkpoint.', time_posted=datetime.datetime.utcnow(), level=5, team=team)
+    high5_7 = High5(receiver=users['Tom'], giver=users['John'], message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=team)
+    high5_8 = High5(receiver=users['Pat'], giver=users['Tom'], message='Pat went to the store to get supplies to make paper prototypes.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
+    high5_9 = High5(receiver=users['Pat'], giver=users['Jane'], message='Pat let us use his apartment to meet for user interviews.', time_posted=datetime.datetime.utcnow(), level=4, team=team)
     team.members.append(user1)
     team.members.append(user2)
     team.members.append(user3)
@@ -1,12 +1,13 @@
 from flask_wtf import Form
 from wtforms import StringField, SelectMultipleField
 from wtforms.validators import DataRequired
+from user_ids_field import UserIdsField
 
 '''
-Add team members form. Requires user to select one or more usernames of members to add to the team.
-Only the team admin can add members.'''
+Add team members form. Requires user to select one or more usernames of members to add to the team, found by
+searching. Only the team admin can add members.'''
 class EditTeamForm(Form):
-    users = SelectMultipleField(u'Add Members', coerce=int, validators=[DataRequired()])
+    users = UserIdsField(u'Add Members', validators=[DataRequired()])
 
 '''
 Remove team members form. Requires user to select one or more usernames of members to remove
@@ -11,13 +11,28 @@ def send_email(subject, sender, recipients, text_body, html_body):
     msg.html = html_body
     mail.send(msg)
 
-#Method to specifically send a notification to the receiver of a new High5 to tell them they have received a high5.
+#Method to build the notification email for the receiver of a new High5 to tell them they have received a high5.
 #Uses a set subject and the admin email as the sender, but populates the message based on the giver and message.
+def high5_email(receiver, giver, message):
+    msg = Message("%s gave you a High5!" % giver, sender=ADMINS[0], recipients=[receiver.get_email()])
+    msg.body = render_template("high5_email.txt", receiver=receiver, giver=giver, message=message)
+    msg.html = render_template("high5_email.html", receiver=receiver, giver=giver, message=message)
+    return msg
+
+#Method to specifically send a notification to the receiver of a new High5 to tell them they have received a high5.
+#This sends right away over its own connection, the web app queues notifications through outbox.py instead.
 def high5_notif(receiver, giver, message):
-    send_email("%s gave you a High5!" % giver,
-               ADMINS[0],
-               [receiver.get_email()],
-               render_template("high5_email.txt",
-                               receiver=receiver, giver=giver, message=message),
-               render_template("high5_email.html",
-                               receiver=receiver, giver=giver, message=message))
\ No newline at end of file
+    mail.send(high5_email(receiver, giver, message))
+
+#Method to build one digest email for a receiver with every High5 notification waiting for them, grouped by team.
+#The templates are rendered once for the whole digest instead of once per High5.
+def high5_digest_email(receiver, notifications):
+    teams = []
+    for notification in sorted(notifications, key=lambda n: (n.team_name, n.created)):
+        if not teams or teams[-1][0] != notification.team_name:
+            teams.append((notification.team_name, []))
+        teams[-1][1].append(notification)
+    msg = Message("You received %d High5's!" % len(notifications), sender=ADMINS[0], recipients=[receiver.get_email()])
+    msg.body = render_template("high5_digest.txt", receiver=receiver, teams=teams, count=len(notifications))
+    msg.html = render_template("high5_digest.html", receiver=receiver, teams=teams, count=len(notifications))
+    return msg
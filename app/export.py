@@ -0,0 +1,116 @@
+from app import active_app, app_db
+from sqlalchemy.orm import aliased
+from models import User, Team, High5
+from collections import OrderedDict
+import csv
+import datetime
+import json
+import re
+import zlib
+
+'''
+Exports of the High5 history, for one team or every team and optionally a range of days, as CSV or newline delimited
+JSON and optionally gzipped. An export is a generator of byte chunks that reads the High5's with one query and
+yield_per, so rows are fetched from the database cursor EXPORT_BATCH_SIZE at a time and each batch is written out
+before the next is read: memory stays the same for a thousand rows or ten million. The one query also means the export
+is a consistent snapshot even while High5's are being given. Used by the export route for team admins and by
+export_high5s.py.'''
+
+#The columns of an export, in order.
+COLUMNS = ['id', 'team', 'time_posted', 'giver', 'receiver', 'level', 'message']
+
+#The formats an export can be written in, with their content types.
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+
+#Text cells starting with these are formulas to a spreadsheet, so CSV exports prefix them with a quote.
+FORMULA = re.compile(u'^[=+\\-@\t\r]')
+
+#Get the rows of an export as tuples in COLUMNS order, ordered by team, then oldest first. They are read off the
+#team feed index, and start and end are datetimes bounding time_posted inclusively.
+def export_rows(team_id=None, start=None, end=None):
+    giver = aliased(User)
+    receiver = aliased(User)
+    query = app_db.session.query(High5.id, Team.name, High5.time_posted, giver.user_name, receiver.user_name,
+                                 High5.level, High5.message). \
+        join(Team, Team.id == High5.team_id). \
+        outerjoin(giver, giver.id == High5.giver_id).outerjoin(receiver, receiver.id == High5.receiver_id)
+    if team_id is not None:
+        query = query.filter(High5.team_id == team_id)
+    if start is not None:
+        query = query.filter(High5.time_posted >= start)
+    if end is not None:
+        query = query.filter(High5.time_posted <= end)
+    return query.order_by(High5.team_id, High5.time_posted, High5.id).yield_per(active_app.config['EXPORT_BATCH_SIZE'])
+
+#Get the export as a generator of byte chunks, one per batch of rows.
+def export_chunks(format='csv', team_id=None, start=None, end=None, compress=False):
+    writer = _csv_chunks if format == 'csv' else _ndjson_chunks
+    chunks = writer(_batches(export_rows(team_id, start, end), active_app.config['EXPORT_BATCH_SIZE']))
+    return _gzip(chunks) if compress else chunks
+
+#The name to download an export as, like high5s-my-team-2016-01-01-2016-12-31.csv.gz.
+def export_filename(team_name, format='csv', start=None, end=None, compress=False):
+    parts = ['high5s', re.sub(r'[^A-Za-z0-9]+', '-', team_name or 'all').strip('-').lower() or 'team']
+    parts += [day.strftime('%Y-%m-%d') for day in [start, end] if day is not None]
+    return '-'.join(parts) + '.' + format + ('.gz' if compress else '')
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+'''
+File like object the csv module writes lines to, collecting them until they are taken as one chunk.'''
+class _Lines(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def take(self):
+        chunk = ''.join(self.lines)
+        self.lines = []
+        return chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+
+#A value as a CSV cell: text as UTF-8 on Python 2, where the csv module only writes bytes, and times in ISO format.
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, type(u'')):
+        if FORMULA.match(value):
+            value = u"'" + value
+        if bytes is str:
+            return value.encode('utf-8')
+    return value
+
+def _csv_chunks(batches):
+    lines = _Lines()
+    writer = csv.writer(lines, lineterminator='\n')
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        writer.writerows([[_cell(value) for value in row] for row in batch])
+        yield lines.take()
+    if lines.lines:
+        yield lines.take()
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(OrderedDict((column, value.isoformat() if isinstance(value, datetime.datetime)
+                                              else value) for column, value in zip(COLUMNS, row))) + '\n'
+                      for row in batch).encode('utf-8')
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
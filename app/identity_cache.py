@@ -0,0 +1,142 @@
+from app import active_app, app_db
+from flask import session
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import User
+from collections import OrderedDict
+import threading
+import time
+
+'''
+In process cache of the logged in users for the Flask-Login user loader, so an authenticated request does not have to
+query the user table before it can run. The cache holds CachedUser records, the few user columns the pages need,
+keyed by id, in LRU order with a time to live (USER_CACHE_SIZE and USER_CACHE_TTL in config.py).
+
+Every change to a user row bumps User.version and drops the user from this process's cache once the change commits;
+dropping it at the flush would let another request reload the old row before the commit and cache it again. Other worker processes
+cannot see that drop, so the version is also stamped into the user's session when they log in or change their own
+settings, and a cached record older than the stamp is reloaded. Changes a user did not make
+themselves reach other processes within the time to live.'''
+
+'''
+A read only stand in for a logged in User with the columns the pages use. Changes must go through the User model.'''
+class CachedUser(UserMixin):
+    def __init__(self, id, user_name, name, email, notify_pref, version):
+        self.id = id
+        self.user_name = user_name
+        self.name = name
+        self.email = email
+        self.notify_pref = notify_pref
+        self.version = version
+
+    def __repr__(self):
+        return '<CachedUser %r>' % (self.user_name)
+
+    def get_id(self):
+        try:
+            return unicode(self.id)  # python 2
+        except NameError:
+            return str(self.id)  # python 3
+
+    def get_user_name(self):
+        return self.user_name
+
+    def get_name(self):
+        return self.name
+
+    def get_email(self):
+        return self.email
+
+    def get_notify_pref(self):
+        return self.notify_pref
+
+'''
+Bounded LRU cache with a time to live, safe to share between request threads. Counts hits and misses.'''
+class IdentityCache(object):
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    #Get the record for an id if it is cached, not expired and at least the given version, when one is given.
+    def get(self, user_id, version=None):
+        with self._lock:
+            entry = self._records.pop(user_id, None)
+            if entry is not None:
+                record, expires = entry
+                if expires > time.time() and (version is None or record.version >= version):
+                    self._records[user_id] = entry
+                    self.hits += 1
+                    return record
+            self.misses += 1
+            return None
+
+    def put(self, record):
+        with self._lock:
+            self._records.pop(record.id, None)
+            self._records[record.id] = (record, time.time() + self.ttl)
+            while len(self._records) > self.size:
+                self._records.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._records.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    #Get the hit and miss counters and the number of cached users.
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._records))
+
+#The cache of this process, made by init_cache for the default app and again in each forked worker.
+cache = None
+
+def init_cache(app):
+    global cache
+    cache = IdentityCache(app.config.get('USER_CACHE_SIZE', 1000), app.config.get('USER_CACHE_TTL', 300))
+
+#Load a user for Flask-Login, from the cache unless the cached record is older than the session's stamp, otherwise
+#with one query for just the cached columns. Returns None for an unknown id.
+def load_cached_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    record = cache.get(user_id, session.get('user_version'))
+    if record is not None:
+        return record
+    row = app_db.session.query(User.id, User.user_name, User.name, User.email, User.notify_pref, User.version). \
+        filter(User.id == user_id).first()
+    if row is None:
+        return None
+    record = CachedUser(*row)
+    cache.put(record)
+    return record
+
+#Stamp the user's current version into the session, after logging in or after they changed their own row.
+def remember_user_version(user):
+    session['user_version'] = user.version
+
+#Note the changed user on its session, to drop from the cache when the session commits.
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_invalidate(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('identity_changes', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    for user_id in session.info.pop('identity_changes', ()):
+        cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('identity_changes', None)
@@ -0,0 +1,524 @@
+from app import active_app, app_db
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import User, Team, High5, members
+from passwords import compare_digest
+from collections import deque
+import errno
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import select
+import socket
+import threading
+import time
+try:
+    from urllib.parse import unquote  # python 3
+except ImportError:
+    from urllib import unquote  # python 2
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+'''
+Live team feeds. When a session that gave, edited or deleted High5's commits, each change is published as an event
+for its team: give and edit carry the High5 as the feed route sends it, delete carries its id. Events of a session that
+rolls back are dropped, the same way search.py treats the search index.
+
+A Hub fans the events of a team out to everyone subscribed to it in one process, and keeps the last few events of each
+team so a browser that reconnects with Last-Event-ID gets what it missed. The browsers are served by a LiveServer:
+/live/<team name> as Server-Sent Events, for a logged in member of the team. It is one thread with a poll loop over
+non blocking sockets, so an idle browser costs a socket and a small buffer rather than a worker or a thread, and
+thousands can wait for the next High5 at once. The one query the server makes, checking that the user is on the team
+they open, runs on a thread of its own, so the loop never waits on the database.
+
+The LiveServer runs on its own in live_server.py. The web workers send it their events as UDP datagrams on
+LIVE_PUBLISH_ADDRESS, which never block the request and are simply lost when it is not running: the pages are always
+right on reload. Each datagram is signed with SECRET_KEY and the server drops any it cannot verify, so another process
+on the host cannot push events to the browsers. With LIVE_PUBLISH_ADDRESS unset, events go to the hub of the same
+process instead.'''
+
+'''
+In process pub/sub for the team events. Subscribers are functions that take the event, already formatted as a
+Server-Sent Event, and must not block: they are called with the hub locked, which keeps every subscriber's events in
+the order they were published.'''
+class Hub(object):
+    def __init__(self, replay=100):
+        self.replay = replay
+        self.published = 0
+        self.delivered = 0
+        self._subscribers = {}
+        self._recent = {}
+        self._ids = itertools.count(1)
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+
+    #Subscribe to the events of a team, first getting the kept events after last_id when it is given. Returns the
+    #token to unsubscribe with.
+    def subscribe(self, team_id, deliver, last_id=None):
+        with self._lock:
+            token = (team_id, next(self._tokens))
+            self._subscribers.setdefault(team_id, {})[token] = deliver
+            if last_id is not None:
+                for event_id, message in self._recent.get(team_id, ()):
+                    if event_id > last_id:
+                        deliver(message)
+            return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            subscribers = self._subscribers.get(token[0], {})
+            subscribers.pop(token, None)
+            if not subscribers:
+                self._subscribers.pop(token[0], None)
+
+    #Send an event to every subscriber of the team. Returns how many it was sent to.
+    def publish(self, team_id, kind, data):
+        with self._lock:
+            event_id = next(self._ids)
+            message = ('id: %d\nevent: %s\ndata: %s\n\n' % (event_id, kind, json.dumps(data))).encode('utf-8')
+            recent = self._recent.get(team_id)
+            if recent is None:
+                recent = self._recent[team_id] = deque(maxlen=self.replay)
+            recent.append((event_id, message))
+            subscribers = list(self._subscribers.get(team_id, {}).values())
+            for deliver in subscribers:
+                deliver(message)
+            self.published += 1
+            self.delivered += len(subscribers)
+            return len(subscribers)
+
+    #Get the number of teams with subscribers, of subscribers and the published and delivered counters.
+    def stats(self):
+        with self._lock:
+            return dict(teams=len(self._subscribers), subscribers=sum(map(len, self._subscribers.values())),
+                        published=self.published, delivered=self.delivered)
+
+hub = Hub(100)
+
+_publish_socket = None
+
+#Size the hub's replay from the app's config and drop the publish socket, which a forked worker must not share with
+#its parent. Run for the default app and again in each forked worker.
+def init_live(app):
+    global _publish_socket
+    hub.replay = app.config.get('LIVE_REPLAY', 100)
+    if _publish_socket is not None:
+        _publish_socket.close()
+        _publish_socket = None
+
+def _address(value):
+    host, port = value.rsplit(':', 1)
+    return host, int(port)
+
+#The signature of a published datagram's payload, an HMAC-SHA256 with the key.
+def _signature(key, payload):
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    return hmac.new(key, payload, hashlib.sha256).hexdigest().encode('ascii')
+
+#The datagram that publishes an event to the live server: the signature, a space and the event as JSON.
+def encode_event(key, team_id, kind, data):
+    payload = json.dumps([team_id, kind, data]).encode('utf-8')
+    return _signature(key, payload) + b' ' + payload
+
+#Publish an event of a team, to the live server when LIVE_PUBLISH_ADDRESS is set, otherwise to this process's hub.
+def publish(team_id, kind, data):
+    global _publish_socket
+    address = active_app.config.get('LIVE_PUBLISH_ADDRESS')
+    if not address:
+        hub.publish(team_id, kind, data)
+        return
+    try:
+        if _publish_socket is None:
+            _publish_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _publish_socket.sendto(encode_event(active_app.config['SECRET_KEY'], team_id, kind, data), _address(address))
+    except socket.error:
+        pass
+
+#The High5 as the feed route sends it. Runs inside a flush, so user names that are not loaded yet are read with the
+#flush's connection rather than through the session.
+def _high5_data(connection, high5):
+    names = {}
+    for user in [high5.__dict__.get('receiver'), high5.__dict__.get('giver')]:
+        if user is not None:
+            names[user.id] = user.user_name
+    missing = [user_id for user_id in [high5.receiver_id, high5.giver_id] if user_id and user_id not in names]
+    if missing:
+        names.update((row[0], row[1]) for row in
+                     connection.execute(app_db.select([User.id, User.user_name]).where(User.id.in_(missing))))
+    return dict(id=high5.id, receiver=names.get(high5.receiver_id), giver=names.get(high5.giver_id),
+                message=high5.message, time=high5.get_time() if high5.time_posted else None, level=high5.level)
+
+def _queue(session, change):
+    if session is not None:
+        session.info.setdefault('live_events', []).append(change)
+
+@event.listens_for(High5, 'after_insert')
+def _queue_give(mapper, connection, target):
+    _queue(object_session(target), (target.team_id, 'give', _high5_data(connection, target)))
+
+@event.listens_for(High5, 'after_update')
+def _queue_edit(mapper, connection, target):
+    _queue(object_session(target), (target.team_id, 'edit', _high5_data(connection, target)))
+
+@event.listens_for(High5, 'after_delete')
+def _queue_delete(mapper, connection, target):
+    _queue(object_session(target), (target.team_id, 'delete', dict(id=target.id)))
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    for team_id, kind, data in session.info.pop('live_events', []):
+        publish(team_id, kind, data)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('live_events', None)
+
+'''
+epoll where there is one, poll elsewhere, with the timeout in seconds either way.'''
+class _Poller(object):
+    def __init__(self):
+        if hasattr(select, 'epoll'):
+            self._poller, self._scale = select.epoll(), 1
+        else:
+            self._poller, self._scale = select.poll(), 1000
+
+    def register(self, fd, mask):
+        self._poller.register(fd, mask)
+
+    def modify(self, fd, mask):
+        self._poller.modify(fd, mask)
+
+    def unregister(self, fd):
+        self._poller.unregister(fd)
+
+    def poll(self, timeout):
+        try:
+            return self._poller.poll(timeout * self._scale)
+        except (IOError, OSError, select.error) as error:
+            if error.args[0] == errno.EINTR:
+                return []
+            raise
+
+'''
+One browser connection to the LiveServer: reading its request, then streaming events to it.'''
+class _Connection(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.request = b''
+        self.out = deque()
+        self.token = None
+        self.origin = None
+        self.closing = False
+        self.closed = False
+        self.writing = False
+        self.looking_up = False
+
+#Status lines of the responses the live server sends.
+STATUS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found', 405: 'Method Not Allowed',
+          431: 'Request Header Fields Too Large', 503: 'Service Unavailable'}
+
+'''
+Server for the live team feeds, see the module docstring. serve_forever runs the poll loop in the calling thread and
+start runs it in a new one. Every setting not given comes from config.py.'''
+class LiveServer(object):
+    def __init__(self, address=None, publish_address=None, hub=hub):
+        self.hub = hub
+        self.heartbeat = active_app.config.get('LIVE_HEARTBEAT', 15)
+        self.queue_max = active_app.config.get('LIVE_QUEUE_MAX', 200)
+        self.origins = active_app.config.get('LIVE_ORIGINS', [])
+        self.secret = active_app.config['SECRET_KEY']
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(_address(address or active_app.config['LIVE_ADDRESS']))
+        self.listener.listen(1024)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.receiver = None
+        if publish_address:
+            self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.receiver.bind(_address(publish_address))
+            self.receiver.setblocking(False)
+        self.connections = {}
+        self._ready = deque()
+        self._lookups = Queue()
+        self._looked_up = deque()
+        self._lookup_thread = None
+        self._wake_read, self._wake_write = os.pipe()
+        self._wake_pending = False
+        self._poller = _Poller()
+        self._poller.register(self.listener.fileno(), select.POLLIN)
+        self._poller.register(self._wake_read, select.POLLIN)
+        if self.receiver is not None:
+            self._poller.register(self.receiver.fileno(), select.POLLIN)
+        self._running = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        self._thread = self._thread or threading.current_thread()
+        self._lookup_thread = threading.Thread(target=self._look_up_teams)
+        self._lookup_thread.daemon = True
+        self._lookup_thread.start()
+        last_heartbeat = time.time()
+        while self._running:
+            for fd, mask in self._poller.poll(self.heartbeat):
+                if fd == self.listener.fileno():
+                    self._accept()
+                elif fd == self._wake_read:
+                    self._drain_wake()
+                elif self.receiver is not None and fd == self.receiver.fileno():
+                    self._receive()
+                else:
+                    self._handle(self.connections.get(fd), mask)
+            while self._looked_up:
+                self._subscribe(*self._looked_up.popleft())
+            while self._ready:
+                self._flush(self._ready.popleft())
+            if time.time() - last_heartbeat >= self.heartbeat:
+                last_heartbeat = time.time()
+                for connection in list(self.connections.values()):
+                    if connection.token is not None:
+                        connection.out.append(b':\n\n')
+                        self._flush(connection)
+        self._lookups.put(None)
+        self._lookup_thread.join()
+        for connection in list(self.connections.values()):
+            self._close(connection)
+        self.listener.close()
+        if self.receiver is not None:
+            self.receiver.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _wake(self):
+        if not self._wake_pending:
+            self._wake_pending = True
+            try:
+                os.write(self._wake_write, b'x')
+            except OSError:
+                pass
+
+    def _drain_wake(self):
+        self._wake_pending = False
+        try:
+            os.read(self._wake_read, 4096)
+        except OSError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.error as error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED):
+                    return
+                raise
+            sock.setblocking(False)
+            self.connections[sock.fileno()] = _Connection(sock)
+            self._poller.register(sock.fileno(), select.POLLIN)
+
+    def _receive(self):
+        while True:
+            try:
+                datagram = self.receiver.recv(65536)
+            except socket.error as error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            signature, _, payload = datagram.partition(b' ')
+            if not compare_digest(signature, _signature(self.secret, payload)):
+                continue
+            try:
+                team_id, kind, data = json.loads(payload.decode('utf-8'))
+            except ValueError:
+                continue
+            self.hub.publish(team_id, kind, data)
+
+    def _handle(self, connection, mask):
+        if connection is None:
+            return
+        if mask & (select.POLLERR | select.POLLHUP):
+            self._close(connection)
+            return
+        if mask & select.POLLIN:
+            try:
+                data = connection.sock.recv(4096)
+            except socket.error as error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                data = b''
+            if not data:
+                self._close(connection)
+                return
+            if connection.token is None and not connection.closing and not connection.looking_up:
+                connection.request += data
+                if b'\r\n\r\n' in connection.request:
+                    self._respond(connection)
+                elif len(connection.request) > 8192:
+                    self._refuse(connection, 431, 'Request too large.')
+        if mask & select.POLLOUT:
+            self._flush(connection)
+
+    #Answer the request of a connection: refuse it, or have the team looked up to subscribe it to.
+    def _respond(self, connection):
+        lines = connection.request.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection.origin = headers.get('origin') if headers.get('origin') in self.origins else None
+        if len(parts) != 3:
+            return self._refuse(connection, 400, 'Bad request.')
+        if parts[0] != 'GET':
+            return self._refuse(connection, 405, 'Only GET.')
+        path = parts[1].split('?', 1)[0]
+        if not path.startswith('/live/'):
+            return self._refuse(connection, 404, 'Not found.')
+        user_id = self._user_id(headers.get('cookie'))
+        if user_id is None:
+            return self._refuse(connection, 401, 'Log in first.')
+        try:
+            last_id = int(headers.get('last-event-id'))
+        except (TypeError, ValueError):
+            last_id = None
+        connection.looking_up = True
+        self._lookups.put((connection, unquote(path[len('/live/'):]), user_id, last_id))
+
+    #Subscribe a connection to the team that was looked up for it, or refuse it. team_id is None when the user is not
+    #on the team and False when the lookup failed.
+    def _subscribe(self, connection, team_id, last_id):
+        connection.looking_up = False
+        if connection.closed:
+            return
+        if team_id is False:
+            return self._refuse(connection, 503, 'Try again later.')
+        if team_id is None:
+            return self._refuse(connection, 404, 'You are not a member of that team.')
+        connection.out.append(self._head(connection, 200, 'text/event-stream') + b'retry: 5000\n\n')
+        connection.token = self.hub.subscribe(team_id, lambda message: self._deliver(connection, message), last_id)
+        self._flush(connection)
+
+    #Run on the lookup thread: look up the team of each connection queued by _respond and hand it back to the loop.
+    def _look_up_teams(self):
+        while True:
+            lookup = self._lookups.get()
+            if lookup is None:
+                return
+            connection, team_name, user_id, last_id = lookup
+            try:
+                team_id = self._team_id(team_name, user_id)
+            except Exception:
+                active_app.logger.exception('Could not look up the live feed of team %r' % team_name)
+                team_id = False
+            self._looked_up.append((connection, team_id, last_id))
+            self._wake()
+
+    def _head(self, connection, status, content_type, length=None):
+        head = ['HTTP/1.1 %d %s' % (status, STATUS[status]), 'Content-Type: ' + content_type,
+                'Cache-Control: no-cache', 'Connection: close', 'X-Accel-Buffering: no']
+        if length is not None:
+            head.append('Content-Length: %d' % length)
+        if connection.origin:
+            head += ['Access-Control-Allow-Origin: ' + connection.origin, 'Access-Control-Allow-Credentials: true']
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+
+    def _refuse(self, connection, status, message):
+        body = message.encode('utf-8')
+        connection.out.append(self._head(connection, status, 'text/plain; charset=utf-8', len(body)) + body)
+        connection.closing = True
+        self._flush(connection)
+
+    #The id of the user logged in with the session cookie, read the same way Flask reads it for the pages.
+    def _user_id(self, cookie):
+        if not cookie:
+            return None
+        request = active_app.request_class({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'SERVER_NAME': 'live',
+                                            'SERVER_PORT': '0', 'wsgi.url_scheme': 'http', 'HTTP_COOKIE': cookie})
+        session = active_app.open_session(request)
+        try:
+            return int(session.get('user_id')) if session is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _team_id(self, team_name, user_id):
+        try:
+            team_name = team_name.decode('utf-8')
+        except (AttributeError, UnicodeDecodeError):
+            pass
+        try:
+            row = app_db.session.query(Team.id).join(members, members.c.team_id == Team.id). \
+                filter(Team.name == team_name).filter(members.c.user_id == user_id).first()
+        finally:
+            app_db.session.remove()
+        return row[0] if row else None
+
+    #Called by the hub, from any thread. Queues the event and has the loop send it.
+    def _deliver(self, connection, message):
+        if len(connection.out) >= self.queue_max:
+            connection.closing = True
+            connection.out.clear()
+        else:
+            connection.out.append(message)
+        self._ready.append(connection)
+        if self._thread is not threading.current_thread():
+            self._wake()
+
+    #Send what a connection has queued until the socket would block, then wait for it to be writable.
+    def _flush(self, connection):
+        if connection.closed:
+            return
+        try:
+            while connection.out:
+                data = connection.out[0]
+                sent = connection.sock.send(data)
+                if sent < len(data):
+                    connection.out[0] = data[sent:]
+                    break
+                connection.out.popleft()
+        except socket.error as error:
+            if error.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._close(connection)
+                return
+        if not connection.out and connection.closing:
+            self._close(connection)
+            return
+        writing = bool(connection.out)
+        if writing != connection.writing:
+            connection.writing = writing
+            self._poller.modify(connection.sock.fileno(), select.POLLIN | (select.POLLOUT if writing else 0))
+
+    def _close(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        if connection.token is not None:
+            self.hub.unsubscribe(connection.token)
+        fd = connection.sock.fileno()
+        self.connections.pop(fd, None)
+        try:
+            self._poller.unregister(fd)
+        except (IOError, OSError, KeyError, ValueError):
+            pass
+        connection.sock.close()
+
+    #Get the number of open connections and the hub's counters.
+    def stats(self):
+        return dict(self.hub.stats(), connections=len(self.connections))
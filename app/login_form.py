@@ -6,11 +6,13 @@ from models import User
 
 '''
 Login form. Requires user to enter user_name and password. Validates that the user exists in the
-database and that the password is correct.
+database and that the password is correct, and keeps the user it checked as form.user, so the password is only
+hashed once per login.
 '''
 class LoginForm(Form):
     user_name = StringField('user_name', validators=[DataRequired()])
     password = PasswordField('password', validators=[DataRequired()])
+    user = None
 
     def validate_password(form, field):
         try:
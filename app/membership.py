@@ -0,0 +1,80 @@
+from app import active_app, app_db
+from sqlalchemy import and_, or_, exists
+from models import User, High5, members
+from stats import add_member_stats, remove_member_stats
+from search import forget_received
+from page_cache import bump_team_version
+
+'''
+Set based team membership operations and the user search behind the type-ahead. Each helper runs a fixed number of
+statements no matter how many users the site has or how many are added or removed at once: candidates come from one
+bounded prefix search, members are added with one multi-row insert and removed with one IN delete, which also bump the team's
+version for page_cache.py. Teams are passed by id. Like stats.py the helpers only add statements to the current
+session, so the caller commits them.'''
+
+
+#Condition that a user row is a member of the team, for use inside a query over User.
+def _is_member(team_id):
+    return exists().where(and_(members.c.team_id == team_id, members.c.user_id == User.id))
+
+#Condition that a column starts with the prefix, as a range so the column's index is used. The comparison is case
+#sensitive, so the prefix is also tried as typed in lower case and with a capital first letter.
+def _starts_with(column, prefix):
+    variants = set([prefix, prefix.lower(), prefix[:1].upper() + prefix[1:].lower()])
+    return or_(*[and_(column >= variant, column < variant + u'\uffff') for variant in variants])
+
+#Find users whose user name or name starts with the prefix, as (id, user_name, name) tuples ordered by name. At most
+#limit users are returned, USER_SEARCH_LIMIT by default and never more than USER_SEARCH_MAX. Users on the team with
+#the id not_on_team and user names in exclude are left out.
+def search_users(prefix, limit=None, not_on_team=None, exclude=()):
+    prefix = (prefix or u'').strip()
+    if not prefix:
+        return []
+    limit = min(limit or active_app.config['USER_SEARCH_LIMIT'], active_app.config['USER_SEARCH_MAX'])
+    query = app_db.session.query(User.id, User.user_name, User.name). \
+        filter(or_(_starts_with(User.user_name, prefix), _starts_with(User.name, prefix)))
+    if not_on_team:
+        query = query.filter(~_is_member(not_on_team))
+    if exclude:
+        query = query.filter(~User.user_name.in_(list(exclude)))
+    return query.order_by(User.name, User.id).limit(limit).all()
+
+#Get the users who are not on the team and could be added, as (id, user_name) pairs ordered by name: the users
+#search_users finds for the prefix, at most limit of them. Without a prefix there are no candidates.
+def member_candidates(team_id, prefix, limit=None):
+    return [(user_id, user_name) for user_id, user_name, _ in search_users(prefix, limit, not_on_team=team_id)]
+
+#Add the users with the given ids to the team, skipping ids that do not exist or are already members, and create
+#their stat rows. Returns the user names that were added.
+def add_members(team_id, user_ids):
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return []
+    added = app_db.session.query(User.id, User.user_name).filter(User.id.in_(user_ids)). \
+        filter(~_is_member(team_id)).all()
+    if not added:
+        return []
+    app_db.session.execute(members.insert().values([dict(team_id=team_id, user_id=user_id) for user_id, _ in added]))
+    add_member_stats(team_id, [user_id for user_id, _ in added])
+    bump_team_version(team_id)
+    return [user_name for _, user_name in added]
+
+#Remove the users with the given ids from the team along with the High5's they received on it, and drop their stat
+#rows. Ids that are not members are skipped. Returns the user names that were removed.
+def remove_members(team_id, user_ids):
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return []
+    removed = app_db.session.query(User.id, User.user_name).filter(User.id.in_(user_ids)). \
+        filter(_is_member(team_id)).all()
+    if not removed:
+        return []
+    removed_ids = [user_id for user_id, _ in removed]
+    remove_member_stats(team_id, removed_ids)
+    forget_received(team_id, removed_ids)
+    High5.query.filter(High5.team_id == team_id).filter(High5.receiver_id.in_(removed_ids)). \
+        delete(synchronize_session=False)
+    app_db.session.execute(members.delete().where(and_(members.c.team_id == team_id,
+                                                       members.c.user_id.in_(removed_ids))))
+    bump_team_version(team_id)
+    return [user_name for _, user_name in removed]
@@ -0,0 +1,256 @@
+from flask import g, request, has_request_context
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from passwords import compare_digest
+from contextlib import contextmanager
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+'''
+Per request instrumentation. While a request runs, hooks on every SQLAlchemy engine count its statements and add up the
+time they took, and the templates it renders add up their render time. When the request ends the totals go into
+histograms labelled by endpoint, which the /metrics route returns in the Prometheus text format, and a request slower
+than SLOW_REQUEST_SECONDS is written to the high5.slow_requests log as one line of JSON with its slowest statements, how
+long each took and where it came in the request. The histograms belong to the process, so with several worker processes
+each one is scraped on its own. /metrics is only served to METRICS_ADDRESSES or to a scraper that sends METRICS_TOKEN.
+Settings are the METRICS_* and SLOW_REQUEST_* values in config.py, and with METRICS_ENABLED off no hook is installed at
+all.'''
+
+#Upper bounds of the histogram buckets.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+slow_log = logging.getLogger('high5.slow_requests')
+
+'''
+One Prometheus histogram with an endpoint label. Each series keeps a count per bucket, the sum and the count, and is
+only turned into cumulative buckets when rendered.'''
+class Histogram(object):
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, endpoint, value):
+        series = self.series.get(endpoint)
+        if series is None:
+            series = self.series[endpoint] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        for endpoint in sorted(self.series):
+            counts, total = self.series[endpoint]
+            label = _label(endpoint)
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append('%s_bucket{endpoint="%s",le="%s"} %d' % (self.name, label, _number(bound), running))
+            running += counts[-1]
+            lines.append('%s_bucket{endpoint="%s",le="+Inf"} %d' % (self.name, label, running))
+            lines.append('%s_sum{endpoint="%s"} %s' % (self.name, label, _number(total)))
+            lines.append('%s_count{endpoint="%s"} %d' % (self.name, label, running))
+        return lines
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+DURATION = Histogram('high5_request_duration_seconds', 'Time to handle a request.', SECONDS_BUCKETS)
+QUERIES = Histogram('high5_request_queries', 'SQL statements run by a request.', QUERY_BUCKETS)
+DB_TIME = Histogram('high5_request_db_seconds', 'Time a request spent running SQL statements.', SECONDS_BUCKETS)
+TEMPLATE_TIME = Histogram('high5_request_template_seconds', 'Time a request spent rendering templates.',
+                          SECONDS_BUCKETS)
+SIZE = Histogram('high5_response_size_bytes', 'Size of the response body.', SIZE_BUCKETS)
+HISTOGRAMS = [DURATION, QUERIES, DB_TIME, TEMPLATE_TIME, SIZE]
+
+#Functions returning more lines for /metrics, for what other modules count, like admission.py.
+COLLECTORS = []
+
+#Requests by (endpoint, method, status), and slow requests by endpoint.
+requests_total = {}
+slow_total = {}
+_lock = threading.Lock()
+
+'''
+What one request has done so far. Kept on flask.g by the hooks below.'''
+class RequestStats(object):
+    def __init__(self):
+        self.start = time.time()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = []
+        self.rendering = False
+        self.streamed_status = None
+        self.streamed_size = 0
+        self.done = False
+
+def _stats():
+    if has_request_context():
+        return getattr(g, 'request_stats', None)
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_start'] = time.time()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.time() - conn.info['metrics_start']
+    stats = _stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements.append((statement, elapsed))
+
+#Add the time the block takes to the current request's template time, unless a template it is rendered inside of
+#is already being timed.
+@contextmanager
+def _timing_template():
+    stats = _stats()
+    if stats is None or stats.rendering:
+        yield
+        return
+    stats.rendering = True
+    start = time.time()
+    try:
+        yield
+    finally:
+        stats.rendering = False
+        stats.template_time += time.time() - start
+
+'''
+Template class that adds the time it takes to render to the current request, whether rendered in one piece or
+streamed, see streaming.py.'''
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        with _timing_template():
+            return Template.render(self, *args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        events = Template.generate(self, *args, **kwargs)
+        while True:
+            with _timing_template():
+                event = next(events, None)
+            if event is None:
+                return
+            yield event
+
+def _bytes(text):
+    return text if isinstance(text, bytes) else text.encode('utf-8')
+
+#Whether the request may read /metrics: it comes from one of METRICS_ADDRESSES or sends METRICS_TOKEN as a bearer
+#token.
+def may_scrape(config):
+    if request.remote_addr in config.get('METRICS_ADDRESSES', ()):
+        return True
+    token = config.get('METRICS_TOKEN')
+    return bool(token) and compare_digest(_bytes(request.headers.get('Authorization', '')), _bytes('Bearer ' + token))
+
+#Install the hooks on the app, and on every engine the first time, unless METRICS_ENABLED is off.
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.jinja_env.template_class = TimedTemplate
+    #Every app made in the process shares slow_log, so the file gets one handler however many apps log to it.
+    path = app.config.get('SLOW_REQUEST_LOG')
+    if path and not any(getattr(handler, 'baseFilename', None) == os.path.abspath(path)
+                        for handler in slow_log.handlers):
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_log.addHandler(handler)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = _stats()
+        if response.is_streamed and stats is not None:
+            stats.streamed_status = response.status_code
+            response.response = _counted(response.response, stats)
+            return response
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = len(response.get_data())
+        _record(app, response.status_code, size or 0)
+        return response
+
+    #A streamed response is recorded when the request context it keeps ends, once it is sent or the browser went away.
+    @app.teardown_request
+    def fail_request_stats(error=None):
+        stats = _stats()
+        if stats is not None and stats.streamed_status is not None and \
+                (error is None or isinstance(error, GeneratorExit)):
+            _record(app, stats.streamed_status, stats.streamed_size)
+        elif error is not None:
+            _record(app, 500, 0)
+
+#Add up the bytes of a streamed response as it is sent.
+def _counted(chunks, stats):
+    try:
+        for chunk in chunks:
+            stats.streamed_size += len(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+#Add a finished request to the histograms and write it to the slow request log if it was slow.
+def _record(app, status, size):
+    stats = _stats()
+    if stats is None or stats.done or request.endpoint == 'pages.metrics':
+        return
+    stats.done = True
+    duration = time.time() - stats.start
+    endpoint = request.endpoint or 'none'
+    slow = duration >= app.config.get('SLOW_REQUEST_SECONDS', 0.5)
+    with _lock:
+        key = (endpoint, request.method, status)
+        requests_total[key] = requests_total.get(key, 0) + 1
+        DURATION.observe(endpoint, duration)
+        QUERIES.observe(endpoint, stats.queries)
+        DB_TIME.observe(endpoint, stats.db_time)
+        TEMPLATE_TIME.observe(endpoint, stats.template_time)
+        SIZE.observe(endpoint, size)
+        if slow:
+            slow_total[endpoint] = slow_total.get(endpoint, 0) + 1
+    if slow:
+        limit = app.config.get('SLOW_REQUEST_STATEMENTS', 20)
+        slowest = sorted(enumerate(stats.statements), key=lambda item: -item[1][1])[:limit]
+        slow_log.warning(json.dumps(dict(
+            method=request.method, path=request.full_path.rstrip('?'), endpoint=endpoint, status=status,
+            duration_ms=round(duration * 1000, 2), queries=stats.queries, db_ms=round(stats.db_time * 1000, 2),
+            template_ms=round(stats.template_time * 1000, 2), bytes=size,
+            statements=[dict(n=n + 1, sql=statement, ms=round(elapsed * 1000, 2))
+                        for n, (statement, elapsed) in slowest]), sort_keys=True))
+
+#Render every metric in the Prometheus text format.
+def render_metrics():
+    with _lock:
+        lines = ['# HELP high5_requests_total Requests handled.', '# TYPE high5_requests_total counter']
+        for (endpoint, method, status), count in sorted(requests_total.items()):
+            lines.append('high5_requests_total{endpoint="%s",method="%s",status="%d"} %d' %
+                         (_label(endpoint), method, status, count))
+        lines += ['# HELP high5_slow_requests_total Requests slower than SLOW_REQUEST_SECONDS.',
+                  '# TYPE high5_slow_requests_total counter']
+        for endpoint, count in sorted(slow_total.items()):
+            lines.append('high5_slow_requests_total{endpoint="%s"} %d' % (_label(endpoint), count))
+        for histogram in HISTOGRAMS:
+            lines += histogram.render()
+    for collect in COLLECTORS:
+        lines += collect()
+    return '\n'.join(lines) + '\n'
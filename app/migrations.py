@@ -0,0 +1,42 @@
+from app import active_app
+from migrate.exceptions import DatabaseNotControlledError
+from migrate.versioning import api
+
+'''
+Schema migrations with sqlalchemy-migrate. The change scripts live in the SQLALCHEMY_MIGRATE_REPO repository and a
+database records the version it is at in its migrate_version table, so upgrading runs only the scripts it has not
+had yet and never drops what it already holds. A database that is not under version control, whether new and empty
+or made by an older db_create.py, is put under version control at version 0 and upgraded from there: the first
+script only creates the tables, columns and indexes that are missing. Schema changes go in a new script in
+db_repository/versions as well as in models.py.'''
+
+
+def _url(url):
+    return url or active_app.config['SQLALCHEMY_DATABASE_URI']
+
+#Get the schema version of the database, or None if it is not under version control.
+def database_version(url=None):
+    try:
+        return int(api.db_version(_url(url), active_app.config['SQLALCHEMY_MIGRATE_REPO']))
+    except DatabaseNotControlledError:
+        return None
+
+#Get the newest schema version in the repository.
+def latest_version():
+    return int(api.version(active_app.config['SQLALCHEMY_MIGRATE_REPO']))
+
+#Upgrade the database in place to the given version, the newest by default, putting it under version control first
+#if it is not. Returns the version the database is at.
+def upgrade_database(version=None, url=None):
+    url = _url(url)
+    if database_version(url) is None:
+        api.version_control(url, active_app.config['SQLALCHEMY_MIGRATE_REPO'], 0)
+    api.upgrade(url, active_app.config['SQLALCHEMY_MIGRATE_REPO'], version)
+    return database_version(url)
+
+#Downgrade the database to the given version by running the downgrade of every script above it. Returns the version
+#the database is at.
+def downgrade_database(version, url=None):
+    url = _url(url)
+    api.downgrade(url, active_app.config['SQLALCHEMY_MIGRATE_REPO'], version)
+    return database_version(url)
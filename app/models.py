@@ -1,26 +1,35 @@
 from app import app_db
+import datetime
 import operator
 from random import SystemRandom
 
-from backports.pbkdf2 import pbkdf2_hmac, compare_digest
 from flask_login import UserMixin
+from sqlalchemy import event
 from sqlalchemy.ext.hybrid import hybrid_property
+from passwords import hash_password, check_password
 
 '''
 Database table members to represent the many to many relationship between Teams and Users.
 A user can be on many teams and a team can have many users. Each user can only
-be on a team one time. Uses the primary keys of the Team and User tables.'''
+be on a team one time. Uses the integer primary keys of the Team and User tables. The unique constraint finds the
+members of a team and the index on (user_id, team_id) finds the teams of a user.'''
 members = app_db.Table('members',
-                app_db.Column('team', app_db.String(100), app_db.ForeignKey('team.name', ondelete='CASCADE')),
-                app_db.Column('user', app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE')),
-                app_db.UniqueConstraint('team', 'user', name='UC_team_user')
+                app_db.Column('team_id', app_db.Integer, app_db.ForeignKey('team.id', ondelete='CASCADE'), nullable=False),
+                app_db.Column('user_id', app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False),
+                app_db.UniqueConstraint('team_id', 'user_id', name='UC_team_user'),
+                app_db.Index('ix_members_user', 'user_id', 'team_id')
                 )
 
+#The ways a user can choose to be emailed about High5's they receive.
+NOTIFY_PREFS = ['immediate', 'hourly', 'daily']
+
 '''
 Class to represent a User on the High5 website in the database. In the db, a user has a unique  given id,
-a unique chosen user_name, a name, an email, and a password for login. The user can be a part of
+a unique chosen user_name, a name, an email, a password for login and a choice of how High5 emails are sent to
+them (right away, or gathered into an hourly or daily digest). The version goes up by one on every change to the row,
+which lets the logged in user cache in identity_cache.py tell a stale copy from a current one. The user can be a part of
 multiple Teams through a relationship in the members table. The password for the User must be stored hashed
-so that there is security around it.'''
+so that there is security around it, see passwords.py for how.'''
 class User(UserMixin, app_db.Model):
     id = app_db.Column(app_db.Integer, primary_key=True)
     user_name = app_db.Column(app_db.String(50), unique=True)
@@ -28,13 +37,15 @@ class User(UserMixin, app_db.Model):
     email = app_db.Column(app_db.String(120), unique=True)
     _password = app_db.Column(app_db.LargeBinary(120))
     _salt = app_db.Column(app_db.String(120))
+    notify_pref = app_db.Column(app_db.String(10), nullable=False, default='immediate', server_default='immediate')
+    version = app_db.Column(app_db.Integer, nullable=False, default=1, server_default='1')
 
     def __init__(self , user_name ,name , email, password):
         self.user_name = user_name
         self.name = name
         self.email = email
         self._salt = bytes(SystemRandom().getrandbits(128))
-        self._password = self._hash_password(password)
+        self._password = hash_password(password, bytes(self._salt))
 
     #Print representation of a User for testing
     def __repr__(self):
@@ -59,31 +70,45 @@ class User(UserMixin, app_db.Model):
     def get_email(self):
         return self.email
 
+    #Getter for how the user wants High5 emails sent, one of NOTIFY_PREFS
+    def get_notify_pref(self):
+        return self.notify_pref
+
     #Getter for the hashed password.
     @hybrid_property
     def password(self):
         return self._password
 
-    #Method to check if the given password is valid.
+    #Method to check if the given password is valid. A valid password stored with an outdated algorithm or cost is
+    #hashed again with the current one, which the caller commits.
     def is_valid_password(self, password):
-        new_hash = self._hash_password(password)
-        return compare_digest(new_hash, self._password)
+        valid, stale = check_password(password, bytes(self._salt), self._password)
+        if valid and stale:
+            self._password = hash_password(password, bytes(self._salt))
+        return valid
 
-    #Method to hash a password.
-    def _hash_password(self, password):
-        pwd = password.encode("utf-8")
-        salt = bytes(self._salt)
-        buff = pbkdf2_hmac("sha512", pwd, salt, iterations=100000)
-        return bytes(buff)
+#Bump the version of a user whose own columns changed. Changes to the user's teams alone do not count.
+@event.listens_for(User, 'before_update')
+def _bump_user_version(mapper, connection, target):
+    if app_db.session.is_modified(target, include_collections=False):
+        target.version = (target.version or 0) + 1
 
 '''
-Class to represent a Team on the High5 website in the database. In the db, a team has a name, an admin which is
-represented by the username of an existing user, and relationships with users and high5s. A team can have many users and
-also many High5's.'''
+Class to represent a Team on the High5 website in the database. In the db, a team has a unique given id, a unique
+name, an admin which is the id of an existing user, and relationships with users and high5s. Every other table refers
+to a team by its id, so the name only appears here and in URLs. A team can have many users and also many High5's.
+The version goes up by one and modified is set on every write to the team's High5's or members, which lets
+page_cache.py tell whether a rendered page of the team is still current.'''
 class Team(app_db.Model):
-    name = app_db.Column(app_db.String(100), primary_key=True)
-    admin = app_db.Column(app_db.String(50), app_db.ForeignKey('user.user_name', ondelete='CASCADE'))
+    id = app_db.Column(app_db.Integer, primary_key=True)
+    name = app_db.Column(app_db.String(100), unique=True, nullable=False)
+    admin_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'))
+    version = app_db.Column(app_db.Integer, nullable=False, default=1, server_default='1')
+    modified = app_db.Column(app_db.DateTime, default=datetime.datetime.utcnow)
+    admin = app_db.relationship('User')
     high5s = app_db.relationship('High5', backref='team', lazy='dynamic', cascade="all, delete-orphan")
+    stats = app_db.relationship('MemberStat', backref='team', lazy='dynamic', cascade="all, delete-orphan")
+    daily_stats = app_db.relationship('DailyStat', backref='team', lazy='dynamic', cascade="all, delete-orphan")
     members = app_db.relationship('User', secondary=members, backref=app_db.backref('teams', lazy='dynamic'), lazy='dynamic')
 
     #Print representation of team for testing
@@ -94,37 +119,47 @@ class Team(app_db.Model):
     def get_name(self):
         return self.name
 
-    #Getter for the team admin
+    #Getter for the user name of the team admin
     def get_admin(self):
-        return self.admin
+        return self.admin.user_name if self.admin else None
+
+    #Getter for the user id of the team admin
+    def get_admin_id(self):
+        return self.admin_id
 
 
 '''
 High5 is a class to represent the High5 messages team members can give to each other on the website.
-In the database, High5's have a unique id, a receiver and a giver which are both User's usernames, a message, a
-time the High5 was posted, and a level between 1 and 5 of the helpfulness of a contribution.
+In the database, High5's have a unique id, a receiver and a giver which are both User ids, a message, a
+time the High5 was posted, and a level between 1 and 5 of the helpfulness of a contribution. The receiver and giver
+Users are loaded in the same query as the High5, since every page that shows a High5 shows their user names.
 A High5 also knows what team it is a part of because a High5 is the many side of the one to many
 relationship with a Team (a High5 can only belong to one team).'''
 class High5(app_db.Model):
     id = app_db.Column(app_db.Integer, primary_key = True)
-    receiver = app_db.Column(app_db.String(50), app_db.ForeignKey('user.user_name', ondelete='CASCADE'))
-    giver = app_db.Column(app_db.String(50), app_db.ForeignKey('user.user_name', ondelete='CASCADE'))
+    receiver_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'))
+    giver_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'))
     message = app_db.Column(app_db.String(250))
     time_posted = app_db.Column(app_db.DateTime)
     level = app_db.Column(app_db.Integer)
-    team_name = app_db.Column(app_db.String(100), app_db.ForeignKey('team.name', ondelete='CASCADE'))
+    team_id = app_db.Column(app_db.Integer, app_db.ForeignKey('team.id', ondelete='CASCADE'))
+    receiver = app_db.relationship('User', foreign_keys=[receiver_id], lazy='joined')
+    giver = app_db.relationship('User', foreign_keys=[giver_id], lazy='joined')
+    __table_args__ = (app_db.Index('ix_high5_team_feed', 'team_id', 'time_posted', 'id'),
+                      app_db.Index('ix_high5_team_receiver_feed', 'team_id', 'receiver_id', 'time_posted', 'id'),
+                      app_db.Index('ix_high5_team_giver_feed', 'team_id', 'giver_id', 'time_posted', 'id'))
 
     #Print representation of a High5 for testing
     def __repr__(self):
         return '<High5 %r>' % (self.message)
 
-    #Getter for the High5 receiver
+    #Getter for the user name of the High5 receiver
     def get_receiver(self):
-        return self.receiver
+        return self.receiver.user_name if self.receiver else None
 
-    #Getter for the High5 giver
+    #Getter for the user name of the High5 giver
     def get_giver(self):
-        return self.giver
+        return self.giver.user_name if self.giver else None
 
     #Getter for the High5 message
     def get_message(self):
@@ -138,6 +173,88 @@ class High5(app_db.Model):
     def get_level(self):
         return self.level
 
+'''
+MemberStat is a materialized summary of one member's High5 activity on one team, keyed by the team and user ids. Each
+team member has exactly one row holding their High5 score (sum of levels received), the count of High5's received and
+the count of High5's given on that team. The rows are kept up to date by the helpers in stats.py in the same transaction as the High5 or
+membership change, so the team leaderboards can be read as a top-k query over an index instead of a full scan.'''
+class MemberStat(app_db.Model):
+    __tablename__ = 'member_stat'
+    team_id = app_db.Column(app_db.Integer, app_db.ForeignKey('team.id', ondelete='CASCADE'), primary_key=True)
+    user_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    score = app_db.Column(app_db.Integer, nullable=False, default=0)
+    received = app_db.Column(app_db.Integer, nullable=False, default=0)
+    given = app_db.Column(app_db.Integer, nullable=False, default=0)
+    __table_args__ = (app_db.Index('ix_member_stat_team_score', 'team_id', 'score'),
+                      app_db.Index('ix_member_stat_team_received', 'team_id', 'received'),
+                      app_db.Index('ix_member_stat_team_given', 'team_id', 'given'))
+
+    #Print representation of a MemberStat for testing
+    def __repr__(self):
+        return '<MemberStat %r %r>' % (self.team_id, self.user_id)
+
+    #Getter for the member's totals as a (score, received, given) tuple
+    def get_totals(self):
+        return (self.score, self.received, self.given)
+
+'''
+DailyStat is a per day rollup of the High5's on a team for one user. Each row holds the High5 score and count the
+user received and the count they gave on that team on that (UTC) day. Like MemberStat it is maintained by stats.py on
+every write, so a leaderboard or score history over any date range sums one bucket per day instead of rescanning the
+High5 table. Unlike MemberStat it mirrors the High5 table exactly, including High5's involving non members, and the
+leaderboards join it against the current members when reading.'''
+class DailyStat(app_db.Model):
+    __tablename__ = 'daily_stat'
+    team_id = app_db.Column(app_db.Integer, app_db.ForeignKey('team.id', ondelete='CASCADE'), primary_key=True)
+    user_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    day = app_db.Column(app_db.Date, primary_key=True)
+    score = app_db.Column(app_db.Integer, nullable=False, default=0)
+    received = app_db.Column(app_db.Integer, nullable=False, default=0)
+    given = app_db.Column(app_db.Integer, nullable=False, default=0)
+    __table_args__ = (app_db.Index('ix_daily_stat_team_day', 'team_id', 'day'),)
+
+    #Print representation of a DailyStat for testing
+    def __repr__(self):
+        return '<DailyStat %r %r %s>' % (self.team_id, self.user_id, self.day)
+
+    #Getter for the day's totals as a (score, received, given) tuple
+    def get_totals(self):
+        return (self.score, self.received, self.given)
+
+'''
+Notification is one row of the email outbox. When a High5 is given, a pending notification for its receiver is added
+in the same transaction, and the worker in outbox.py later sends it over SMTP. The receiver is a user id, while the
+giver's user name, the team name and the message are copied in so the email says what the High5 said when it was
+given. The receiver's notify_pref is copied in as the mode, and hourly or daily notifications are not due until the end
+of their digest window, when the worker sends every notification the receiver has waiting as one digest email. A notification that keeps failing is retried with backoff until
+it runs out of attempts and is marked dead, where it stays for someone to look at instead of being retried forever.'''
+class Notification(app_db.Model):
+    id = app_db.Column(app_db.Integer, primary_key=True)
+    receiver_id = app_db.Column(app_db.Integer, app_db.ForeignKey('user.id', ondelete='CASCADE'))
+    giver = app_db.Column(app_db.String(50))
+    message = app_db.Column(app_db.String(250))
+    team_name = app_db.Column(app_db.String(100))
+    mode = app_db.Column(app_db.String(10), nullable=False, default='immediate')
+    status = app_db.Column(app_db.String(10), nullable=False, default='pending')
+    attempts = app_db.Column(app_db.Integer, nullable=False, default=0)
+    next_attempt = app_db.Column(app_db.DateTime, nullable=False)
+    last_error = app_db.Column(app_db.String(250))
+    created = app_db.Column(app_db.DateTime)
+    sent = app_db.Column(app_db.DateTime)
+    __table_args__ = (app_db.Index('ix_notification_due', 'status', 'next_attempt'),)
+
+    #Print representation of a Notification for testing
+    def __repr__(self):
+        return '<Notification %r %r>' % (self.receiver_id, self.status)
+
+    #Getter for the notification status, one of pending, sent or dead
+    def get_status(self):
+        return self.status
+
+    #Getter for whether the notification waits for a digest instead of being sent on its own
+    def is_digest(self):
+        return self.mode != 'immediate'
+
 #Calculate the high5 score based on the passed in list of high5s, which will be all the High5's
 #received by one team member (the current user).
 def calculate_score(high5s):
@@ -0,0 +1,11 @@
+from flask_wtf import Form
+from wtforms import SelectField
+from wtforms.validators import DataRequired
+
+'''
+Notification settings form. Lets a user choose whether High5 emails are sent to them right away or gathered into
+an hourly or daily digest.'''
+class NotificationForm(Form):
+    notify_pref = SelectField(u'High5 Emails', choices=[('immediate', 'Right away'), ('hourly', 'Hourly digest'),
+                                                        ('daily', 'Daily digest')],
+                              validators=[DataRequired()])
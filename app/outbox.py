@@ -0,0 +1,171 @@
+from app import active_app, app_db, mail
+from models import User, Notification
+from emails import high5_email, high5_digest_email
+import datetime
+import logging
+import smtplib
+import socket
+import time
+
+'''
+The email outbox. Web requests only add a pending Notification row in the same transaction as the High5, and the
+worker started by notify_worker.py drains the outbox in batches, sending each batch over a single SMTP connection.
+Receivers who chose an hourly or daily digest get one email with everything waiting for them when their window
+closes, instead of one email per High5. Failed notifications are retried with exponential backoff and marked dead
+once they run out of attempts. A notification whose email cannot be built or sent for any other reason, like a bad
+address or a broken template, is marked dead at once and logged to high5.outbox, so it never holds up the rest of the
+outbox. Settings are the OUTBOX_* values in config.py.'''
+
+#Errors that mean the mail server could not take a message right now, as opposed to a bug in the worker.
+SEND_ERRORS = (smtplib.SMTPException, socket.error)
+
+outbox_log = logging.getLogger('high5.outbox')
+
+#Queue a notification for the receiver of a new High5, given by id, due right away or at the end of the receiver's
+#digest window. The team name and the giver's user name are copied into the email. The caller commits it together with
+#the High5.
+def enqueue_high5(team_name, giver, receiver_id, message, now=None):
+    now = now or datetime.datetime.utcnow()
+    receiver_user = User.query.get(receiver_id)
+    mode = receiver_user.get_notify_pref() if receiver_user else 'immediate'
+    app_db.session.add(Notification(receiver_id=receiver_id, giver=giver, message=message, team_name=team_name,
+                                    mode=mode, status='pending', attempts=0, next_attempt=digest_due(mode, now),
+                                    created=now))
+
+#When a notification queued now in the given mode is due. Hourly digests go out on the hour and daily digests at
+#midnight UTC, so everything a receiver gets within one window is due at the same moment and goes out together.
+def digest_due(mode, now):
+    if mode == 'hourly':
+        return now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    if mode == 'daily':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+    return now
+
+#Claim up to limit due notifications for this worker, and with them every other due digest notification of the
+#receivers of the digest ones, so a receiver's digest goes out as one email however many High5's it holds and wherever
+#the limit falls. Claiming counts the attempt and pushes next_attempt out by the lease, with one guarded UPDATE per
+#notification, so another worker polling at the same time skips the ones this worker got and a worker that dies mid
+#batch only delays its notifications until the lease runs out.
+def claim_due(limit, now=None):
+    now = now or datetime.datetime.utcnow()
+    lease_end = now + datetime.timedelta(seconds=active_app.config['OUTBOX_LEASE'])
+    due_now = Notification.query.filter(Notification.status == 'pending').filter(Notification.next_attempt <= now)
+    due = due_now.with_entities(Notification.id, Notification.receiver_id, Notification.mode). \
+        order_by(Notification.next_attempt, Notification.receiver_id, Notification.id).limit(limit).all()
+    ids = [notification_id for notification_id, _, _ in due]
+    digest_receivers = set(receiver_id for _, receiver_id, mode in due if mode != 'immediate')
+    if digest_receivers:
+        ids += [notification_id for (notification_id,) in due_now.with_entities(Notification.id).
+                filter(Notification.mode != 'immediate').filter(Notification.receiver_id.in_(digest_receivers)).
+                filter(~Notification.id.in_(ids)).order_by(Notification.id)]
+    claimed = []
+    for notification_id in ids:
+        updated = Notification.query.filter(Notification.id == notification_id). \
+            filter(Notification.status == 'pending').filter(Notification.next_attempt <= now). \
+            update({Notification.next_attempt: lease_end, Notification.attempts: Notification.attempts + 1},
+                   synchronize_session=False)
+        if updated:
+            claimed.append(notification_id)
+    app_db.session.commit()
+    if not claimed:
+        return []
+    return Notification.query.filter(Notification.id.in_(claimed)).order_by(Notification.id).all()
+
+#Seconds to wait before the next attempt after the given number of failed attempts.
+def retry_delay(attempts):
+    delay = active_app.config['OUTBOX_RETRY_DELAY'] * 2 ** max(attempts - 1, 0)
+    return min(delay, active_app.config['OUTBOX_MAX_RETRY_DELAY'])
+
+#Record a failed attempt, scheduling a retry or marking the notification dead once it is out of attempts, or at once
+#for a permanent failure that another attempt would only repeat.
+def _fail(notification, error, now, permanent=False):
+    notification.last_error = ('%s: %s' % (type(error).__name__, error))[:250] if permanent else str(error)[:250]
+    if permanent or notification.attempts >= active_app.config['OUTBOX_MAX_ATTEMPTS']:
+        notification.status = 'dead'
+    else:
+        notification.next_attempt = now + datetime.timedelta(seconds=retry_delay(notification.attempts))
+
+#Group a batch into the emails to send, as a list of (receiver, notifications) pairs. Each immediate notification is
+#an email of its own while the digest notifications of one receiver share an email. Notifications for users that do
+#not exist are marked dead.
+def _group_emails(notifications):
+    receivers = dict((user.id, user) for user in
+                     User.query.filter(User.id.in_(set(n.receiver_id for n in notifications))))
+    emails = []
+    digests = {}
+    for notification in notifications:
+        receiver = receivers.get(notification.receiver_id)
+        if receiver is None:
+            notification.status = 'dead'
+            notification.last_error = 'No user with id %s' % notification.receiver_id
+        elif not notification.is_digest():
+            emails.append((receiver, [notification]))
+        elif notification.receiver_id in digests:
+            digests[notification.receiver_id].append(notification)
+        else:
+            digests[notification.receiver_id] = [notification]
+            emails.append((receiver, digests[notification.receiver_id]))
+    return emails
+
+#Build the email for a group made by _group_emails, a digest when more than one High5 is waiting.
+def _build_email(receiver, notifications):
+    if len(notifications) == 1:
+        return high5_email(receiver, notifications[0].giver, notifications[0].message)
+    return high5_digest_email(receiver, notifications)
+
+#Send one batch of due notifications over one SMTP connection. Must run inside an app context. Returns a dict with
+#the number of notifications sent, scheduled for retry and marked dead.
+def drain_outbox(now=None):
+    now = now or datetime.datetime.utcnow()
+    counts = dict(sent=0, retry=0, dead=0)
+    notifications = claim_due(active_app.config['OUTBOX_BATCH_SIZE'], now)
+    if not notifications:
+        return counts
+    done = set()
+    try:
+        with mail.connect() as connection:
+            for receiver, group in _group_emails(notifications):
+                try:
+                    connection.send(_build_email(receiver, group))
+                except SEND_ERRORS as error:
+                    for notification in group:
+                        _fail(notification, error, now)
+                except Exception as error:
+                    outbox_log.exception('Could not send notifications %s', [n.id for n in group])
+                    for notification in group:
+                        _fail(notification, error, now, permanent=True)
+                else:
+                    for notification in group:
+                        notification.status = 'sent'
+                        notification.sent = now
+                done.update(notification.id for notification in group)
+    except SEND_ERRORS as error:
+        #Could not connect, or the connection broke outside a send, so the rest of the batch is retried
+        for notification in notifications:
+            if notification.id not in done and notification.status == 'pending':
+                _fail(notification, error, now)
+    except Exception:
+        #Keep what was sent, the rest is claimed again once its lease runs out
+        app_db.session.commit()
+        raise
+    for notification in notifications:
+        if notification.status == 'pending':
+            counts['retry'] += 1
+        else:
+            counts[notification.status] += 1
+    app_db.session.commit()
+    return counts
+
+#Run the outbox worker until interrupted, draining batches back to back and sleeping when the outbox is empty or a
+#batch failed.
+def run_worker(poll_interval=None):
+    poll_interval = poll_interval or active_app.config['OUTBOX_POLL_INTERVAL']
+    while True:
+        try:
+            with active_app.app_context():
+                counts = drain_outbox()
+        except Exception:
+            outbox_log.exception('Could not drain the outbox')
+            counts = {}
+        if not sum(counts.values()):
+            time.sleep(poll_interval)
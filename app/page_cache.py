@@ -0,0 +1,206 @@
+from app import active_app, app_db
+from flask import request, Markup
+from werkzeug.http import is_resource_modified
+from models import Team
+from collections import OrderedDict
+import datetime
+import hashlib
+import os
+import socket
+import threading
+
+'''
+Caching of the team and user pages. Every write that changes what a team's pages show (giving, editing or deleting a
+High5 and adding or removing members) bumps the team's version with bump_team_version, in the same transaction. The
+pages are built from fragments (the leaderboards, the team feed, the body of the user page) that are rendered once per
+team version and kept in a bounded cache, so a page of a team nobody has written to since only runs the query for the
+team. Each page also gets an ETag made from the team version and the URL, and Last-Modified from the team's last write,
+and a browser that already has the page as of that version gets 304 Not Modified without anything being rendered.
+
+The cache backend is the in process LRU cache below by default, one per worker process, or a memcached server shared
+by every worker when PAGE_CACHE_SERVER is set in config.py. Keys hold the team version, so nothing is ever invalidated:
+fragments of older versions are just never asked for again and fall out of the cache.'''
+
+#Templates whose text goes into every key and ETag, so changed templates are not served from the cache after a
+#deploy.
+TEMPLATES = ['team.html', 'team_leaders.html', 'team_feed.html', 'user.html', 'user_high5s.html']
+
+def _templates_digest():
+    digest = hashlib.sha1()
+    for name in TEMPLATES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', name), 'rb') as template:
+            digest.update(template.read())
+    return digest.hexdigest()[:12]
+
+TEMPLATES_DIGEST = _templates_digest()
+
+#Bump the version of a team and set its modified time. Like stats.py this only adds a statement to the session, so
+#the caller commits it together with the write.
+def bump_team_version(team_id):
+    app_db.session.execute(Team.__table__.update().where(Team.id == team_id).
+                           values(version=Team.__table__.c.version + 1, modified=datetime.datetime.utcnow()))
+
+'''
+Bounded LRU cache of rendered fragments in this process, safe to share between request threads. Counts hits and
+misses.'''
+class LocalCache(object):
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._values.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._values[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = value
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    #Get the hit and miss counters and the number of cached fragments.
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._values))
+
+'''
+Client for a memcached server, speaking its text protocol over one connection per thread. The cache is only an
+optimization, so a server that is down or answers badly counts as a miss and the page is rendered instead.'''
+class MemcachedCache(object):
+    def __init__(self, server, timeout=0.5):
+        host, port = server.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.create_connection(self.address, self.timeout)
+            connection = self._local.connection = (sock, sock.makefile('rb'))
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b'get ' + key.encode('utf-8') + b'\r\n')
+            line = reader.readline()
+            value = None
+            if line.startswith(b'VALUE '):
+                length = int(line.split()[3])
+                value = reader.read(length + 2)[:length].decode('utf-8')
+                line = reader.readline()
+            if line != b'END\r\n':
+                raise IOError('unexpected reply %r' % line)
+        except (IOError, socket.error, ValueError, IndexError):
+            self._close()
+            self._count('errors')
+            value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value):
+        data = value.encode('utf-8')
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b'set ' + key.encode('utf-8') + b' 0 0 ' + str(len(data)).encode('ascii') + b'\r\n' +
+                         data + b'\r\n')
+            if reader.readline() != b'STORED\r\n':
+                raise IOError('not stored')
+        except (IOError, socket.error):
+            self._close()
+            self._count('errors')
+
+    def clear(self):
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b'flush_all\r\n')
+            reader.readline()
+        except (IOError, socket.error):
+            self._close()
+
+    #Get the hit, miss and error counters.
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, errors=self.errors)
+
+#Make the backend config.py asks for.
+def make_cache(config):
+    if config.get('PAGE_CACHE_SERVER'):
+        return MemcachedCache(config['PAGE_CACHE_SERVER'])
+    return LocalCache(config.get('PAGE_CACHE_SIZE', 2000))
+
+#The backend of this process, made by init_cache for the default app and again in each forked worker, so no memcached
+#connection is shared between processes.
+cache = None
+
+def init_cache(app):
+    global cache
+    cache = make_cache(app.config)
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+#Get a fragment of a team's pages from the cache, or render it with the function and cache it. The key is the team's
+#id, version and modified time, which tells apart a new team that was given the id of a deleted one, the fragment name
+#and the parts, which must hold everything else the fragment depends on.
+def cached_fragment(team, name, parts, render):
+    key = 'high5:%s:%d:%d:%s:%s' % (TEMPLATES_DIGEST, team.id, team.version, name, _digest(team.modified, *parts))
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html)
+    return Markup(html)
+
+#Answer a GET for a page of the team with 304 when the client already has it as of the team's current version,
+#otherwise render it with the function. The parts are the values the page depends on besides the team version and
+#the URL. A page that shows anything relative to today passes the date as changes_daily, so its ETag changes every
+#day and Last-Modified is never before the day started. The ETag is weak, as the page is the same whether it is sent
+#compressed or not, see compression.py.
+def conditional_page(team, parts, render, changes_daily=None):
+    if request.method not in ('GET', 'HEAD'):
+        return render()
+    etag = _digest(TEMPLATES_DIGEST, team.id, team.version, team.modified, request.full_path, changes_daily, *parts)
+    last_modified = team.modified
+    if changes_daily is not None:
+        day_start = datetime.datetime.combine(changes_daily, datetime.time())
+        last_modified = max(last_modified, day_start) if last_modified else day_start
+    if is_resource_modified(request.environ, 'W/"%s"' % etag, last_modified=last_modified):
+        response = active_app.make_response(render())
+    else:
+        response = active_app.response_class(status=304)
+    response.headers['ETag'] = 'W/"%s"' % etag  # set_etag of this Werkzeug writes weak ETags with w/
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,48 @@
+from sqlalchemy import desc, and_, or_
+from models import High5
+import datetime
+
+'''
+Keyset (cursor) pagination for the High5 feeds. Feeds are ordered newest first on (time_posted, id), and a page
+continues from the cursor of the last High5 on the previous page instead of using an OFFSET, so every page is a short
+range read off the (team_id, ..., time_posted, id) indexes on High5 no matter how long the team's history is.'''
+
+#Number of High5's shown on each page of a feed.
+PER_PAGE = 25
+
+CURSOR_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+#Build the opaque cursor that points just past the given High5, as "<time_posted>_<id>".
+def encode_cursor(high5):
+    return '%s_%d' % (high5.time_posted.strftime(CURSOR_FORMAT), high5.id)
+
+#Parse a cursor made by encode_cursor back into a (time_posted, id) pair. Returns None for a missing or malformed
+#cursor so callers fall back to the first page.
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        time_part, id_part = cursor.rsplit('_', 1)
+        return datetime.datetime.strptime(time_part, CURSOR_FORMAT), int(id_part)
+    except ValueError:
+        return None
+
+#Get one page of a High5 query, newest first, starting after the cursor. The query should only filter, the ordering
+#is added here so it always matches the cursor. Returns (high5s, next_cursor) where next_cursor is None on the last
+#page.
+def keyset_page(query, cursor=None, per_page=PER_PAGE):
+    position = decode_cursor(cursor)
+    if position is not None:
+        time_posted, high5_id = position
+        query = query.filter(or_(High5.time_posted < time_posted,
+                                 and_(High5.time_posted == time_posted, High5.id < high5_id)))
+    high5s = query.order_by(desc(High5.time_posted), desc(High5.id)).limit(per_page + 1).all()
+    if len(high5s) > per_page:
+        high5s = high5s[:per_page]
+        return high5s, encode_cursor(high5s[-1])
+    return high5s, None
+
+#Turn a High5 into the plain dict sent by the feed endpoint.
+def high5_to_dict(high5):
+    return dict(id=high5.id, receiver=high5.get_receiver(), giver=high5.get_giver(), message=high5.get_message(),
+                time=high5.get_time(), level=high5.get_level())
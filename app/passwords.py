@@ -0,0 +1,205 @@
+from app import active_app
+import hashlib
+import multiprocessing
+import os
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+try:
+    from hmac import compare_digest
+except ImportError:
+    from backports.pbkdf2 import compare_digest
+
+try:
+    from hashlib import pbkdf2_hmac
+except ImportError:
+    from backports.pbkdf2 import pbkdf2_hmac
+
+'''
+Password hashing for User. A stored password is "<algorithm>$<cost>$<digest>", so every hash says how it was made and
+a hash made with an older algorithm or a lower cost is upgraded the next time its user logs in. Hashes written before
+the prefix existed are bare 100,000 iteration PBKDF2-SHA512 digests and verify as exactly that. Hashing runs on a
+small pool of threads (PASSWORD_HASH_THREADS in config.py); the native hashlib functions release the GIL, so while a
+login waits on the pool, the other request threads of its process keep running. That takes a server that runs
+requests on threads, like the gthread workers of gunicorn.conf.py, which also sizes the pool of each worker.
+import_csv.py hashes many passwords at once on a pool of processes instead, one per CPU core by default, see
+hash_passwords, while /api/import hashes its batch on the threads, see hash_passwords_threaded.'''
+
+'''
+PBKDF2-SHA512 through the hashlib function backed by OpenSSL. The cost is the iteration count. Falls back to the
+backports.pbkdf2 package on Pythons older than 2.7.8, which lack hashlib.pbkdf2_hmac.'''
+class Pbkdf2Hasher(object):
+    name = 'pbkdf2_sha512'
+    available = True
+
+    def __init__(self, iterations=100000):
+        self.cost = str(iterations)
+
+    def hash(self, password, salt, cost):
+        return pbkdf2_hmac('sha512', password, salt, int(cost))
+
+'''
+scrypt through hashlib, available on Python 3.6+ built against OpenSSL 1.1. The cost is "n,r,p".'''
+class ScryptHasher(object):
+    name = 'scrypt'
+    available = hasattr(hashlib, 'scrypt')
+
+    def __init__(self, n=16384, r=8, p=1):
+        self.cost = '%d,%d,%d' % (n, r, p)
+
+    def hash(self, password, salt, cost):
+        n, r, p = [int(part) for part in cost.split(',')]
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=64)
+
+HASHERS = dict((hasher.name, hasher) for hasher in [Pbkdf2Hasher, ScryptHasher])
+
+#How the passwords stored before the algorithm prefix existed were hashed.
+LEGACY = (Pbkdf2Hasher.name, '100000')
+
+'''
+A fixed size pool of daemon threads that run hashing jobs for the request threads. The threads start on first use
+and are started again in a process forked after that, since threads do not survive a fork.'''
+class HashPool(object):
+    def __init__(self, size):
+        self.size = size
+        self._tasks = Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._tasks = Queue()
+            for _ in range(self.size):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        tasks = self._tasks
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            func, args, done, outcome = task
+            try:
+                outcome.append((True, func(*args)))
+            except Exception as error:
+                outcome.append((False, error))
+            done.set()
+
+    #Run func(*args) on a pool thread, wait for it and return its result or raise its exception.
+    def run(self, func, *args):
+        return self.map(func, [args])[0]
+
+    #Run func(*args) for each args in the list on the pool's threads, wait for all of them and return their results in
+    #order, or raise the exception of the first that failed.
+    def map(self, func, args_list):
+        if self._pid != os.getpid():
+            self._start()
+        jobs = []
+        for args in args_list:
+            done, outcome = threading.Event(), []
+            self._tasks.put((func, args, done, outcome))
+            jobs.append((done, outcome))
+        results = []
+        for done, outcome in jobs:
+            done.wait()
+            ok, value = outcome[0]
+            if not ok:
+                raise value
+            results.append(value)
+        return results
+
+    #Stop the pool's threads once they finish the jobs already queued. The next run starts new ones.
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for _ in range(self.size):
+                    self._tasks.put(None)
+            self._pid = None
+
+#The pool of this process, made by init_pool for the default app and again in each forked worker.
+pool = None
+
+def init_pool(app):
+    global pool
+    if pool is not None:
+        pool.close()
+    pool = HashPool(app.config.get('PASSWORD_HASH_THREADS', 4))
+
+#Get the hasher new passwords are hashed with, from PASSWORD_HASHER in config.py. Falls back to PBKDF2 if the
+#configured algorithm is not available on this Python.
+def current_hasher():
+    if active_app.config.get('PASSWORD_HASHER') == ScryptHasher.name and ScryptHasher.available:
+        return ScryptHasher(*active_app.config.get('PASSWORD_SCRYPT_COST', (16384, 8, 1)))
+    return Pbkdf2Hasher(active_app.config.get('PASSWORD_PBKDF2_ITERATIONS', 100000))
+
+#Split a stored password into (algorithm, cost, digest), recognising the bare legacy digests.
+def _parse(stored):
+    stored = bytes(stored)
+    for name in HASHERS:
+        prefix = (name + '$').encode('ascii')
+        if stored.startswith(prefix):
+            _, cost, digest = stored.split(b'$', 2)
+            return name, cost.decode('ascii'), digest
+    return LEGACY[0], LEGACY[1], stored
+
+#Hash a password with the current hasher and return the value to store.
+def hash_password(password, salt):
+    hasher = current_hasher()
+    digest = pool.run(hasher.hash, password.encode('utf-8'), salt, hasher.cost)
+    return ('%s$%s$' % (hasher.name, hasher.cost)).encode('ascii') + bytes(digest)
+
+#Passwords each process of hash_passwords hashes per task.
+HASH_CHUNK = 50
+
+#Hash one chunk of hash_passwords' (password, salt) pairs in a pool process.
+def _hash_chunk(pairs):
+    hasher = current_hasher()
+    prefix = ('%s$%s$' % (hasher.name, hasher.cost)).encode('ascii')
+    return [prefix + bytes(hasher.hash(password.encode('utf-8'), salt, hasher.cost)) for password, salt in pairs]
+
+#Hash many (password, salt) pairs with the current hasher across a pool of processes, the given number or one per CPU
+#core. Returns the values to store, in order. Processes sidestep the GIL entirely, and hashing in chunks keeps the
+#pickling between them small next to the hashing.
+def hash_passwords(pairs, processes=None):
+    chunks = [pairs[start:start + HASH_CHUNK] for start in range(0, len(pairs), HASH_CHUNK)]
+    processes = min(processes or multiprocessing.cpu_count(), len(chunks))
+    if processes <= 1:
+        hashed = [_hash_chunk(chunk) for chunk in chunks]
+    else:
+        workers = multiprocessing.Pool(processes)
+        try:
+            hashed = workers.map(_hash_chunk, chunks)
+        finally:
+            workers.close()
+            workers.join()
+    return [value for chunk in hashed for value in chunk]
+
+#Hash many (password, salt) pairs with the current hasher on the thread pool of this process, for a request: unlike
+#hash_passwords it forks nothing inside the web worker and keeps to PASSWORD_HASH_THREADS cores. Returns the values to
+#store, in order.
+def hash_passwords_threaded(pairs):
+    hasher = current_hasher()
+    prefix = ('%s$%s$' % (hasher.name, hasher.cost)).encode('ascii')
+    digests = pool.map(hasher.hash, [(password.encode('utf-8'), salt, hasher.cost) for password, salt in pairs])
+    return [prefix + bytes(digest) for digest in digests]
+
+#Check a password against a stored value. Returns (valid, stale) where stale means the stored value was made with
+#another algorithm or cost than the current hasher and should be replaced with hash_password.
+def check_password(password, salt, stored):
+    name, cost, digest = _parse(stored)
+    hasher = HASHERS[name]
+    if not hasher.available:
+        return False, True
+    candidate = pool.run(hasher().hash, password.encode('utf-8'), salt, cost)
+    valid = compare_digest(bytes(candidate), digest)
+    current = current_hasher()
+    return valid, (name, cost) != (current.name, current.cost)
@@ -0,0 +1,185 @@
+from app import active_app, app_db
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import High5
+from whoosh import index
+from whoosh.compat import text_type
+from whoosh.fields import Schema, ID, TEXT, NUMERIC, DATETIME
+from whoosh.qparser import QueryParser
+from whoosh.query import And, Or, Term, DateRange
+from whoosh.writing import AsyncWriter, CLEAR
+import datetime
+import os
+import shutil
+import threading
+
+'''
+Full text search over High5 messages with Whoosh indexes under the WHOOSH_BASE directory, one index per team. Every
+search is scoped to a team, so keeping the teams apart means a search only reads the posting lists of that team's
+High5's and costs the same however many High5's the rest of the site has. Each index holds the message, giver,
+receiver and time of the team's High5's, so searches are also scoped by those without touching the database, and
+returns High5 ids newest first that are then loaded in one query. Teams, givers and receivers are kept by id, so
+renaming a team or a user leaves the indexes as they are.
+
+The indexes follow the database on their own: inserts, updates and deletes of High5 rows are collected on the session
+and written to the indexes once the session commits, and dropped if it rolls back. Bulk deletes that bypass the ORM
+must tell the index with forget_received. search_index.py rebuilds the indexes from the database.'''
+
+#Nothing is stored: opening a searcher over stored fields reads an offset for every document, which would cost more
+#than the search itself. The High5 id comes from the id column instead. The giver and receiver are user ids as text.
+SCHEMA = Schema(id=NUMERIC(unique=True, sortable=True),
+                message=TEXT,
+                giver=ID,
+                receiver=ID,
+                time=DATETIME(sortable=True))
+
+_indexes = {}
+_lock = threading.Lock()
+
+#Whoosh only indexes unicode text, while High5's made in Python 2 code may hold byte strings.
+def _text(value):
+    if value is None or isinstance(value, text_type):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return text_type(value)
+
+#Get the directory of a team's index, named by the team id.
+def _team_path(team_id):
+    return os.path.join(active_app.config['WHOOSH_BASE'], str(int(team_id)))
+
+#Get a team's index, creating an empty one the first time.
+def get_index(team_id):
+    path = _team_path(team_id)
+    with _lock:
+        if path not in _indexes:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            if index.exists_in(path):
+                _indexes[path] = index.open_dir(path)
+            else:
+                _indexes[path] = index.create_in(path, SCHEMA)
+        return _indexes[path]
+
+#Build the index document for a High5.
+def _document(high5):
+    return dict(id=high5.id, message=_text(high5.message) or u'', giver=_text(high5.giver_id),
+                receiver=_text(high5.receiver_id), time=high5.time_posted)
+
+#Queue an index change to apply when the session the High5 belongs to commits.
+def _queue(session, change):
+    session.info.setdefault('search_changes', []).append(change)
+
+@event.listens_for(High5, 'after_insert')
+@event.listens_for(High5, 'after_update')
+def _queue_update(mapper, connection, target):
+    _queue(object_session(target), ('update', target.team_id, _document(target)))
+
+@event.listens_for(High5, 'after_delete')
+def _queue_delete(mapper, connection, target):
+    _queue(object_session(target), ('delete', target.team_id, target.id))
+
+#Queue removing the High5's the users with the given ids received on the team, for the bulk delete that removes team
+#members.
+def forget_received(team_id, user_ids):
+    if user_ids:
+        _queue(app_db.session(), ('forget_received', team_id, [_text(user_id) for user_id in user_ids]))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if changes:
+        try:
+            apply_changes(changes)
+        except Exception:
+            active_app.logger.exception('Could not update the High5 search index, run search_index.py rebuild')
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('search_changes', None)
+
+#Write queued changes to the indexes with one writer per team. A writer waits for its index lock in the background if
+#another process holds it.
+def apply_changes(changes):
+    writers = {}
+    for kind, team_id, value in changes:
+        if team_id not in writers:
+            writers[team_id] = AsyncWriter(get_index(team_id))
+        writer = writers[team_id]
+        if kind == 'update':
+            writer.update_document(**value)
+        elif kind == 'delete':
+            writer.delete_by_term('id', value)
+        else:
+            writer.delete_by_query(Or([Term('receiver', user_id) for user_id in value]))
+    for writer in writers.values():
+        writer.commit()
+
+#Search the High5 messages of a team, optionally only those from a giver, to a receiver (user ids) or posted between
+#start and end (datetimes, either may be None). Returns (ids, total) for the page of matches, newest first, where ids
+#are High5 ids and total is the number of matches.
+def search_high5s(team_id, text, giver_id=None, receiver_id=None, start=None, end=None, page=1, per_page=25):
+    text = _text(text or u'').strip()
+    if not text or not index.exists_in(_team_path(team_id)):
+        return [], 0
+    query = [QueryParser('message', SCHEMA).parse(text)]
+    if giver_id is not None:
+        query.append(Term('giver', _text(giver_id)))
+    if receiver_id is not None:
+        query.append(Term('receiver', _text(receiver_id)))
+    if start or end:
+        query.append(DateRange('time', start, end))
+    with get_index(team_id).searcher() as searcher:
+        results = searcher.search_page(And(query), page, pagelen=per_page, sortedby='time', reverse=True)
+        high5_ids = searcher.reader().column_reader('id')
+        return [high5_ids[hit.docnum] for hit in results], len(results)
+
+#Parse a YYYY-MM-DD day from a search form into the datetime it starts at, or ends at when end is true. Returns None
+#for a missing or malformed day.
+def parse_day(value, end=False):
+    try:
+        day = datetime.datetime.strptime(value or '', '%Y-%m-%d')
+    except ValueError:
+        return None
+    if end:
+        return day + datetime.timedelta(days=1, microseconds=-1)
+    return day
+
+#Load the High5's for ids from search_high5s in the same order. High5's deleted since they were indexed are skipped.
+def load_high5s(ids):
+    if not ids:
+        return []
+    high5s = dict((high5.id, high5) for high5 in High5.query.filter(High5.id.in_(ids)))
+    return [high5s[high5_id] for high5_id in ids if high5_id in high5s]
+
+#Replace the indexes with ones built from the High5 table, or just the index of the team with the given id. A full
+#rebuild also removes the indexes of teams that no longer have High5's. Returns the number of High5's indexed.
+def rebuild_index(team_id=None, batch_size=10000):
+    query = app_db.session.query(High5.id, High5.message, High5.team_id, High5.giver_id, High5.receiver_id,
+                                 High5.time_posted).filter(High5.team_id != None).order_by(High5.team_id)
+    if team_id is not None:
+        query = query.filter(High5.team_id == team_id)
+    count = 0
+    writer = None
+    rebuilt = set()
+    for high5 in query.yield_per(batch_size):
+        path = _team_path(high5.team_id)
+        if path not in rebuilt:
+            if writer is not None:
+                writer.commit(mergetype=CLEAR)
+            writer = get_index(high5.team_id).writer(limitmb=256)
+            rebuilt.add(path)
+        writer.add_document(**_document(high5))
+        count += 1
+    if writer is not None:
+        writer.commit(mergetype=CLEAR)
+    if team_id is not None and not count:
+        get_index(team_id).writer().commit(mergetype=CLEAR)
+    if team_id is None and os.path.isdir(active_app.config['WHOOSH_BASE']):
+        for name in os.listdir(active_app.config['WHOOSH_BASE']):
+            path = os.path.join(active_app.config['WHOOSH_BASE'], name)
+            if path not in rebuilt:
+                with _lock:
+                    _indexes.pop(path, None)
+                shutil.rmtree(path)
+    return count
@@ -0,0 +1,77 @@
+/*
+ * "Load more" links for the High5 feeds on the team and user pages. Each a.load_more link carries the JSON feed url
+ * (data-feed), the cursor of the next page (data-next), the id of the list to append to (data-list) and which kind of
+ * feed it is (data-kind). Without javascript the link's href loads the next page server side instead.
+ */
+(function () {
+    function line(parent, text) {
+        parent.appendChild(document.createElement('br'));
+        parent.appendChild(document.createTextNode(text));
+    }
+
+    function renderHigh5(high5, link) {
+        var kind = link.getAttribute('data-kind');
+        var item = document.createElement('li');
+        item.id = 'high5-' + high5.id;
+        if (kind !== 'team') {
+            item.className = 'user_high5';
+        }
+        var icon = document.createElement('span');
+        icon.className = 'icon icon-star';
+        var message = document.createElement('h3');
+        message.className = 'high5_msg';
+        message.appendChild(document.createTextNode(high5.message));
+        icon.appendChild(message);
+        item.appendChild(icon);
+        var details = document.createElement('p');
+        details.className = 'high5_dets';
+        if (kind === 'received') {
+            details.appendChild(document.createTextNode('From: ' + high5.giver));
+        } else {
+            details.appendChild(document.createTextNode('To: ' + high5.receiver));
+            if (kind === 'team') {
+                line(details, 'From: ' + high5.giver);
+            }
+        }
+        line(details, 'Date: ' + high5.time);
+        line(details, 'Level: ' + high5.level);
+        if (kind === 'given') {
+            var edit = document.createElement('a');
+            edit.href = link.getAttribute('data-edit') + high5.id;
+            edit.appendChild(document.createTextNode('Edit High5'));
+            details.appendChild(document.createElement('br'));
+            details.appendChild(edit);
+        }
+        item.appendChild(details);
+        return item;
+    }
+
+    function loadMore(event) {
+        var link = event.currentTarget;
+        event.preventDefault();
+        var request = new XMLHttpRequest();
+        request.open('GET', link.getAttribute('data-feed') + '?cursor=' +
+            encodeURIComponent(link.getAttribute('data-next')));
+        request.onload = function () {
+            if (request.status !== 200) {
+                return;
+            }
+            var page = JSON.parse(request.responseText);
+            var list = document.getElementById(link.getAttribute('data-list'));
+            for (var i = 0; i < page.high5s.length; i++) {
+                list.appendChild(renderHigh5(page.high5s[i], link));
+            }
+            if (page.next) {
+                link.setAttribute('data-next', page.next);
+            } else {
+                link.parentNode.removeChild(link);
+            }
+        };
+        request.send();
+    }
+
+    var links = document.querySelectorAll('a.load_more');
+    for (var i = 0; i < links.length; i++) {
+        links[i].addEventListener('click', loadMore);
+    }
+})();
@@ -0,0 +1,59 @@
+/*
+ * Live team feed. The team feed list carries the url of its Server-Sent Events stream (data-live), see app/live.py.
+ * A give event puts the new High5 at the top of the list, an edit event changes its message and a delete event takes
+ * it out. The browser reconnects by itself and the server sends what was missed.
+ */
+(function () {
+    var list = document.getElementById('team_feed');
+    if (!list || !list.getAttribute('data-live') || !window.EventSource) {
+        return;
+    }
+
+    function line(parent, text, first) {
+        if (!first) {
+            parent.appendChild(document.createElement('br'));
+        }
+        parent.appendChild(document.createTextNode(text));
+    }
+
+    function renderHigh5(high5) {
+        var item = document.createElement('li');
+        item.id = 'high5-' + high5.id;
+        var icon = document.createElement('span');
+        icon.className = 'icon icon-star';
+        var message = document.createElement('h3');
+        message.className = 'high5_msg';
+        message.appendChild(document.createTextNode(high5.message));
+        icon.appendChild(message);
+        item.appendChild(icon);
+        var details = document.createElement('p');
+        details.className = 'high5_dets';
+        line(details, 'To: ' + high5.receiver, true);
+        line(details, 'From: ' + high5.giver);
+        line(details, 'Date: ' + high5.time);
+        line(details, 'Level: ' + high5.level);
+        item.appendChild(details);
+        return item;
+    }
+
+    var source = new EventSource(list.getAttribute('data-live'), {withCredentials: true});
+    source.addEventListener('give', function (event) {
+        var high5 = JSON.parse(event.data);
+        if (!document.getElementById('high5-' + high5.id)) {
+            list.insertBefore(renderHigh5(high5), list.firstChild);
+        }
+    });
+    source.addEventListener('edit', function (event) {
+        var high5 = JSON.parse(event.data);
+        var item = document.getElementById('high5-' + high5.id);
+        if (item) {
+            list.replaceChild(renderHigh5(high5), item);
+        }
+    });
+    source.addEventListener('delete', function (event) {
+        var item = document.getElementById('high5-' + JSON.parse(event.data).id);
+        if (item) {
+            item.parentNode.removeChild(item);
+        }
+    });
+})();
@@ -0,0 +1,63 @@
+/*
+ * Type-ahead for picking users on the create team and edit team pages. Each input[data-user-search] carries the search
+ * url (data-user-search), the id of the multiple select to fill (data-target) and optionally a team whose members are
+ * left out (data-team). As the user types, the select's unselected options are replaced by the matching users and the
+ * selected ones are kept. Without javascript the input's form searches server side instead.
+ */
+(function () {
+    var DELAY = 150;
+
+    function fill(select, users) {
+        var selected = {};
+        for (var i = select.options.length - 1; i >= 0; i--) {
+            if (select.options[i].selected) {
+                selected[select.options[i].value] = true;
+            } else {
+                select.remove(i);
+            }
+        }
+        for (var j = 0; j < users.length; j++) {
+            if (!selected[String(users[j].id)]) {
+                var option = document.createElement('option');
+                option.value = users[j].id;
+                option.appendChild(document.createTextNode(users[j].user_name + ' (' + users[j].name + ')'));
+                select.appendChild(option);
+            }
+        }
+    }
+
+    function search(input) {
+        var url = input.getAttribute('data-user-search') + '?q=' + encodeURIComponent(input.value);
+        if (input.getAttribute('data-team')) {
+            url += '&team=' + encodeURIComponent(input.getAttribute('data-team'));
+        }
+        var request = new XMLHttpRequest();
+        request.open('GET', url);
+        request.onload = function () {
+            if (request.status !== 200 || input.getAttribute('data-searched') !== input.value) {
+                return;
+            }
+            fill(document.getElementById(input.getAttribute('data-target')), JSON.parse(request.responseText).users);
+        };
+        input.setAttribute('data-searched', input.value);
+        request.send();
+    }
+
+    function attach(input) {
+        var timer = null;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { search(input); }, DELAY);
+        });
+        input.form.addEventListener('submit', function (event) {
+            event.preventDefault();
+            clearTimeout(timer);
+            search(input);
+        });
+    }
+
+    var inputs = document.querySelectorAll('input[data-user-search]');
+    for (var i = 0; i < inputs.length; i++) {
+        attach(inputs[i]);
+    }
+})();
@@ -0,0 +1,294 @@
+from app import app_db
+from sqlalchemy import desc, func, and_
+from models import User, Team, High5, MemberStat, DailyStat, members
+import datetime
+
+'''
+Helpers to maintain and read the member_stat and daily_stat tables, the materialized per team and member High5 totals
+used for the team leaderboards and score histories. Teams and users are passed by id. Every helper only adds
+statements to the current session, so the caller commits them together with the High5 or membership change that
+caused them.'''
+
+
+#Create the stat rows for users who just joined a team. The totals are seeded from any High5's already on the team
+#for those users, so a member who is removed and later added back gets the same totals the leaderboards always had.
+def add_member_stats(team_id, user_ids):
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    totals = dict((user_id, [0, 0, 0]) for user_id in user_ids)
+    received = app_db.session.query(High5.receiver_id, func.sum(High5.level), func.count(High5.id)). \
+        filter(High5.team_id == team_id).filter(High5.receiver_id.in_(user_ids)).group_by(High5.receiver_id)
+    for user_id, score, count in received:
+        totals[user_id][0] = score or 0
+        totals[user_id][1] = count
+    given = app_db.session.query(High5.giver_id, func.count(High5.id)). \
+        filter(High5.team_id == team_id).filter(High5.giver_id.in_(user_ids)).group_by(High5.giver_id)
+    for user_id, count in given:
+        totals[user_id][2] = count
+    MemberStat.query.filter(MemberStat.team_id == team_id).filter(MemberStat.user_id.in_(user_ids)). \
+        delete(synchronize_session=False)
+    app_db.session.execute(MemberStat.__table__.insert(),
+                           [dict(team_id=team_id, user_id=user_id, score=score, received=received_count,
+                                 given=given_count)
+                            for user_id, (score, received_count, given_count) in totals.items()])
+
+#Account for a new High5 on the team totals and daily buckets of its receiver and giver. Users who are not members
+#of the team have no stat row, so those updates simply match nothing for them, the same way the leaderboards only rank
+#members. The daily buckets are kept for everyone.
+def record_high5(team_id, giver_id, receiver_id, level, time_posted):
+    _adjust(team_id, receiver_id, score=level, received=1)
+    _adjust(team_id, giver_id, given=1)
+    _adjust_day(team_id, receiver_id, time_posted.date(), score=level, received=1)
+    _adjust_day(team_id, giver_id, time_posted.date(), given=1)
+
+#Account for many new High5's on one team, given as (giver_id, receiver_id, level, time_posted) tuples. The changes
+#are added up first, so each member and each member's day is updated once however many of the High5's involve them.
+def record_high5s(team_id, high5s):
+    totals = {}
+    days = {}
+    for giver_id, receiver_id, level, time_posted in high5s:
+        for key, bucket in [(receiver_id, totals), ((receiver_id, time_posted.date()), days)]:
+            change = bucket.setdefault(key, [0, 0, 0])
+            change[0] += level
+            change[1] += 1
+        for key, bucket in [(giver_id, totals), ((giver_id, time_posted.date()), days)]:
+            bucket.setdefault(key, [0, 0, 0])[2] += 1
+    for user_id, (score, received, given) in sorted(totals.items()):
+        _adjust(team_id, user_id, score=score, received=received, given=given)
+    for (user_id, day), (score, received, given) in sorted(days.items()):
+        _adjust_day(team_id, user_id, day, score=score, received=received, given=given)
+
+#Reverse record_high5 for a High5 that is being deleted.
+def unrecord_high5(team_id, giver_id, receiver_id, level, time_posted):
+    _adjust(team_id, receiver_id, score=-level, received=-1)
+    _adjust(team_id, giver_id, given=-1)
+    _adjust_day(team_id, receiver_id, time_posted.date(), score=-level, received=-1)
+    _adjust_day(team_id, giver_id, time_posted.date(), given=-1)
+
+#Drop the stat rows of users being removed from a team. Removing a member also deletes the High5's they received on
+#that team, which lowers the given count of everyone who gave them, so this must be called before those High5's are
+#deleted.
+def remove_member_stats(team_id, user_ids):
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    day = func.date(High5.time_posted, type_=app_db.Date)
+    removed = app_db.session.query(High5.giver_id, High5.receiver_id, day, func.sum(High5.level),
+                                   func.count(High5.id)). \
+        filter(High5.team_id == team_id).filter(High5.receiver_id.in_(user_ids)). \
+        group_by(High5.giver_id, High5.receiver_id, day).all()
+    for giver_id, receiver_id, removed_day, score, count in removed:
+        _adjust(team_id, giver_id, given=-count)
+        _adjust_day(team_id, giver_id, removed_day, given=-count)
+        _adjust_day(team_id, receiver_id, removed_day, score=-score, received=-count)
+    MemberStat.query.filter(MemberStat.team_id == team_id).filter(MemberStat.user_id.in_(user_ids)). \
+        delete(synchronize_session=False)
+
+#Apply signed deltas to one member's stat row with a single UPDATE.
+def _adjust(team_id, user_id, score=0, received=0, given=0):
+    MemberStat.query.filter(MemberStat.team_id == team_id).filter(MemberStat.user_id == user_id). \
+        update({MemberStat.score: MemberStat.score + score,
+                MemberStat.received: MemberStat.received + received,
+                MemberStat.given: MemberStat.given + given}, synchronize_session=False)
+
+#Apply signed deltas to one user's bucket for one day, creating the bucket the first time the day sees a High5.
+#Both statements run straight away so a second High5 on the same day in the same transaction finds the new row.
+def _adjust_day(team_id, user_id, day, score=0, received=0, given=0):
+    updated = DailyStat.query.filter(DailyStat.team_id == team_id).filter(DailyStat.user_id == user_id). \
+        filter(DailyStat.day == day). \
+        update({DailyStat.score: DailyStat.score + score,
+                DailyStat.received: DailyStat.received + received,
+                DailyStat.given: DailyStat.given + given}, synchronize_session=False)
+    if not updated:
+        app_db.session.execute(DailyStat.__table__.insert().values(team_id=team_id, user_id=user_id, day=day,
+                                                                   score=score, received=received, given=given))
+
+#Get the top members of a team ordered by one of the stat columns. Returns a list of (user_name, value) pairs, the
+#same shape the calculate_top_* helpers in models.py return.
+def _top_members(team_id, column, limit):
+    return app_db.session.query(User.user_name, column).select_from(MemberStat). \
+        join(User, User.id == MemberStat.user_id).filter(MemberStat.team_id == team_id). \
+        order_by(desc(column), User.user_name).limit(limit).all()
+
+#Get one member's all time High5 score on a team, or 0 if they are not a member.
+def member_score(team_id, user_id):
+    stat = MemberStat.query.get((team_id, user_id))
+    return stat.score if stat else 0
+
+#Get a user's all time totals on every team they are a member of, as a list of (team_name, score, received, given)
+#ordered by team name. It is one query however many teams the user is on, reading their stat rows through the members
+#index.
+def user_team_totals(user_id):
+    return [tuple(row) for row in
+            app_db.session.query(Team.name, MemberStat.score, MemberStat.received, MemberStat.given).
+            select_from(members).join(Team, Team.id == members.c.team_id).
+            join(MemberStat, and_(MemberStat.team_id == members.c.team_id, MemberStat.user_id == members.c.user_id)).
+            filter(members.c.user_id == user_id).order_by(Team.name)]
+
+#Get the top three high5 scorers on the team with name and score.
+def top_scorers(team_id, limit=3):
+    return _top_members(team_id, MemberStat.score, limit)
+
+#Get the top three members with the most high5's received on the team with name and count.
+def top_receivers(team_id, limit=3):
+    return _top_members(team_id, MemberStat.received, limit)
+
+#Get the top three members who gave the most high5's on the team with name and count.
+def top_givers(team_id, limit=3):
+    return _top_members(team_id, MemberStat.given, limit)
+
+#Turn a named window or a custom range into inclusive (start, end) days. 'week' starts on this Monday, 'month' on
+#the first of this month and '90d' covers the last 90 days including today. A custom range needs both start and end
+#as YYYY-MM-DD strings. Returns None for the all time leaderboards or anything that does not parse.
+def window_bounds(window=None, start=None, end=None, today=None):
+    today = today or datetime.datetime.utcnow().date()
+    if window == 'week':
+        return today - datetime.timedelta(days=today.weekday()), today
+    if window == 'month':
+        return today.replace(day=1), today
+    if window == '90d':
+        return today - datetime.timedelta(days=89), today
+    if start and end:
+        try:
+            start_day = datetime.datetime.strptime(start, '%Y-%m-%d').date()
+            end_day = datetime.datetime.strptime(end, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+        if start_day <= end_day:
+            return start_day, end_day
+    return None
+
+#Get the top members of a team for a date range by summing their daily buckets. Every current member is ranked,
+#with zero for members who have no buckets in the range, just like the all time leaderboards.
+def _top_members_between(team_id, column, start, end, limit):
+    total = func.coalesce(func.sum(column), 0)
+    return app_db.session.query(User.user_name, total).select_from(MemberStat). \
+        join(User, User.id == MemberStat.user_id). \
+        outerjoin(DailyStat, and_(DailyStat.team_id == MemberStat.team_id,
+                                  DailyStat.user_id == MemberStat.user_id,
+                                  DailyStat.day >= start, DailyStat.day <= end)). \
+        filter(MemberStat.team_id == team_id).group_by(MemberStat.user_id, User.user_name). \
+        order_by(desc(total), User.user_name).limit(limit).all()
+
+#Get the top three high5 scorers on the team between two days with name and score.
+def top_scorers_between(team_id, start, end, limit=3):
+    return _top_members_between(team_id, DailyStat.score, start, end, limit)
+
+#Get the top three members with the most high5's received on the team between two days with name and count.
+def top_receivers_between(team_id, start, end, limit=3):
+    return _top_members_between(team_id, DailyStat.received, start, end, limit)
+
+#Get the top three members who gave the most high5's on the team between two days with name and count.
+def top_givers_between(team_id, start, end, limit=3):
+    return _top_members_between(team_id, DailyStat.given, start, end, limit)
+
+#Get a user's High5 activity on a team day by day, oldest first, as a list of (day, score, received, given). Days
+#without any High5's are left out. Optionally limited to an inclusive range of days.
+def score_history(team_id, user_id, start=None, end=None):
+    history = app_db.session.query(DailyStat.day, DailyStat.score, DailyStat.received, DailyStat.given). \
+        filter(DailyStat.team_id == team_id).filter(DailyStat.user_id == user_id)
+    if start is not None:
+        history = history.filter(DailyStat.day >= start)
+    if end is not None:
+        history = history.filter(DailyStat.day <= end)
+    return [tuple(row) for row in history.order_by(DailyStat.day)
+            if row.score or row.received or row.given]
+
+#Compute the totals every stat row should hold straight from the members and High5 tables, with one grouped query
+#per total. Returns a dict of (team_id, user_id) -> (score, received, given), limited to one team if given.
+def compute_member_stats(team_id=None):
+    member_query = app_db.session.query(members.c.team_id, members.c.user_id)
+    received_query = app_db.session.query(High5.team_id, High5.receiver_id, func.sum(High5.level),
+                                          func.count(High5.id)).group_by(High5.team_id, High5.receiver_id)
+    given_query = app_db.session.query(High5.team_id, High5.giver_id, func.count(High5.id)). \
+        group_by(High5.team_id, High5.giver_id)
+    if team_id is not None:
+        member_query = member_query.filter(members.c.team_id == team_id)
+        received_query = received_query.filter(High5.team_id == team_id)
+        given_query = given_query.filter(High5.team_id == team_id)
+    received = dict(((team, user_id), (score or 0, count)) for team, user_id, score, count in received_query)
+    given = dict(((team, user_id), count) for team, user_id, count in given_query)
+    totals = {}
+    for key in member_query:
+        key = tuple(key)
+        score, received_count = received.get(key, (0, 0))
+        totals[key] = (score, received_count, given.get(key, 0))
+    return totals
+
+#Throw away the stat rows and recompute them from the members and High5 tables. Used to fill the table for an
+#existing database and to repair it if verify_member_stats finds drift. The caller commits.
+def rebuild_member_stats(team_id=None):
+    totals = compute_member_stats(team_id)
+    delete_query = MemberStat.query
+    if team_id is not None:
+        delete_query = delete_query.filter(MemberStat.team_id == team_id)
+    delete_query.delete(synchronize_session=False)
+    rows = [dict(team_id=team, user_id=user_id, score=score, received=received, given=given)
+            for (team, user_id), (score, received, given) in totals.items()]
+    if rows:
+        app_db.session.execute(MemberStat.__table__.insert(), rows)
+    return len(rows)
+
+#Compare the stored stat rows with freshly computed totals. Returns a sorted list of
+#(team_id, user_id, stored, expected) for every row that differs, where a missing row is None.
+def verify_member_stats(team_id=None):
+    expected = compute_member_stats(team_id)
+    stored_query = MemberStat.query
+    if team_id is not None:
+        stored_query = stored_query.filter(MemberStat.team_id == team_id)
+    stored = dict(((stat.team_id, stat.user_id), stat.get_totals()) for stat in stored_query)
+    mismatches = []
+    for key in set(expected) | set(stored):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), expected.get(key)))
+    return sorted(mismatches)
+
+#Compute the buckets the daily_stat table should hold from the High5 table, grouping by calendar day in the database.
+#Returns a dict of (team_id, user_id, day) -> (score, received, given), limited to one team if given. A High5 whose
+#giver or receiver no longer exists has no bucket for that side.
+def compute_daily_stats(team_id=None):
+    day = func.date(High5.time_posted, type_=app_db.Date)
+    received_query = app_db.session.query(High5.team_id, High5.receiver_id, day, func.sum(High5.level),
+                                          func.count(High5.id)).filter(High5.receiver_id != None). \
+        group_by(High5.team_id, High5.receiver_id, day)
+    given_query = app_db.session.query(High5.team_id, High5.giver_id, day, func.count(High5.id)). \
+        filter(High5.giver_id != None).group_by(High5.team_id, High5.giver_id, day)
+    if team_id is not None:
+        received_query = received_query.filter(High5.team_id == team_id)
+        given_query = given_query.filter(High5.team_id == team_id)
+    totals = {}
+    for team, user_id, bucket_day, score, count in received_query:
+        totals[(team, user_id, bucket_day)] = (score or 0, count, 0)
+    for team, user_id, bucket_day, count in given_query:
+        score, received_count, _ = totals.get((team, user_id, bucket_day), (0, 0, 0))
+        totals[(team, user_id, bucket_day)] = (score, received_count, count)
+    return totals
+
+#Backfill the daily_stat table from the existing High5's, replacing whatever buckets were there. The caller commits.
+def rebuild_daily_stats(team_id=None):
+    totals = compute_daily_stats(team_id)
+    delete_query = DailyStat.query
+    if team_id is not None:
+        delete_query = delete_query.filter(DailyStat.team_id == team_id)
+    delete_query.delete(synchronize_session=False)
+    rows = [dict(team_id=team, user_id=user_id, day=day, score=score, received=received, given=given)
+            for (team, user_id, day), (score, received, given) in totals.items()]
+    if rows:
+        app_db.session.execute(DailyStat.__table__.insert(), rows)
+    return len(rows)
+
+#Compare the stored daily buckets with freshly computed ones, the same way verify_member_stats does. Empty buckets
+#left behind by deletes count as missing.
+def verify_daily_stats(team_id=None):
+    expected = compute_daily_stats(team_id)
+    stored_query = DailyStat.query
+    if team_id is not None:
+        stored_query = stored_query.filter(DailyStat.team_id == team_id)
+    stored = dict(((stat.team_id, stat.user_id, stat.day), stat.get_totals()) for stat in stored_query
+                  if stat.get_totals() != (0, 0, 0))
+    mismatches = []
+    for key in set(expected) | set(stored):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], key[2], stored.get(key), expected.get(key)))
+    return sorted(mismatches)
@@ -0,0 +1,21 @@
+from flask import current_app, render_template, stream_with_context
+
+'''
+Streamed rendering of the team and user pages. With STREAM_PAGES on, a page is sent as its template renders instead of
+once it has rendered: the header goes out first, then each fragment as it is rendered, so the browser starts fetching
+the stylesheets while the leaderboards and the feed are still being queried. The views pass the fragments as functions
+the template calls, each in a block of its own: Jinja yields what comes before a block before running it, while it
+evaluates all the expressions of a run of text and expressions before yielding any of it.
+
+The page keeps the request context until it is sent, so the database session, the admission slot and the request
+metrics last until the end of it. A fragment that fails once the page has started can no longer turn it into an error
+page; the page is cut short and the error logged. Anything that can answer 404, like looking up the team, is done
+before the page starts. Tests request the streamed pages with BufferedClient of app/test/clients.py.'''
+
+#Respond with the template rendered from the context as it renders, or in one piece with STREAM_PAGES off.
+def stream_page(template_name, **context):
+    if not current_app.config.get('STREAM_PAGES', True):
+        return render_template(template_name, **context)
+    template = current_app.jinja_env.get_template(template_name)
+    current_app.update_template_context(context)
+    return current_app.response_class(stream_with_context(template.generate(context)), mimetype='text/html')
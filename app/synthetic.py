@@ -0,0 +1,148 @@
+from app import app_db
+from models import User, Team, High5, members
+from passwords import hash_password
+from stats import rebuild_member_stats, rebuild_daily_stats
+from search import rebuild_index
+from sqlalchemy import func
+from random import SystemRandom
+import bisect
+import datetime
+import random
+
+'''
+Made up data at production scale, for benchmarks and for trying the app against a big database. generate adds N
+users, M teams and K High5's with the skew real use has: a few users are on many teams while most are on one or two,
+team sizes have a long tail, a few teams give most of the High5's and within a team a few members give and receive most
+of them. Rows go in with bulk core inserts in batches rather than one ORM object at a time. Every made up user has the
+password SEED_PASSWORD, hashed once and stored with the same salt for all of them, so making 100,000 users does not
+hash 100,000 times. The stat tables are rebuilt afterwards; the search index only if asked, since it takes longer than
+the rest together.'''
+
+SEED_PASSWORD = 'password'
+
+#Rows per INSERT statement.
+BATCH_SIZE = 10000
+
+#Most members a made up team gets.
+MAX_TEAM_SIZE = 500
+
+#Made up team names and High5 messages are built from these.
+TEAM_KINDS = ['Running Club', 'Project Team', 'Study Group', 'Book Club', 'Support Desk', 'Design Team', 'Band',
+              'Lab', 'Choir', 'Committee']
+ACTIONS = ['helping with the release', 'fixing the build', 'covering my shift', 'organizing the team dinner',
+           'reviewing my code so quickly', 'the great demo', 'bringing snacks to the meeting', 'staying late to finish '
+           'the report', 'answering all my questions', 'cleaning up after the event', 'the awesome slides',
+           'driving everyone home', 'taking notes at the meeting', 'finding that nasty bug', 'planning the trip']
+
+#How often made up users pick each notification setting, and each High5 level.
+NOTIFY_WEIGHTS = [('immediate', 80), ('daily', 15), ('hourly', 5)]
+LEVEL_WEIGHTS = [(1, 30), (2, 25), (3, 20), (4, 15), (5, 10)]
+
+_seed_hashes = {}
+
+#Get a (salt, hash) pair for the password, made once per process and then reused for every made up user.
+def seed_password(password=SEED_PASSWORD):
+    if password not in _seed_hashes:
+        salt = bytes(SystemRandom().getrandbits(128))
+        _seed_hashes[password] = (salt, hash_password(password, salt))
+    return _seed_hashes[password]
+
+'''
+Picks from a list of choices with fixed weights in O(log n), by bisecting the running totals.'''
+class WeightedChoice(object):
+    def __init__(self, choices, weights, rand):
+        self.choices = choices
+        self.totals = []
+        running = 0.0
+        for weight in weights:
+            running += weight
+            self.totals.append(running)
+        self.rand = rand
+
+    def pick(self):
+        return self.choices[bisect.bisect(self.totals, self.rand.random() * self.totals[-1])]
+
+    #Pick count different choices. Fine while count is small next to the number of choices.
+    def sample(self, count):
+        picked = []
+        seen = set()
+        while len(picked) < count:
+            choice = self.pick()
+            if choice not in seen:
+                seen.add(choice)
+                picked.append(choice)
+        return picked
+
+#Zipf weights 1/rank^s for count ranks.
+def _zipf(count, s=1.0):
+    return [1.0 / (rank ** s) for rank in range(1, count + 1)]
+
+#Insert rows from an iterable in batches of BATCH_SIZE. Returns how many rows went in.
+def _insert(table, rows):
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            app_db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        app_db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+#Get the id the next row of a table would get if ids are handed out in order.
+def _next_id(column):
+    return (app_db.session.query(func.max(column)).scalar() or 0) + 1
+
+#Add made up users, teams, members and High5's and rebuild the stat tables, then commit. The user names start with
+#the prefix and teams are named after it, so several runs can share a database. High5's are spread over the given
+#number of days up to now. The seed makes the data the same every run. Returns the number of rows made of each kind.
+def generate(users, teams, high5s, prefix=u'synthetic', days=365, seed=242, index=False, now=None):
+    if users < 2:
+        raise ValueError('A High5 needs at least 2 users')
+    rand = random.Random(seed)
+    now = now or datetime.datetime.utcnow()
+    salt, password = seed_password()
+    first_user = _next_id(User.id)
+    user_ids = list(range(first_user, first_user + users))
+    notify = WeightedChoice([pref for pref, _ in NOTIFY_WEIGHTS], [weight for _, weight in NOTIFY_WEIGHTS], rand)
+    made_users = _insert(User.__table__, (
+        dict(id=user_id, user_name=u'%s%06d' % (prefix, user_id), name=u'%s User %d' % (prefix.title(), user_id),
+             email=u'%s%06d@illinois.edu' % (prefix, user_id), _password=password, _salt=salt,
+             notify_pref=notify.pick(), version=1) for user_id in user_ids))
+
+    popular = list(user_ids)
+    rand.shuffle(popular)
+    user_choice = WeightedChoice(popular, _zipf(len(popular), 0.8), rand)
+    first_team = _next_id(Team.id)
+    rosters = []
+    for team_id in range(first_team, first_team + teams):
+        size = min(max(2, users // 2), MAX_TEAM_SIZE, max(3, int(rand.paretovariate(1.6) * 8)))
+        rosters.append((team_id, user_choice.sample(size)))
+    made_teams = _insert(Team.__table__, (
+        dict(id=team_id, name=u'%s %s %d' % (prefix.title(), rand.choice(TEAM_KINDS), team_id), admin_id=roster[0])
+        for team_id, roster in rosters))
+    made_members = _insert(members, (dict(team_id=team_id, user_id=user_id)
+                                     for team_id, roster in rosters for user_id in roster))
+
+    team_choice = WeightedChoice(rosters, [len(roster) * rand.paretovariate(2.0) for _, roster in rosters], rand)
+    member_choices = {}
+    level = WeightedChoice([value for value, _ in LEVEL_WEIGHTS], [weight for _, weight in LEVEL_WEIGHTS], rand)
+    def made_high5s():
+        for _ in range(high5s):
+            team_id, roster = team_choice.pick()
+            if team_id not in member_choices:
+                member_choices[team_id] = WeightedChoice(roster, _zipf(len(roster)), rand)
+            giver, receiver = member_choices[team_id].sample(2)
+            yield dict(receiver_id=receiver, giver_id=giver, team_id=team_id, level=level.pick(),
+                       message=u'Thanks for %s!' % rand.choice(ACTIONS),
+                       time_posted=now - datetime.timedelta(seconds=rand.randrange(days * 86400)))
+    made = _insert(High5.__table__, made_high5s())
+    rebuild_member_stats()
+    rebuild_daily_stats()
+    app_db.session.commit()
+    if index:
+        rebuild_index()
+    return dict(users=made_users, teams=made_teams, members=made_members, high5s=made)
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import json
+import os
+import shutil
+import tempfile
+sys.path.append('..')
+from app import app_db, create_app
+from app.models import User
+from clients import BufferedClient
+
+"""
+Class to test admission control: requests over a route's capacity turned away with 503, users over their rate turned
+away with 429, slots of dead workers taken back and the counters in /metrics.
+"""
+class AdmissionTest(unittest.TestCase):
+    team_page = '/team/John/CS465 Group 17'
+
+    def setUp(self):
+        super(AdmissionTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app(ADMISSION_STORE=os.path.join(self.directory, 'admission'),
+                              ADMISSION_ROUTES={'pages.team': (['GET'], 1, None, None),
+                                                'api.api_give_high5s': (None, None, 1.0, 2)})
+        self.admission = self.app.extensions['admission']
+        self.ids = dict(app_db.session.query(User.user_name, User.id).filter(User.user_name.in_(["John", "Tom"])))
+
+    def tearDown(self):
+        self.admission.store.close()
+        shutil.rmtree(self.directory)
+        app_db.session.remove()
+        super(AdmissionTest, self).tearDown()
+
+    def _client(self, user_name):
+        client = BufferedClient(self.app, self.app.response_class)
+        with client.session_transaction() as session:
+            session['user_id'] = str(self.ids[user_name])
+            session['_fresh'] = True
+        return client
+
+    #Tests that a request to a full route is turned away with 503 until the slot holding it is freed, and that the
+    #counters in /metrics show it.
+    def test_busy(self):
+        client = self._client("John")
+        slot = self.admission.store.acquire('pages.team')
+        response = client.get(self.team_page)
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (503, '1'))
+        self.admission.store.release(slot)
+        self.assertEqual(client.get(self.team_page).status_code, 200)
+        text = client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).data.decode('utf-8')
+        self.assertIn('high5_admission_capacity{endpoint="pages.team"} 1', text)
+        self.assertIn('high5_admission_in_flight{endpoint="pages.team"} 0', text)
+        self.assertIn('high5_admission_requests_total{endpoint="pages.team",outcome="admitted"} 2', text)
+        self.assertIn('high5_admission_requests_total{endpoint="pages.team",outcome="busy"} 1', text)
+
+    #Tests that a slot held by a worker that died is taken back.
+    def test_dead_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if self.admission.store.acquire('pages.team') is not None else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(self.admission.store.stats()['pages.team']['in_flight'], 1)
+        self.assertEqual(self._client("John").get(self.team_page).status_code, 200)
+        self.assertEqual(self.admission.store.stats()['pages.team']['in_flight'], 0)
+
+    #Tests that a user over their burst gets 429 with the seconds until their next token, and other users do not.
+    def test_rate_limited(self):
+        john = self._client("John")
+        give = lambda client: client.post('/api/teams/CS465 Group 17/high5s', data=json.dumps(dict(high5s=[])),
+                                          content_type='application/json')
+        self.assertEqual([give(john).status_code for _ in range(2)], [400, 400])
+        response = give(john)
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (429, '1'))
+        self.assertIn('error', json.loads(response.data.decode('utf-8')))
+        self.assertEqual(give(self._client("Tom")).status_code, 400)
+        self.assertEqual(self.admission.store.stats()['api.api_give_high5s']['limited'], 1)
+
+    #Tests that a request turned away as busy gives back the token it took, so the user is not limited for it.
+    def test_busy_costs_no_token(self):
+        app = create_app(ADMISSION_STORE=os.path.join(self.directory, 'refund'),
+                         ADMISSION_ROUTES={'pages.login': (['POST'], 1, 0.01, 1)})
+        store = app.extensions['admission'].store
+        client = app.test_client()
+        login = lambda: client.post('/login', data=dict(user_name='John'),
+                                    environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code
+        slot = store.acquire('pages.login')
+        self.assertEqual([login(), login()], [503, 503])
+        store.release(slot)
+        self.assertEqual([login(), login()], [200, 429])
+        store.close()
+
+    #Tests that clients behind a trusted proxy are limited by their own address, and that X-Forwarded-For is ignored
+    #without TRUSTED_PROXIES.
+    def test_trusted_proxies(self):
+        for proxies, statuses in [(1, [200, 429, 200]), (0, [200, 429, 429])]:
+            app = create_app(ADMISSION_STORE=os.path.join(self.directory, 'proxies%d' % proxies),
+                             ADMISSION_ROUTES={'pages.login': (['POST'], None, 0.01, 1)}, TRUSTED_PROXIES=proxies)
+            client = app.test_client()
+            login = lambda address: client.post('/login', data=dict(user_name='John'),
+                                                environ_base={'REMOTE_ADDR': '10.0.0.1'},
+                                                headers={'X-Forwarded-For': address}).status_code
+            self.assertEqual([login('192.0.2.1'), login('192.0.2.1'), login('192.0.2.2')], statuses)
+            app.extensions['admission'].store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
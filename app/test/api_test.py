@@ -0,0 +1,166 @@
+import unittest
+import sys
+import json
+sys.path.append('..')
+from app import app, app_db
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import User, Team, High5, Notification
+from app.membership import add_members
+from app.stats import verify_member_stats, verify_daily_stats, member_score, compute_member_stats
+
+"""
+Class to test the JSON API: giving a batch of High5's in one transaction with a result for each, and fetching several
+teams in one request.
+"""
+class ApiTest(unittest.TestCase):
+    team_name = "Api Test Team"
+    other_team = "Api Test Other Team"
+
+    def setUp(self):
+        super(ApiTest, self).setUp()
+        self._cleanup()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, list(self.ids.values()))
+        app_db.session.commit()
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = str(self.ids["John"])
+            session['_fresh'] = True
+
+    def tearDown(self):
+        self._cleanup()
+        super(ApiTest, self).tearDown()
+
+    def _cleanup(self):
+        for team in Team.query.filter(Team.name.in_([self.team_name, self.other_team])):
+            app_db.session.delete(team)
+        Notification.query.filter(Notification.team_name.in_([self.team_name, self.other_team])). \
+            delete(synchronize_session=False)
+        app_db.session.commit()
+
+    def _give(self, body, client=None):
+        response = (client or self.client).post('/api/teams/%s/high5s' % self.team_name, data=json.dumps(body),
+                                                content_type='application/json')
+        return response.status_code, json.loads(response.data.decode('utf-8'))
+
+    #Tests that the valid High5's of a batch are given in one commit of the writer engine with their stats and
+    #notifications, and the others come back with their errors.
+    def test_give_batch(self):
+        commits = []
+        def count(conn):
+            if conn.engine is app_db.get_engine(app):
+                commits.append(conn)
+        items = [dict(receiver='Tom', message=u'Thanks for the review', level=4),
+                 dict(receiver='Jane', message=u'Great demo', level=9),
+                 dict(receiver='Nobody', message=u'Who?', level=3),
+                 dict(receiver='John', message=u'Me', level=3),
+                 dict(receiver='Tom', level='high'),
+                 dict(receiver='Tom', message=u'Again', level=2)]
+        event.listen(Engine, 'commit', count)
+        try:
+            status, body = self._give(dict(high5s=items))
+        finally:
+            event.remove(Engine, 'commit', count)
+        self.assertEqual((status, body['created'], len(commits)), (201, 3, 1))
+        self.assertEqual([sorted(result) for result in body['results']],
+                         [['id', 'index'], ['id', 'index'], ['errors', 'index'], ['errors', 'index'],
+                          ['errors', 'index'], ['id', 'index']])
+        self.assertEqual(sorted(body['results'][4]['errors']), ['level', 'message'])
+        self.assertEqual(High5.query.get(body['results'][1]['id']).level, 5)
+        self.assertEqual(member_score(self.team_id, self.ids["Tom"]), 6)
+        self.assertEqual(verify_member_stats(self.team_id), [])
+        self.assertEqual(verify_daily_stats(self.team_id), [])
+        self.assertEqual(Notification.query.filter(Notification.team_name == self.team_name).count(), 3)
+
+    #Tests that an atomic batch with an invalid High5 gives none, and that bad requests are refused.
+    def test_give_refused(self):
+        status, body = self._give(dict(high5s=[dict(receiver='Tom', message=u'Fine', level=3),
+                                               dict(receiver='Tom', message=u'', level=3)], atomic=True))
+        self.assertEqual((status, body['created']), (400, 0))
+        self.assertEqual(Team.query.get(self.team_id).high5s.count(), 0)
+        self.assertEqual(self._give(dict(high5s=[]))[0], 400)
+        self.assertEqual(self._give(dict(high5s=[dict(receiver='Tom', message=u'x', level=1)] * 101))[0], 413)
+        response = self.client.post('/api/teams/%s/high5s' % self.team_name, data=dict(receiver='Tom'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._give(dict(high5s=[]), client=app.test_client())[0], 401)
+
+    #Tests that receivers that are not user names are reported like any other invalid High5, that a level too big for
+    #an int is still moved to 5 and 0 to 1 like any other level out of range, and that a missing level is required.
+    def test_give_odd_values(self):
+        status, body = self._give(dict(high5s=[dict(receiver=['Tom'], message=u'List', level=3),
+                                               dict(receiver=dict(name='Tom'), message=u'Object', level=3),
+                                               dict(receiver=7, message=u'Number', level=3),
+                                               dict(receiver='Tom', message=u'Huge', level=10 ** 20),
+                                               dict(receiver='Tom', message=u'Fraction', level=2.5),
+                                               dict(receiver='Tom', message=u'Zero', level=0),
+                                               dict(receiver='Tom', message=u'Negative', level=-3),
+                                               dict(receiver='Tom', message=u'Missing')]))
+        self.assertEqual((status, body['created']), (201, 3))
+        self.assertEqual([result.get('errors') for result in body['results'][:3]],
+                         [dict(receiver='Must be a user name.')] * 3)
+        self.assertEqual(High5.query.get(body['results'][3]['id']).level, 5)
+        self.assertEqual(body['results'][4]['errors'], dict(level='Must be a whole number, 1 to 5.'))
+        self.assertEqual(High5.query.get(body['results'][5]['id']).level, 1)
+        self.assertEqual(High5.query.get(body['results'][6]['id']).level, 1)
+        self.assertEqual(body['results'][7]['errors'], dict(level='Required.'))
+
+    #Tests fetching several teams at once, in the order asked for, with unknown teams and teams the user is not on
+    #listed apart.
+    def test_fetch_teams(self):
+        self._give(dict(high5s=[dict(receiver='Tom', message=u'Fetched', level=3)]))
+        response = self.client.get('/api/teams?team=%s&team=No Such Team&team=CS465 Group 17'
+                                   '&team=UIUC Girls Running Club' % self.team_name)
+        body = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([team['name'] for team in body['teams']], [self.team_name, 'CS465 Group 17'])
+        self.assertEqual(body['unknown'], ['No Such Team', 'UIUC Girls Running Club'])
+        team = body['teams'][0]
+        self.assertEqual([high5['message'] for high5 in team['high5s']], ['Fetched'])
+        self.assertEqual(team['top_scorers'][0], ['Tom', 3])
+        self.assertEqual(len(body['teams'][1]['high5s']), min(25, High5.query.join(Team).
+                                                                filter(Team.name == 'CS465 Group 17').count()))
+
+    #Get the profile with the number of statements the request ran.
+    def _profile(self):
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            response = self.client.get('/api/profile')
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        return json.loads(response.data.decode('utf-8')), len(statements)
+
+    #Tests that the profile has the user's totals on each of their teams, matching the totals computed from the High5
+    #table, and that a user on one more team costs no more statements.
+    def test_profile(self):
+        self._give(dict(high5s=[dict(receiver='Tom', message=u'Thanks', level=3)]))
+        before, statements = self._profile()
+        team = Team(name=self.other_team, admin_id=self.ids["Tom"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        add_members(team.id, [self.ids["John"], self.ids["Tom"]])
+        app_db.session.commit()
+        self.client.post('/api/teams/%s/high5s' % self.other_team, content_type='application/json',
+                         data=json.dumps(dict(high5s=[dict(receiver='Tom', message=u'More', level=2)] * 2)))
+        profile, more_statements = self._profile()
+        self.assertEqual(more_statements, statements)
+        self.assertEqual(len(profile['teams']), len(before['teams']) + 1)
+        computed = compute_member_stats()
+        teams = dict((team.name, team.id) for team in Team.query.join(Team.members).filter(User.id == self.ids["John"]))
+        self.assertEqual(sorted(teams), [team['name'] for team in profile['teams']])
+        for team in profile['teams']:
+            self.assertEqual((team['score'], team['received'], team['given']),
+                             computed[(teams[team['name']], self.ids["John"])])
+        self.assertEqual(profile['totals']['given'], before['totals']['given'] + 2)
+        self.assertEqual(profile['totals']['score'], sum(team['score'] for team in profile['teams']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import json
+import os
+sys.path.append('..')
+from app import app, app_db, create_app, before_fork, after_fork
+from app.models import User
+
+"""
+Class to test the app factory: apps made with their own settings, and worker processes forked from an app that has
+used the database.
+"""
+class AppFactoryTest(unittest.TestCase):
+    def tearDown(self):
+        app_db.session.remove()
+        super(AppFactoryTest, self).tearDown()
+
+    #Tests that another app has the same routes as the default app and serves them with its own settings.
+    def test_create_app(self):
+        other = create_app(API_BATCH_MAX=1)
+        self.assertEqual(sorted(rule.rule for rule in other.url_map.iter_rules()),
+                         sorted(rule.rule for rule in app.url_map.iter_rules()))
+        self.assertEqual(app.config['API_BATCH_MAX'], 100)
+        client = other.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = str(User.query.filter(User.user_name == "John").one().id)
+            session['_fresh'] = True
+        response = client.post('/api/teams/CS465 Group 17/high5s', content_type='application/json',
+                               data=json.dumps(dict(high5s=[dict(receiver='Tom', message=u'Hi', level=1)] * 2)))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(client.get('/login').status_code, 200)
+
+    #Run the function in a forked process and return whether it returned true there.
+    def _in_child(self, function):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                code = 0 if function() else 1
+            except Exception:
+                code = 2
+            os._exit(code)
+        return os.waitpid(pid, 0)[1] == 0
+
+    #The pid that opened the connection the session runs its next query on.
+    def _connection_pid(self):
+        return app_db.session.connection(mapper=User.__mapper__).connection._connection_record.info.get('pid')
+
+    #Tests that a worker forked after the parent used the database queries on connections of its own, whether it runs
+    #after_fork or not, and that the parent's connections keep working.
+    def test_fork(self):
+        User.query.filter(User.user_name == "John").one()
+        app_db.session.connection(mapper=User.__mapper__)
+        app_db.session.remove()
+        def worker():
+            after_fork(app)
+            return User.query.filter(User.user_name == "John").count() == 1 and self._connection_pid() == os.getpid()
+        self.assertTrue(self._in_child(worker))
+        self.assertTrue(self._in_child(lambda: self._connection_pid() == os.getpid()))
+        self.assertEqual(self._connection_pid(), os.getpid())
+        self.assertEqual(User.query.filter(User.user_name == "John").count(), 1)
+        app_db.session.remove()
+        before_fork(app)
+        self.assertTrue(self._in_child(worker))
+
+
+if __name__ == '__main__':
+    unittest.main()
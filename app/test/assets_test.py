@@ -0,0 +1,95 @@
+import unittest
+import sys
+import gzip
+import io
+import os
+import shutil
+import tempfile
+sys.path.append('..')
+from app import create_app
+from app import assets
+from app.assets import build_assets
+
+"""
+Class to test the fingerprinted static assets: the build of app/static, the URLs the pages link and how the assets are
+served.
+"""
+class AssetsTest(unittest.TestCase):
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static')
+
+    def setUp(self):
+        super(AssetsTest, self).setUp()
+        self.build_dir = tempfile.mkdtemp()
+        self.manifest = build_assets(self.static_dir, self.build_dir)
+        self.app = create_app(ASSET_BUILD_DIR=self.build_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.build_dir)
+        super(AssetsTest, self).tearDown()
+
+    def _built(self, name):
+        with open(os.path.join(self.build_dir, self.manifest['files'][name]['path']), 'rb') as built:
+            return built.read()
+
+    #Tests that every file gets a name of its own content, that stylesheets link the fingerprinted fonts and that
+    #building again gives the same files.
+    def test_build(self):
+        files = self.manifest['files']
+        self.assertEqual(files['default.css']['path'][:8], 'default.')
+        self.assertIn('gzip', files['default.css']['encodings'])
+        self.assertEqual(files['fonts/fontawesome-webfont.woff']['encodings'], [])
+        self.assertIn(("url('%s?v=3.0.1')" % files['fonts/fontawesome-webfont.woff']['path']).encode('utf-8'),
+                      self._built('fonts.css'))
+        self.assertIn(b'url(images/bg01.jpg)', self._built('default.css'))
+        self.assertEqual(build_assets(self.static_dir, self.build_dir), self.manifest)
+
+    #Tests that pages link the fingerprinted files, which are served for good and compressed when the browser accepts
+    #it, and that without a build they link app/static.
+    def test_serve(self):
+        client = self.app.test_client()
+        url = '/assets/' + self.manifest['files']['default.css']['path']
+        self.assertIn(url.encode('utf-8'), client.get('/login').data)
+        response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual((response.status_code, response.headers['Content-Encoding']), (200, 'gzip'))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(response.data)).read(), self._built('default.css'))
+        response = client.get(url)
+        self.assertEqual((response.data, response.headers.get('Content-Encoding')), (self._built('default.css'), None))
+        self.assertEqual(client.get('/assets/manifest.json').status_code, 404)
+        self.assertEqual(client.get('/assets/default.css').status_code, 404)
+        other = create_app(ASSET_BUILD_DIR=os.path.join(self.build_dir, 'none'))
+        self.assertIn(b'/static/default.css', other.test_client().get('/login').data)
+
+    #Tests that stylesheets get a brotli variant, served before gzip to browsers that accept both.
+    @unittest.skipIf(assets.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        self.assertEqual(self.manifest['files']['default.css']['encodings'], ['br', 'gzip'])
+        url = '/assets/' + self.manifest['files']['default.css']['path']
+        response = self.app.test_client().get(url, headers={'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual((response.status_code, response.headers['Content-Encoding']), (200, 'br'))
+        self.assertEqual(assets.brotli.decompress(response.data), self._built('default.css'))
+
+    #Tests that images get a rendition for each narrower width, which asset_url picks for the width asked for and the
+    #assets route serves, and that wider widths get the image itself.
+    @unittest.skipIf(assets.Image is None, 'Pillow is not installed')
+    def test_renditions(self):
+        manifest = build_assets(self.static_dir, self.build_dir, [100, 200, 400])
+        entry = manifest['files']['images/scr01.jpg']
+        self.assertEqual(sorted(entry['widths']), ['100', '200'])
+        with open(os.path.join(self.build_dir, entry['widths']['100']), 'rb') as rendition:
+            self.assertEqual(assets.Image.open(rendition).size, (100, 63))
+        app = create_app(ASSET_BUILD_DIR=self.build_dir)
+        with app.test_request_context():
+            url = app.extensions['assets'].url
+            self.assertEqual(url('images/scr01.jpg', 150), '/assets/' + entry['widths']['200'])
+            self.assertEqual(url('images/scr01.jpg', 100), '/assets/' + entry['widths']['100'])
+            self.assertEqual(url('images/scr01.jpg', 300), '/assets/' + entry['path'])
+            self.assertEqual(url('images/scr01.jpg'), '/assets/' + entry['path'])
+        response = app.test_client().get('/assets/' + entry['widths']['200'])
+        self.assertEqual((response.status_code, response.mimetype), (200, 'image/jpeg'))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,11 @@
+from flask.testing import FlaskClient
+
+'''
+Test client that reads each response in full before returning it, like a browser, so a streamed page of
+app/streaming.py has been rendered and its request has ended by the time a test looks at it. Pass buffered=False to
+read a response chunk by chunk. The tests that request the streamed pages make their clients with
+BufferedClient(app, app.response_class), leaving the test_client of the apps as Flask makes it.'''
+class BufferedClient(FlaskClient):
+    def open(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        return FlaskClient.open(self, *args, **kwargs)
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import threading
+sys.path.append('..')
+from app import app, app_db
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from app.models import User
+
+"""
+Class to test that reads and writes go to the right engine, and that reads are not held up by a write in progress.
+"""
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        super(DatabaseTest, self).setUp()
+        self.reader = app_db.get_read_engine(app)
+        self.statements = []
+        event.listen(self.reader, 'before_cursor_execute', self._reader_statement)
+        event.listen(app_db.engine, 'before_cursor_execute', self._writer_statement)
+
+    def tearDown(self):
+        event.remove(self.reader, 'before_cursor_execute', self._reader_statement)
+        event.remove(app_db.engine, 'before_cursor_execute', self._writer_statement)
+        app_db.session.rollback()
+        User.query.filter(User.user_name == "Pat").update({User.notify_pref: 'immediate'})
+        app_db.session.commit()
+        super(DatabaseTest, self).tearDown()
+
+    def _reader_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(('read', statement.split()[0]))
+
+    def _writer_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(('write', statement.split()[0]))
+
+    #Tests that queries go to the read engine until the session writes, then to the writer until it commits.
+    def test_routing(self):
+        self.assertIsNotNone(self.reader)
+        pat = User.query.filter(User.user_name == "Pat").one()
+        pat.notify_pref = 'daily'
+        app_db.session.flush()
+        self.assertEqual(User.query.filter(User.notify_pref == 'daily').filter(User.user_name == "Pat").count(), 1)
+        app_db.session.commit()
+        User.query.count()
+        self.assertEqual(self.statements, [('read', 'SELECT'), ('write', 'UPDATE'), ('write', 'SELECT'),
+                                           ('read', 'SELECT')])
+
+    #Tests that the SQLite connections use WAL and that read connections refuse to write.
+    def test_read_connections(self):
+        connection = self.reader.connect()
+        try:
+            self.assertEqual(connection.execute('PRAGMA journal_mode').scalar(), 'wal')
+            self.assertEqual(connection.execute('PRAGMA busy_timeout').scalar(), app.config['SQLITE_BUSY_TIMEOUT'])
+            self.assertRaises(OperationalError, connection.execute, "UPDATE user SET name = name")
+        finally:
+            connection.close()
+
+    #Tests that another thread reads the last committed value straight away while a write is not yet committed.
+    def test_read_during_write(self):
+        pat = User.query.filter(User.user_name == "Pat").one()
+        pat.notify_pref = 'hourly'
+        app_db.session.flush()
+        seen = []
+        def read():
+            with app.app_context():
+                seen.append(User.query.filter(User.user_name == "Pat").one().get_notify_pref())
+                app_db.session.remove()
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(2)
+        self.assertEqual(seen, ['immediate'])
+        app_db.session.commit()
+
+
+if __name__ == '__main__':
+    unittest.main()
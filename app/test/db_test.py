@@ -13,7 +13,7 @@ class MyDBTest(unittest.TestCase):
     #Function to setup for the rest of the tests.
     def setUp(self):
         super(MyDBTest, self).setUp()
-        exists = Team.query.get("Men's Running Club Test")
+        exists = Team.query.filter(Team.name == "Men's Running Club Test").first()
         if exists:
             app_db.session.delete(exists)
             app_db.session.commit()
@@ -24,7 +24,7 @@ class MyDBTest(unittest.TestCase):
 
 #Tests for adding and removing a team from the db.
     def test_add_remove_team(self):
-        new_team = Team(name="Men's Running Club Test", admin="VPeterson")
+        new_team = Team(name="Men's Running Club Test", admin=User.query.filter(User.user_name == "VPeterson").one())
         team_members = []
         team_members.append("John")
         team_members.append("Tom")
@@ -65,7 +65,7 @@ class MyDBTest(unittest.TestCase):
         new_user = User(user_name='Jimmy', name='Jimmy John', email='jjohn@illinois.edu', password='jjjj')
         app_db.session.add(new_user)
         app_db.session.commit()
-        new_team = Team(name="Men's Running Club Test", admin="Jimmy")
+        new_team = Team(name="Men's Running Club Test", admin=new_user)
         team_members = []
         team_members.append("John")
         team_members.append("Tom")
@@ -75,31 +75,33 @@ class MyDBTest(unittest.TestCase):
             if user1:
                 new_team.members.append(user1)
         app_db.session.add(new_team)
-        high5_1 = High5(receiver='Tom', giver='Jimmy', message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=new_team)
-        high5_2 = High5(receiver='John', giver='Tom', message='John went to the store to get supplies to make paper prototypes.', time_posted=datetime.datetime.utcnow(), level=4, team=new_team)
+        tom = User.query.filter(User.user_name == "Tom").one()
+        john = User.query.filter(User.user_name == "John").one()
+        high5_1 = High5(receiver=tom, giver=new_user, message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=new_team)
+        high5_2 = High5(receiver=john, giver=tom, message='John went to the store to get supplies to make paper prototypes.', time_posted=datetime.datetime.utcnow(), level=4, team=new_team)
         app_db.session.add(high5_1)
         app_db.session.add(high5_2)
         app_db.session.commit()
-        high5s = High5.query.filter(High5.team_name == "Men's Running Club Test").all()
+        team_id = new_team.id
+        high5s = High5.query.filter(High5.team_id == team_id).all()
         self.assertEqual(len(high5s), 2)
-        john = User.query.filter(User.user_name == "John").one()
         new_team.members.remove(john)
-        High5.query.filter(High5.team_name=="Men's Running Club Test").filter(High5.receiver=="John").delete()
+        High5.query.filter(High5.team_id==team_id).filter(High5.receiver_id==john.id).delete()
         app_db.session.commit()
-        high5s = High5.query.filter(High5.team_name == "Men's Running Club Test").all()
+        high5s = High5.query.filter(High5.team_id == team_id).all()
         self.assertEqual(len(high5s), 1)
         app_db.session.delete(new_team)
         app_db.session.delete(new_user)
         app_db.session.commit()
         team_exists = Team.query.filter(Team.name == "Men's Running Club Test").all()
         self.assertEqual(len(team_exists), 0)
-        high5s = High5.query.filter(High5.team_name == "Men's Running Club Test").all()
+        high5s = High5.query.filter(High5.team_id == team_id).all()
         self.assertEqual(len(high5s), 0)
 
     def test_calculate_score(self):
-        new_team = Team(name="Men's Running Club Test", admin="Jimmy")
-        high5_1 = High5(receiver='Tom', giver='Jimmy', message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=new_team)
-        high5_3 = High5(receiver='Tom', giver='Jimmy', message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=1, team=new_team)
+        new_team = Team(name="Men's Running Club Test")
+        high5_1 = High5(message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=5, team=new_team)
+        high5_3 = High5(message='Tom went in to extra office hours to get feedback on our project change idea', time_posted=datetime.datetime.utcnow(), level=1, team=new_team)
         tom_high5s = []
         tom_high5s.append(high5_1)
         tom_high5s.append(high5_3)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import unittest
+import csv
+import datetime
+import gzip
+import io
+import json
+import sys
+sys.path.append('..')
+from app import app, app_db
+from app.models import User, Team, High5
+from app.membership import add_members
+from app.export import export_chunks
+
+"""
+Class to test the High5 history exports: their rows in each format, the range of days, gzip, streaming in batches and
+that only the team admin can export a team.
+"""
+class ExportTest(unittest.TestCase):
+    team_name = "Export Test Team"
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self._cleanup()
+        self.batch_size = app.config['EXPORT_BATCH_SIZE']
+        app.config['EXPORT_BATCH_SIZE'] = 2
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, list(self.ids.values()))
+        day = datetime.datetime(2016, 3, 1, 12)
+        for days, giver, receiver, message in [(0, "John", "Tom", u'Thanks for the review'),
+                                               (1, "Tom", "Jane", u'Caf\xe9 run, "merci"'),
+                                               (31, "Jane", "John", u'=1+1 is two'),
+                                               (40, "John", "Jane", u'Later')]:
+            app_db.session.add(High5(receiver_id=self.ids[receiver], giver_id=self.ids[giver], message=message,
+                                     time_posted=day + datetime.timedelta(days=days), level=3, team_id=self.team_id))
+        app_db.session.commit()
+        self.client = app.test_client()
+        self._login("John")
+
+    def tearDown(self):
+        app.config['EXPORT_BATCH_SIZE'] = self.batch_size
+        self._cleanup()
+        super(ExportTest, self).tearDown()
+
+    def _cleanup(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+        app_db.session.commit()
+
+    def _login(self, user_name):
+        with self.client.session_transaction() as session:
+            session['user_id'] = str(self.ids[user_name])
+            session['_fresh'] = True
+
+    def _export(self, query=''):
+        return self.client.get('/export/John/%s%s' % (self.team_name, query), buffered=False)
+
+    #Read a CSV export into rows of text, on Python 2 where the csv module reads bytes too.
+    def _csv_rows(self, data):
+        if bytes is str:
+            return [[cell.decode('utf-8') for cell in row] for row in csv.reader(io.BytesIO(data))]
+        return list(csv.reader(io.StringIO(data.decode('utf-8'))))
+
+    #Tests the CSV export of a whole team, oldest first, with text that needs quoting and a formula made harmless.
+    def test_csv(self):
+        response = self._export()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=high5s-export-test-team.csv')
+        rows = self._csv_rows(response.data)
+        self.assertEqual(rows[0], ['id', 'team', 'time_posted', 'giver', 'receiver', 'level', 'message'])
+        self.assertEqual([row[2:] for row in rows[1:3]],
+                         [['2016-03-01T12:00:00', 'John', 'Tom', '3', 'Thanks for the review'],
+                          ['2016-03-02T12:00:00', 'Tom', 'Jane', '3', u'Caf\xe9 run, "merci"']])
+        self.assertEqual([row[6] for row in rows[3:]], ["'=1+1 is two", 'Later'])
+
+    #Tests a range of days as newline delimited JSON, and that gzip gives the same export compressed.
+    def test_ndjson_range_gzip(self):
+        query = '?format=ndjson&start=2016-03-02&end=2016-04-01'
+        plain = self._export(query).data
+        rows = [json.loads(line) for line in plain.decode('utf-8').splitlines()]
+        self.assertEqual([(row['giver'], row['message']) for row in rows],
+                         [('Tom', u'Caf\xe9 run, "merci"'), ('Jane', u'=1+1 is two')])
+        response = self._export(query + '&gzip=1')
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertTrue(response.headers['Content-Disposition'].endswith('-2016-03-02-2016-04-01.ndjson.gz'))
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(response.data)).read(), plain)
+        self.assertEqual(self._export('?format=xml').status_code, 400)
+
+    #Tests that an export is written a batch of rows at a time.
+    def test_batches(self):
+        chunks = list(export_chunks('csv', self.team_id))
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [3, 2])
+
+    #Tests that members who are not the admin cannot export the team.
+    def test_admin_only(self):
+        self._login("Tom")
+        response = self._export()
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(b'Thanks for the review', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
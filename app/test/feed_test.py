@@ -0,0 +1,124 @@
+import unittest
+import sys
+import json
+import time
+sys.path.append('..')
+from app import app, app_db
+import datetime
+from app.models import User, Team, High5, MemberStat, DailyStat, members
+from app.stats import add_member_stats
+from app.pagination import PER_PAGE, keyset_page, encode_cursor, decode_cursor
+from clients import BufferedClient
+
+"""
+Class to test the keyset paginated High5 feeds. A team with 100,000 High5's must render the first page of the team
+page in about the same time as a team with 100, and walking the JSON feed must return every High5 exactly once.
+"""
+class FeedTest(unittest.TestCase):
+    big_team = "Feed Test Big Team"
+    small_team = "Feed Test Small Team"
+
+    #Create the two teams once for the whole class with bulk inserts, since 100,000 ORM adds would take minutes.
+    @classmethod
+    def setUpClass(cls):
+        app_db.create_all()
+        cls._delete_teams()
+        start = datetime.datetime(2016, 1, 1)
+        john = User.query.filter(User.user_name == "John").one()
+        tom = User.query.filter(User.user_name == "Tom").one()
+        for team_name, count in [(cls.big_team, 100000), (cls.small_team, 100)]:
+            team = Team(name=team_name, admin=john)
+            team.members.append(john)
+            team.members.append(tom)
+            app_db.session.add(team)
+            app_db.session.flush()
+            rows = [dict(receiver_id=tom.id, giver_id=john.id, message="High5 number %d" % i, level=i % 5 + 1,
+                         team_id=team.id, time_posted=start + datetime.timedelta(minutes=i // 3))
+                    for i in range(count)]
+            app_db.session.execute(High5.__table__.insert(), rows)
+            add_member_stats(team.id, [john.id, tom.id])
+        app_db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._delete_teams()
+
+    #Delete the test teams with bulk deletes rather than the ORM cascade, which would load every High5.
+    @classmethod
+    def _delete_teams(cls):
+        for (team_id,) in app_db.session.query(Team.id).filter(Team.name.in_([cls.big_team, cls.small_team])):
+            High5.query.filter(High5.team_id == team_id).delete(synchronize_session=False)
+            MemberStat.query.filter(MemberStat.team_id == team_id).delete(synchronize_session=False)
+            DailyStat.query.filter(DailyStat.team_id == team_id).delete(synchronize_session=False)
+            app_db.session.execute(members.delete().where(members.c.team_id == team_id))
+            Team.query.filter(Team.id == team_id).delete(synchronize_session=False)
+        app_db.session.commit()
+
+    def setUp(self):
+        super(FeedTest, self).setUp()
+        self.client = BufferedClient(app, app.response_class)
+        john = User.query.filter(User.user_name == "John").one()
+        with self.client.session_transaction() as session:
+            session['user_id'] = john.get_id()
+            session['_fresh'] = True
+
+    #Best of several timings of rendering the first team page, to keep scheduler noise out of the comparison.
+    def _render_time(self, team_name):
+        timings = []
+        for _ in range(5):
+            start = time.time()
+            response = self.client.get('/team/John/' + team_name)
+            timings.append(time.time() - start)
+            self.assertEqual(response.status_code, 200)
+        return min(timings), response.data
+
+    #Tests that the first page renders one page of High5's in constant time, whatever the size of the team.
+    def test_first_page_constant_time(self):
+        small_time, small_page = self._render_time(self.small_team)
+        big_time, big_page = self._render_time(self.big_team)
+        self.assertEqual(small_page.count(b'class="high5_msg"'), PER_PAGE)
+        self.assertEqual(big_page.count(b'class="high5_msg"'), PER_PAGE)
+        self.assertIn(b'High5 number 99999', big_page)
+        self.assertIn(b'class="load_more"', big_page)
+        self.assertLess(big_time, max(small_time * 3, small_time + 0.05))
+
+    #Tests that following the JSON feed's cursors returns every High5 once, newest first, including High5's that
+    #share a time_posted.
+    def test_walk_feed(self):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get('/feed/John/%s/team?cursor=%s' % (self.small_team, cursor))
+            page = json.loads(response.data.decode('utf-8'))
+            self.assertLessEqual(len(page['high5s']), PER_PAGE)
+            seen.extend(high5['id'] for high5 in page['high5s'])
+            cursor = page['next']
+        expected = [high5.id for high5 in High5.query.join(High5.team).filter(Team.name == self.small_team).
+                    order_by(High5.time_posted.desc(), High5.id.desc())]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 100)
+
+    #Tests the received and given feeds of the user page and unknown feed kinds.
+    def test_user_feeds(self):
+        response = self.client.get('/user/Tom/' + self.big_team)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="high5_msg"'), PER_PAGE)
+        response = self.client.get('/feed/John/%s/given' % self.big_team)
+        self.assertEqual(len(json.loads(response.data.decode('utf-8'))['high5s']), PER_PAGE)
+        response = self.client.get('/feed/Tom/%s/given' % self.big_team)
+        self.assertEqual(json.loads(response.data.decode('utf-8')), {'high5s': [], 'next': None})
+        self.assertEqual(self.client.get('/feed/John/%s/everything' % self.big_team).status_code, 404)
+
+    #Tests that cursors round trip and that a malformed cursor falls back to the first page.
+    def test_cursors(self):
+        query = High5.query.join(High5.team).filter(Team.name == self.small_team)
+        first_page, next_cursor = keyset_page(query)
+        self.assertEqual(decode_cursor(next_cursor), (first_page[-1].time_posted, first_page[-1].id))
+        self.assertEqual(encode_cursor(first_page[-1]), next_cursor)
+        self.assertEqual(keyset_page(query, 'not a cursor')[0], first_page)
+        second_page, _ = keyset_page(query, next_cursor)
+        self.assertFalse(set(h.id for h in first_page) & set(h.id for h in second_page))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import sys
+import time
+sys.path.append('..')
+from app import app, app_db
+from flask import session
+from app.models import User
+from app.identity_cache import IdentityCache, CachedUser, cache, load_cached_user
+
+"""
+Class to test the logged in user cache: LRU and time to live, hit and miss counts, and dropping or reloading a user
+whose row changed.
+"""
+class IdentityCacheTest(unittest.TestCase):
+    def setUp(self):
+        super(IdentityCacheTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        cache.clear()
+        self.pat = User.query.filter(User.user_name == "Pat").first()
+
+    def tearDown(self):
+        User.query.filter(User.user_name == "Pat").update({User.notify_pref: 'immediate'})
+        app_db.session.commit()
+        cache.clear()
+        super(IdentityCacheTest, self).tearDown()
+
+    def _record(self, id, version=1):
+        return CachedUser(id, 'user%d' % id, 'User', 'user@illinois.edu', 'immediate', version)
+
+    #Tests that the least recently used user is evicted first and that records expire after the time to live.
+    def test_lru_and_ttl(self):
+        lru = IdentityCache(2, 60)
+        lru.put(self._record(1))
+        lru.put(self._record(2))
+        self.assertIsNotNone(lru.get(1))
+        lru.put(self._record(3))
+        self.assertIsNone(lru.get(2))
+        self.assertIsNotNone(lru.get(1))
+        self.assertIsNotNone(lru.get(3))
+        self.assertEqual(lru.stats(), dict(hits=3, misses=1, size=2))
+        expiring = IdentityCache(2, 0.01)
+        expiring.put(self._record(1))
+        time.sleep(0.02)
+        self.assertIsNone(expiring.get(1))
+
+    #Tests that a record at or newer than the given version is a hit and an older one is a miss that drops it.
+    def test_version(self):
+        lru = IdentityCache(2, 60)
+        lru.put(self._record(1, version=3))
+        self.assertIsNotNone(lru.get(1, 3))
+        self.assertIsNotNone(lru.get(1, 2))
+        self.assertIsNone(lru.get(1, 4))
+        self.assertIsNone(lru.get(1))
+
+    #Tests that the loader queries once and then serves the user from the cache until the row is updated.
+    def test_loader_invalidated_on_update(self):
+        with app.test_request_context():
+            hits = cache.stats()['hits']
+            first = load_cached_user(self.pat.get_id())
+            second = load_cached_user(self.pat.get_id())
+            self.assertIs(first, second)
+            self.assertEqual(cache.stats()['hits'], hits + 1)
+            version = self.pat.version
+            self.pat.notify_pref = 'daily'
+            app_db.session.commit()
+            self.assertEqual(self.pat.version, version + 1)
+            third = load_cached_user(self.pat.get_id())
+            self.assertIsNot(third, first)
+            self.assertEqual(third.get_notify_pref(), 'daily')
+            self.assertIsNone(load_cached_user('999999'))
+            self.assertIsNone(load_cached_user('not an id'))
+
+    #Tests that a user is dropped when the change commits, not when it is flushed, so a record another request cached
+    #in between is dropped too, and that a rolled back change keeps the record.
+    def test_invalidated_on_commit(self):
+        record = CachedUser(self.pat.id, 'Pat', 'Pat', 'patpython@illinois.edu', 'immediate', self.pat.version)
+        cache.put(record)
+        self.pat.notify_pref = 'daily'
+        app_db.session.flush()
+        self.assertIs(cache.get(self.pat.id), record)
+        app_db.session.rollback()
+        self.assertIs(cache.get(self.pat.id), record)
+        self.pat.notify_pref = 'daily'
+        app_db.session.flush()
+        cache.put(record)
+        app_db.session.commit()
+        self.assertIsNone(cache.get(self.pat.id))
+
+    #Tests that a session stamped with a newer version than the cached record reloads it, as after a change made in
+    #another worker process that this process's cache never heard about.
+    def test_stale_stamp_reloads(self):
+        cache.put(CachedUser(self.pat.id, 'Pat', 'Stale Name', 'patpython@illinois.edu', 'immediate',
+                             self.pat.version - 1))
+        with app.test_request_context():
+            session['user_version'] = self.pat.version
+            self.assertEqual(load_cached_user(self.pat.get_id()).get_name(), self.pat.get_name())
+
+    #Tests that changing email settings through the site updates the user and is seen on the next page.
+    def test_settings_through_client(self):
+        client = app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = self.pat.get_id()
+            client_session['_fresh'] = True
+        self.assertEqual(client.get('/index/Pat').status_code, 200)
+        response = client.post('/notifications/Pat', data=dict(notify_pref='hourly'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(b'<option selected value="hourly">', client.get('/index/Pat').data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import json
+import sys
+sys.path.append('..')
+from app import app, app_db, passwords, bulk_import
+from app.models import User, Team, MemberStat, members
+from app.bulk_import import read_csv, import_rows
+from app.stats import verify_member_stats
+
+"""
+Class to test the bulk imports of users, teams and members from CSV: the valid rows go in, every other row is reported
+with its problems, and imported users can log in.
+"""
+class ImportTest(unittest.TestCase):
+    team_names = ["Import Test Team", "Import Test Other Team"]
+
+    def setUp(self):
+        super(ImportTest, self).setUp()
+        self._cleanup()
+        self.admins = app.config['IMPORT_ADMINS']
+        self.iterations = app.config['PASSWORD_PBKDF2_ITERATIONS']
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = 1000
+
+    def tearDown(self):
+        app.config['IMPORT_ADMINS'] = self.admins
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = self.iterations
+        self._cleanup()
+        super(ImportTest, self).tearDown()
+
+    def _cleanup(self):
+        for team in Team.query.filter(Team.name.in_(self.team_names)):
+            app_db.session.delete(team)
+        user_ids = [user_id for (user_id,) in app_db.session.query(User.id).filter(User.user_name.like('importtest%'))]
+        if user_ids:
+            app_db.session.execute(members.delete().where(members.c.user_id.in_(user_ids)))
+            MemberStat.query.filter(MemberStat.user_id.in_(user_ids)).delete(synchronize_session=False)
+            User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        app_db.session.commit()
+
+    def _import(self, kind, text):
+        report = import_rows(kind, read_csv(kind, text.encode('utf-8')))
+        app_db.session.commit()
+        return report
+
+    #Tests that users, teams and members are imported with one report line for each row that was not.
+    def test_import(self):
+        report = self._import('users', u'User_Name,Name,Email,Password,Notify_Pref\n'
+                                       u'importtest1,Ann Import,ann@import.test,secret1,daily\n'
+                                       u'importtest2,Bob Import,bob@import.test,secret2,\n'
+                                       u'importtest2,Bob Again,bob2@import.test,secret3,\n'
+                                       u'John,John Again,john@import.test,secret4,\n'
+                                       u'importtest3,Cy Import,,secret5,weekly\n')
+        self.assertEqual((report.rows, report.created), (5, 2))
+        self.assertEqual(report.errors, {4: dict(user_name='Repeated in the file.'),
+                                         5: dict(user_name='Already taken.'),
+                                         6: dict(email='Required.', notify_pref='One of immediate, hourly, daily.')})
+        ann = User.query.filter(User.user_name == 'importtest1').one()
+        self.assertEqual(ann.get_notify_pref(), 'daily')
+        self.assertTrue(ann.is_valid_password('secret1'))
+        self.assertFalse(ann.is_valid_password('secret2'))
+
+        report = self._import('teams', u'name,admin\nImport Test Team,importtest1\nImport Test Team,importtest2\n'
+                                       u'Import Test Other Team,nobody\nCS465 Group 17,importtest2\n')
+        self.assertEqual(report.created, 1)
+        self.assertEqual(sorted(report.errors), [3, 4, 5])
+        team = Team.query.filter(Team.name == "Import Test Team").one()
+        self.assertEqual([member.user_name for member in team.members], ['importtest1'])
+
+        report = self._import('members', u'team,user_name\nImport Test Team,importtest2\nImport Test Team,John\n'
+                                         u'Import Test Team,importtest1\nImport Test Team,John\n'
+                                         u'No Such Team,importtest2\n')
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors, {4: dict(user_name='Already a member of Import Test Team.'),
+                                         5: dict(user_name='Repeated in the file.'),
+                                         6: dict(team='No team named No Such Team.')})
+        self.assertEqual(sorted(member.user_name for member in team.members), ['John', 'importtest1', 'importtest2'])
+        self.assertEqual(verify_member_stats(team.id), [])
+
+    #Tests that passwords hashed on a pool of processes come back in order and check like any other.
+    def test_hash_passwords(self):
+        chunk = passwords.HASH_CHUNK
+        passwords.HASH_CHUNK = 1
+        try:
+            hashed = passwords.hash_passwords([(u'one', b'salt1'), (u'two', b'salt2'), (u'three', b'salt3')], 2)
+        finally:
+            passwords.HASH_CHUNK = chunk
+        checks = [(u'one', b'salt1', hashed[0]), (u'two', b'salt2', hashed[1]), (u'three', b'salt3', hashed[2]),
+                  (u'one', b'salt2', hashed[1])]
+        self.assertEqual([passwords.check_password(password, salt, stored)[0] for password, salt, stored in checks],
+                         [True, True, True, False])
+
+    #Tests that only the import admins can import through the API, with the report sent back as JSON, that it takes
+    #at most IMPORT_MAX_USERS users and hashes their passwords without forking a pool of processes.
+    def test_api(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = str(User.query.filter(User.user_name == 'John').one().id)
+            session['_fresh'] = True
+        body = u'user_name,name,email,password\nimporttest9,Dee Import,dee@import.test,secret\n'
+        app.config['IMPORT_ADMINS'] = []
+        self.assertEqual(client.post('/api/import/users', data=body, content_type='text/csv').status_code, 403)
+        app.config['IMPORT_ADMINS'] = ['John']
+        self.assertEqual(client.post('/api/import/users', data=u'user_name,name\n', content_type='text/csv').
+                         status_code, 400)
+        too_many = body + u'importtest8,Eve Import,eve@import.test,secret\n'
+        app.config['IMPORT_MAX_USERS'], max_users = 1, app.config['IMPORT_MAX_USERS']
+        try:
+            self.assertEqual(client.post('/api/import/users', data=too_many, content_type='text/csv').status_code, 413)
+        finally:
+            app.config['IMPORT_MAX_USERS'] = max_users
+        hash_passwords = bulk_import.hash_passwords
+        bulk_import.hash_passwords = None
+        try:
+            response = client.post('/api/import/users', data=body, content_type='text/csv')
+        finally:
+            bulk_import.hash_passwords = hash_passwords
+        report = json.loads(response.data.decode('utf-8'))
+        self.assertEqual((report['rows'], report['created'], report['errors']), (1, 1, []))
+        user = User.query.filter(User.user_name == 'importtest9').one()
+        self.assertTrue(user.is_valid_password(u'secret'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import socket
+import sys
+import time
+sys.path.append('..')
+from app import app, app_db
+from app.models import User, Team, High5, Notification
+from app.membership import add_members
+from app import live
+from app.live import Hub, LiveServer, hub
+
+"""
+Class to test the live team feeds: the hub's fan out and replay, and the events of giving, editing and deleting a
+High5 streamed by the live server to a member of the team.
+"""
+class LiveTest(unittest.TestCase):
+    team_name = "Live Test Team"
+
+    def setUp(self):
+        super(LiveTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        self._cleanup()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, [self.ids["John"], self.ids["Tom"]])
+        app_db.session.commit()
+        self.publish_address = app.config['LIVE_PUBLISH_ADDRESS']
+        app.config['LIVE_PUBLISH_ADDRESS'] = None
+        self.server = LiveServer('127.0.0.1:0').start()
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = str(self.ids["John"])
+            session['_fresh'] = True
+
+    def tearDown(self):
+        self.server.stop()
+        app.config['LIVE_PUBLISH_ADDRESS'] = self.publish_address
+        self._cleanup()
+        super(LiveTest, self).tearDown()
+
+    def _cleanup(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+        Notification.query.filter(Notification.team_name == self.team_name).delete(synchronize_session=False)
+        app_db.session.commit()
+
+    #Open the team's stream as the given user, or without a session cookie. Returns the socket and what it read.
+    def _connect(self, user_name=None, team_name=None):
+        headers = ''
+        if user_name:
+            cookie = app.session_interface.get_signing_serializer(app).dumps(
+                {'user_id': str(self.ids[user_name]), '_fresh': True})
+            headers = 'Cookie: %s=%s\r\n' % (app.session_cookie_name, cookie)
+        sock = socket.create_connection(self.server.address, timeout=5)
+        sock.sendall(('GET /live/%s HTTP/1.1\r\nHost: live\r\n%s\r\n' %
+                      ((team_name or self.team_name).replace(' ', '%20'), headers)).encode('latin-1'))
+        return sock, self._read(sock, b'\r\n\r\n')
+
+    def _read(self, sock, until, data=b''):
+        while until not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    #Tests that the hub sends each event to the subscribers of its team only, and replays the kept events after the
+    #last id a subscriber saw.
+    def test_hub(self):
+        hub = Hub(replay=2)
+        first, second, other = [], [], []
+        token = hub.subscribe(1, first.append)
+        hub.subscribe(1, second.append)
+        hub.subscribe(2, other.append)
+        self.assertEqual(hub.publish(1, 'give', dict(id=7)), 2)
+        hub.unsubscribe(token)
+        hub.publish(1, 'delete', dict(id=7))
+        hub.publish(1, 'give', dict(id=8))
+        self.assertEqual(first, [b'id: 1\nevent: give\ndata: {"id": 7}\n\n'])
+        self.assertEqual(len(second), 3)
+        self.assertEqual(other, [])
+        replayed = []
+        hub.subscribe(1, replayed.append, last_id=1)
+        self.assertEqual(replayed, second[1:])
+        self.assertEqual(hub.stats(), dict(teams=2, subscribers=3, published=3, delivered=4))
+
+    #Tests that a member sees the High5's given, edited and deleted on the team as they are committed.
+    def test_stream(self):
+        sock, head = self._connect("Tom")
+        try:
+            self.assertTrue(head.startswith(b'HTTP/1.1 200 OK\r\n'))
+            self.assertIn(b'Content-Type: text/event-stream', head)
+            for _ in range(50):
+                if self.server.stats()['subscribers']:
+                    break
+                time.sleep(0.01)
+            self.client.post('/giveHigh5/John/%s' % self.team_name,
+                             data=dict(receiver='Tom', message=u'Live thanks', level=4))
+            high5_id = High5.query.filter(High5.message == u'Live thanks').one().id
+            self.client.post('/editHigh5/John/%s/%d' % (self.team_name, high5_id),
+                             data=dict(comment_update=u'Live thanks again'))
+            self.client.post('/deleteHigh5/John/%s/%d' % (self.team_name, high5_id))
+            data = self._read(sock, ('event: delete\ndata: {"id": %d}\n\n' % high5_id).encode('utf-8'))
+        finally:
+            sock.close()
+        self.assertIn(b'event: give\ndata: ', data)
+        self.assertIn(b'"giver": "John"', data)
+        self.assertIn(b'"message": "Live thanks"', data)
+        self.assertIn(b'event: edit\ndata: ', data)
+        self.assertIn(b'"message": "Live thanks again"', data)
+        self.assertIn(('event: delete\ndata: {"id": %d}\n\n' % high5_id).encode('utf-8'), data)
+
+    #Tests that the live server publishes the datagrams signed with SECRET_KEY and drops the others.
+    def test_signed_datagrams(self):
+        server = LiveServer('127.0.0.1:0', '127.0.0.1:0', hub=Hub()).start()
+        received = []
+        server.hub.subscribe(self.team_id, received.append)
+        address = '%s:%d' % server.receiver.getsockname()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(('[%d, "give", {"id": 1}]' % self.team_id).encode('utf-8'), server.receiver.getsockname())
+            sock.sendto(('%s [%d, "give", {"id": 2}]' % ('0' * 64, self.team_id)).encode('utf-8'),
+                        server.receiver.getsockname())
+            app.config['LIVE_PUBLISH_ADDRESS'] = address
+            live.publish(self.team_id, 'give', dict(id=3))
+            for _ in range(50):
+                if server.stats()['published']:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.05)
+        finally:
+            app.config['LIVE_PUBLISH_ADDRESS'] = None
+            sock.close()
+            server.stop()
+        self.assertEqual(received, [b'id: 1\nevent: give\ndata: {"id": 3}\n\n'])
+
+    #Tests that a High5 without a time is published with a null time.
+    def test_no_time(self):
+        received = []
+        token = hub.subscribe(self.team_id, received.append)
+        try:
+            app_db.session.add(High5(receiver_id=self.ids["Tom"], giver_id=self.ids["John"], message=u'Timeless',
+                                     level=2, team_id=self.team_id))
+            app_db.session.commit()
+        finally:
+            hub.unsubscribe(token)
+        self.assertEqual(len(received), 1)
+        self.assertIn(b'"time": null', received[0])
+
+    #Tests that a browser not logged in, or not on the team, is refused.
+    def test_refused(self):
+        for user_name, status in [(None, b'401'), ("Jane", b'404')]:
+            sock, head = self._connect(user_name)
+            sock.close()
+            self.assertTrue(head.startswith(b'HTTP/1.1 ' + status), head)
+        self.assertEqual(self.server.stats()['subscribers'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import sys
+sys.path.append('..')
+from app import app, app_db
+import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import User, Team, High5, MemberStat
+from app.membership import member_candidates, search_users, add_members, remove_members
+from app.stats import record_high5, verify_member_stats, verify_daily_stats
+
+"""
+Class to test the set based team membership helpers, and that the edit team page runs the same number of queries no
+matter how many users the site has.
+"""
+class MembershipTest(unittest.TestCase):
+    team_name = "Membership Test Team"
+
+    def setUp(self):
+        super(MembershipTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        app_db.create_all()
+        self._cleanup()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane", "Pat"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, [self.ids["John"], self.ids["Tom"]])
+        app_db.session.commit()
+
+    def tearDown(self):
+        self._cleanup()
+        super(MembershipTest, self).tearDown()
+
+    def _cleanup(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+        User.query.filter(User.user_name.like('member_filler_%')).delete(synchronize_session=False)
+        app_db.session.commit()
+
+    def _member_names(self):
+        return sorted(member.get_user_name() for member in Team.query.get(self.team_id).members)
+
+    #Tests that the candidates are the users matching the prefix who are not on the team, at most limit of them.
+    def test_candidates(self):
+        names = [user_name for _, user_name in member_candidates(self.team_id, u'j')]
+        self.assertNotIn("John", names)
+        self.assertIn("Jane", names)
+        self.assertNotIn("Pat", names)
+        self.assertEqual(member_candidates(self.team_id, u'to'), [])
+        self.assertEqual(member_candidates(self.team_id, u''), [])
+        self.assertEqual(len(member_candidates(self.team_id, u'j', limit=1)), 1)
+
+    #Tests that adding skips current members and unknown ids and creates stat rows for the new members.
+    def test_add(self):
+        added = add_members(self.team_id, [self.ids["Jane"], self.ids["Pat"], self.ids["Tom"], 999999])
+        app_db.session.commit()
+        self.assertEqual(sorted(added), ["Jane", "Pat"])
+        self.assertEqual(self._member_names(), ["Jane", "John", "Pat", "Tom"])
+        self.assertEqual(MemberStat.query.filter(MemberStat.team_id == self.team_id).count(), 4)
+        self.assertEqual(verify_member_stats(self.team_id), [])
+
+    #Tests that removing members deletes the High5's they received and keeps the stats of the others right.
+    def test_remove(self):
+        add_members(self.team_id, [self.ids["Jane"], self.ids["Pat"]])
+        now = datetime.datetime.utcnow()
+        for giver, receiver in [("John", "Tom"), ("Jane", "Tom"), ("Tom", "Pat"), ("Tom", "Jane")]:
+            app_db.session.add(High5(receiver_id=self.ids[receiver], giver_id=self.ids[giver], message='Thanks',
+                                     time_posted=now, level=3, team_id=self.team_id))
+            record_high5(self.team_id, self.ids[giver], self.ids[receiver], 3, now)
+        app_db.session.commit()
+        removed = remove_members(self.team_id, [self.ids["Tom"], self.ids["Pat"], 999999])
+        app_db.session.commit()
+        self.assertEqual(sorted(removed), ["Pat", "Tom"])
+        self.assertEqual(self._member_names(), ["Jane", "John"])
+        self.assertEqual([(high5.get_giver(), high5.get_receiver()) for high5 in
+                          High5.query.filter(High5.team_id == self.team_id)], [("Tom", "Jane")])
+        self.assertEqual(verify_member_stats(self.team_id), [])
+        self.assertEqual(verify_daily_stats(self.team_id), [])
+
+    #Tests the prefix search on user names and names, its limits and the users it leaves out.
+    def test_search(self):
+        self.assertEqual([user_name for _, user_name, _ in search_users(u'jan')], ["Jane"])
+        self.assertEqual([user_name for _, user_name, _ in search_users(u'Pat Py')], ["Pat"])
+        self.assertEqual(search_users(u'Jane', not_on_team=self.team_id)[0][1], "Jane")
+        self.assertEqual(search_users(u'To', not_on_team=self.team_id), [])
+        self.assertEqual(search_users(u'Jane', exclude=["Jane"]), [])
+        self.assertEqual(search_users(u'  '), [])
+        app_db.session.execute(User.__table__.insert(),
+                               [dict(user_name='member_filler_%d' % i, name='Filler %d' % i,
+                                     email='filler%d@illinois.edu' % i) for i in range(40)])
+        app_db.session.commit()
+        self.assertEqual(len(search_users(u'member_filler')), app.config['USER_SEARCH_LIMIT'])
+        self.assertEqual(len(search_users(u'filler', limit=1000)), app.config['USER_SEARCH_MAX'])
+        client = app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = str(self.ids["John"])
+            client_session['_fresh'] = True
+        response = client.get('/users/search?q=t&limit=5&team=' + self.team_name)
+        self.assertNotIn(b'"Tom"', response.data)
+        self.assertIn(b'"users"', response.data)
+
+    #Tests that the edit team page runs the same number of queries after another 200 users join the site, and that
+    #adding members through it works.
+    def test_edit_page_queries(self):
+        client = app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = str(self.ids["John"])
+            client_session['_fresh'] = True
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        url = '/edit/John/' + self.team_name
+        client.get(url)
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            client.get(url)
+            before = len(statements)
+            self.assertTrue(before > 0)
+            app_db.session.execute(User.__table__.insert(),
+                                   [dict(user_name='member_filler_%d' % i, name='Filler %d' % i,
+                                         email='filler%d@illinois.edu' % i) for i in range(200)])
+            app_db.session.commit()
+            del statements[:]
+            response = client.get(url)
+            self.assertEqual(len(statements), before)
+            self.assertNotIn(b'member_filler_', response.data)
+            response = client.get(url + '?q=member_filler_19')
+            self.assertEqual(response.data.count(b'">member_filler_19'), 10)
+            response = client.post(url, data=dict(users=[str(self.ids["Jane"]), str(self.ids["Pat"])]))
+            self.assertEqual(response.status_code, 302)
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        self.assertEqual(self._member_names(), ["Jane", "John", "Pat", "Tom"])
+
+
+if __name__ == '__main__':
+    unittest.main()
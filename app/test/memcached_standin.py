@@ -0,0 +1,61 @@
+import threading
+try:
+    import socketserver  # python 3
+except ImportError:
+    import SocketServer as socketserver  # python 2
+
+'''
+A local stand in for a memcached server, for testing the MemcachedCache backend of app/page_cache.py without one. It
+speaks the part of the memcached text protocol the backend uses (get, set, delete and flush_all) and keeps the values
+in a dict. Start it with start() and stop it with stop(); it listens on a free port of 127.0.0.1, given by server.'''
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        values = self.server.values
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            words = line.split()
+            if not words:
+                continue
+            command = words[0]
+            if command == b'get':
+                for key in words[1:]:
+                    if key in values:
+                        flags, data = values[key]
+                        self.wfile.write(b'VALUE ' + key + b' ' + flags + b' ' + str(len(data)).encode('ascii') +
+                                         b'\r\n' + data + b'\r\n')
+                self.wfile.write(b'END\r\n')
+            elif command == b'set':
+                data = self.rfile.read(int(words[4]) + 2)[:-2]
+                values[words[1]] = (words[2], data)
+                self.wfile.write(b'STORED\r\n')
+            elif command == b'delete':
+                self.wfile.write(b'DELETED\r\n' if values.pop(words[1], None) else b'NOT_FOUND\r\n')
+            elif command == b'flush_all':
+                values.clear()
+                self.wfile.write(b'OK\r\n')
+            else:
+                self.wfile.write(b'ERROR\r\n')
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class MemcachedStandIn(object):
+    def __init__(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.values = {}
+        self.server = '127.0.0.1:%d' % self._server.server_address[1]
+        self.values = self._server.values
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,118 @@
+import unittest
+import sys
+sys.path.append('..')
+from app import app, app_db, metrics, create_app
+from clients import BufferedClient
+from app.models import User
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+"""
+Class to test that every request is counted in /metrics with its SQL statements, template time and response size, and
+that slow requests are written to the slow request log with their statements.
+"""
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        self.client = BufferedClient(app, app.response_class)
+        (user_id,) = app_db.session.query(User.id).filter(User.user_name == 'John').one()
+        app_db.session.remove()
+        with self.client.session_transaction() as client_session:
+            client_session['user_id'] = str(user_id)
+            client_session['_fresh'] = True
+        self.slow_seconds = app.config['SLOW_REQUEST_SECONDS']
+
+    def tearDown(self):
+        app.config['SLOW_REQUEST_SECONDS'] = self.slow_seconds
+        app.config['METRICS_ENABLED'] = True
+        app.config['METRICS_TOKEN'] = None
+        super(MetricsTest, self).tearDown()
+
+    #Return the sum and count of a histogram's series for the endpoint.
+    def _series(self, histogram, endpoint):
+        counts, total = histogram.series.get(endpoint, [[0], 0.0])
+        return total, sum(counts)
+
+    #Tests that a page adds one request to each histogram with the statements a separate listener counted.
+    def test_request_recorded(self):
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        queries_before, count_before = self._series(metrics.QUERIES, 'pages.team')
+        template_before = self._series(metrics.TEMPLATE_TIME, 'pages.team')[0]
+        size_before = self._series(metrics.SIZE, 'pages.team')[0]
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            response = self.client.get('/team/John/CS465 Group 17')
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        self.assertEqual(response.status_code, 200)
+        queries_after, count_after = self._series(metrics.QUERIES, 'pages.team')
+        self.assertEqual(count_after, count_before + 1)
+        self.assertEqual(queries_after - queries_before, len(statements))
+        self.assertGreater(self._series(metrics.TEMPLATE_TIME, 'pages.team')[0], template_before)
+        self.assertEqual(self._series(metrics.SIZE, 'pages.team')[0] - size_before, len(response.data))
+        text = self.client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).data.decode('utf-8')
+        self.assertIn('high5_requests_total{endpoint="pages.team",method="GET",status="200"}', text)
+        self.assertIn('high5_request_queries_bucket{endpoint="pages.team",le="+Inf"} %d' % count_after, text)
+        self.assertNotIn('endpoint="pages.metrics"', text)
+
+    #Tests that a request slower than SLOW_REQUEST_SECONDS is logged as JSON with its statements.
+    def test_slow_request_logged(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        metrics.slow_log.addHandler(handler)
+        app.config['SLOW_REQUEST_SECONDS'] = 0
+        try:
+            self.client.get('/user/John/CS465 Group 17')
+        finally:
+            metrics.slow_log.removeHandler(handler)
+        self.assertEqual(len(records), 1)
+        line = json.loads(records[0].getMessage())
+        self.assertEqual((line['endpoint'], line['status'], line['path']), ('pages.user', 200,
+                                                                         '/user/John/CS465 Group 17'))
+        self.assertEqual(len(line['statements']), line['queries'])
+        self.assertTrue(all(statement['sql'] for statement in line['statements']))
+        self.assertEqual(sorted(statement['ms'] for statement in line['statements'])[::-1],
+                         [statement['ms'] for statement in line['statements']])
+
+    #Tests that apps logging slow requests to the same file share one handler for it.
+    def test_one_log_handler(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'slow.log')
+        try:
+            create_app(SLOW_REQUEST_LOG=path)
+            create_app(SLOW_REQUEST_LOG=path)
+            handlers = [handler for handler in metrics.slow_log.handlers
+                        if getattr(handler, 'baseFilename', None) == path]
+            self.assertEqual(len(handlers), 1)
+            metrics.slow_log.removeHandler(handlers[0])
+            handlers[0].close()
+        finally:
+            shutil.rmtree(directory)
+
+    #Tests that /metrics is only served to METRICS_ADDRESSES or with METRICS_TOKEN.
+    def test_restricted(self):
+        elsewhere = dict(environ_base={'REMOTE_ADDR': '10.1.2.3'})
+        self.assertEqual(self.client.get('/metrics', environ_base={'REMOTE_ADDR': '::1'}).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', **elsewhere).status_code, 403)
+        app.config['METRICS_TOKEN'] = 'scrape me'
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer scrape me'},
+                                         **elsewhere).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer guess'},
+                                         **elsewhere).status_code, 403)
+
+    #Tests that /metrics is not served when METRICS_ENABLED is off.
+    def test_disabled(self):
+        app.config['METRICS_ENABLED'] = False
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
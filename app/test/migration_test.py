@@ -0,0 +1,99 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+sys.path.append('..')
+from app import app, app_db
+from sqlalchemy import create_engine
+from sqlalchemy.engine.reflection import Inspector
+from app.migrations import database_version, latest_version, upgrade_database, downgrade_database
+
+#The tables db_create.py made before the database was under version control.
+OLD_SCHEMA = '''
+CREATE TABLE user (id INTEGER NOT NULL, user_name VARCHAR(50), name VARCHAR(50), email VARCHAR(120), _password BLOB,
+                   _salt VARCHAR(120), PRIMARY KEY (id), UNIQUE (user_name), UNIQUE (email));
+CREATE INDEX ix_user_name_1 ON user (name);
+CREATE TABLE team (name VARCHAR(100) NOT NULL, admin VARCHAR(50), PRIMARY KEY (name));
+CREATE TABLE high5 (id INTEGER NOT NULL, receiver VARCHAR(50), giver VARCHAR(50), message VARCHAR(250),
+                    time_posted DATETIME, level INTEGER, team_name VARCHAR(100), PRIMARY KEY (id));
+CREATE TABLE members (team VARCHAR(100), user INTEGER, CONSTRAINT "UC_team_user" UNIQUE (team, user));
+INSERT INTO user (id, user_name, name, email) VALUES (1, 'Ann', 'Ann Old', 'ann@illinois.edu');
+INSERT INTO team VALUES ('Old Team', 'Ann');
+INSERT INTO members VALUES ('Old Team', 1);
+INSERT INTO high5 VALUES (1, 'Ann', 'Ann', 'Kept', '2016-11-05 12:00:00', 3, 'Old Team');
+'''
+
+"""
+Class to test that the migrations upgrade a database made before version control to the schema in models.py without
+losing its rows, and that the committed database is at the newest version.
+"""
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        super(MigrationTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.url = 'sqlite:///' + os.path.join(self.directory, 'old.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(MigrationTest, self).tearDown()
+
+    def _indexes(self, inspector, table_name):
+        return set(index['name'] for index in inspector.get_indexes(table_name))
+
+    #Tests upgrading, downgrading and upgrading again a database with the old schema, and that the names it refers
+    #to teams and users by become ids and back.
+    def test_upgrade_old_database(self):
+        connection = sqlite3.connect(os.path.join(self.directory, 'old.db'))
+        connection.executescript(OLD_SCHEMA)
+        connection.close()
+        self.assertEqual(database_version(self.url), None)
+        self.assertEqual(upgrade_database(url=self.url), latest_version())
+        engine = create_engine(self.url)
+        inspector = Inspector.from_engine(engine)
+        for table in app_db.metadata.sorted_tables:
+            columns = set(column['name'] for column in inspector.get_columns(table.name))
+            self.assertEqual(columns, set(column.name for column in table.columns), table.name)
+            self.assertTrue(set(index.name for index in table.indexes) <= self._indexes(inspector, table.name),
+                            table.name)
+        self.assertEqual(engine.execute('SELECT user_name, notify_pref, version FROM user').fetchall(),
+                         [('Ann', 'immediate', 1)])
+        self.assertEqual(engine.execute('SELECT id, name, admin_id FROM team').fetchall(), [(1, 'Old Team', 1)])
+        self.assertEqual(engine.execute('SELECT message, receiver_id, giver_id, team_id FROM high5').fetchall(),
+                         [('Kept', 1, 1, 1)])
+        self.assertEqual(engine.execute('SELECT team_id, user_id FROM members').fetchall(), [(1, 1)])
+        self.assertEqual(downgrade_database(2, url=self.url), 2)
+        self.assertEqual(engine.execute('SELECT team, user FROM members').fetchall(), [('Old Team', 1)])
+        self.assertEqual(engine.execute('SELECT receiver, giver, team_name FROM high5').fetchall(),
+                         [('Ann', 'Ann', 'Old Team')])
+        self.assertEqual(downgrade_database(1, url=self.url), 1)
+        self.assertNotIn('ix_members_user', self._indexes(Inspector.from_engine(engine), 'members'))
+        self.assertEqual(upgrade_database(url=self.url), latest_version())
+        self.assertIn('ix_members_user', self._indexes(Inspector.from_engine(engine), 'members'))
+        self.assertEqual(engine.execute('SELECT team_id, user_id FROM members').fetchall(), [(1, 1)])
+        engine.dispose()
+
+    #Tests that a migration that fails half way through rebuilding the tables leaves them as they were. A stray
+    #high5_old table makes renaming high5 fail after team and members were renamed.
+    def test_failed_rebuild_rolls_back(self):
+        connection = sqlite3.connect(os.path.join(self.directory, 'old.db'))
+        connection.executescript(OLD_SCHEMA + 'CREATE TABLE high5_old (id INTEGER);')
+        connection.close()
+        self.assertRaises(Exception, upgrade_database, url=self.url)
+        self.assertEqual(database_version(self.url), 2)
+        engine = create_engine(self.url)
+        inspector = Inspector.from_engine(engine)
+        self.assertEqual(set(['team', 'members', 'high5', 'high5_old']) - set(inspector.get_table_names()), set())
+        self.assertNotIn('team_old', inspector.get_table_names())
+        self.assertIn('ix_members_user', self._indexes(inspector, 'members'))
+        self.assertEqual(engine.execute('SELECT team, user FROM members').fetchall(), [('Old Team', 1)])
+        engine.dispose()
+
+    #Tests that the committed database has had every migration.
+    def test_database_is_current(self):
+        self.assertEqual(database_version(), latest_version())
+
+
+if __name__ == '__main__':
+    unittest.main()
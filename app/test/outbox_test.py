@@ -0,0 +1,223 @@
+import unittest
+import sys
+import asyncore
+import smtpd
+import socket
+import threading
+sys.path.append('..')
+from app import app, app_db, mail
+import datetime
+from flask import template_rendered
+from app.models import User, Notification
+from app import outbox
+from app.outbox import enqueue_high5, drain_outbox, retry_delay, digest_due, run_worker
+
+"""
+Local stand-in for the SMTP server. Accepts everything unless told to refuse, records every message it receives and
+counts the connections made to it.
+"""
+class StubSMTPServer(smtpd.SMTPServer):
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.messages = []
+        self.connections = 0
+        self.refuse = False
+        self.running = True
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.05, count=1)
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.refuse:
+            return '451 Try again later'
+        self.messages.append((rcpttos, data))
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.close()
+
+"""
+Class to test the email outbox worker, including digests, against the stand-in SMTP server.
+"""
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        super(OutboxTest, self).setUp()
+        app_db.create_all()
+        Notification.query.delete()
+        app_db.session.commit()
+        self.server = StubSMTPServer()
+        self.mail_config = dict((key, app.config.get(key)) for key in
+                                ['MAIL_SERVER', 'MAIL_PORT', 'MAIL_USE_SSL', 'MAIL_USERNAME', 'MAIL_PASSWORD'])
+        app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=self.server.port, MAIL_USE_SSL=False,
+                          MAIL_USERNAME=None, MAIL_PASSWORD=None)
+        mail.init_app(app)
+        self.now = datetime.datetime.utcnow()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["Pat", "Tom"])))
+
+    def tearDown(self):
+        User.query.filter(User.user_name == "Pat").update({User.notify_pref: 'immediate'})
+        self.server.stop()
+        app.config.update(self.mail_config)
+        mail.init_app(app)
+        Notification.query.delete()
+        app_db.session.commit()
+        super(OutboxTest, self).tearDown()
+
+    def _drain(self, seconds_later=0):
+        with app.app_context():
+            return drain_outbox(self.now + datetime.timedelta(seconds=seconds_later))
+
+    #Tests that a batch of notifications is sent over a single SMTP connection and marked sent.
+    def test_batch_one_connection(self):
+        for giver in ["John", "Tom", "Jane"]:
+            enqueue_high5("Outbox Team", giver, self.ids["Pat"], "Thanks from %s" % giver, self.now)
+        app_db.session.commit()
+        self.assertEqual(self._drain(), dict(sent=3, retry=0, dead=0))
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.messages[0][0], ['patpython@illinois.edu'])
+        self.assertEqual(Notification.query.filter(Notification.status == 'sent').count(), 3)
+        self.assertEqual(self._drain(), dict(sent=0, retry=0, dead=0))
+
+    #Tests that refused messages are retried with backoff and only sent once they are due again.
+    def test_retry_with_backoff(self):
+        enqueue_high5("Outbox Team", "John", self.ids["Pat"], "Thanks", self.now)
+        app_db.session.commit()
+        self.server.refuse = True
+        self.assertEqual(self._drain(), dict(sent=0, retry=1, dead=0))
+        notification = Notification.query.one()
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('451', notification.last_error)
+        self.assertEqual(notification.next_attempt, self.now + datetime.timedelta(seconds=retry_delay(1)))
+        self.server.refuse = False
+        self.assertEqual(self._drain(retry_delay(1) - 1), dict(sent=0, retry=0, dead=0))
+        self.assertEqual(self._drain(retry_delay(1)), dict(sent=1, retry=0, dead=0))
+        self.assertEqual(len(self.server.messages), 1)
+
+    #Tests that a notification is marked dead after the last attempt and never tried again.
+    def test_dead_letter(self):
+        enqueue_high5("Outbox Team", "John", self.ids["Pat"], "Thanks", self.now)
+        enqueue_high5("Outbox Team", "John", 999999, "Thanks", self.now)
+        app_db.session.commit()
+        self.server.refuse = True
+        seconds = 0
+        for attempt in range(1, app.config['OUTBOX_MAX_ATTEMPTS']):
+            self.assertEqual(self._drain(seconds)['retry'], 1)
+            seconds += retry_delay(attempt)
+        self.assertEqual(self._drain(seconds), dict(sent=0, retry=0, dead=1))
+        self.assertEqual(Notification.query.filter(Notification.status == 'dead').count(), 2)
+        self.server.refuse = False
+        self.assertEqual(self._drain(seconds + 100000), dict(sent=0, retry=0, dead=0))
+
+    #Tests that when the mail server cannot be reached the whole batch is kept for a retry.
+    def test_server_down(self):
+        enqueue_high5("Outbox Team", "John", self.ids["Pat"], "Thanks", self.now)
+        enqueue_high5("Outbox Team", "Tom", self.ids["Pat"], "Thanks", self.now)
+        app_db.session.commit()
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        app.config['MAIL_PORT'] = closed.getsockname()[1]
+        closed.close()
+        mail.init_app(app)
+        self.assertEqual(self._drain(), dict(sent=0, retry=2, dead=0))
+        app.config['MAIL_PORT'] = self.server.port
+        mail.init_app(app)
+        self.assertEqual(self._drain(retry_delay(1)), dict(sent=2, retry=0, dead=0))
+
+    #Tests that a notification whose email cannot be built is marked dead at once while the rest of the batch is sent,
+    #and that the worker keeps running after a batch fails.
+    def test_broken_email(self):
+        enqueue_high5("Outbox Team", "John", self.ids["Pat"], "Thanks", self.now)
+        enqueue_high5("Outbox Team", "John", self.ids["Tom"], "Thanks", self.now)
+        app_db.session.commit()
+        build_email = outbox._build_email
+        def broken(receiver, notifications):
+            if receiver.user_name == "Pat":
+                raise ValueError('broken template')
+            return build_email(receiver, notifications)
+        outbox._build_email = broken
+        try:
+            self.assertEqual(self._drain(), dict(sent=1, retry=0, dead=1))
+        finally:
+            outbox._build_email = build_email
+        dead = Notification.query.filter(Notification.status == 'dead').one()
+        self.assertEqual((dead.receiver_id, dead.last_error), (self.ids["Pat"], 'ValueError: broken template'))
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self._drain(100000), dict(sent=0, retry=0, dead=0))
+        class Stop(Exception):
+            pass
+        def stop(seconds):
+            raise Stop()
+        drain, sleep = outbox.drain_outbox, outbox.time.sleep
+        outbox.drain_outbox, outbox.time.sleep = lambda: 1 / 0, stop
+        try:
+            self.assertRaises(Stop, run_worker, 1)
+        finally:
+            outbox.drain_outbox, outbox.time.sleep = drain, sleep
+
+    #Tests when notifications in each mode are due.
+    def test_digest_due(self):
+        now = datetime.datetime(2016, 11, 5, 14, 35, 10)
+        self.assertEqual(digest_due('immediate', now), now)
+        self.assertEqual(digest_due('hourly', now), datetime.datetime(2016, 11, 5, 15, 0, 0))
+        self.assertEqual(digest_due('daily', now), datetime.datetime(2016, 11, 6, 0, 0, 0))
+
+    #Tests that a burst of High5's for a daily digest receiver waits for the end of the day and then goes out as one
+    #email, grouped by team, rendering the templates once.
+    def test_daily_digest(self):
+        User.query.filter(User.user_name == "Pat").update({User.notify_pref: 'daily'})
+        app_db.session.commit()
+        for i in range(10):
+            team_name = "Race Weekend Team" if i % 2 else "Outbox Team"
+            enqueue_high5(team_name, "John", self.ids["Pat"], "Great race number %d" % i, self.now)
+        enqueue_high5("Outbox Team", "John", self.ids["Tom"], "Thanks Tom", self.now)
+        app_db.session.commit()
+        self.assertEqual(self._drain(), dict(sent=1, retry=0, dead=0))
+        self.assertEqual(self.server.messages[0][0], ['tomduck@illinois.edu'])
+        rendered = []
+        record = lambda sender, template, context, **extra: rendered.append(template.name)
+        template_rendered.connect(record, app)
+        try:
+            seconds = (digest_due('daily', self.now) - self.now).total_seconds()
+            self.assertEqual(self._drain(seconds), dict(sent=10, retry=0, dead=0))
+        finally:
+            template_rendered.disconnect(record, app)
+        self.assertEqual(len(self.server.messages), 2)
+        recipients, data = self.server.messages[1]
+        self.assertEqual(recipients, ['patpython@illinois.edu'])
+        self.assertIn("You received 10 High5's!", data)
+        self.assertIn("Race Weekend Team", data)
+        self.assertIn("Great race number 9", data)
+        self.assertEqual(sorted(rendered), ['high5_digest.html', 'high5_digest.txt'])
+
+    #Tests that a digest bigger than a batch still goes out as one email.
+    def test_digest_bigger_than_batch(self):
+        User.query.filter(User.user_name == "Pat").update({User.notify_pref: 'hourly'})
+        app_db.session.commit()
+        for i in range(5):
+            enqueue_high5("Outbox Team", "John", self.ids["Pat"], "Thanks number %d" % i, self.now)
+        app_db.session.commit()
+        batch_size = app.config['OUTBOX_BATCH_SIZE']
+        app.config['OUTBOX_BATCH_SIZE'] = 2
+        try:
+            seconds = (digest_due('hourly', self.now) - self.now).total_seconds()
+            self.assertEqual(self._drain(seconds), dict(sent=5, retry=0, dead=0))
+        finally:
+            app.config['OUTBOX_BATCH_SIZE'] = batch_size
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertIn("You received 5 High5's!", self.server.messages[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import sys
+sys.path.append('..')
+from app import app, app_db, page_cache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import User, Team
+from app.membership import add_members, remove_members
+from app.page_cache import LocalCache, MemcachedCache
+from clients import BufferedClient
+from memcached_standin import MemcachedStandIn
+
+"""
+Class to test that writes to a team bump its version, that the team and user pages are answered with 304 until the
+team changes, and that the fragments of an unchanged team come from the cache, in this process or from memcached.
+"""
+class PageCacheTest(unittest.TestCase):
+    team_name = "Page Cache Test Team"
+
+    def setUp(self):
+        super(PageCacheTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        self._cleanup()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, [self.ids["John"], self.ids["Tom"]])
+        app_db.session.commit()
+        self.client = BufferedClient(app, app.response_class)
+        with self.client.session_transaction() as session:
+            session['user_id'] = str(self.ids["John"])
+            session['_fresh'] = True
+        self.cache = page_cache.cache
+        page_cache.cache = LocalCache(100)
+
+    def tearDown(self):
+        page_cache.cache = self.cache
+        self._cleanup()
+        super(PageCacheTest, self).tearDown()
+
+    def _cleanup(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+        app_db.session.commit()
+
+    def _version(self):
+        version = app_db.session.query(Team.version).filter(Team.id == self.team_id).scalar()
+        app_db.session.remove()
+        return version
+
+    def _give(self, message):
+        response = self.client.post('/giveHigh5/John/' + self.team_name,
+                                    data=dict(receiver='Tom', message=message, level=3))
+        self.assertEqual(response.status_code, 302)
+
+    #Tests that giving, editing and deleting High5's and adding and removing members each bump the version.
+    def test_writes_bump_version(self):
+        version = self._version()
+        self._give(u'Version test')
+        self.assertEqual(self._version(), version + 1)
+        high5_id = Team.query.get(self.team_id).high5s.one().id
+        self.client.post('/editHigh5/John/%s/%d' % (self.team_name, high5_id), data=dict(comment_update=u'Edited'))
+        self.assertEqual(self._version(), version + 2)
+        self.client.post('/deleteHigh5/John/%s/%d' % (self.team_name, high5_id))
+        self.assertEqual(self._version(), version + 3)
+        add_members(self.team_id, [self.ids["Jane"]])
+        app_db.session.commit()
+        remove_members(self.team_id, [self.ids["Jane"]])
+        app_db.session.commit()
+        self.assertEqual(self._version(), version + 5)
+
+    #Tests that the team and user pages are answered with 304 for the current ETag or Last-Modified, and in full once
+    #the team has changed.
+    def test_not_modified(self):
+        for page in ['/team/John/' + self.team_name, '/user/Tom/' + self.team_name]:
+            response = self.client.get(page)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['ETag'])
+            self.assertIn('private', response.headers['Cache-Control'])
+            etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+            cached = self.client.get(page, headers={'If-None-Match': etag})
+            self.assertEqual((cached.status_code, cached.data), (304, b''))
+            self.assertEqual(self.client.get(page, headers={'If-Modified-Since': last_modified}).status_code, 304)
+            self._give(u'Changes the page %s' % page)
+            changed = self.client.get(page, headers={'If-None-Match': etag})
+            self.assertEqual(changed.status_code, 200)
+            self.assertIn(b'Changes the page', changed.data)
+            self.assertNotEqual(changed.headers['ETag'], etag)
+
+    #Tests that a second request for an unchanged team page only runs the query for the team.
+    def test_fragments_cached(self):
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        first = self.client.get('/team/John/%s?window=week' % self.team_name)
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            second = self.client.get('/team/John/%s?window=week' % self.team_name)
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(page_cache.cache.stats()['hits'], 2)
+
+    #Tests that the fragments are kept in memcached when it is configured, and that the pages are still served when
+    #the server is gone.
+    def test_memcached(self):
+        standin = MemcachedStandIn().start()
+        try:
+            page_cache.cache = MemcachedCache(standin.server)
+            first = self.client.get('/user/Tom/' + self.team_name)
+            self.assertEqual(len(standin.values), 1)
+            self.assertEqual(self.client.get('/user/Tom/' + self.team_name).data, first.data)
+            self.assertEqual(page_cache.cache.stats(), dict(hits=1, misses=1, errors=0))
+        finally:
+            standin.stop()
+        page_cache.cache = MemcachedCache(standin.server)
+        self.assertEqual(self.client.get('/user/Tom/' + self.team_name).data, first.data)
+        self.assertGreater(page_cache.cache.stats()['errors'], 0)
+
+    #Tests that the in process cache drops the least recently used fragment when full.
+    def test_local_cache_bounded(self):
+        cache = LocalCache(2)
+        cache.set('a', u'1')
+        cache.set('b', u'2')
+        cache.get('a')
+        cache.set('c', u'3')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (u'1', None, u'3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
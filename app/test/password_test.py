@@ -0,0 +1,109 @@
+import unittest
+import sys
+import threading
+sys.path.append('..')
+from app import app, app_db, models
+from backports.pbkdf2 import pbkdf2_hmac as backports_pbkdf2_hmac
+from app.models import User
+from app.passwords import hash_password, check_password, HashPool, ScryptHasher
+
+"""
+Class to test the password hashers: the stored format, verifying and upgrading legacy hashes, and the hashing pool.
+"""
+class PasswordTest(unittest.TestCase):
+    def setUp(self):
+        super(PasswordTest, self).setUp()
+        self.config = dict((key, app.config.get(key)) for key in ['PASSWORD_HASHER', 'PASSWORD_PBKDF2_ITERATIONS',
+                                                                   'WTF_CSRF_ENABLED'])
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = 1000
+        user_exists = User.query.filter(User.user_name == "Hashy").first()
+        if user_exists:
+            app_db.session.delete(user_exists)
+            app_db.session.commit()
+
+    def tearDown(self):
+        app.config.update(self.config)
+        super(PasswordTest, self).tearDown()
+
+    #Tests that new hashes carry their algorithm and cost and only match the right password.
+    def test_hash_format(self):
+        stored = hash_password(u'abc123', b'salt')
+        self.assertTrue(stored.startswith(b'pbkdf2_sha512$1000$'))
+        self.assertEqual(check_password(u'abc123', b'salt', stored), (True, False))
+        self.assertEqual(check_password(u'abc124', b'salt', stored), (False, False))
+        self.assertEqual(check_password(u'abc123', b'pepper', stored)[0], False)
+
+    #Tests that a bare digest from before the prefix still verifies, and that logging in upgrades it.
+    def test_legacy_upgrade(self):
+        user = User(user_name='Hashy', name='Hashy Hash', email='hashy@illinois.edu', password='jjjj')
+        user._password = bytes(backports_pbkdf2_hmac("sha512", b'jjjj', bytes(user._salt), 100000))
+        self.assertEqual(check_password(u'jjjj', bytes(user._salt), user._password), (True, True))
+        self.assertFalse(user.is_valid_password(u'wrong'))
+        self.assertFalse(user._password.startswith(b'pbkdf2_sha512$'))
+        self.assertTrue(user.is_valid_password(u'jjjj'))
+        self.assertTrue(user._password.startswith(b'pbkdf2_sha512$1000$'))
+        self.assertTrue(user.is_valid_password(u'jjjj'))
+
+    #Tests that raising the configured cost makes existing hashes stale, and scrypt where hashlib has it.
+    def test_cost_and_algorithm_change(self):
+        stored = hash_password(u'abc123', b'salt')
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = 2000
+        self.assertEqual(check_password(u'abc123', b'salt', stored), (True, True))
+        if not ScryptHasher.available:
+            return
+        app.config['PASSWORD_HASHER'] = 'scrypt'
+        scrypt_stored = hash_password(u'abc123', b'salt')
+        self.assertTrue(scrypt_stored.startswith(b'scrypt$'))
+        self.assertEqual(check_password(u'abc123', b'salt', scrypt_stored), (True, False))
+        self.assertEqual(check_password(u'abc123', b'salt', stored), (True, True))
+
+    #Tests that logging in, upgrading a stale hash on the way, hashes the password once to check it and once to
+    #upgrade it.
+    def test_login_hashes_once(self):
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = 500
+        app_db.session.add(User(user_name='Hashy', name='Hashy Hash', email='hashy@illinois.edu', password='jjjj'))
+        app_db.session.commit()
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = 1000
+        calls = []
+        check, hash = models.check_password, models.hash_password
+        models.check_password = lambda *args: calls.append('check') or check(*args)
+        models.hash_password = lambda *args: calls.append('hash') or hash(*args)
+        try:
+            response = app.test_client().post('/login', data=dict(user_name='Hashy', password='jjjj'))
+        finally:
+            models.check_password, models.hash_password = check, hash
+        self.assertEqual((response.status_code, calls), (302, ['check', 'hash']))
+        self.assertTrue(User.query.filter(User.user_name == 'Hashy').one()._password.startswith(b'pbkdf2_sha512$1000$'))
+        app_db.session.delete(User.query.filter(User.user_name == 'Hashy').one())
+        app_db.session.commit()
+
+    #Tests that the pool never runs more jobs at once than it has threads and passes errors back to the caller.
+    def test_pool_bounded(self):
+        pool = HashPool(2)
+        lock = threading.Lock()
+        running = [0, 0]
+        def job():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.02)
+            with lock:
+                running[0] -= 1
+            return 'done'
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.run(job))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['done'] * 8)
+        self.assertEqual(running[1], 2)
+        self.assertRaises(ZeroDivisionError, pool.run, lambda: 1 // 0)
+        pool.close()
+        self.assertEqual(pool.run(job), 'done')
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
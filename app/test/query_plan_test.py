@@ -0,0 +1,107 @@
+import unittest
+import re
+import sys
+sys.path.append('..')
+from app import app, app_db
+import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import User, Team, High5
+from app.membership import add_members
+from app.stats import record_high5
+from clients import BufferedClient
+
+#A step of a query plan that reads a whole table or index instead of searching it.
+SCAN = re.compile(r'^SCAN (TABLE )?(?!CONSTANT ROW|SUBQUERY)')
+
+"""
+Class to test that every query the routes run is answered by searching an index. Each route is requested through the
+test client, and every statement it ran is explained with EXPLAIN QUERY PLAN. A plan that scans a table fails the test
+with the statement and its plan.
+"""
+class QueryPlanTest(unittest.TestCase):
+    team_name = "Query Plan Test Team"
+    created_team = "Query Plan Created Team"
+
+    def setUp(self):
+        super(QueryPlanTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        self._cleanup()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane", "Pat"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, [self.ids["John"], self.ids["Tom"], self.ids["Jane"]])
+        now = datetime.datetime.utcnow()
+        for giver, receiver in [("John", "Tom"), ("Tom", "John"), ("Jane", "John")]:
+            app_db.session.add(High5(receiver_id=self.ids[receiver], giver_id=self.ids[giver], message=u'Thanks',
+                                     time_posted=now, level=3, team_id=self.team_id))
+            record_high5(self.team_id, self.ids[giver], self.ids[receiver], 3, now)
+        app_db.session.commit()
+        self.client = BufferedClient(app, app.response_class)
+        with self.client.session_transaction() as client_session:
+            client_session['user_id'] = str(self.ids["John"])
+            client_session['_fresh'] = True
+
+    def tearDown(self):
+        self._cleanup()
+        super(QueryPlanTest, self).tearDown()
+
+    def _cleanup(self):
+        for team in Team.query.filter(Team.name.in_([self.team_name, self.created_team])):
+            app_db.session.delete(team)
+        app_db.session.commit()
+
+    #Request the url and check the plan of every statement the request ran.
+    def assertNoScans(self, url, data=None):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith(('INSERT', 'PRAGMA', 'EXPLAIN')):
+                statements.append((statement, parameters[0] if executemany else parameters))
+        event.listen(Engine, 'before_cursor_execute', record)
+        try:
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, data=data)
+            response.get_data()
+        finally:
+            event.remove(Engine, 'before_cursor_execute', record)
+        self.assertIn(response.status_code, (200, 302), url)
+        self.assertTrue(statements, url)
+        for statement, parameters in statements:
+            plan = [tuple(row)[-1] for row in app_db.engine.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+            scans = [step for step in plan if SCAN.match(step)]
+            self.assertEqual(scans, [], '%s ran\n%s\nwith the plan %s' % (url, statement, plan))
+
+    #Tests the pages and feeds.
+    def test_pages(self):
+        team = self.team_name
+        for url in ['/index/John', '/index/John?q=ja', '/users/search?q=ja&team=' + team, '/team/John/' + team,
+                    '/team/John/' + team + '?window=week', '/user/John/' + team, '/feed/John/' + team + '/team',
+                    '/feed/John/' + team + '/received', '/feed/John/' + team + '/given', '/edit/John/' + team,
+                    '/edit/John/' + team + '?q=pa', '/search/John/' + team + '?q=thanks',
+                    '/search/John/' + team + '?q=thanks&giver=Tom&receiver=John', '/giveHigh5/John/' + team,
+                    '/api/profile', '/export/John/' + team,
+                    '/export/John/' + team + '?format=ndjson&start=2016-01-01&end=2016-12-31']:
+            self.assertNoScans(url)
+
+    #Tests the forms that change High5's, members, teams and settings.
+    def test_writes(self):
+        team = self.team_name
+        self.assertNoScans('/giveHigh5/John/' + team, dict(receiver='Tom', message='Nice work', level=4))
+        high5_id = app_db.session.query(High5.id).filter(High5.team_id == self.team_id). \
+            filter(High5.giver_id == self.ids["John"]).order_by(High5.id.desc()).first()[0]
+        self.assertNoScans('/editHigh5/John/%s/%d' % (team, high5_id), dict(comment_update='Very nice work'))
+        self.assertNoScans('/deleteHigh5/John/%s/%d' % (team, high5_id), {})
+        self.assertNoScans('/edit/John/' + team, dict(users=[str(self.ids["Pat"])]))
+        self.assertNoScans('/edit/John/' + team, dict(team_members=[str(self.ids["Tom"])]))
+        self.assertNoScans('/notifications/John', dict(notify_pref='immediate'))
+        self.assertNoScans('/index/John', dict(team_name=self.created_team, team_members=[str(self.ids["Jane"])]))
+        self.assertNoScans('/delete/John/' + self.created_team, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
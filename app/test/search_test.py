@@ -0,0 +1,115 @@
+import unittest
+import sys
+import shutil
+import tempfile
+sys.path.append('..')
+from app import app, app_db
+import datetime
+from app.models import User, Team, High5
+from app.membership import add_members, remove_members
+from app.search import search_high5s, rebuild_index
+
+"""
+Class to test that the High5 search index follows gives, edits and deletes, and that searches are scoped by team,
+giver, receiver and date.
+"""
+class SearchTest(unittest.TestCase):
+    team_name = "Search Test Team"
+
+    def setUp(self):
+        super(SearchTest, self).setUp()
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.whoosh_base = app.config['WHOOSH_BASE']
+        app.config['WHOOSH_BASE'] = tempfile.mkdtemp()
+        self._delete_team()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        team = Team(name=self.team_name, admin_id=self.ids["John"])
+        app_db.session.add(team)
+        app_db.session.flush()
+        self.team_id = team.id
+        add_members(self.team_id, self.ids.values())
+        app_db.session.commit()
+        self.now = datetime.datetime(2016, 11, 5, 12, 0, 0)
+
+    def tearDown(self):
+        self._delete_team()
+        shutil.rmtree(app.config['WHOOSH_BASE'])
+        app.config['WHOOSH_BASE'] = self.whoosh_base
+        super(SearchTest, self).tearDown()
+
+    def _delete_team(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+            app_db.session.commit()
+
+    def _give(self, giver, receiver, message, days_ago=0):
+        high5 = High5(receiver_id=self.ids[receiver], giver_id=self.ids[giver], message=message, level=3,
+                      team_id=self.team_id, time_posted=self.now - datetime.timedelta(days=days_ago))
+        app_db.session.add(high5)
+        app_db.session.commit()
+        return high5
+
+    def _search(self, text, **scope):
+        return search_high5s(self.team_id, text, **scope)[0]
+
+    #Tests that new High5's are found newest first and that the scope filters apply.
+    def test_give_and_scope(self):
+        old = self._give("John", "Tom", u"Great job on the release notes", days_ago=10)
+        new = self._give("Jane", "Tom", u"Thanks for fixing the release build")
+        other = self._give("Tom", "Jane", u"Lovely cake")
+        self.assertEqual(self._search(u"release"), [new.id, old.id])
+        self.assertEqual(self._search(u"cake"), [other.id])
+        self.assertEqual(self._search(u"release", giver_id=self.ids["John"]), [old.id])
+        self.assertEqual(self._search(u"release", receiver_id=self.ids["Jane"]), [])
+        self.assertEqual(self._search(u"release", start=self.now - datetime.timedelta(days=1)), [new.id])
+        self.assertEqual(search_high5s(self.team_id + 1, u"release"), ([], 0))
+        self.assertEqual(search_high5s(self.team_id, u"release", per_page=1), ([new.id], 2))
+        self.assertEqual(self._search(u"  "), [])
+
+    #Tests that edits, deletes and removed members reach the index and rolled back changes do not.
+    def test_incremental_updates(self):
+        high5 = self._give("John", "Tom", u"Nice demo")
+        high5.message = u"Nice presentation"
+        app_db.session.commit()
+        self.assertEqual(self._search(u"demo"), [])
+        self.assertEqual(self._search(u"presentation"), [high5.id])
+        app_db.session.delete(high5)
+        app_db.session.commit()
+        self.assertEqual(self._search(u"presentation"), [])
+        app_db.session.add(High5(receiver_id=self.ids["Tom"], giver_id=self.ids["John"], message=u"Never saved",
+                                 level=1, team_id=self.team_id, time_posted=self.now))
+        app_db.session.flush()
+        app_db.session.rollback()
+        self.assertEqual(self._search(u"saved"), [])
+        kept = self._give("Tom", "Jane", u"Good review")
+        self._give("John", "Tom", u"Good review")
+        remove_members(self.team_id, [self.ids["Tom"]])
+        app_db.session.commit()
+        self.assertEqual(self._search(u"review"), [kept.id])
+
+    #Tests that a rebuild from the database finds the same High5's and that the search page shows them.
+    def test_rebuild_and_page(self):
+        high5 = self._give("John", "Tom", u"Spotless whiteboard")
+        shutil.rmtree(app.config['WHOOSH_BASE'])
+        app.config['WHOOSH_BASE'] = tempfile.mkdtemp()
+        self.assertEqual(self._search(u"whiteboard"), [])
+        self.assertEqual(rebuild_index(self.team_id), 1)
+        self.assertEqual(self._search(u"whiteboard"), [high5.id])
+        client = app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = str(self.ids["John"])
+            client_session['_fresh'] = True
+        response = client.get('/search/John/' + self.team_name + '?q=whiteboard&start=2016-11-05&end=2016-11-05')
+        self.assertIn(b'Spotless whiteboard', response.data)
+        response = client.get('/search/John/' + self.team_name + '?q=whiteboard&start=2016-11-06')
+        self.assertNotIn(b'Spotless whiteboard', response.data)
+        response = client.get('/search/John/' + self.team_name + '?q=whiteboard&giver=John')
+        self.assertIn(b'Spotless whiteboard', response.data)
+        response = client.get('/search/John/' + self.team_name + '?q=whiteboard&giver=Nobody')
+        self.assertNotIn(b'Spotless whiteboard', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+import sys
+sys.path.append('..')
+from app import app_db
+import datetime
+from app.models import User, Team, High5, MemberStat, DailyStat, calculate_top_scorers, calculate_top_receivers, \
+    calculate_top_givers
+from app.stats import add_member_stats, remove_member_stats, record_high5, unrecord_high5, top_scorers, \
+    top_receivers, top_givers, rebuild_member_stats, verify_member_stats, top_scorers_between, top_givers_between, \
+    score_history, window_bounds, rebuild_daily_stats, verify_daily_stats
+
+"""
+Class to test that the member_stat table stays in step with the High5's and members of a team, and that the
+leaderboards read from it match the full calculations in models.py. Also tests the daily_stat buckets behind the
+windowed leaderboards and score histories.
+"""
+class MemberStatTest(unittest.TestCase):
+    team_name = "Stats Test Team"
+
+    #Function to setup for the rest of the tests. Creates a team of three seeded users.
+    def setUp(self):
+        super(MemberStatTest, self).setUp()
+        app_db.create_all()
+        self._delete_team()
+        self.ids = dict((user.get_user_name(), user.id) for user in
+                        User.query.filter(User.user_name.in_(["John", "Tom", "Jane"])))
+        self.team = Team(name=self.team_name, admin_id=self.ids["John"])
+        for user_name in ["John", "Tom", "Jane"]:
+            self.team.members.append(User.query.get(self.ids[user_name]))
+        app_db.session.add(self.team)
+        app_db.session.flush()
+        self.team_id = self.team.id
+        add_member_stats(self.team_id, [self.ids["John"], self.ids["Tom"], self.ids["Jane"]])
+        app_db.session.commit()
+
+    def tearDown(self):
+        self._delete_team()
+        super(MemberStatTest, self).tearDown()
+
+    def _delete_team(self):
+        exists = Team.query.filter(Team.name == self.team_name).first()
+        if exists:
+            app_db.session.delete(exists)
+            app_db.session.commit()
+
+    def _give(self, giver, receiver, level, days_ago=0):
+        time_posted = datetime.datetime.utcnow() - datetime.timedelta(days=days_ago)
+        high5 = High5(receiver_id=self.ids[receiver], giver_id=self.ids[giver], message='Thanks %s' % receiver,
+                      time_posted=time_posted, level=level, team=self.team)
+        app_db.session.add(high5)
+        record_high5(self.team_id, self.ids[giver], self.ids[receiver], level, time_posted)
+        app_db.session.commit()
+        return high5
+
+    def _assert_matches_full_calculation(self):
+        high5s = High5.query.filter(High5.team_id == self.team_id).all()
+        team_members = self.team.members.all()
+        self.assertEqual([value for _, value in top_scorers(self.team_id)],
+                         [value for _, value in calculate_top_scorers(high5s, team_members)])
+        self.assertEqual([value for _, value in top_receivers(self.team_id)],
+                         [value for _, value in calculate_top_receivers(high5s, team_members)])
+        self.assertEqual([value for _, value in top_givers(self.team_id)],
+                         [value for _, value in calculate_top_givers(high5s, team_members)])
+        self.assertEqual(verify_member_stats(self.team_id), [])
+        self.assertEqual(verify_daily_stats(self.team_id), [])
+
+    #Tests that new members start with zero totals and show up on the leaderboards.
+    def test_new_members(self):
+        self.assertEqual(len(top_scorers(self.team_id)), 3)
+        self.assertEqual(top_scorers(self.team_id)[0][1], 0)
+        self.assertEqual(verify_member_stats(self.team_id), [])
+
+    #Tests that giving and deleting High5's keeps the totals and the top lists correct.
+    def test_give_and_delete(self):
+        self._give("John", "Tom", 5)
+        self._give("Jane", "Tom", 1)
+        self._give("Tom", "Jane", 4)
+        self._assert_matches_full_calculation()
+        self.assertEqual(top_scorers(self.team_id)[0], ("Tom", 6))
+        self.assertEqual(top_receivers(self.team_id)[0], ("Tom", 2))
+        high5 = High5.query.filter(High5.team_id == self.team_id).filter(High5.giver_id == self.ids["John"]).one()
+        unrecord_high5(self.team_id, self.ids["John"], self.ids["Tom"], 5, high5.time_posted)
+        app_db.session.delete(high5)
+        app_db.session.commit()
+        self._assert_matches_full_calculation()
+        self.assertEqual(top_scorers(self.team_id)[0], ("Jane", 4))
+
+    #Tests that removing a member drops their row and lowers the given count of members who gave them High5's.
+    def test_remove_member(self):
+        self._give("John", "Tom", 5)
+        self._give("John", "Jane", 2)
+        tom = User.query.filter(User.user_name == "Tom").one()
+        self.team.members.remove(tom)
+        remove_member_stats(self.team_id, [self.ids["Tom"]])
+        High5.query.filter(High5.team_id == self.team_id).filter(High5.receiver_id == self.ids["Tom"]).delete()
+        app_db.session.commit()
+        self._assert_matches_full_calculation()
+        self.assertEqual(top_givers(self.team_id)[0], ("John", 1))
+        self.assertEqual(MemberStat.query.filter(MemberStat.team_id == self.team_id).count(), 2)
+
+    #Tests that rebuilding repairs a stat table that drifted from the High5 table.
+    def test_rebuild(self):
+        self._give("John", "Tom", 3)
+        High5.query.filter(High5.team_id == self.team_id).delete()
+        app_db.session.commit()
+        self.assertEqual(len(verify_member_stats(self.team_id)), 2)
+        rebuild_member_stats(self.team_id)
+        app_db.session.commit()
+        self.assertEqual(verify_member_stats(self.team_id), [])
+        self.assertEqual(top_scorers(self.team_id)[0][1], 0)
+
+    #Tests that the windowed leaderboards only count the High5's inside the range and still rank every member.
+    def test_windowed_leaderboards(self):
+        self._give("John", "Tom", 5, days_ago=40)
+        self._give("John", "Tom", 5, days_ago=40)
+        self._give("Tom", "Jane", 2, days_ago=1)
+        self._give("John", "Jane", 1)
+        self._assert_matches_full_calculation()
+        today = datetime.datetime.utcnow().date()
+        start, end = today - datetime.timedelta(days=6), today
+        self.assertEqual(top_scorers(self.team_id)[0], ("Tom", 10))
+        self.assertEqual(top_scorers_between(self.team_id, start, end), [("Jane", 3), ("John", 0), ("Tom", 0)])
+        self.assertEqual(top_givers_between(self.team_id, start, end)[0][1], 1)
+        start, end = window_bounds('90d')
+        self.assertEqual(top_scorers_between(self.team_id, start, end)[0], ("Tom", 10))
+        self.assertEqual([row[1:] for row in score_history(self.team_id, self.ids["Jane"])], [(2, 1, 0), (1, 1, 0)])
+
+    #Tests turning window names and custom ranges into days.
+    def test_window_bounds(self):
+        today = datetime.date(2016, 11, 17)
+        self.assertEqual(window_bounds('week', today=today), (datetime.date(2016, 11, 14), today))
+        self.assertEqual(window_bounds('month', today=today), (datetime.date(2016, 11, 1), today))
+        self.assertEqual(window_bounds('90d', today=today), (datetime.date(2016, 8, 20), today))
+        self.assertEqual(window_bounds(None, '2016-01-01', '2016-01-31'),
+                         (datetime.date(2016, 1, 1), datetime.date(2016, 1, 31)))
+        self.assertEqual(window_bounds(None, '2016-02-01', '2016-01-31'), None)
+        self.assertEqual(window_bounds(None, 'yesterday', '2016-01-31'), None)
+        self.assertEqual(window_bounds(), None)
+
+    #Tests that removing a member takes their received High5's out of the daily buckets and that backfilling
+    #recreates the buckets from the High5 table.
+    def test_daily_remove_and_backfill(self):
+        self._give("John", "Tom", 5, days_ago=3)
+        self._give("Jane", "John", 2, days_ago=3)
+        tom = User.query.filter(User.user_name == "Tom").one()
+        self.team.members.remove(tom)
+        remove_member_stats(self.team_id, [self.ids["Tom"]])
+        High5.query.filter(High5.team_id == self.team_id).filter(High5.receiver_id == self.ids["Tom"]).delete()
+        app_db.session.commit()
+        self.assertEqual(verify_daily_stats(self.team_id), [])
+        DailyStat.query.filter(DailyStat.team_id == self.team_id).delete()
+        app_db.session.commit()
+        self.assertEqual(len(verify_daily_stats(self.team_id)), 2)
+        rebuild_daily_stats(self.team_id)
+        app_db.session.commit()
+        self.assertEqual(verify_daily_stats(self.team_id), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
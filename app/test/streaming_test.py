@@ -0,0 +1,69 @@
+import unittest
+import sys
+import gzip
+import io
+sys.path.append('..')
+from app import app_db, create_app
+from app.models import User
+from clients import BufferedClient
+
+"""
+Class to test the streamed team and user pages and the compression of responses: the header sent before the fragments,
+the compressed stream giving the same page, the weak ETags and the settings that turn each off.
+"""
+class StreamingTest(unittest.TestCase):
+    team_page = '/team/John/CS465 Group 17'
+
+    def setUp(self):
+        super(StreamingTest, self).setUp()
+        self.user_id = User.query.filter(User.user_name == "John").one().id
+        app_db.session.remove()
+
+    def tearDown(self):
+        app_db.session.remove()
+        super(StreamingTest, self).tearDown()
+
+    def _client(self, **settings):
+        app = create_app(**settings)
+        client = BufferedClient(app, app.response_class)
+        with client.session_transaction() as session:
+            session['user_id'] = str(self.user_id)
+            session['_fresh'] = True
+        return client
+
+    #Tests that the team page is sent as it renders, its header before the leaderboards and the feed, and that the
+    #compressed stream and the page rendered in one piece are the same page.
+    def test_streamed_page(self):
+        response = self._client().get(self.team_page, headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.assertEqual((response.headers['Content-Encoding'], response.headers.get('Content-Length')), ('gzip', None))
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        decompressor = gzip.zlib.decompressobj(16 + gzip.zlib.MAX_WBITS)
+        parts = [decompressor.decompress(chunk) for chunk in response.response]
+        response.close()
+        self.assertIn(b'<div id="header"', parts[0])
+        self.assertNotIn(b'high5_score', parts[0])
+        whole = self._client(STREAM_PAGES=False, COMPRESS_ENABLED=False).get(self.team_page)
+        self.assertEqual((whole.headers.get('Content-Encoding'), b''.join(parts)), (None, whole.data))
+        cached = self._client().get(self.team_page, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    #Tests that a user page is looked up before it starts, so a user who does not exist still gets 404.
+    def test_missing_user(self):
+        self.assertEqual(self._client().get('/user/Nobody/CS465 Group 17').status_code, 404)
+        response = self._client().get('/user/Tom/CS465 Group 17', headers={'Accept-Encoding': 'gzip'})
+        self.assertIn(b'Tom', gzip.GzipFile(fileobj=io.BytesIO(response.data)).read())
+
+    #Tests that a response given in one piece is compressed from COMPRESS_MIN_SIZE bytes, and only for the browsers
+    #that accept gzip.
+    def test_min_size(self):
+        client = self._client(COMPRESS_MIN_SIZE=100000)
+        self.assertIsNone(client.get('/login', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding'))
+        client = self._client(COMPRESS_MIN_SIZE=100)
+        response = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual((response.headers['Content-Encoding'], response.headers['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertIn(b'<html', gzip.GzipFile(fileobj=io.BytesIO(response.data)).read())
+        self.assertIsNone(client.get('/login').headers.get('Content-Encoding'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+sys.path.append('..')
+from app import app_db
+from sqlalchemy import func
+from app.models import User, Team, High5, MemberStat, DailyStat, members
+from app.stats import verify_member_stats, verify_daily_stats
+from app.synthetic import generate, SEED_PASSWORD, WeightedChoice
+import random
+
+"""
+Class to test that the made up data generator adds consistent users, teams, members and High5's with their stat rows,
+and that the made up users can log in.
+"""
+class SyntheticTest(unittest.TestCase):
+    prefix = u'synthtest'
+
+    def setUp(self):
+        super(SyntheticTest, self).setUp()
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+        super(SyntheticTest, self).tearDown()
+
+    #Delete the made up rows with bulk deletes, since the rows never went through the ORM.
+    def _cleanup(self):
+        team_ids = [team_id for (team_id,) in app_db.session.query(Team.id).filter(Team.name.like(u'Synthtest %'))]
+        if team_ids:
+            for model in [High5, MemberStat, DailyStat]:
+                model.query.filter(model.team_id.in_(team_ids)).delete(synchronize_session=False)
+            app_db.session.execute(members.delete().where(members.c.team_id.in_(team_ids)))
+            Team.query.filter(Team.id.in_(team_ids)).delete(synchronize_session=False)
+        User.query.filter(User.user_name.like(self.prefix + u'%')).delete(synchronize_session=False)
+        app_db.session.commit()
+
+    #Tests the counts, that every High5 is between two different members of its team and that the stats match.
+    def test_generate(self):
+        made = generate(40, 5, 300, prefix=self.prefix)
+        self.assertEqual((made['users'], made['teams'], made['high5s']), (40, 5, 300))
+        team_ids = [team_id for (team_id,) in app_db.session.query(Team.id).filter(Team.name.like(u'Synthtest %'))]
+        self.assertEqual(len(team_ids), 5)
+        self.assertEqual(app_db.session.query(func.count()).select_from(members).
+                         filter(members.c.team_id.in_(team_ids)).scalar(), made['members'])
+        roster = set(tuple(row) for row in app_db.session.query(members.c.team_id, members.c.user_id))
+        for high5 in High5.query.filter(High5.team_id.in_(team_ids)):
+            self.assertNotEqual(high5.giver_id, high5.receiver_id)
+            self.assertIn((high5.team_id, high5.giver_id), roster)
+            self.assertIn((high5.team_id, high5.receiver_id), roster)
+        for team in Team.query.filter(Team.id.in_(team_ids)):
+            self.assertIn((team.id, team.admin_id), roster)
+            self.assertEqual(verify_member_stats(team.id), [])
+            self.assertEqual(verify_daily_stats(team.id), [])
+        users = User.query.filter(User.user_name.like(self.prefix + u'%')).limit(2).all()
+        self.assertTrue(users[0].is_valid_password(SEED_PASSWORD))
+        self.assertFalse(users[1].is_valid_password('wrong'))
+
+    #Tests that weighted picks follow the weights and that a sample has no repeats.
+    def test_weighted_choice(self):
+        choice = WeightedChoice(['a', 'b'], [9, 1], random.Random(1))
+        picks = [choice.pick() for _ in range(1000)]
+        self.assertTrue(850 < picks.count('a') < 950)
+        self.assertEqual(sorted(choice.sample(2)), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
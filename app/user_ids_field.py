@@ -0,0 +1,15 @@
+from wtforms import SelectMultipleField
+
+'''
+Multiple selection of users by id for forms that must not list every user on the site. The choices are only the users
+to show right now, the results of a search or none at all, so any id is accepted and the code using the ids skips the
+ones that are not users. The type-ahead in static/user_search.js fills the choices from the /users/search route.'''
+class UserIdsField(SelectMultipleField):
+    def __init__(self, label=None, validators=None, **kwargs):
+        kwargs.setdefault('coerce', int)
+        kwargs.setdefault('choices', [])
+        super(UserIdsField, self).__init__(label, validators, **kwargs)
+
+    #Any id is a valid choice, see the class docstring.
+    def pre_validate(self, form):
+        pass
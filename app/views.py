@@ -1,46 +1,82 @@
-from flask import render_template, redirect, url_for, g, flash
-from sqlalchemy import desc
+from flask import Blueprint, render_template, redirect, url_for, g, flash, request, jsonify, abort, Response, \
+    stream_with_context, current_app
+from werkzeug.urls import url_encode
 import datetime
-from app import app, app_db, login_manager
+from app import app_db, login_manager
 from flask_login import login_required, login_user, logout_user, current_user
-from models import User, Team, High5, calculate_score, calculate_top_scorers, \
-    calculate_top_givers, calculate_top_receivers
+from models import User, Team, High5
+from stats import record_high5, unrecord_high5, top_scorers, top_receivers, \
+    top_givers, top_scorers_between, top_receivers_between, top_givers_between, window_bounds, \
+    score_history, member_score, user_team_totals
+from pagination import PER_PAGE, keyset_page, high5_to_dict
 from login_form import LoginForm, RegistrationForm
 from create_team_form import TeamForm
 from edit_team_form import EditTeamForm, RemoveMemberForm
 from high5_form import High5Form
 from edit_comment_form import EditCommentForm
-from emails import high5_notif
+from notification_form import NotificationForm
+from outbox import enqueue_high5
+from identity_cache import load_cached_user, remember_user_version
+from membership import member_candidates, search_users, add_members, remove_members
+from search import search_high5s, load_high5s, parse_day
+from metrics import render_metrics, may_scrape
+from page_cache import bump_team_version, cached_fragment, conditional_page
+from export import FORMATS, export_chunks, export_filename
+from streaming import stream_page
 
-"""Create the app routes used in the app URL. Login is the main team page. Any page which cannot be visited until a
-user is logged in has the @login_required property."""
+"""Create the app routes used in the app URL, as the pages blueprint that create_app registers. Login is the main team
+page. Any page which cannot be visited until a user is logged in has the @login_required property. URLs name teams and
+users, which the routes turn into ids before using them."""
 
-@app.before_request
+pages = Blueprint('pages', __name__)
+
+@pages.before_app_request
 def before_request():
     g.user = current_user
 
 @login_manager.user_loader
 def load_user(id):
-    return User.query.get(id)
+    return load_cached_user(id)
+
+#Get the team with the name from a URL, or respond with 404 if there is none.
+def _team(team_name):
+    return Team.query.filter(Team.name == team_name).first_or_404()
+
+#Get the id of the user with the name from a URL, or respond with 404 if there is none.
+def _user_id(user_name):
+    user_id = _user_ids([user_name]).get(user_name)
+    if user_id is None:
+        abort(404)
+    return user_id
+
+#Map user names to user ids with one query. Names of users that do not exist are left out.
+def _user_ids(user_names):
+    user_names = [user_name for user_name in user_names if user_name]
+    if not user_names:
+        return {}
+    return dict(app_db.session.query(User.user_name, User.id).filter(User.user_name.in_(user_names)))
 
 """Create the login page for the app, which is the first page the user is brought to.
-The login page has the login form and a button for the user to go to the registration page."""
+The login page has the login form and a button for the user to go to the registration page. Logging in saves the
+user's password hash if it was upgraded to the current algorithm while checking it."""
 
-@app.route('/', methods=['GET', 'POST'])
-@app.route('/login', methods=['GET', 'POST'])
+@pages.route('/', methods=['GET', 'POST'])
+@pages.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user_name = form.user_name.data
-        user = LoginForm.validate_password(form, None)
+        user = form.user
         login_user(user)
+        app_db.session.commit()
+        remember_user_version(user)
         return redirect('/index/' + user_name)
     return render_template('login.html', form=form)
 
 """
 Create the registration page for a new user. A user must fill in the registration form before they can be logged in.
 If a user tries to register with an existing user name, they will be unable to register until they change the name."""
-@app.route('/register', methods=('GET', 'POST'))
+@pages.route('/register', methods=('GET', 'POST'))
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -55,6 +91,7 @@ def register():
             app_db.session.add(new_user)
             app_db.session.commit()
             login_user(new_user)
+            remember_user_version(new_user)
             return redirect('/index/' + user_name)
         else:
             flash("User already exists with that user name or email.")
@@ -62,67 +99,150 @@ def register():
 
 """
 Logout the currently logged in user and bring the user to the login page."""
-@app.route('/logout')
+@pages.route('/logout')
 @login_required
 def logout():
     logout_user()
     return redirect('/login')
 
 """Create the index page, which is the first page the user sees after login. This page has a list
-of all the user's teams in alphabetical order so a user can select which team to view.
-Also has a form for a user to create a new team with a team name and starting members."""
+of all the user's teams in alphabetical order so a user can select which team to view, with the score and the
+High5's received and given on each team and in total.
+Also has a form for a user to create a new team with a team name and starting members, and a form to choose how
+High5 emails are sent to them. Starting members are found with the type-ahead search, or without javascript by the
+search text in the q query argument."""
 
-@app.route('/index/<user_name>', methods=['GET', 'POST'])
+@pages.route('/index/<user_name>', methods=['GET', 'POST'])
 @login_required
 def index(user_name):
-    teams = Team.query.filter(Team.members.any(User.user_name == user_name)).order_by(Team.name).all()
+    user_id = _user_ids([user_name]).get(user_name)
+    teams = user_team_totals(user_id) if user_id is not None else []
+    totals = [sum(team[column] for team in teams) for column in (1, 2, 3)]
     form = TeamForm()
-    form.team_members.choices = [(u.id, u.user_name) for u in User.query.filter(User.user_name != user_name).order_by('name')]
+    form.team_members.choices = [(user_id, member_name) for user_id, member_name, _ in
+                                 search_users(request.args.get('q'), exclude=[user_name])]
     if form.validate_on_submit():
         team_name = form.team_name.data
         team_members = form.team_members.data
-        list(set(team_members))
-        new_team = Team(name=team_name, admin=user_name)
-        new_team.members.append(User.query.filter(User.user_name == user_name).first())
-        for team_member in team_members:
-            user1 = User.query.get(team_member)
-            if user1:
-                new_team.members.append(user1)
+        new_team = Team(name=team_name, admin_id=current_user.id)
         app_db.session.add(new_team)
+        app_db.session.flush()
+        add_members(new_team.id, [current_user.id] + team_members)
         app_db.session.commit()
         return redirect('/index/' + user_name)
-    return render_template('index.html', teams=teams, user=user_name, form=form)
+    notification_form = NotificationForm(formdata=None, notify_pref=current_user.get_notify_pref())
+    return render_template('index.html', teams=teams, totals=totals, user=user_name, form=form,
+                           notification_form=notification_form)
+
+"""Search users by the start of their user name or name, for the type-ahead that picks members on the create team and
+edit team pages. Takes the typed text (q), optionally the name of a team whose members are left out (team) and a
+limit. The logged in user is never included. Returns the matching users as json."""
+
+@pages.route('/users/search')
+@login_required
+def searchUsers():
+    team_id = None
+    if request.args.get('team'):
+        team_id = _team(request.args.get('team')).id
+    users = search_users(request.args.get('q'), request.args.get('limit', type=int), not_on_team=team_id,
+                         exclude=[current_user.get_user_name()])
+    return jsonify(users=[dict(id=user_id, user_name=user_name, name=name) for user_id, user_name, name in users])
+
+"""Save the choice of how High5 emails are sent to the user from the form on the index page: right away, or in an
+hourly or daily digest. A user can only change their own setting. Returns the user to the index page."""
+
+@pages.route('/notifications/<user_name>', methods=['POST'])
+@login_required
+def notifications(user_name):
+    form = NotificationForm()
+    if form.validate_on_submit() and current_user.get_user_name() == user_name:
+        user = User.query.get(current_user.id)
+        user.notify_pref = form.notify_pref.data
+        app_db.session.commit()
+        remember_user_version(user)
+    return redirect('/index/' + user_name)
 
 
 """Create the team page, which is specific for the user and selected team from index page.
-The team page shows the top high5 scorers and givers, as well as a list of all high5's given for the team starting with
-the most recent. If the current user is the admin of the team, then they will be able to
-select "Edit Team" to go to the edit team page."""
+The team page shows the top high5 scorers and givers, as well as the first page of high5's given for the team starting
+with the most recent. Later pages come from the feed route below, or from the cursor query argument without javascript. The leaderboards are all time unless a window (week, month, 90d) or a start and end day is given in
+the query string. If the current user is the admin of the team, then they will be able to
+select "Edit Team" to go to the edit team page. The leaderboards and the feed are cached per team version and the page
+is answered with 304 when the browser's copy is current, see page_cache.py. The page is sent as it renders, the header
+before the leaderboards and the leaderboards before the feed, see streaming.py."""
 
-@app.route('/team/<user_name>/<team_name>', methods=['GET', 'POST'])
+@pages.route('/team/<user_name>/<team_name>', methods=['GET', 'POST'])
 @login_required
 def team(team_name, user_name):
-    team = Team.query.get(team_name)
-    high5s = High5.query.filter(High5.team_name == team_name).order_by(desc(High5.time_posted)).all()
-    team_members = team.members.all()
-    top_scorers = calculate_top_scorers(high5s, team_members)
-    top_receivers = calculate_top_receivers(high5s, team_members)
-    top_givers = calculate_top_givers(high5s, team_members)
-    return render_template('team.html', team=team, user=user_name, high5s=high5s,
-                           top_receivers=top_receivers, top_scorers=top_scorers, top_givers=top_givers)
+    team = _team(team_name)
+    bounds = window_bounds(request.args.get('window'), request.args.get('start'), request.args.get('end'))
+    cursor = request.args.get('cursor')
+    def render():
+        leaders = lambda: cached_fragment(team, 'team_leaders', [bounds], lambda: _render_leaders(team, bounds))
+        feed = lambda: cached_fragment(team, 'team_feed', [user_name, cursor],
+                                       lambda: _render_team_feed(team, user_name, cursor))
+        return stream_page('team.html', team=team, user=user_name, bounds=bounds, leaders=leaders, feed=feed)
+    return conditional_page(team, [user_name], render, changes_daily=bounds and bounds[1])
+
+#Render the leaderboards of the team page, all time or for the date range in bounds.
+def _render_leaders(team, bounds):
+    if bounds:
+        start, end = bounds
+        leaders = dict(top_receivers=top_receivers_between(team.id, start, end),
+                       top_scorers=top_scorers_between(team.id, start, end),
+                       top_givers=top_givers_between(team.id, start, end))
+    else:
+        leaders = dict(top_receivers=top_receivers(team.id), top_scorers=top_scorers(team.id),
+                       top_givers=top_givers(team.id))
+    return render_template('team_leaders.html', **leaders)
 
+#Render a page of the team feed with its "Load more" link.
+def _render_team_feed(team, user_name, cursor):
+    high5s, next_cursor = keyset_page(_feed_query(team.id, None, 'team'), cursor)
+    return render_template('team_feed.html', team=team, user=user_name, high5s=high5s, next_cursor=next_cursor)
 
-"""Create the page for a user to give high5's to other teammates on the selected team. Add the new High5 to the db.
-Make sure a user does not try to give themself a high5"""
 
-@app.route('/giveHigh5/<user_name>/<team_name>', methods=['GET', 'POST'])
+"""Create the search page for a team. Searches the messages of the team's High5's for the words in q, optionally only
+High5's from a giver, to a receiver (user names), or posted between the start and end days. Shows a page of matches
+newest first with a link to the next page."""
+
+@pages.route('/search/<user_name>/<team_name>')
+@login_required
+def search(team_name, user_name):
+    team = _team(team_name)
+    page = max(request.args.get('page', 1, type=int), 1)
+    giver, receiver = request.args.get('giver'), request.args.get('receiver')
+    user_ids = _user_ids([giver, receiver])
+    if (giver and giver not in user_ids) or (receiver and receiver not in user_ids):
+        ids, total = [], 0
+    else:
+        ids, total = search_high5s(team.id, request.args.get('q'), giver_id=user_ids.get(giver),
+                                   receiver_id=user_ids.get(receiver), start=parse_day(request.args.get('start')),
+                                   end=parse_day(request.args.get('end'), end=True), page=page, per_page=PER_PAGE)
+    next_page = None
+    if page * PER_PAGE < total:
+        args = request.args.to_dict()
+        args['page'] = page + 1
+        next_page = request.path + '?' + url_encode(args)
+    return render_template('search.html', team=team, user=user_name, high5s=load_high5s(ids), total=total,
+                           next_page=next_page)
+
+
+"""Create the page for a user to give high5's to other teammates on the selected team. Add the new High5 to the db,
+together with an email notification for the receiver that the outbox worker sends later.
+Make sure a user does not try to give themself a high5 or give one to a user who does not exist."""
+
+@pages.route('/giveHigh5/<user_name>/<team_name>', methods=['GET', 'POST'])
 @login_required
 def giveHigh5(team_name, user_name):
-    team = Team.query.get(team_name)
+    team = _team(team_name)
     form = High5Form()
     if form.validate_on_submit():
         receiver = form.receiver.data
-        if not (receiver == user_name):
+        user_ids = _user_ids([user_name, receiver])
+        if receiver not in user_ids:
+            flash("No user named %s." % receiver)
+        elif not (receiver == user_name):
             message = form.message.data
             level = form.level.data
             if level < 1:
@@ -131,38 +251,69 @@ def giveHigh5(team_name, user_name):
                 level = 5
             else:
                 level = level
-            new_high5 = High5(receiver=receiver, giver=user_name, message=message, time_posted=datetime.datetime.utcnow(),
-                              level=level, team=team)
+            new_high5 = High5(receiver_id=user_ids[receiver], giver_id=user_ids[user_name], message=message,
+                              time_posted=datetime.datetime.utcnow(), level=level, team=team)
             app_db.session.add(new_high5)
+            record_high5(team.id, user_ids[user_name], user_ids[receiver], level, new_high5.time_posted)
+            bump_team_version(team.id)
+            enqueue_high5(team_name, user_name, user_ids[receiver], message, new_high5.time_posted)
             app_db.session.commit()
-            return redirect('/notify/' + user_name + '/' + team_name + '/' + receiver + '/' + message)
+            return redirect('/team/' + user_name + '/' + team_name)
     return render_template('giveHigh5.html', team=team, user=user_name, form=form)
 
-"""Send an email notification to the receiver of a new High5. Gets called from the GiveHigh5 page and sends an email from
- the admin account to the receiver with the giver's name and contents of the message. Returns the user who gave the
- high5 to the team page."""
+"""Create the user page, specific to the user and the selected team. Show the user's total
+high5 score, their day by day score history for the last 90 days and the first page of received high5's starting with
+the most recent. Also list the first page of high5's that a user has given and allow the user to edit any of those
+high5's. Later pages of either list come from the feed route. Cached per team version and sent as it renders like the
+team page, with the user looked up first so a missing one gets 404 before the page starts."""
 
-@app.route('/notify/<user_name>/<team_name>/<receiver_name>/<message>', methods=['GET', 'POST'])
+@pages.route('/user/<user_name>/<team_name>', methods=['GET', 'POST'])
 @login_required
-def notify(user_name, team_name, receiver_name, message):
-    receiver = User.query.filter(User.user_name == receiver_name).first()
-    high5_notif(receiver, user_name, message)
-    return redirect('/team/' + user_name + '/' + team_name)
+def user(team_name, user_name):
+    team = _team(team_name)
+    start, end = window_bounds('90d')
+    received, given = request.args.get('received'), request.args.get('given')
+    user_id = current_user.id if current_user.user_name == user_name else _user_id(user_name)
+    def render():
+        high5s = lambda: cached_fragment(team, 'user_high5s', [user_name, received, given, end],
+                                         lambda: _render_user_high5s(team, user_name, user_id, received, given, start,
+                                                                     end))
+        return stream_page('user.html', team=team, user=user_name, high5s=high5s)
+    return conditional_page(team, [user_name], render, changes_daily=end)
 
-"""Create the user page, specific to the user and the selected team. Show the user's total
-high5 score and all received high5's starting with the most recent. Also list the high5's that a user has given and
-allow the user to edit any of those high5's."""
+#Render the body of the user page: score, score history and a page each of received and given High5's.
+def _render_user_high5s(team, user_name, user_id, received, given, start, end):
+    high5s, next_received = keyset_page(_feed_query(team.id, user_id, 'received'), received)
+    score = member_score(team.id, user_id)
+    myhigh5s, next_given = keyset_page(_feed_query(team.id, user_id, 'given'), given)
+    history = score_history(team.id, user_id, start, end)
+    return render_template('user_high5s.html', team=team, user=user_name, high5s=high5s, score=score,
+                           myhigh5s=myhigh5s, history=history, next_received=next_received, next_given=next_given)
 
-@app.route('/user/<user_name>/<team_name>', methods=['GET', 'POST'])
+"""Serve later pages of the High5 feeds as JSON for the "Load more" links on the team and user pages. The feed is the
+whole team for 'team', or the high5's the user received or gave on the team for 'received' and 'given'. The cursor
+query argument continues after the last high5 already shown and the response carries the cursor for the next page,
+which is null on the last page."""
+
+@pages.route('/feed/<user_name>/<team_name>/<kind>')
 @login_required
-def user(team_name, user_name):
-    team = Team.query.get(team_name)
-    high5s = High5.query.filter(High5.team_name == team_name).filter(High5.receiver == user_name). \
-        order_by(desc(High5.time_posted)).all()
-    score = calculate_score(high5s)
-    myhigh5s = High5.query.filter(High5.team_name == team_name).filter(High5.giver == user_name). \
-        order_by(desc(High5.time_posted)).all()
-    return render_template('user.html', team=team, user=user_name, high5s=high5s, score=score, myhigh5s=myhigh5s)
+def feed(team_name, user_name, kind):
+    query = _feed_query(_team(team_name).id, _user_id(user_name), kind)
+    if query is None:
+        abort(404)
+    high5s, next_cursor = keyset_page(query, request.args.get('cursor'))
+    return jsonify(high5s=[high5_to_dict(high5) for high5 in high5s], next=next_cursor)
+
+#Build the unordered High5 query behind one of the feeds, or None for an unknown kind.
+def _feed_query(team_id, user_id, kind):
+    query = High5.query.filter(High5.team_id == team_id)
+    if kind == 'team':
+        return query
+    if kind == 'received':
+        return query.filter(High5.receiver_id == user_id)
+    if kind == 'given':
+        return query.filter(High5.giver_id == user_id)
+    return None
 
 
 """Create the page for a team admin to edit a team by by adding/removing team members.
@@ -170,54 +321,64 @@ This page can only be reached by the admin of the team. Any added users must exi
 already exist in the team. Two forms exist for adding or removing members multiple at a time. If a user is removed from
 a team, the team page no longer includes any High5's that member received. This page also
 has the button for a user to delete a team. Uses multiple selection fields to allow addition and removal of multiple
-users at a time."""
+users at a time. Users to add are found with the type-ahead search, or without javascript by the search text in the q
+query argument."""
 
-@app.route('/edit/<user_name>/<team_name>', methods=['GET', 'POST'])
+@pages.route('/edit/<user_name>/<team_name>', methods=['GET', 'POST'])
 @login_required
 def editTeam(team_name, user_name):
-    team = Team.query.get(team_name)
-    if not team.get_admin() == user_name:
+    team = _team(team_name)
+    if not team.get_admin_id() == _user_id(user_name):
         flash("Cannot edit a team you are not admin for.")
         return redirect('/team/' + user_name + '/' + team_name)
-    members = team.members.all()
+    members = team.members.order_by(User.name).all()
     edit_form = EditTeamForm()
-    possible_to_add = [(u.id, u.user_name) for u in User.query.filter(User.user_name != user_name).order_by('name')]
-    definite_to_add = []
-    for uid,uname in possible_to_add:
-        if User.query.get(uid) not in members:
-            definite_to_add.append((uid,uname))
-    edit_form.users.choices = definite_to_add
+    edit_form.users.choices = member_candidates(team.id, request.args.get('q', u''))
     remove_member_form = RemoveMemberForm()
-    possible_to_remove = [(u.id, u.user_name) for u in User.query.filter(User.user_name != user_name).order_by('name')]
-    definite_to_remove = []
-    for uid,uname in possible_to_remove:
-        if User.query.get(uid) in members:
-            definite_to_remove.append((uid,uname))
-    remove_member_form.team_members.choices = definite_to_remove
+    remove_member_form.team_members.choices = [(member.id, member.user_name) for member in members
+                                               if member.id != team.get_admin_id()]
     if edit_form.validate_on_submit():
-        team_members = edit_form.users.data
-        for team_member in team_members:
-            team.members.append(User.query.get(team_member))
+        add_members(team.id, edit_form.users.data)
         app_db.session.commit()
         return redirect('/edit/' + user_name + '/' + team_name)
     if remove_member_form.validate_on_submit():
-        team_members = remove_member_form.team_members.data
-        for team_member in team_members:
-            team.members.remove(User.query.get(team_member))
-            High5.query.filter(High5.team_name==team_name).filter(High5.receiver==team_member).delete()
+        remove_members(team.id, remove_member_form.team_members.data)
         app_db.session.commit()
         return redirect('/edit/' + user_name + '/' + team_name)
     return render_template('editTeam.html', team=team, user=user_name, members=members,
                            edit_form=edit_form, remove_member_form=remove_member_form)
 
+"""Download the High5 history of a team as CSV or newline delimited JSON (format=csv or ndjson), optionally only
+from the start to the end day (YYYY-MM-DD) and gzipped (gzip=1). Only the team admin can export a team. The export is
+streamed as it is read, see export.py."""
+
+@pages.route('/export/<user_name>/<team_name>')
+@login_required
+def exportHigh5s(team_name, user_name):
+    team = _team(team_name)
+    if not team.get_admin_id() == current_user.id:
+        flash("Cannot export a team you are not admin for.")
+        return redirect('/team/' + user_name + '/' + team_name)
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        abort(400)
+    start = parse_day(request.args.get('start'))
+    end = parse_day(request.args.get('end'), end=True)
+    compress = bool(request.args.get('gzip'))
+    chunks = export_chunks(format, team.id, start, end, compress)
+    response = Response(stream_with_context(chunks), mimetype='application/gzip' if compress else FORMATS[format])
+    response.headers['Content-Disposition'] = 'attachment; filename=%s' % export_filename(team.name, format, start,
+                                                                                          end, compress)
+    return response
+
 """Create the page for a team admin to delete a team which they are the admin for. Only allow an admin to delete a team.
 Bring the user back to the Teams page after deleting."""
 
-@app.route('/delete/<user_name>/<team_name>', methods=['GET', 'POST'])
+@pages.route('/delete/<user_name>/<team_name>', methods=['GET', 'POST'])
 @login_required
 def deleteTeam(team_name, user_name):
-    team = Team.query.get(team_name)
-    if not team.get_admin() == user_name:
+    team = _team(team_name)
+    if not team.get_admin_id() == _user_id(user_name):
         return redirect('/team/' + user_name + '/' + team_name)
     app_db.session.delete(team)
     app_db.session.commit()
@@ -227,7 +388,7 @@ def deleteTeam(team_name, user_name):
 of a High5 that they have given. Update the message in the db and return the user to their user page. This page
 also has the button for a user to delete a High5. """
 
-@app.route('/editHigh5/<user_name>/<team_name>/<id>', methods=['GET', 'POST'])
+@pages.route('/editHigh5/<user_name>/<team_name>/<id>', methods=['GET', 'POST'])
 @login_required
 def editHigh5(team_name, user_name, id):
     high5 = High5.query.get(id)
@@ -237,6 +398,7 @@ def editHigh5(team_name, user_name, id):
     if edit_form.validate_on_submit():
         new_message = edit_form.comment_update.data
         setattr(high5, 'message', new_message)
+        bump_team_version(high5.team_id)
         app_db.session.commit()
         return redirect('/user/' + user_name + '/' + team_name)
     return render_template('editComment.html', team=team_name, user=user_name, high5=high5, edit_form=edit_form)
@@ -244,12 +406,26 @@ def editHigh5(team_name, user_name, id):
 """Create the page for a user to delete a High5 that they have given. Only can the giver of a High5 delete it. Bring the
 user back to their user page after deleting the High5."""
 
-@app.route('/deleteHigh5/<user_name>/<team_name>/<id>', methods=['GET', 'POST'])
+@pages.route('/deleteHigh5/<user_name>/<team_name>/<id>', methods=['GET', 'POST'])
 @login_required
 def deleteHigh5(team_name, user_name, id):
     high5 = High5.query.get(id)
     if not high5.get_giver() == user_name:
         return redirect('/user/' + user_name + '/' + team_name)
+    unrecord_high5(high5.team_id, high5.giver_id, high5.receiver_id, high5.get_level(), high5.time_posted)
+    bump_team_version(high5.team_id)
     app_db.session.delete(high5)
     app_db.session.commit()
-    return redirect('/user/' + user_name + '/' + team_name)
\ No newline at end of file
+    return redirect('/user/' + user_name + '/' + team_name)
+
+"""Return the request metrics of this process in the Prometheus text format for a Prometheus server to scrape, see
+metrics.py. Responds with 404 when METRICS_ENABLED is off and with 403 to a client that is not in METRICS_ADDRESSES and
+does not send METRICS_TOKEN."""
+
+@pages.route('/metrics')
+def metrics():
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    if not may_scrape(current_app.config):
+        abort(403)
+    return current_app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
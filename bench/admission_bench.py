@@ -0,0 +1,106 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+'''
+Load shedding by the admission control in app/admission.py, and what it costs a request.
+    python bench/admission_bench.py [threads] [capacity] [seconds]
+Makes a small database with bench/route_bench.py and has the given number of threads (64 by default), each logged in
+as another member, request the busiest team's page back to back for the given number of seconds (5 by default),
+waiting as long as Retry-After says when turned away. Runs once with admission control off and once with the team page
+limited to the given capacity (4 by default), each in its own process. Reports the requests served per second, the
+latency of the served requests and of the turned away ones, and the time a check of the shared store takes.'''
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+def rush(threads, seconds):
+    from route_bench import setup
+    from app import app, app_db
+    from app.models import User
+    directory = tempfile.mkdtemp()
+    try:
+        s = setup('small', directory)
+        app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_BENCH_ENABLED') == '1'
+        app.config['SLOW_REQUEST_SECONDS'] = 60
+        user_ids = [user_id for (user_id,) in app_db.session.query(User.id).filter(User.user_name.in_(s.members))]
+        app_db.session.remove()
+        url = '/team/%s/%s' % (s.user, s.team)
+        served, refused = [], []
+        end = time.time() + seconds
+        def worker(user_id):
+            client = app.test_client()
+            with client.session_transaction() as client_session:
+                client_session['user_id'] = str(user_id)
+                client_session['_fresh'] = True
+            while time.time() < end:
+                start = time.time()
+                response = client.get(url, buffered=True)
+                (served if response.status_code == 200 else refused).append((time.time() - start) * 1000)
+                if response.status_code != 200:
+                    time.sleep(float(response.headers['Retry-After']))
+        workers = [threading.Thread(target=worker, args=(user_ids[n % len(user_ids)],)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return dict(served=len(served) / float(seconds), refused=len(refused) / float(seconds),
+                    served_p50=percentile(served, 0.5), served_p99=percentile(served, 0.99),
+                    refused_p50=percentile(refused, 0.5), refused_p99=percentile(refused, 0.99))
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+#Microseconds a slot and a token take from the shared store.
+def check_costs(loops=20000):
+    from app.admission import SharedStore
+    directory = tempfile.mkdtemp()
+    try:
+        store = SharedStore(os.path.join(directory, 'admission'), [('route', 16)], 16384)
+        start = time.time()
+        for _ in range(loops):
+            store.release(store.acquire('route'))
+        slot = (time.time() - start) / loops * 1000000
+        start = time.time()
+        for n in range(loops):
+            store.take('route', 'user %d' % (n % 1000), 1000.0, 1000)
+        token = (time.time() - start) / loops * 1000000
+        store.close()
+        return slot, token
+    finally:
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--rush':
+        import config
+        config.ADMISSION_ROUTES = {'pages.team': (None, int(args[2]), None, None)}
+        results = rush(int(args[1]), float(args[3]))
+        print(json.dumps(results))
+        return 0
+    threads = args[0] if args else '64'
+    capacity = args[1] if len(args) > 1 else '4'
+    seconds = args[2] if len(args) > 2 else '5'
+    print('%-10s %10s %10s %12s %12s %12s %12s' % ('admission', 'served/s', 'refused/s', 'served p50', 'served p99',
+                                                    'refused p50', 'refused p99'))
+    for enabled in ['0', '1']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--rush', threads, capacity,
+                                          seconds], env=dict(os.environ, ADMISSION_BENCH_ENABLED=enabled))
+        results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('%-10s %10.0f %10.0f %9.1f ms %9.1f ms %9.1f ms %9.1f ms' % (
+            'on' if enabled == '1' else 'off', results['served'], results['refused'], results['served_p50'],
+            results['served_p99'], results['refused_p50'], results['refused_p99']))
+    slot, token = check_costs()
+    print('shared store: %.1f us to take and free a slot, %.1f us to take a token' % (slot, token))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
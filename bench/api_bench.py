@@ -0,0 +1,115 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, app_db
+
+'''
+Requests, SQL statements, commits and time to give many High5's and to read many teams, through the pages and through
+the JSON API in app/api.py.
+    python bench/api_bench.py [high5s] [teams] [size]
+Makes a database of the given size from bench/route_bench.py (small by default) in a temporary directory. As the admin
+of the busiest team it gives the given number of High5's (20 by default) to other members with the give High5 page,
+following each redirect to the team page like a browser, and then in one request to the API. It then reads the given
+number of the busiest teams (10 by default), which the admin is made a member of first, as one team page each and as
+one API request, with the page cache emptied before each team and then with every team already in the cache.'''
+
+#Run the function as one measured step and return [requests, statements, commits, milliseconds].
+def measure(function):
+    counts = dict(statements=0, commits=0)
+    def statement(conn, cursor, text, parameters, context, executemany):
+        counts['statements'] += 1
+    def commit(conn):
+        if conn.engine is app_db.get_engine(app):
+            counts['commits'] += 1
+    app_db.session.remove()
+    event.listen(Engine, 'before_cursor_execute', statement)
+    event.listen(Engine, 'commit', commit)
+    try:
+        start = time.time()
+        requests = function()
+        elapsed = (time.time() - start) * 1000
+    finally:
+        event.remove(Engine, 'before_cursor_execute', statement)
+        event.remove(Engine, 'commit', commit)
+    return [requests, counts['statements'], counts['commits'], elapsed]
+
+def run(size, high5s, teams):
+    from route_bench import setup
+    from sqlalchemy import func
+    from app import page_cache
+    from app.models import Team, High5
+    from app.membership import add_members
+    directory = tempfile.mkdtemp()
+    try:
+        s = setup(size, directory)
+        receivers = (s.members * high5s)[:high5s]
+        results = {}
+        def pages():
+            for receiver in receivers:
+                response = s.client.post('/giveHigh5/%s/%s' % (s.user, s.team), follow_redirects=True,
+                                         data=dict(receiver=receiver, message=u'Thanks for the help', level=3))
+                assert response.status_code == 200
+            return 2 * len(receivers)
+        results['give pages'] = measure(pages)
+        def api():
+            response = s.client.post('/api/teams/%s/high5s' % s.team, content_type='application/json',
+                                     data=json.dumps(dict(high5s=[dict(receiver=receiver, message=u'Thanks', level=3)
+                                                                  for receiver in receivers])))
+            assert json.loads(response.data.decode('utf-8'))['created'] == len(receivers)
+            return 1
+        results['give api'] = measure(api)
+        team_ids = [team_id for (team_id,) in app_db.session.query(High5.team_id).group_by(High5.team_id).
+                    order_by(func.count(High5.id).desc()).limit(teams)]
+        for team_id in team_ids:
+            add_members(team_id, [s.user_id])
+        app_db.session.commit()
+        names = [name for (name,) in app_db.session.query(Team.name).filter(Team.id.in_(team_ids))]
+        for warm in ['cold', 'warm']:
+            def pages():
+                for name in names:
+                    if warm == 'cold':
+                        page_cache.cache.clear()
+                    assert s.client.get('/team/%s/%s' % (s.user, name)).status_code == 200
+                return len(names)
+            if warm == 'warm':
+                pages()
+            results['read pages %s' % warm] = measure(pages)
+            def api():
+                if warm == 'cold':
+                    page_cache.cache.clear()
+                response = s.client.get('/api/teams?' + '&'.join('team=' + name for name in names))
+                assert len(json.loads(response.data.decode('utf-8'))['teams']) == len(names)
+                return 1
+            if warm == 'warm':
+                api()
+            results['read api %s' % warm] = measure(api)
+        return results
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--size':
+        print(json.dumps(run(args[1], int(args[2]), int(args[3]))))
+        return 0
+    high5s = args[0] if args else '20'
+    teams = args[1] if len(args) > 1 else '10'
+    size = args[2] if len(args) > 2 else 'small'
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--size', size, high5s, teams])
+    results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    print('%-22s %9s %11s %8s %9s' % ('', 'requests', 'statements', 'commits', 'ms'))
+    for label in ['give pages', 'give api', 'read pages cold', 'read api cold', 'read pages warm', 'read api warm']:
+        print('%-22s %9d %11d %8d %9.1f' % tuple([label] + results[label]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
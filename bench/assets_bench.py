@@ -0,0 +1,68 @@
+#!flask/bin/python
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+'''
+What the fingerprinted assets of app/assets.py save a browser loading the pages.
+    python bench/assets_bench.py [visits]
+Builds app/static into a temporary directory and loads the login page and the assets it links through the Flask test
+client like a browser with a cache, once linking app/static and once linking the build, for the given number of visits
+(10 by default). A browser keeps a /static file but asks whether it changed on each later visit, since Flask serves
+it with a short max-age, while it keeps a fingerprinted file for good. Reports the requests and the bytes of the
+first visit and of the later ones, and the time serving an asset takes.'''
+
+ASSET = re.compile(r'(?:href|src)="(/(?:static|assets)/[^"]+)"')
+
+#Load the page and its assets the given number of times like a browser keeping what it was sent, returning the
+#requests and bytes of the first visit, those of all the later ones, and the milliseconds an asset request took.
+def visit(app, visits):
+    client = app.test_client()
+    cache = {}
+    first = later = None
+    requests = transferred = 0
+    timings = []
+    for number in range(visits):
+        page = client.get('/login')
+        requests, transferred = requests + 1, transferred + len(page.data)
+        for url in ASSET.findall(page.data.decode('utf-8')):
+            kept = cache.get(url)
+            if kept is not None and 'immutable' in kept.headers.get('Cache-Control', ''):
+                continue
+            headers = {'Accept-Encoding': 'br, gzip'}
+            if kept is not None:
+                headers['If-None-Match'] = kept.headers['ETag']
+            start = time.time()
+            response = client.get(url, headers=headers)
+            timings.append((time.time() - start) * 1000)
+            requests, transferred = requests + 1, transferred + len(response.data)
+            if response.status_code == 200:
+                cache[url] = response
+        if number == 0:
+            first = (requests, transferred)
+            requests = transferred = 0
+    later = (requests, transferred)
+    return first, later, sorted(timings)[len(timings) // 2]
+
+def main(args):
+    visits = int(args[0]) if args else 10
+    from app import create_app
+    from app.assets import build_assets
+    directory = tempfile.mkdtemp()
+    try:
+        build_assets(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'static'), directory)
+        print('%-8s %15s %15s %20s %20s %12s' % ('links', 'first requests', 'first bytes',
+                                               'later requests', 'later bytes', 'asset p50'))
+        for label, build_dir in [('static', os.path.join(directory, 'none')), ('assets', directory)]:
+            first, later, asset_ms = visit(create_app(ASSET_BUILD_DIR=build_dir), visits)
+            print('%-8s %15d %15d %20d %20d %9.2f ms' % (label, first[0], first[1], later[0], later[1], asset_ms))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
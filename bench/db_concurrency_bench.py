@@ -0,0 +1,122 @@
+#!flask/bin/python
+import datetime
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sqlalchemy.exc import OperationalError
+from app import app, app_db
+
+'''
+Benchmark for reads while writes are happening.
+    python bench/db_concurrency_bench.py [seconds] [readers]
+Runs reader threads (4 by default) that load a team's leaderboard and newest High5's while a writer thread keeps
+giving High5's on the same team, for the given number of seconds (5 by default), against a copy of high5_app.db.
+Each setup runs in its own process: "baseline" is one engine with the rollback journal, "tuned" the read and writer
+engines of app/database.py with WAL. Reports read and write throughput, read latency and how many statements failed
+with "database is locked".'''
+
+MODES = dict(baseline=dict(SQLALCHEMY_ROUTE_READS=False, SQLITE_WAL=False, SQLITE_MMAP_SIZE=0),
+             tuned=dict())
+TEAM = u'Concurrency Bench Team'
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+#Point the app at a copy of the database in a temporary directory, in the journal mode the setup expects.
+def use_copy(directory, settings):
+    path = os.path.join(directory, 'high5_app.db')
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'high5_app.db'), path)
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=%s' % ('WAL' if settings.get('SQLITE_WAL', True) else 'DELETE'))
+    connection.close()
+    app.config.update(settings)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['WHOOSH_BASE'] = os.path.join(directory, 'search.db')
+
+#Make the team, with the first 20 users as members. Returns the team id and the member ids.
+def setup_team():
+    from app.models import User, Team
+    from app.membership import add_members
+    user_ids = [user_id for (user_id,) in app_db.session.query(User.id).order_by(User.id).limit(20)]
+    team = Team(name=TEAM, admin_id=user_ids[0])
+    app_db.session.add(team)
+    app_db.session.flush()
+    team_id = team.id
+    add_members(team_id, user_ids)
+    app_db.session.commit()
+    app_db.session.remove()
+    return team_id, user_ids
+
+def run(mode, seconds, readers):
+    from app.models import High5
+    from app.stats import record_high5, top_scorers
+    directory = tempfile.mkdtemp()
+    try:
+        use_copy(directory, MODES[mode])
+        team_id, user_ids = setup_team()
+        stop = threading.Event()
+        latencies = []
+        writes = []
+        locked = []
+        def read():
+            while not stop.is_set():
+                start = time.time()
+                try:
+                    top_scorers(team_id)
+                    High5.query.filter(High5.team_id == team_id).order_by(High5.time_posted.desc()).limit(25).all()
+                    latencies.append(time.time() - start)
+                except OperationalError:
+                    locked.append(1)
+                finally:
+                    app_db.session.remove()
+        def write():
+            i = 0
+            while not stop.is_set():
+                giver, receiver = user_ids[i % len(user_ids)], user_ids[(i + 1) % len(user_ids)]
+                now = datetime.datetime.utcnow()
+                try:
+                    app_db.session.add(High5(receiver_id=receiver, giver_id=giver, message=u'Thanks for the help',
+                                             level=3, team_id=team_id, time_posted=now))
+                    record_high5(team_id, giver, receiver, 3, now)
+                    app_db.session.commit()
+                    writes.append(1)
+                except OperationalError:
+                    app_db.session.rollback()
+                    locked.append(1)
+                finally:
+                    app_db.session.remove()
+                i += 1
+        threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print('%-8s %2d readers: %7.1f reads/s, %6.1f writes/s, read p50 %6.1f ms p95 %6.1f ms p99 %6.1f ms, '
+              '%d locked' % (mode, readers, len(latencies) / float(seconds), len(writes) / float(seconds),
+                             percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000,
+                             percentile(latencies, 0.99) * 1000, len(locked)))
+    finally:
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--mode':
+        run(args[1], float(args[2]), int(args[3]))
+        return 0
+    seconds = args[0] if args else '5'
+    readers = args[1] if len(args) > 1 else '4'
+    for mode in ['baseline', 'tuned']:
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), '--mode', mode, seconds, readers])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
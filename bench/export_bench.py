@@ -0,0 +1,76 @@
+#!flask/bin/python
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app import app, app_db
+
+'''
+Peak memory and time of the streaming High5 export in app/export.py as the export grows.
+    python bench/export_bench.py [rows ...]
+For each number of rows (10000, 100000 and 1000000 by default) a process makes the small database of
+bench/route_bench.py in a temporary directory, copies its High5's until the table has that many rows, and exports all
+of them as CSV and as gzipped CSV to /dev/null. Reports the time and how much the process's peak resident memory grew
+during each export, next to loading the same rows with .all() the way the export scripts used to, for up to
+ALL_MAX rows.'''
+
+#Most rows loaded with .all(), which needs memory for every one of them.
+ALL_MAX = 100000
+
+#Peak resident memory of this process in MB.
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(rows, way):
+    from route_bench import setup
+    from app.models import High5
+    from app.export import export_chunks
+    directory = tempfile.mkdtemp()
+    try:
+        setup('small', directory)
+        columns = 'receiver_id, giver_id, message, time_posted, level, team_id'
+        while True:
+            count = app_db.session.query(High5).count()
+            if count >= rows:
+                break
+            app_db.session.execute('INSERT INTO high5 (%s) SELECT %s FROM high5 ORDER BY id LIMIT %d' %
+                                   (columns, columns, rows - count))
+            app_db.session.commit()
+        app_db.session.remove()
+        before = peak_mb()
+        start = time.time()
+        if way == 'all':
+            High5.query.all()
+        else:
+            with open(os.devnull, 'wb') as output:
+                for chunk in export_chunks('csv', compress=way == 'gzip'):
+                    output.write(chunk)
+        return [time.time() - start, peak_mb() - before]
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--rows':
+        print(json.dumps(run(int(args[1]), args[2])))
+        return 0
+    sizes = args or ['10000', '100000', '1000000']
+    print('%-10s %-12s %9s %16s' % ('rows', 'export', 'seconds', 'peak MB growth'))
+    for rows in sizes:
+        for way in ['csv', 'gzip', 'all']:
+            if way == 'all' and int(rows) > ALL_MAX:
+                continue
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--rows', rows, way])
+            seconds, growth = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+            label = {'csv': 'CSV', 'gzip': 'CSV gzip', 'all': '.all()'}[way]
+            print('%-10s %-12s %9.1f %16.1f' % (rows, label, seconds, growth))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
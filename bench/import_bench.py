@@ -0,0 +1,118 @@
+#!flask/bin/python
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app import app, app_db
+
+'''
+Throughput of the bulk CSV import in app/bulk_import.py next to creating the same users one ORM object at a time.
+    python bench/import_bench.py [users] [processes] [hashes]
+Makes CSV files of the given number of users (50000 by default) with a team for every 50 of them and each user on one
+or two teams, and imports them into an empty database in a temporary directory. The import is timed with passwords
+hashed at 1 PBKDF2 iteration so it shows the cost of everything but the hashing, which is measured on its own:
+the given number of passwords (100 by default) hashed at the configured cost on one process and on the given number
+of processes (one per CPU core by default). The estimate for importing the users at the configured cost adds the
+two. For comparison the first 1000 users are also made the way the register route and db_add_team.py make them: a
+User each, hashing its password on the spot, and add_members for each membership.'''
+
+CHEAP_ITERATIONS = 1
+
+#Build the users, teams and members CSV files for the number of users.
+def make_csv(users):
+    teams = max(1, users // 50)
+    names = [u'import%06d' % number for number in range(users)]
+    files = dict(users=[u'user_name,name,email,password'], teams=[u'name,admin'], members=[u'team,user_name'])
+    for number, name in enumerate(names):
+        files['users'].append(u'%s,Import User %d,%s@import.test,password%d' % (name, number, name, number))
+    for team in range(teams):
+        files['teams'].append(u'Import Team %d,%s' % (team, names[team * 50]))
+    for number, name in enumerate(names):
+        for team in set([number // 50 % teams, number * 7 % teams]) if number % 3 == 0 else [number // 50 % teams]:
+            if number != team * 50:
+                files['members'].append(u'Import Team %d,%s' % (team, name))
+    return dict((kind, (u'\n'.join(lines) + u'\n').encode('utf-8')) for kind, lines in files.items())
+
+def run(users, processes, hashes):
+    from app.migrations import upgrade_database
+    from app.bulk_import import read_csv, import_rows
+    from app.passwords import hash_passwords, hash_passwords_threaded
+    from app.models import User, Team
+    from app.membership import add_members
+    directory = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'high5_app.db')
+    try:
+        upgrade_database()
+        results = {}
+        start = time.time()
+        pairs = [(u'password%d' % number, b'salt%d' % number) for number in range(hashes)]
+        hash_passwords(pairs, 1)
+        results['hash 1 process'] = hashes / (time.time() - start)
+        start = time.time()
+        hash_passwords(pairs, processes)
+        results['hash %d processes' % processes] = hashes / (time.time() - start)
+        start = time.time()
+        hash_passwords_threaded(pairs)
+        results['hash request threads'] = hashes / (time.time() - start)
+        results['request threads'] = app.config['PASSWORD_HASH_THREADS']
+        configured = app.config['PASSWORD_PBKDF2_ITERATIONS']
+        app.config['PASSWORD_PBKDF2_ITERATIONS'] = CHEAP_ITERATIONS
+        files = make_csv(users)
+        for kind in ['users', 'teams', 'members']:
+            report = import_rows(kind, read_csv(kind, files[kind]), processes)
+            app_db.session.commit()
+            assert not report.errors, report.to_dict()['errors'][:3]
+            results['import ' + kind] = [report.rows, report.seconds]
+        app_db.session.remove()
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'orm.db')
+        app_db.get_engine(app).dispose()
+        upgrade_database()
+        rows = min(users, 1000)
+        start = time.time()
+        for number in range(rows):
+            app_db.session.add(User(u'orm%06d' % number, u'Orm User', u'orm%06d@import.test' % number, u'password'))
+        app_db.session.flush()
+        team = Team(name=u'Orm Team', admin_id=User.query.first().id)
+        app_db.session.add(team)
+        app_db.session.flush()
+        for (user_id,) in app_db.session.query(User.id):
+            add_members(team.id, [user_id])
+        app_db.session.commit()
+        results['orm users and members'] = [rows * 2, time.time() - start]
+        results['configured iterations'] = configured
+        return results
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--users':
+        print(json.dumps(run(int(args[1]), int(args[2]), int(args[3]))))
+        return 0
+    users = args[0] if args else '50000'
+    processes = args[1] if len(args) > 1 else str(multiprocessing.cpu_count())
+    hashes = args[2] if len(args) > 2 else '100'
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--users', users, processes, hashes])
+    results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    print('%-34s %9s %9s %12s' % ('', 'rows', 'seconds', 'rows/second'))
+    for label in ['import users', 'import teams', 'import members', 'orm users and members']:
+        rows, seconds = results[label]
+        print('%-34s %9d %9.1f %12.0f' % (label, rows, seconds, rows / seconds))
+    hash_rate = results['hash %s processes' % processes]
+    print('\nPBKDF2 at %d iterations: %.1f hashes/second on 1 process, %.1f on %s' %
+          (results['configured iterations'], results['hash 1 process'], hash_rate, processes))
+    print('Estimated import of %s users at that cost: %.1f minutes' %
+          (users, (int(users) / hash_rate + results['import users'][1]) / 60))
+    print('%.1f hashes/second on the %d hashing threads of a web worker, %.1f seconds for IMPORT_MAX_USERS users in '
+          '/api/import' % (results['hash request threads'], results['request threads'],
+                           app.config['IMPORT_MAX_USERS'] / results['hash request threads']))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,152 @@
+#!flask/bin/python
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.migrations import upgrade_database
+
+'''
+Benchmark for the integer keys of schema version 3 against the name keys of version 2.
+    python bench/keys_bench.py [high5s] [teams] [users]
+Makes a database at version 2 in a temporary directory and fills it with made up users (5,000 by default), teams
+(1,000 by default) of 20 members each, High5's between members (1,000,000 by default) and their stat rows. Measures
+the size of every index and times the joins the pages run, then upgrades the database to version 3, timing the
+migration, and measures again. The queries are the same ones at both versions, with names looked up through ids at
+version 3 the way the routes do it.'''
+
+#The queries timed at each version, as (label, version 2 query, version 3 query). Each takes a team name and a user
+#name.
+QUERIES = [
+    ('team feed page',
+     'SELECT id, receiver, giver, message, time_posted FROM high5 WHERE team_name = :team '
+     'ORDER BY time_posted DESC, id DESC LIMIT 25',
+     'SELECT h.id, r.user_name, g.user_name, h.message, h.time_posted FROM high5 h '
+     'LEFT JOIN user r ON r.id = h.receiver_id LEFT JOIN user g ON g.id = h.giver_id '
+     'WHERE h.team_id = (SELECT id FROM team WHERE name = :team) ORDER BY h.time_posted DESC, h.id DESC LIMIT 25'),
+    ('received feed page',
+     'SELECT id, receiver, giver, message, time_posted FROM high5 WHERE team_name = :team AND receiver = :user '
+     'ORDER BY time_posted DESC, id DESC LIMIT 25',
+     'SELECT h.id, r.user_name, g.user_name, h.message, h.time_posted FROM high5 h '
+     'LEFT JOIN user r ON r.id = h.receiver_id LEFT JOIN user g ON g.id = h.giver_id '
+     'WHERE h.team_id = (SELECT id FROM team WHERE name = :team) '
+     'AND h.receiver_id = (SELECT id FROM user WHERE user_name = :user) '
+     'ORDER BY h.time_posted DESC, h.id DESC LIMIT 25'),
+    ('leaderboard',
+     'SELECT user_name, score FROM member_stat WHERE team_name = :team ORDER BY score DESC, user_name LIMIT 10',
+     'SELECT u.user_name, s.score FROM member_stat s JOIN user u ON u.id = s.user_id '
+     'WHERE s.team_id = (SELECT id FROM team WHERE name = :team) ORDER BY s.score DESC, u.user_name LIMIT 10'),
+    ('teams of a user',
+     'SELECT team.name FROM team JOIN members ON members.team = team.name JOIN user ON user.id = members.user '
+     'WHERE user.user_name = :user ORDER BY team.name',
+     'SELECT team.name FROM team JOIN members ON members.team_id = team.id JOIN user ON user.id = members.user_id '
+     'WHERE user.user_name = :user ORDER BY team.name'),
+    ('givers of a team',
+     'SELECT u.name, COUNT(*) FROM high5 h JOIN user u ON u.user_name = h.giver WHERE h.team_name = :team '
+     'GROUP BY u.id',
+     'SELECT u.name, COUNT(*) FROM high5 h JOIN user u ON u.id = h.giver_id '
+     'WHERE h.team_id = (SELECT id FROM team WHERE name = :team) GROUP BY u.id')]
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+#Fill a version 2 database with users, teams, members, High5's and the stat rows that go with them.
+def fill(path, count, teams, users):
+    rand = random.Random(242)
+    connection = sqlite3.connect(path)
+    connection.executemany('INSERT INTO user (id, user_name, name, email) VALUES (?, ?, ?, ?)',
+                           [(i, u'user%05d' % i, u'Bench User %d' % i, u'user%05d@illinois.edu' % i)
+                            for i in range(1, users + 1)])
+    rosters = []
+    for team in range(teams):
+        team_name = u'Benchmark Team %04d' % team
+        roster = rand.sample(range(1, users + 1), 20)
+        rosters.append((team_name, roster))
+        connection.execute('INSERT INTO team (name, admin) VALUES (?, ?)', (team_name, u'user%05d' % roster[0]))
+        connection.executemany('INSERT INTO members (team, user) VALUES (?, ?)',
+                               [(team_name, user_id) for user_id in roster])
+    base = datetime.datetime(2016, 1, 1)
+    def high5s():
+        for i in range(count):
+            team_name, roster = rosters[rand.randrange(teams)]
+            giver, receiver = rand.sample(roster, 2)
+            yield (u'user%05d' % receiver, u'user%05d' % giver, u'Thanks for the help with number %d' % i,
+                   str(base + datetime.timedelta(minutes=i)), rand.randint(1, 5), team_name)
+    connection.executemany('INSERT INTO high5 (receiver, giver, message, time_posted, level, team_name) '
+                           'VALUES (?, ?, ?, ?, ?, ?)', high5s())
+    connection.execute('INSERT INTO daily_stat SELECT team_name, user_name, day, SUM(score), SUM(received), '
+                       'SUM(given) FROM (SELECT team_name, receiver AS user_name, date(time_posted) AS day, '
+                       'level AS score, 1 AS received, 0 AS given FROM high5 UNION ALL SELECT team_name, giver, '
+                       'date(time_posted), 0, 0, 1 FROM high5) GROUP BY team_name, user_name, day')
+    connection.execute('INSERT INTO member_stat SELECT team_name, user_name, SUM(score), SUM(received), SUM(given) '
+                       'FROM daily_stat GROUP BY team_name, user_name')
+    connection.commit()
+    connection.close()
+    return rosters
+
+#Get the size in KB of every index and of the whole file, after a VACUUM so both versions are packed the same way.
+def sizes(path):
+    connection = sqlite3.connect(path)
+    connection.execute('VACUUM')
+    indexes = dict((name, size / 1024.0) for name, size in connection.execute(
+        "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE type = 'index') "
+        "GROUP BY name"))
+    connection.close()
+    return indexes, os.path.getsize(path) / 1024.0
+
+#Time each query against random teams and members. Returns the (p50, p95) in ms of each.
+def time_queries(path, rosters, version, rounds):
+    rand = random.Random(17)
+    connection = sqlite3.connect(path)
+    timings = {}
+    for label, old, new in QUERIES:
+        query = old if version == 2 else new
+        latencies = []
+        for _ in range(rounds):
+            team_name, roster = rosters[rand.randrange(len(rosters))]
+            parameters = dict(team=team_name, user=u'user%05d' % rand.choice(roster))
+            start = time.time()
+            connection.execute(query, parameters).fetchall()
+            latencies.append((time.time() - start) * 1000)
+        timings[label] = (percentile(latencies, 0.5), percentile(latencies, 0.95))
+    connection.close()
+    return timings
+
+def main(args):
+    count = int(args[0]) if args else 1000000
+    teams = int(args[1]) if len(args) > 1 else 1000
+    users = int(args[2]) if len(args) > 2 else 5000
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'keys.db')
+        url = 'sqlite:///' + path
+        upgrade_database(2, url=url)
+        start = time.time()
+        rosters = fill(path, count, teams, users)
+        print('Made %d High5\'s on %d teams of %d users in %.1f seconds' % (count, teams, users, time.time() - start))
+        before_indexes, before_file = sizes(path)
+        before_times = time_queries(path, rosters, 2, 500)
+        start = time.time()
+        upgrade_database(3, url=url)
+        print('Upgraded to version 3 in %.1f seconds' % (time.time() - start))
+        after_indexes, after_file = sizes(path)
+        after_times = time_queries(path, rosters, 3, 500)
+        print('\n%-36s %12s %12s' % ('index', 'names KB', 'ids KB'))
+        for name in sorted(set(before_indexes) | set(after_indexes)):
+            print('%-36s %12.0f %12.0f' % (name, before_indexes.get(name, 0), after_indexes.get(name, 0)))
+        print('%-36s %12.0f %12.0f' % ('all indexes', sum(before_indexes.values()), sum(after_indexes.values())))
+        print('%-36s %12.0f %12.0f' % ('database file', before_file, after_file))
+        print('\n%-20s %22s %22s' % ('query', 'names p50 / p95 ms', 'ids p50 / p95 ms'))
+        for label, _, _ in QUERIES:
+            print('%-20s %10.3f / %9.3f %10.3f / %9.3f' % ((label,) + before_times[label] + after_times[label]))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,118 @@
+#!flask/bin/python
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app import app, app_db
+from app.live import encode_event
+
+'''
+Cost of idle browsers on the live team feeds in app/live.py, and how long an event takes to reach all of them.
+    python bench/live_bench.py [connections] [events]
+Starts live_server.py's LiveServer in another process and, logged in as John, opens the given number of streams
+(5000 by default) of CS465 Group 17. Reports how long they took to open, the server's memory per stream and its CPU
+while they are idle, and then publishes the given number of events (20 by default) the way the web workers do, one
+at a time, reporting how long the last stream took to get each one.'''
+
+TEAM = 'CS465 Group 17'
+USER = 'John'
+IDLE_SECONDS = 5
+
+#The resident memory in KB and the CPU seconds used so far of a process.
+def usage(pid):
+    with open('/proc/%d/status' % pid) as status:
+        rss = [int(line.split()[1]) for line in status if line.startswith('VmRSS:')][0]
+    with open('/proc/%d/stat' % pid) as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+
+def serve():
+    from app.live import LiveServer
+    server = LiveServer('127.0.0.1:0', '127.0.0.1:0')
+    print(json.dumps([server.address[1], server.receiver.getsockname()[1]]))
+    sys.stdout.flush()
+    server.serve_forever()
+
+#Read from every socket until each has received the marker, returning the seconds until the last did.
+def wait_all(poller, sockets, marker, start):
+    pending = dict((fd, b'') for fd in sockets)
+    while pending:
+        for fd, _ in poller.poll(10):
+            try:
+                data = sockets[fd].recv(65536)
+            except socket.error:
+                continue
+            if fd not in pending:
+                continue
+            data = pending[fd] + data
+            if marker in data:
+                del pending[fd]
+            else:
+                pending[fd] = data[-len(marker):]
+    return time.time() - start
+
+def main(args):
+    if args and args[0] == '--serve':
+        serve()
+        return 0
+    connections = int(args[0]) if args else 5000
+    events = int(args[1]) if len(args) > 1 else 20
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError):
+        pass
+    from app.models import User, Team
+    user_id = User.query.filter(User.user_name == USER).one().id
+    team_id = Team.query.filter(Team.name == TEAM).one().id
+    app_db.session.remove()
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': str(user_id), '_fresh': True})
+    request = ('GET /live/%s HTTP/1.1\r\nHost: live\r\nCookie: %s=%s\r\n\r\n' %
+               (TEAM.replace(' ', '%20'), app.session_cookie_name, cookie)).encode('latin-1')
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'], stdout=subprocess.PIPE)
+    sockets = {}
+    try:
+        port, publish_port = json.loads(server.stdout.readline().decode('utf-8'))
+        rss_before, _ = usage(server.pid)
+        poller = select.epoll() if hasattr(select, 'epoll') else select.poll()
+        start = time.time()
+        for _ in range(connections):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(request)
+            sock.setblocking(False)
+            sockets[sock.fileno()] = sock
+            poller.register(sock.fileno(), select.POLLIN)
+        opened = wait_all(poller, sockets, b'retry: 5000\n\n', start)
+        time.sleep(1)
+        rss_after, cpu_before = usage(server.pid)
+        time.sleep(IDLE_SECONDS)
+        _, cpu_after = usage(server.pid)
+        publisher = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        latencies = []
+        for number in range(events):
+            marker = ('event: give\ndata: {"id": %d}\n\n' % number).encode('utf-8')
+            start = time.time()
+            publisher.sendto(encode_event(app.config['SECRET_KEY'], team_id, 'give', dict(id=number)),
+                             ('127.0.0.1', publish_port))
+            latencies.append(wait_all(poller, sockets, marker, start) * 1000)
+        latencies.sort()
+    finally:
+        for sock in sockets.values():
+            sock.close()
+        server.kill()
+        server.wait()
+    print('%-36s %d' % ('streams', connections))
+    print('%-36s %.2f' % ('seconds to open them all', opened))
+    print('%-36s %.2f' % ('server KB per stream', (rss_after - rss_before) / float(connections)))
+    print('%-36s %.2f' % ('server CPU % while idle', 100 * (cpu_after - cpu_before) / IDLE_SECONDS))
+    print('%-36s %.1f' % ('ms for an event to reach all, p50', latencies[len(latencies) // 2]))
+    print('%-36s %.1f' % ('ms for an event to reach all, max', latencies[-1]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+'''
+Overhead of the request metrics in app/metrics.py.
+    python bench/metrics_bench.py [rounds] [repeats]
+Requests the pages in PAGES through the Flask test client the given number of rounds (200 by default) against a copy
+of high5_app.db, with METRICS_ENABLED off and on. Each setting runs in its own process, alternating, the given number
+of times (3 by default), and the fastest median of each counts. The setting is made in config before the app is imported,
+since the hooks are installed when it is. Reports the median time of a request to each page with
+metrics off and on and the difference. Since that difference is close to the noise between processes, it also times
+the hooks themselves: what they add to each SQL statement and to each request, and from those and the statements each
+page runs, what they add to a request to each page.'''
+
+PAGES = ['/index/John', '/team/John/CS465 Group 17', '/user/John/CS465 Group 17',
+         '/feed/John/CS465 Group 17/team', '/edit/VPeterson/CS465 Group 17', '/login']
+
+def _endpoints():
+    from app import app
+    adapter = app.url_map.bind('localhost')
+    return dict((page, adapter.match(page)[0]) for page in PAGES)
+
+def run(rounds):
+    from app import app, app_db
+    from app.models import User
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'high5_app.db')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'high5_app.db'), path)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+        client = app.test_client()
+        users = dict(app_db.session.query(User.user_name, User.id).filter(User.user_name.in_(['John', 'VPeterson'])))
+        app_db.session.remove()
+        results = {}
+        for page in PAGES:
+            with client.session_transaction() as client_session:
+                client_session['user_id'] = str(users['VPeterson' if page.startswith('/edit') else 'John'])
+                client_session['_fresh'] = True
+            for _ in range(10):
+                client.get(page, buffered=True)
+            latencies = []
+            for _ in range(rounds):
+                start = time.time()
+                response = client.get(page, buffered=True)
+                latencies.append((time.time() - start) * 1000)
+            results[page] = sorted(latencies)[rounds // 2]
+            assert response.status_code == 200, page
+        return results
+    finally:
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+#Time the statement hooks and the per request bookkeeping directly, in microseconds.
+def hook_costs(loops=100000):
+    from app import app, metrics
+    class Connection(object):
+        info = {}
+    conn = Connection()
+    with app.test_request_context('/login'):
+        app.preprocess_request()
+        start = time.time()
+        for _ in range(loops):
+            metrics._before_cursor_execute(conn, None, 'SELECT 1', (), None, False)
+            metrics._after_cursor_execute(conn, None, 'SELECT 1', (), None, False)
+        statement = (time.time() - start) / loops * 1000000
+    response = app.response_class('x' * 4096)
+    start = time.time()
+    for _ in range(loops // 10):
+        with app.test_request_context('/login'):
+            app.preprocess_request()
+            app.process_response(response)
+    with_hooks = time.time() - start
+    before, after = app.before_request_funcs[None], app.after_request_funcs[None]
+    app.before_request_funcs[None] = [f for f in before if f.__module__ != metrics.__name__]
+    app.after_request_funcs[None] = [f for f in after if f.__module__ != metrics.__name__]
+    start = time.time()
+    for _ in range(loops // 10):
+        with app.test_request_context('/login'):
+            app.preprocess_request()
+            app.process_response(response)
+    without_hooks = time.time() - start
+    app.before_request_funcs[None], app.after_request_funcs[None] = before, after
+    return statement, (with_hooks - without_hooks) / (loops // 10) * 1000000
+
+def main(args):
+    if args and args[0] == '--enabled':
+        import config
+        config.METRICS_ENABLED = args[1] == '1'
+        results = run(int(args[2]))
+        if config.METRICS_ENABLED:
+            from app import metrics
+            results = dict(results, queries=dict((page, metrics.QUERIES.series[endpoint][1] / (int(args[2]) + 10))
+                                                 for page, endpoint in _endpoints().items()),
+                           hooks=hook_costs())
+        print(json.dumps(results))
+        return 0
+    rounds = args[0] if args else '200'
+    repeats = int(args[1]) if len(args) > 1 else 3
+    best = {'0': {}, '1': {}}
+    for _ in range(repeats):
+        for enabled in ['0', '1']:
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--enabled', enabled, rounds])
+            results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+            for page in PAGES:
+                best[enabled][page] = min(results[page], best[enabled].get(page, results[page]))
+            if enabled == '1':
+                queries = results['queries']
+                statement, per_request = [min(cost, best.get('hooks', results['hooks'])[i])
+                                          for i, cost in enumerate(results['hooks'])]
+                best['hooks'] = [statement, per_request]
+    statement, per_request = best['hooks']
+    print('hooks: %.2f us per SQL statement, %.2f us per request' % (statement, per_request))
+    print('%-34s %9s %9s %11s %5s %11s' % ('page', 'off ms', 'on ms', 'difference', 'SQL', 'hooks'))
+    for page in PAGES:
+        off, on = best['0'][page], best['1'][page]
+        hooks = queries[page] * statement + per_request
+        print('%-34s %9.3f %9.3f %8.0f us %5.1f %5.0f us %.1f%%' % (page, off, on, (on - off) * 1000, queries[page],
+                                                                     hooks, hooks / off / 10))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, app_db
+
+'''
+Latency of the team and user pages with the page cache in app/page_cache.py.
+    python bench/page_cache_bench.py [rounds] [size]
+Makes a database of the given size from bench/route_bench.py (small by default) in a temporary directory and, as the
+admin of the busiest team, requests each page the given number of times (200 by default) three ways: with the cache
+emptied before every request, as every page was before caching, with the fragments in the cache, and with the ETag of
+the last response so it is answered with 304. Reports the median latency and the SQL statements of each.'''
+
+PAGES = [('team', '/team/%(user)s/%(team)s'), ('team ?window', '/team/%(user)s/%(team)s?window=month'),
+         ('user', '/user/%(user)s/%(team)s')]
+
+def run(size, rounds):
+    from route_bench import setup
+    from app import page_cache
+    directory = tempfile.mkdtemp()
+    try:
+        scenario = setup(size, directory)
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        results = {}
+        for label, page in PAGES:
+            url = page % dict(user=scenario.user, team=scenario.team)
+            etag = scenario.client.get(url).headers['ETag']
+            for way in ['uncached', 'fragments', '304']:
+                latencies = []
+                for _ in range(rounds):
+                    if way == 'uncached':
+                        page_cache.cache.clear()
+                    headers = {'If-None-Match': etag} if way == '304' else {}
+                    app_db.session.remove()
+                    del statements[:]
+                    event.listen(Engine, 'before_cursor_execute', count)
+                    try:
+                        start = time.time()
+                        response = scenario.client.get(url, headers=headers)
+                        latencies.append((time.time() - start) * 1000)
+                    finally:
+                        event.remove(Engine, 'before_cursor_execute', count)
+                    assert response.status_code == (304 if way == '304' else 200), (url, response.status_code)
+                results['%s %s' % (label, way)] = [sorted(latencies)[rounds // 2], len(statements)]
+        return results
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--size':
+        print(json.dumps(run(args[1], int(args[2]))))
+        return 0
+    rounds = args[0] if args else '200'
+    size = args[1] if len(args) > 1 else 'small'
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--size', size, rounds])
+    results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    print('%-28s %9s %6s' % ('page', 'p50 ms', 'SQL'))
+    for label, _ in PAGES:
+        for way in ['uncached', 'fragments', '304']:
+            print('%-28s %9.2f %6d' % tuple(['%s %s' % (label, way)] + results['%s %s' % (label, way)]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+#!flask/bin/python
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backports.pbkdf2 import pbkdf2_hmac as backports_pbkdf2_hmac
+from app import app, app_db
+from app import passwords
+from app.models import User
+from app.passwords import Pbkdf2Hasher, ScryptHasher, HashPool, hash_password, check_password
+try:
+    from http.client import HTTPConnection  # python 3
+    from urllib.parse import urlencode
+except ImportError:
+    from httplib import HTTPConnection  # python 2
+    from urllib import urlencode
+
+'''
+Benchmark for the password hashers.
+    python bench/password_bench.py [seconds]
+First times one hash with each backend. Then runs concurrent logins (check_password against a stored hash) through
+hashing pools of different sizes while another thread keeps serving a page that does not hash, and reports login
+throughput and the latency of the other page. Last it serves the app with gunicorn.conf.py as in production, one
+worker with one request thread and then with the configured threads, and runs the same load over HTTP against a copy
+of high5_app.db.'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+#The user the logins over HTTP log in as.
+LOGIN = dict(user_name='benchlogin', password='abc123')
+
+#Run by gunicorn as the app module of serve_load: the default app on the database copy, with CSRF and admission
+#control off so every login is served.
+if os.environ.get('PASSWORD_BENCH_DB'):
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.environ['PASSWORD_BENCH_DB'], WTF_CSRF_ENABLED=False,
+                      ADMISSION_ENABLED=False)
+
+def time_backend(name, func, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('%-32s %8.1f ms per hash' % (name, best * 1000))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+def login_load(pool_size, login_threads, seconds):
+    passwords.pool = HashPool(pool_size)
+    stored = hash_password(u'abc123', b'salt')
+    stop = threading.Event()
+    logins = []
+    page_latencies = []
+    def login():
+        while not stop.is_set():
+            check_password(u'abc123', b'salt', stored)
+            logins.append(1)
+    def page():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.time()
+            client.get('/login')
+            page_latencies.append(time.time() - start)
+    threads = [threading.Thread(target=login) for _ in range(login_threads)] + [threading.Thread(target=page)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    passwords.pool.close()
+    print('pool %d, %2d login threads: %6.1f logins/s, other page p50 %6.1f ms p95 %6.1f ms (%d served)' %
+          (pool_size, login_threads, len(logins) / float(seconds), percentile(page_latencies, 0.5) * 1000,
+           percentile(page_latencies, 0.95) * 1000, len(page_latencies)))
+
+#Copy high5_app.db to the directory with the user LOGIN added. Returns the path of the copy.
+def login_database(directory):
+    path = os.path.join(directory, 'high5_app.db')
+    shutil.copy(os.path.join(ROOT, 'high5_app.db'), path)
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    try:
+        app_db.session.add(User(LOGIN['user_name'], u'Bench Login', u'benchlogin@bench.test', LOGIN['password']))
+        app_db.session.commit()
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    return path
+
+def _request(connections, method, url, body=None):
+    try:
+        connection = connections.get('connection') or HTTPConnection(*connections['address'])
+        connections['connection'] = connection
+        connection.request(method, url, body, {'Content-Type': 'application/x-www-form-urlencoded'} if body else {})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except (socket.error, IOError):
+        connections.pop('connection', None)
+        return None
+
+#Serve the app with gunicorn.conf.py, one worker with the given request threads, and run the load of login_load over
+#HTTP: concurrent logins and another client loading the login page.
+def serve_load(path, threads, login_clients, seconds):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    address = listener.getsockname()
+    listener.close()
+    env = dict(os.environ, PORT=str(address[1]), WEB_CONCURRENCY='1', GUNICORN_THREADS=str(threads),
+               PASSWORD_BENCH_DB=path, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(
+                   os.path.abspath(__file__)), os.environ.get('PYTHONPATH')])))
+    with open(os.devnull, 'w') as devnull:
+        server = subprocess.Popen([sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()', '-c',
+                                   os.path.join(ROOT, 'gunicorn.conf.py'), 'password_bench:app'],
+                                  cwd=ROOT, env=env, stdout=devnull, stderr=devnull)
+    try:
+        for _ in range(300):
+            if _request(dict(address=address), 'GET', '/login') == 200:
+                break
+            time.sleep(0.1)
+        stop = threading.Event()
+        logins = []
+        page_latencies = []
+        def login():
+            connections = dict(address=address)
+            while not stop.is_set():
+                if _request(connections, 'POST', '/login', urlencode(LOGIN)) == 302:
+                    logins.append(1)
+        def page():
+            connections = dict(address=address)
+            while not stop.is_set():
+                start = time.time()
+                if _request(connections, 'GET', '/login') == 200:
+                    page_latencies.append(time.time() - start)
+        clients = [threading.Thread(target=login) for _ in range(login_clients)] + [threading.Thread(target=page)]
+        for client in clients:
+            client.start()
+        time.sleep(seconds)
+        stop.set()
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+    print('1 worker, %d request threads, %2d login clients: %6.1f logins/s, other page p50 %6.1f ms p95 %6.1f ms '
+          '(%d served)' % (threads, login_clients, len(logins) / float(seconds),
+                           percentile(page_latencies, 0.5) * 1000, percentile(page_latencies, 0.95) * 1000,
+                           len(page_latencies)))
+
+def main(args):
+    seconds = float(args[0]) if args else 5.0
+    iterations = app.config['PASSWORD_PBKDF2_ITERATIONS']
+    print('Single hash, %d PBKDF2 iterations:' % iterations)
+    time_backend('backports.pbkdf2', lambda: backports_pbkdf2_hmac('sha512', b'abc123', b'salt', iterations))
+    time_backend('hashlib.pbkdf2_hmac', lambda: Pbkdf2Hasher(iterations).hash(b'abc123', b'salt', str(iterations)))
+    if ScryptHasher.available:
+        scrypt = ScryptHasher(*app.config['PASSWORD_SCRYPT_COST'])
+        time_backend('hashlib.scrypt %s' % scrypt.cost, lambda: scrypt.hash(b'abc123', b'salt', scrypt.cost))
+    else:
+        print('%-32s not available on this Python' % 'hashlib.scrypt')
+    print('')
+    print('Concurrent logins for %.0f s each:' % seconds)
+    for pool_size in [1, 2, 4]:
+        login_load(pool_size, 8, seconds)
+    print('')
+    print('gunicorn.conf.py over HTTP for %.0f s each:' % seconds)
+    directory = tempfile.mkdtemp()
+    try:
+        path = login_database(directory)
+        for threads in [1, int(os.environ.get('GUNICORN_THREADS', 8))]:
+            serve_load(path, threads, 4, seconds)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
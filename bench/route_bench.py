@@ -0,0 +1,218 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, app_db
+
+'''
+End to end latency of every route in app/views.py as the database grows.
+    python bench/route_bench.py [rounds] [size ...]
+For each dataset size (small and medium by default, see SIZES) a process makes a database in a temporary directory
+with app/synthetic.py and requests every route through the Flask test client the given number of times (50 by
+default), as the admin of the busiest team. Reports the p50, p95 and p99 latency and the median and largest number of
+SQL statements of each route at each size, and lists any route that has no case here.'''
+
+#Users, teams and High5's of each dataset size.
+SIZES = dict(small=(1000, 100, 10000), medium=(10000, 1000, 100000), large=(50000, 5000, 1000000))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+'''
+The state the cases share: the team and user the requests are made as, a logged in test client and counters that
+later rounds of a case use to make new names or pick the rows an earlier case made.'''
+class Scenario(object):
+    def __init__(self, team, user):
+        from app.models import User, High5, members
+        self.team = team.name
+        self.team_id = team.id
+        self.user = user.user_name
+        self.user_id = user.id
+        self.members = [user_name for (user_name,) in app_db.session.query(User.user_name).
+                        join(members, members.c.user_id == User.id).filter(members.c.team_id == team.id).
+                        filter(User.id != user.id).order_by(User.id).limit(50)]
+        self.outsiders = [user_id for (user_id,) in app_db.session.query(User.id).
+                          filter(~User.id.in_(app_db.session.query(members.c.user_id).
+                                              filter(members.c.team_id == team.id))).order_by(User.id).limit(1000)]
+        self.high5_id = app_db.session.query(High5.id).filter(High5.team_id == team.id). \
+            filter(High5.giver_id == user.id).order_by(High5.id.desc()).first()[0]
+        self.counter = 0
+        self.created_teams = []
+        self.client = self.login(app.test_client())
+
+    def login(self, client):
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = str(self.user_id)
+            client_session['_fresh'] = True
+        return client
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+    def cursor(self, kind):
+        response = self.client.get('/feed/%s/%s/%s' % (self.user, self.team, kind))
+        return json.loads(response.data.decode('utf-8'))['next'] or ''
+
+    #Give a High5 outside the timing, for the delete case, and return its id.
+    def given_high5(self):
+        from app.models import High5
+        self.client.post('/giveHigh5/%s/%s' % (self.user, self.team),
+                         data=dict(receiver=self.members[0], message=u'To be deleted', level=1))
+        return app_db.session.query(High5.id).filter(High5.team_id == self.team_id). \
+            filter(High5.giver_id == self.user_id).order_by(High5.id.desc()).first()[0]
+
+    #Add an outsider to the team outside the timing, for the remove member case, and return their id.
+    def added_member(self):
+        user_id = self.outsiders[self.next() % len(self.outsiders)]
+        self.client.post('/edit/%s/%s' % (self.user, self.team), data=dict(users=[str(user_id)]))
+        return user_id
+
+#Each case is a label and a function of the scenario that returns (client, method, url, data). The function runs
+#before the timing starts, so it can set up what the request needs. Data given as a string is sent as JSON.
+CASES = [
+    ('GET login', lambda s: (app.test_client(), 'GET', '/login', None)),
+    ('POST login', lambda s: (app.test_client(), 'POST', '/login',
+                              dict(user_name=s.user, password='password'))),
+    ('GET register', lambda s: (app.test_client(), 'GET', '/register', None)),
+    ('POST register', lambda s: (app.test_client(), 'POST', '/register',
+                                 dict(user_name=u'bench%d' % s.next(), name=u'Bench User', password='password',
+                                      email=u'bench%d@illinois.edu' % s.counter))),
+    ('GET logout', lambda s: (s.login(app.test_client()), 'GET', '/logout', None)),
+    ('GET index', lambda s: (s.client, 'GET', '/index/' + s.user, None)),
+    ('GET index ?q', lambda s: (s.client, 'GET', '/index/%s?q=synthetic00' % s.user, None)),
+    ('POST index (create team)', lambda s: (s.client, 'POST', '/index/' + s.user,
+                                            dict(team_name=s.created_teams.append(u'Bench Team %d' % s.next()) or
+                                                 s.created_teams[-1], team_members=[str(s.outsiders[0])]))),
+    ('GET users/search', lambda s: (s.client, 'GET', '/users/search?q=synthetic00&team=' + s.team, None)),
+    ('POST notifications', lambda s: (s.client, 'POST', '/notifications/' + s.user,
+                                      dict(notify_pref=['immediate', 'daily'][s.next() % 2]))),
+    ('GET team', lambda s: (s.client, 'GET', '/team/%s/%s' % (s.user, s.team), None)),
+    ('GET team ?window', lambda s: (s.client, 'GET', '/team/%s/%s?window=month' % (s.user, s.team), None)),
+    ('GET team ?cursor', lambda s: (s.client, 'GET', '/team/%s/%s?cursor=%s' % (s.user, s.team, s.cursor('team')),
+                                    None)),
+    ('GET search', lambda s: (s.client, 'GET', '/search/%s/%s?q=thanks+release' % (s.user, s.team), None)),
+    ('GET giveHigh5', lambda s: (s.client, 'GET', '/giveHigh5/%s/%s' % (s.user, s.team), None)),
+    ('POST giveHigh5', lambda s: (s.client, 'POST', '/giveHigh5/%s/%s' % (s.user, s.team),
+                                  dict(receiver=s.members[s.next() % len(s.members)], message=u'Thanks for the help',
+                                       level=3))),
+    ('GET user', lambda s: (s.client, 'GET', '/user/%s/%s' % (s.user, s.team), None)),
+    ('GET feed team', lambda s: (s.client, 'GET', '/feed/%s/%s/team?cursor=%s' % (s.user, s.team, s.cursor('team')),
+                                 None)),
+    ('GET feed received', lambda s: (s.client, 'GET', '/feed/%s/%s/received' % (s.user, s.team), None)),
+    ('GET feed given', lambda s: (s.client, 'GET', '/feed/%s/%s/given' % (s.user, s.team), None)),
+    ('GET edit', lambda s: (s.client, 'GET', '/edit/%s/%s' % (s.user, s.team), None)),
+    ('GET edit ?q', lambda s: (s.client, 'GET', '/edit/%s/%s?q=synthetic00' % (s.user, s.team), None)),
+    ('POST edit (add member)', lambda s: (s.client, 'POST', '/edit/%s/%s' % (s.user, s.team),
+                                          dict(users=[str(s.outsiders[s.next() % len(s.outsiders)])]))),
+    ('POST edit (remove member)', lambda s: (s.client, 'POST', '/edit/%s/%s' % (s.user, s.team),
+                                             dict(team_members=[str(s.added_member())]))),
+    ('GET editHigh5', lambda s: (s.client, 'GET', '/editHigh5/%s/%s/%d' % (s.user, s.team, s.high5_id), None)),
+    ('POST editHigh5', lambda s: (s.client, 'POST', '/editHigh5/%s/%s/%d' % (s.user, s.team, s.high5_id),
+                                  dict(comment_update=u'Thanks again %d' % s.next()))),
+    ('POST deleteHigh5', lambda s: (s.client, 'POST', '/deleteHigh5/%s/%s/%d' % (s.user, s.team, s.given_high5()),
+                                    {})),
+    ('GET delete (team)', lambda s: (s.client, 'GET', '/delete/%s/%s' % (s.user, s.created_teams.pop()), None)),
+    ('GET metrics', lambda s: (app.test_client(), 'GET', '/metrics', None)),
+    ('POST api high5s (20)', lambda s: (s.client, 'POST', '/api/teams/%s/high5s' % s.team, json.dumps(dict(
+        high5s=[dict(receiver=receiver, message=u'Thanks for the help', level=3) for receiver in s.members[:20]])))),
+    ('GET api teams', lambda s: (s.client, 'GET', '/api/teams?team=' + s.team, None)),
+    ('GET api profile', lambda s: (s.client, 'GET', '/api/profile', None)),
+    ('GET export', lambda s: (s.client, 'GET', '/export/%s/%s' % (s.user, s.team), None)),
+]
+
+#Make the dataset in a temporary directory and pick the busiest team and its admin.
+def setup(size, directory):
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'high5_app.db')
+    app.config['WHOOSH_BASE'] = os.path.join(directory, 'search.db')
+    app.config['WTF_CSRF_ENABLED'] = False
+    #The cases repeat requests faster than any user would, see bench/admission_bench.py for admission control
+    app.config['ADMISSION_ENABLED'] = False
+    from sqlalchemy import func
+    from app.migrations import upgrade_database
+    from app.models import Team, High5
+    from app.search import rebuild_index
+    from app.synthetic import generate
+    upgrade_database()
+    generate(*SIZES[size])
+    (team_id,) = app_db.session.query(High5.team_id).group_by(High5.team_id). \
+        order_by(func.count(High5.id).desc()).first()
+    team = Team.query.get(team_id)
+    rebuild_index(team_id)
+    return Scenario(team, team.admin)
+
+#Run every case for the rounds and return {label: [p50, p95, p99, median statements, most statements]}.
+def run(size, rounds):
+    directory = tempfile.mkdtemp()
+    try:
+        scenario = setup(size, directory)
+        adapter = app.url_map.bind('localhost')
+        endpoints = set()
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        results = {}
+        for label, case in CASES:
+            latencies = []
+            counts = []
+            for _ in range(rounds):
+                client, method, url, data = case(scenario)
+                endpoints.add(adapter.match(url.split('?')[0], method)[0])
+                app_db.session.remove()
+                event.listen(Engine, 'before_cursor_execute', count)
+                try:
+                    del statements[:]
+                    start = time.time()
+                    response = client.open(url, method=method, data=data, environ_base={'REMOTE_ADDR': '127.0.0.1'},
+                                           content_type='application/json' if isinstance(data, str) else None)
+                    response.get_data()
+                    latencies.append((time.time() - start) * 1000)
+                finally:
+                    event.remove(Engine, 'before_cursor_execute', count)
+                if response.status_code >= 400:
+                    raise AssertionError('%s %s returned %d' % (method, url, response.status_code))
+                counts.append(len(statements))
+            results[label] = [percentile(latencies, 0.5), percentile(latencies, 0.95), percentile(latencies, 0.99),
+                              percentile(counts, 0.5), max(counts)]
+        missing = sorted(set(app.view_functions) - endpoints - set(['static', 'assets.asset']))
+        return dict(results=results, missing=missing)
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+
+def main(args):
+    if args and args[0] == '--size':
+        print(json.dumps(run(args[1], int(args[2]))))
+        return 0
+    rounds = args[0] if args else '50'
+    sizes = args[1:] or ['small', 'medium']
+    reports = {}
+    for size in sizes:
+        start = time.time()
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--size', size, rounds])
+        reports[size] = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('%s: %d users, %d teams, %d High5\'s, ran in %.0f seconds' % ((size,) + SIZES[size] +
+                                                                           (time.time() - start,)))
+    print('\n%-28s %-7s %9s %9s %9s %6s %6s' % ('route', 'size', 'p50 ms', 'p95 ms', 'p99 ms', 'SQL', 'max'))
+    for label, _ in CASES:
+        for i, size in enumerate(sizes):
+            p50, p95, p99, median, most = reports[size]['results'][label]
+            print('%-28s %-7s %9.2f %9.2f %9.2f %6d %6d' % (label if i == 0 else '', size, p50, p95, p99, median,
+                                                            most))
+    for size in sizes:
+        if reports[size]['missing']:
+            print('No case for %s' % ', '.join(reports[size]['missing']))
+            break
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
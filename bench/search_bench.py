@@ -0,0 +1,81 @@
+#!flask/bin/python
+import bisect
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app import app
+from app.search import get_index, search_high5s
+
+'''
+Benchmark for the High5 search index.
+    python bench/search_bench.py [high5s] [teams]
+Indexes the given number of made up High5 messages (1,000,000 by default) spread over the teams (100 by default) in a
+temporary WHOOSH_BASE, then times searches within a team for a common word, a rare word, a common word scoped to
+a giver, a common word within a month and a phrase, and reports the median and 95th percentile of each.'''
+
+#Words a High5 might use, most common first. Messages draw from these and a long tail of made up words with Zipf
+#frequencies, so common words match many High5's and rare ones few, as in real text.
+WORDS = ('thanks great job help for the team on release demo review fix build deploy cake coffee meeting design docs '
+         'test bug customer launch support weekend report slides plan code data').split()
+
+def vocabulary(size=20000):
+    words = WORDS + ['word%d' % rank for rank in range(size - len(WORDS))]
+    weights = [1.0 / rank for rank in range(1, size + 1)]
+    total = sum(weights)
+    cumulative = []
+    running = 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+    return words, cumulative
+
+def build(count, teams, users=200):
+    start = time.time()
+    words, cumulative = vocabulary()
+    base = datetime.datetime(2016, 1, 1)
+    rand = random.Random(242)
+    for team in range(teams):
+        writer = get_index(team + 1).writer(limitmb=64)
+        for i in range(team, count, teams):
+            message = u' '.join(words[min(bisect.bisect(cumulative, rand.random()), len(words) - 1)]
+                                for _ in range(12))
+            writer.add_document(id=i, message=message, giver=u'%d' % rand.randrange(users),
+                                receiver=u'%d' % rand.randrange(users), time=base + datetime.timedelta(minutes=i))
+        writer.commit()
+    print('Indexed %d High5\'s in %.1f seconds' % (count, time.time() - start))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def time_search(label, rounds, **kwargs):
+    latencies = []
+    for i in range(rounds):
+        start = time.time()
+        search_high5s(i % 10 + 1, **kwargs)
+        latencies.append((time.time() - start) * 1000)
+    print('%-26s p50 %7.2f ms   p95 %7.2f ms' % (label, percentile(latencies, 0.5), percentile(latencies, 0.95)))
+
+def main(args):
+    count = int(args[0]) if args else 1000000
+    teams = int(args[1]) if len(args) > 1 else 100
+    app.config['WHOOSH_BASE'] = tempfile.mkdtemp()
+    try:
+        build(count, teams)
+        time_search('common word', 50, text=u'release')
+        time_search('rare word', 50, text=u'word500')
+        time_search('common word and giver', 50, text=u'release', giver_id=7)
+        time_search('common word in a month', 50, text=u'release', start=datetime.datetime(2016, 3, 1),
+                    end=datetime.datetime(2016, 3, 31))
+        time_search('phrase', 50, text=u'"great job"')
+    finally:
+        shutil.rmtree(app.config['WHOOSH_BASE'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
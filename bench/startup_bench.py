@@ -0,0 +1,142 @@
+#!flask/bin/python
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+'''
+Cold start of a web worker, with and without gunicorn's --preload, for sizing the number of workers.
+    python bench/startup_bench.py [runs] [workers]
+Each run (5 by default) is a new process that imports the app, timing the libraries and the app's own modules apart,
+and then, as a worker that imported the app itself, requests each page in PAGES for the first and the second time
+against a copy of high5_app.db. Then one process preloads the app like the gunicorn master in gunicorn.conf.py, runs
+before_fork and forks the given number of workers (4 by default), which run after_fork and request the same pages.
+Reports the medians, the memory only each worker holds (what --preload saves is the rest) and whether they are within
+BUDGET.'''
+
+PAGES = ['/login', '/index/John', '/team/John/CS465 Group 17', '/user/John/CS465 Group 17']
+
+#Most milliseconds for importing the app, for a worker's first request to a page and most KB a forked worker may
+#hold on its own after its first requests, which gunicorn.conf.py sizes the workers by as WORKER_KB.
+BUDGET = dict(import_ms=1500, first_request_ms=50, worker_kb=24576)
+
+#The KB of memory this process has written to and shares with no other process. Pages of the database file read
+#through mmap are left out: they stay in the page cache that every worker reads.
+def private_kb():
+    total = 0
+    with open('/proc/self/smaps') as smaps:
+        for line in smaps:
+            if line.startswith('Private_Dirty:'):
+                total += int(line.split()[1])
+    return total
+
+#Request each page twice as John, returning the milliseconds of the first and the second request to each.
+def request_pages(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['user_id'] = str(user_id)
+        client_session['_fresh'] = True
+    times = {}
+    for page in PAGES:
+        for attempt in ['first', 'second']:
+            start = time.time()
+            response = client.get(page, buffered=True)
+            times.setdefault(attempt, {})[page] = (time.time() - start) * 1000
+            assert response.status_code == 200, page
+    return times
+
+def import_app(path):
+    start = time.time()
+    import flask, flask_sqlalchemy, flask_login, flask_mail, flask_wtf, jinja2, sqlalchemy, whoosh
+    libraries = time.time()
+    from app import app
+    done = time.time()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    return app, dict(libraries_ms=(libraries - start) * 1000, app_ms=(done - libraries) * 1000)
+
+#One process importing the app and serving its first requests, like a worker without --preload.
+def run_cold(path, user_id):
+    app, results = import_app(path)
+    results.update(request_pages(app, user_id), kb=private_kb())
+    return results
+
+#One process preloading the app and forking the workers, which each report back over a pipe.
+def run_preloaded(path, user_id, workers):
+    from app import before_fork, after_fork
+    app, results = import_app(path)
+    reports = []
+    for _ in range(workers):
+        before_fork(app)
+        read_end, write_end = os.pipe()
+        start = time.time()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            after_fork(app)
+            report = dict(request_pages(app, user_id), fork_ms=(time.time() - start) * 1000, kb=private_kb())
+            os.write(write_end, json.dumps(report).encode('utf-8'))
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end, 'rb') as reader:
+            reports.append(json.loads(reader.read().decode('utf-8')))
+        os.waitpid(pid, 0)
+    return dict(results, workers=reports)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main(args):
+    if args and args[0] in ('--cold', '--preloaded'):
+        if args[0] == '--cold':
+            results = run_cold(args[1], int(args[2]))
+        else:
+            results = run_preloaded(args[1], int(args[2]), int(args[3]))
+        print(json.dumps(results))
+        return 0
+    runs = int(args[0]) if args else 5
+    workers = args[1] if len(args) > 1 else '4'
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'high5_app.db')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'high5_app.db'), path)
+        connection = sqlite3.connect(path)
+        user_id = connection.execute("SELECT id FROM user WHERE user_name = 'John'").fetchone()[0]
+        connection.close()
+        def run(flag, *extra):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), flag, path, str(user_id)] +
+                                             list(extra))
+            return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        cold = [run('--cold') for _ in range(runs)]
+        preloaded = run('--preloaded', workers)
+    finally:
+        shutil.rmtree(directory)
+    import_ms = median([result['libraries_ms'] + result['app_ms'] for result in cold])
+    print('import: %.0f ms, libraries %.0f ms and app %.0f ms (budget %d ms)' %
+          (import_ms, median([result['libraries_ms'] for result in cold]),
+           median([result['app_ms'] for result in cold]), BUDGET['import_ms']))
+    print('%-34s %13s %13s %13s' % ('page, ms', 'cold first', 'forked first', 'second'))
+    worst = 0
+    for page in PAGES:
+        cold_first = median([result['first'][page] for result in cold])
+        forked_first = median([worker['first'][page] for worker in preloaded['workers']])
+        second = median([result['second'][page] for result in cold])
+        worst = max(worst, forked_first)
+        print('%-34s %13.1f %13.1f %13.1f' % (page, cold_first, forked_first, second))
+    print('worker memory: %d KB on its own without --preload, %d KB forked from a preloaded master (budget %d KB)' %
+          (median([result['kb'] for result in cold]), median([worker['kb'] for worker in preloaded['workers']]),
+           BUDGET['worker_kb']))
+    print('fork to last first request: %.0f ms' % median([worker['fork_ms'] for worker in preloaded['workers']]))
+    over = [name for name, value in [('import_ms', import_ms), ('first_request_ms', worst),
+                                     ('worker_kb', median([worker['kb'] for worker in preloaded['workers']]))]
+            if value > BUDGET[name]]
+    print('over budget: ' + ', '.join(over) if over else 'within budget')
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+#!flask/bin/python
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+'''
+Time to first byte, time to last byte and bytes on the wire of the team and user pages of a large team, with the pages
+streamed or not and compressed or not, see app/streaming.py and app/compression.py.
+    python bench/stream_bench.py [rounds] [size]
+Makes a database of the given size (medium by default, see bench/route_bench.py) and requests the team and user pages
+of the busiest team through the Flask test client the given number of times (20 by default) in each mode, as a browser
+that accepts gzip. Each page is requested with the fragment cache emptied first, which is when the leaderboards and
+the feed are queried and streaming matters, and with it full. Reports the median times and the bytes of the body.'''
+
+MODES = [('whole', False, False), ('whole+gzip', False, True), ('stream', True, False), ('stream+gzip', True, True)]
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+#Request the page, returning the milliseconds until its first body bytes and its last, and the bytes of the body.
+def fetch(client, url):
+    start = time.time()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    first = time.time()
+    size += sum(len(chunk) for chunk in chunks)
+    response.close()
+    assert response.status_code == 200, url
+    return (first - start) * 1000, (time.time() - start) * 1000, size
+
+def main(args):
+    rounds = int(args[0]) if args else 20
+    size = args[1] if len(args) > 1 else 'medium'
+    from route_bench import setup
+    from app import app, app_db, page_cache
+    from app.page_cache import LocalCache
+    directory = tempfile.mkdtemp()
+    try:
+        s = setup(size, directory)
+        pages = [('team', '/team/%s/%s' % (s.user, s.team)), ('user', '/user/%s/%s' % (s.user, s.team))]
+        print('%-6s %-12s %-6s %12s %12s %10s' % ('page', 'mode', 'cache', 'first byte', 'last byte', 'bytes'))
+        for page, url in pages:
+            for mode, stream, compress in MODES:
+                app.config['STREAM_PAGES'], app.config['COMPRESS_ENABLED'] = stream, compress
+                for cache in ['cold', 'warm']:
+                    results = []
+                    for _ in range(rounds):
+                        if cache == 'cold':
+                            page_cache.cache = LocalCache(app.config['PAGE_CACHE_SIZE'])
+                        results.append(fetch(s.client, url))
+                    print('%-6s %-12s %-6s %9.2f ms %9.2f ms %10d' % (
+                        page, mode, cache, median([result[0] for result in results]),
+                        median([result[1] for result in results]), median([result[2] for result in results])))
+    finally:
+        app_db.session.remove()
+        app_db.get_engine(app).dispose()
+        shutil.rmtree(directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
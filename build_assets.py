@@ -0,0 +1,28 @@
+#!flask/bin/python
+import os
+import sys
+import time
+from config import basedir, ASSET_BUILD_DIR, ASSET_IMAGE_WIDTHS
+from app import assets
+
+'''
+Build the fingerprinted static assets the web process serves, see app/assets.py.
+    python build_assets.py
+Run it before starting the web process on each deploy; the Procfile does. Files of earlier builds are kept, so pages
+rendered before the deploy still find theirs.'''
+
+def main(args):
+    start = time.time()
+    manifest = assets.build_assets(os.path.join(basedir, 'app', 'static'), ASSET_BUILD_DIR, ASSET_IMAGE_WIDTHS)
+    files = manifest['files'].values()
+    print('Built %d files into %s in %.1f seconds: %d with gzip, %d with brotli, %d images with renditions.' %
+          (len(files), ASSET_BUILD_DIR, time.time() - start, sum(1 for entry in files if 'gzip' in entry['encodings']),
+           sum(1 for entry in files if 'br' in entry['encodings']), sum(1 for entry in files if entry['widths'])))
+    if assets.brotli is None:
+        print('The brotli package is not installed, so no brotli variants were made.')
+    if assets.Image is None:
+        print('Pillow is not installed, so no image renditions were made.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -7,6 +7,19 @@ WTF_CSRF_SECRET_KEY = 'z9y8x7w6v5u4t3s2r1'
 
 SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'high5_app.db')
 
+# database engines, see app/database.py
+SQLALCHEMY_ROUTE_READS = True         # send read queries to their own pool of connections
+SQLALCHEMY_READ_DATABASE_URI = None   # read replica of a server database, SQLite reads the main file
+SQLITE_WAL = True                     # write ahead log, so reads do not wait for writes
+SQLITE_BUSY_TIMEOUT = 5000            # milliseconds a connection waits for a lock held by another process
+SQLITE_MMAP_SIZE = 268435456          # bytes of the database file read through memory mapped I/O
+SQLITE_READ_POOL_SIZE = 8             # read connections kept open per process
+SQLITE_READ_POOL_OVERFLOW = 8         # extra read connections opened under load
+SQLITE_WRITE_TIMEOUT = 30             # seconds a request waits for the single writer connection
+
+# schema migrations, see app/migrations.py
+SQLALCHEMY_MIGRATE_REPO = os.path.join(basedir, 'db_repository')
+
 # email server
 MAIL_SERVER = 'smtp.googlemail.com'
 MAIL_PORT = 465
@@ -16,4 +29,102 @@ MAIL_USERNAME = 'high5.vpeters2'
 MAIL_PASSWORD = 'high5CS242'
 
 # administrator list
-ADMINS = ['high5.vpeters2@gmail.com']
\ No newline at end of file
+ADMINS = ['high5.vpeters2@gmail.com']
+
+# email outbox worker, see app/outbox.py
+OUTBOX_BATCH_SIZE = 50          # notifications sent over one SMTP connection
+OUTBOX_MAX_ATTEMPTS = 6         # attempts before a notification is marked dead
+OUTBOX_RETRY_DELAY = 30         # seconds before the first retry, doubled after every failed attempt
+OUTBOX_MAX_RETRY_DELAY = 3600   # longest wait between two attempts
+OUTBOX_LEASE = 300              # seconds a claimed notification stays hidden from other workers while it is sent
+OUTBOX_POLL_INTERVAL = 5        # seconds the worker sleeps when the outbox is empty
+
+# password hashing, see app/passwords.py
+PASSWORD_HASHER = 'pbkdf2_sha512'   # or 'scrypt' where hashlib supports it
+PASSWORD_PBKDF2_ITERATIONS = 100000
+PASSWORD_SCRYPT_COST = (16384, 8, 1)  # n, r, p
+PASSWORD_HASH_THREADS = 4             # threads hashing passwords for the requests of a process, set per worker by
+                                      # gunicorn.conf.py so all the workers have about one per CPU core
+
+# logged in user cache, see app/identity_cache.py
+USER_CACHE_SIZE = 1000   # users kept per worker process
+USER_CACHE_TTL = 300     # seconds before a cached user is loaded again
+
+# type-ahead user search, see search_users in app/membership.py
+USER_SEARCH_LIMIT = 10   # users returned when the request does not ask for a number
+USER_SEARCH_MAX = 25     # most users one search returns
+
+# full text search over High5 messages, see app/search.py
+WHOOSH_BASE = os.path.join(basedir, 'search.db')
+
+# request metrics and the slow request log, see app/metrics.py
+METRICS_ENABLED = True          # count statements and time SQL and templates per request, served at /metrics
+METRICS_ADDRESSES = ('127.0.0.1', '::1')    # client addresses /metrics is served to without METRICS_TOKEN
+METRICS_TOKEN = None            # bearer token a scraper elsewhere sends as 'Authorization: Bearer <token>'
+SLOW_REQUEST_SECONDS = 0.5      # requests at least this slow are written to the high5.slow_requests log
+SLOW_REQUEST_STATEMENTS = 20    # slowest statements included in a slow request's log line
+SLOW_REQUEST_LOG = None         # file the slow request log is appended to, as well as any logging set up elsewhere
+
+# team and user page caching, see app/page_cache.py
+PAGE_CACHE_SIZE = 2000      # rendered fragments kept per worker process
+PAGE_CACHE_SERVER = None    # host:port of a memcached server shared by every worker, used instead of PAGE_CACHE_SIZE
+
+# JSON API, see app/api.py
+API_BATCH_MAX = 100    # High5's one request can give
+API_TEAMS_MAX = 20     # teams one request can fetch
+
+# live team feeds, see app/live.py
+LIVE_URL = 'http://localhost:5001/live'     # where browsers open the team feeds, LIVE_ADDRESS behind any proxy
+LIVE_ADDRESS = '127.0.0.1:5001'             # host:port live_server.py accepts browsers on
+LIVE_PUBLISH_ADDRESS = '127.0.0.1:5002'     # host:port the web workers send events to, None for the hub of each process
+LIVE_ORIGINS = ['http://localhost:5000']    # sites whose pages may open the feeds, with the session cookie
+LIVE_HEARTBEAT = 15                         # seconds between the comments that keep idle connections open
+LIVE_REPLAY = 100                           # events kept per team for browsers that reconnect
+LIVE_QUEUE_MAX = 200                        # events waiting for a slow browser before it is disconnected
+
+# High5 history exports, see app/export.py
+EXPORT_BATCH_SIZE = 1000    # rows fetched from the database and written out at a time
+
+# bulk imports of users, teams and members from CSV, see app/bulk_import.py
+IMPORT_BATCH_SIZE = 1000      # rows per INSERT statement
+IMPORT_HASH_PROCESSES = None  # processes hashing the passwords of imported users, None for one per CPU core
+IMPORT_ADMINS = []            # user names allowed to import through /api/import, import_csv.py is not limited
+IMPORT_MAX_ROWS = 5000        # rows one /api/import request can send, import_csv.py is not limited
+IMPORT_MAX_USERS = 100        # rows of users one /api/import request can send: their passwords are hashed in the
+                              # request, 0.1 to 0.2 s each per core, and must be done within gunicorn's timeout
+
+# proxies in front of the app that add to X-Forwarded-For, 1 behind the Heroku router; admission control and /metrics
+# then see the client's address instead of the proxy's, see app/__init__.py. Leave at 0 when clients reach the app
+# directly, or they could claim any address
+TRUSTED_PROXIES = 0
+
+# admission control of the expensive routes, see app/admission.py
+ADMISSION_ENABLED = True
+# file the workers of a host share limits in, or None for a new one for each app, which the workers gunicorn forks from
+# the preloaded app share; set a path when each worker imports the app itself
+ADMISSION_STORE = None
+ADMISSION_BUCKETS = 16384      # users and addresses whose token buckets are kept, 16 bytes each
+ADMISSION_RETRY_AFTER = 1      # seconds a request turned away as busy is told to wait
+# each limited endpoint: (methods or None for all, requests served at once per host or None for no limit, requests
+# per second per user and burst or None for no per user limit)
+ADMISSION_ROUTES = {
+    'pages.login': (['POST'], 8, 1.0, 20),              # hashes a password, about a core each
+    'pages.register': (['POST'], 4, 0.1, 5),            # hashes a password
+    'pages.giveHigh5': (['POST'], 16, 1.0, 30),
+    'pages.team': (None, 32, None, None),
+    'api.api_give_high5s': (None, 8, 0.5, 10),          # up to API_BATCH_MAX High5's each
+    'api.api_import': (None, 1, None, None),
+}
+
+# fingerprinted static assets, see app/assets.py and build_assets.py
+ASSET_BUILD_DIR = os.path.join(basedir, 'assets')   # where build_assets.py writes the built files and manifest.json
+ASSET_MAX_AGE = 31536000                            # seconds browsers keep a fingerprinted file, a year
+ASSET_IMAGE_WIDTHS = [320, 640]                     # widths of the smaller renditions of each image, with Pillow
+
+# streamed pages and compressed responses, see app/streaming.py and app/compression.py
+STREAM_PAGES = True         # send the team and user pages as they render, the header before the leaderboards and feed
+COMPRESS_ENABLED = True     # gzip responses for the browsers that accept it
+COMPRESS_LEVEL = 6          # 1 is the fastest, 9 the smallest
+COMPRESS_MIN_SIZE = 1024    # bytes a response given in one piece needs to be compressed, streamed ones always are
+COMPRESS_MIMETYPES = ['text/html', 'text/plain', 'text/css', 'text/csv', 'application/json', 'application/x-ndjson',
+                      'application/javascript']
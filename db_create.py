@@ -1,22 +1,29 @@
 #!flask/bin/python
-#from migrate.versioning import api
-from config import SQLALCHEMY_DATABASE_URI
-from config import SQLALCHEMY_MIGRATE_REPO
+import sys
 from app import app_db
 from app import db_add_team
-import os
+from app.models import User
+from app.migrations import upgrade_database
+from app.stats import rebuild_member_stats, rebuild_daily_stats
 
-#Delete the database if it already exists
-os.system('rm high5_app.db')
+'''
+Create the database, or upgrade an existing one to the newest schema in place without losing its data, see
+app/migrations.py.
+    python db_create.py
+A database without any users is filled with made up users and teams.'''
 
-#Create the database and fill it with made up users and teams initially.
-app_db.create_all()
-db_add_team.create_users()
-db_add_team.create_running_team()
-db_add_team.create_project_team()
+def main(args):
+    version = upgrade_database()
+    if User.query.first() is None:
+        db_add_team.create_users()
+        db_add_team.create_running_team()
+        db_add_team.create_project_team()
+        rebuild_member_stats()
+        rebuild_daily_stats()
+        app_db.session.commit()
+        print('Added the made up users and teams.')
+    print('Database is at version %d.' % version)
+    return 0
 
-# if not os.path.exists(SQLALCHEMY_MIGRATE_REPO):
-#     api.create(SQLALCHEMY_MIGRATE_REPO, 'database repository')
-#     api.version_control(SQLALCHEMY_DATABASE_URI, SQLALCHEMY_MIGRATE_REPO)
-# else:
-#     api.version_control(SQLALCHEMY_DATABASE_URI, SQLALCHEMY_MIGRATE_REPO, api.version(SQLALCHEMY_MIGRATE_REPO))
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
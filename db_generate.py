@@ -0,0 +1,31 @@
+#!flask/bin/python
+import os
+import sys
+import time
+from app import app
+
+'''
+Fill a database with made up users, teams and High5's at production scale, see app/synthetic.py.
+    python db_generate.py users teams high5s [database file] [--index]
+Adds to the database in config.py, or to the given SQLite file, which is made or upgraded to the newest schema first.
+With --index the search index is rebuilt as well. Every made up user logs in with the password "password".'''
+
+def main(args):
+    index = '--index' in args
+    args = [arg for arg in args if arg != '--index']
+    if len(args) not in (3, 4) or not all(arg.isdigit() for arg in args[:3]):
+        print('usage: db_generate.py users teams high5s [database file] [--index]')
+        return 2
+    if len(args) == 4:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(args[3])
+    from app.migrations import upgrade_database
+    from app.synthetic import generate
+    upgrade_database()
+    start = time.time()
+    made = generate(int(args[0]), int(args[1]), int(args[2]), index=index)
+    print('Added %(users)d users, %(teams)d teams, %(members)d members and %(high5s)d High5\'s' % made +
+          ' in %.1f seconds.' % (time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,27 @@
+#!flask/bin/python
+import sys
+from app.migrations import database_version, latest_version, upgrade_database, downgrade_database
+
+'''
+Maintenance command for the database schema, see app/migrations.py.
+    python db_migrate.py version              print the version of the database and the newest version
+    python db_migrate.py upgrade [version]    upgrade in place, to the newest version by default
+    python db_migrate.py downgrade version    downgrade to an older version'''
+
+def main(args):
+    if not args or args[0] not in ('version', 'upgrade', 'downgrade') or (args[0] == 'downgrade' and len(args) < 2):
+        print('usage: db_migrate.py version|upgrade [version]|downgrade version')
+        return 2
+    if args[0] == 'version':
+        print('Database is at version %s, the newest is %d.' % (database_version(), latest_version()))
+        return 0
+    version = int(args[1]) if len(args) > 1 else None
+    if args[0] == 'upgrade':
+        version = upgrade_database(version)
+    else:
+        version = downgrade_database(version)
+    print('Database is at version %d.' % version)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+from sqlalchemy import *
+from sqlalchemy.engine.reflection import Inspector
+from migrate import *
+
+'''
+The schema from before the database was under version control. A new database gets every table. A database made by
+an older db_create.py gets the tables, columns and indexes it is missing, and what it already has is left alone. The
+stat tables of an older database start out empty, so run db_stats.py rebuild and search_index.py rebuild after
+upgrading one. Downgrading drops every table.'''
+
+meta = MetaData()
+
+user = Table('user', meta,
+             Column('id', Integer, primary_key=True),
+             Column('user_name', String(50), unique=True),
+             Column('name', String(50)),
+             Column('email', String(120), unique=True),
+             Column('_password', LargeBinary(120)),
+             Column('_salt', String(120)),
+             Column('notify_pref', String(10), nullable=False, server_default='immediate'),
+             Column('version', Integer, nullable=False, server_default='1'),
+             Index('ix_user_name_1', 'name'))
+
+team = Table('team', meta,
+             Column('name', String(100), primary_key=True),
+             Column('admin', String(50), ForeignKey('user.user_name', ondelete='CASCADE')))
+
+members = Table('members', meta,
+                Column('team', String(100), ForeignKey('team.name', ondelete='CASCADE')),
+                Column('user', Integer, ForeignKey('user.id', ondelete='CASCADE')),
+                UniqueConstraint('team', 'user', name='UC_team_user'))
+
+high5 = Table('high5', meta,
+              Column('id', Integer, primary_key=True),
+              Column('receiver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')),
+              Column('giver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')),
+              Column('message', String(250)),
+              Column('time_posted', DateTime),
+              Column('level', Integer),
+              Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE')),
+              Index('ix_high5_team_feed', 'team_name', 'time_posted', 'id'),
+              Index('ix_high5_team_receiver_feed', 'team_name', 'receiver', 'time_posted', 'id'),
+              Index('ix_high5_team_giver_feed', 'team_name', 'giver', 'time_posted', 'id'))
+
+member_stat = Table('member_stat', meta,
+                    Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE'), primary_key=True),
+                    Column('user_name', String(50), ForeignKey('user.user_name', ondelete='CASCADE'),
+                           primary_key=True),
+                    Column('score', Integer, nullable=False),
+                    Column('received', Integer, nullable=False),
+                    Column('given', Integer, nullable=False),
+                    Index('ix_member_stat_team_score', 'team_name', 'score'),
+                    Index('ix_member_stat_team_received', 'team_name', 'received'),
+                    Index('ix_member_stat_team_given', 'team_name', 'given'))
+
+daily_stat = Table('daily_stat', meta,
+                   Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE'), primary_key=True),
+                   Column('user_name', String(50), ForeignKey('user.user_name', ondelete='CASCADE'),
+                          primary_key=True),
+                   Column('day', Date, primary_key=True),
+                   Column('score', Integer, nullable=False),
+                   Column('received', Integer, nullable=False),
+                   Column('given', Integer, nullable=False),
+                   Index('ix_daily_stat_team_day', 'team_name', 'day'))
+
+notification = Table('notification', meta,
+                     Column('id', Integer, primary_key=True),
+                     Column('receiver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')),
+                     Column('giver', String(50)),
+                     Column('message', String(250)),
+                     Column('team_name', String(100)),
+                     Column('mode', String(10), nullable=False),
+                     Column('status', String(10), nullable=False),
+                     Column('attempts', Integer, nullable=False),
+                     Column('next_attempt', DateTime, nullable=False),
+                     Column('last_error', String(250)),
+                     Column('created', DateTime),
+                     Column('sent', DateTime),
+                     Index('ix_notification_due', 'status', 'next_attempt'))
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    inspector = Inspector.from_engine(migrate_engine)
+    existing = inspector.get_table_names()
+    for table in meta.sorted_tables:
+        if table.name not in existing:
+            table.create()
+            continue
+        columns = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in columns:
+                column.create()
+        indexes = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create()
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    meta.drop_all()
@@ -0,0 +1,25 @@
+from sqlalchemy import *
+from migrate import *
+
+'''
+Index the members table by user, for the list of a user's teams on the index page. The unique constraint on
+(team, user) only finds the members of a team, so without it the list scans every team. The team is in the index too,
+so the list reads the user's team names from the index alone.'''
+
+meta = MetaData()
+
+members = Table('members', meta,
+                Column('team', String(100)),
+                Column('user', Integer))
+
+ix_members_user = Index('ix_members_user', members.c.user, members.c.team)
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    ix_members_user.create()
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    ix_members_user.drop()
@@ -0,0 +1,210 @@
+from sqlalchemy import *
+from sqlalchemy.engine.reflection import Inspector
+from migrate import *
+
+'''
+Give teams an integer id and refer to teams and users by id everywhere: the team admin, the members, the giver,
+receiver and team of a High5, the keys of the stat tables and the receiver of a notification. SQLite cannot change a
+column's type in place, so each table is renamed, made again with the new columns and filled from the renamed table,
+which is then dropped. Teams are numbered in order of name. Member and stat rows of users or teams that no longer exist
+are dropped, while a High5 or notification keeps its row with a NULL in place of a user or team that is gone.
+Downgrading turns the ids back into names the same way. The search index names its directories by team id, so run
+search_index.py rebuild after upgrading or downgrading.'''
+
+#The tables that are made again, in an order where a table comes after the tables it refers to.
+TABLES = ['team', 'members', 'high5', 'member_stat', 'daily_stat', 'notification']
+
+
+def _user(meta):
+    return Table('user', meta,
+                 Column('id', Integer, primary_key=True),
+                 Column('user_name', String(50), unique=True))
+
+
+def _notification(meta, receiver):
+    return Table('notification', meta,
+                 Column('id', Integer, primary_key=True),
+                 receiver,
+                 Column('giver', String(50)),
+                 Column('message', String(250)),
+                 Column('team_name', String(100)),
+                 Column('mode', String(10), nullable=False),
+                 Column('status', String(10), nullable=False),
+                 Column('attempts', Integer, nullable=False),
+                 Column('next_attempt', DateTime, nullable=False),
+                 Column('last_error', String(250)),
+                 Column('created', DateTime),
+                 Column('sent', DateTime),
+                 Index('ix_notification_due', 'status', 'next_attempt'))
+
+new_meta = MetaData()
+_user(new_meta)
+
+Table('team', new_meta,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(100), unique=True, nullable=False),
+      Column('admin_id', Integer, ForeignKey('user.id', ondelete='CASCADE')))
+
+Table('members', new_meta,
+      Column('team_id', Integer, ForeignKey('team.id', ondelete='CASCADE'), nullable=False),
+      Column('user_id', Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False),
+      UniqueConstraint('team_id', 'user_id', name='UC_team_user'),
+      Index('ix_members_user', 'user_id', 'team_id'))
+
+Table('high5', new_meta,
+      Column('id', Integer, primary_key=True),
+      Column('receiver_id', Integer, ForeignKey('user.id', ondelete='CASCADE')),
+      Column('giver_id', Integer, ForeignKey('user.id', ondelete='CASCADE')),
+      Column('message', String(250)),
+      Column('time_posted', DateTime),
+      Column('level', Integer),
+      Column('team_id', Integer, ForeignKey('team.id', ondelete='CASCADE')),
+      Index('ix_high5_team_feed', 'team_id', 'time_posted', 'id'),
+      Index('ix_high5_team_receiver_feed', 'team_id', 'receiver_id', 'time_posted', 'id'),
+      Index('ix_high5_team_giver_feed', 'team_id', 'giver_id', 'time_posted', 'id'))
+
+Table('member_stat', new_meta,
+      Column('team_id', Integer, ForeignKey('team.id', ondelete='CASCADE'), primary_key=True),
+      Column('user_id', Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+      Column('score', Integer, nullable=False),
+      Column('received', Integer, nullable=False),
+      Column('given', Integer, nullable=False),
+      Index('ix_member_stat_team_score', 'team_id', 'score'),
+      Index('ix_member_stat_team_received', 'team_id', 'received'),
+      Index('ix_member_stat_team_given', 'team_id', 'given'))
+
+Table('daily_stat', new_meta,
+      Column('team_id', Integer, ForeignKey('team.id', ondelete='CASCADE'), primary_key=True),
+      Column('user_id', Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+      Column('day', Date, primary_key=True),
+      Column('score', Integer, nullable=False),
+      Column('received', Integer, nullable=False),
+      Column('given', Integer, nullable=False),
+      Index('ix_daily_stat_team_day', 'team_id', 'day'))
+
+_notification(new_meta, Column('receiver_id', Integer, ForeignKey('user.id', ondelete='CASCADE')))
+
+old_meta = MetaData()
+_user(old_meta)
+
+Table('team', old_meta,
+      Column('name', String(100), primary_key=True),
+      Column('admin', String(50), ForeignKey('user.user_name', ondelete='CASCADE')))
+
+Table('members', old_meta,
+      Column('team', String(100), ForeignKey('team.name', ondelete='CASCADE')),
+      Column('user', Integer, ForeignKey('user.id', ondelete='CASCADE')),
+      UniqueConstraint('team', 'user', name='UC_team_user'),
+      Index('ix_members_user', 'user', 'team'))
+
+Table('high5', old_meta,
+      Column('id', Integer, primary_key=True),
+      Column('receiver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')),
+      Column('giver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')),
+      Column('message', String(250)),
+      Column('time_posted', DateTime),
+      Column('level', Integer),
+      Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE')),
+      Index('ix_high5_team_feed', 'team_name', 'time_posted', 'id'),
+      Index('ix_high5_team_receiver_feed', 'team_name', 'receiver', 'time_posted', 'id'),
+      Index('ix_high5_team_giver_feed', 'team_name', 'giver', 'time_posted', 'id'))
+
+Table('member_stat', old_meta,
+      Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE'), primary_key=True),
+      Column('user_name', String(50), ForeignKey('user.user_name', ondelete='CASCADE'), primary_key=True),
+      Column('score', Integer, nullable=False),
+      Column('received', Integer, nullable=False),
+      Column('given', Integer, nullable=False),
+      Index('ix_member_stat_team_score', 'team_name', 'score'),
+      Index('ix_member_stat_team_received', 'team_name', 'received'),
+      Index('ix_member_stat_team_given', 'team_name', 'given'))
+
+Table('daily_stat', old_meta,
+      Column('team_name', String(100), ForeignKey('team.name', ondelete='CASCADE'), primary_key=True),
+      Column('user_name', String(50), ForeignKey('user.user_name', ondelete='CASCADE'), primary_key=True),
+      Column('day', Date, primary_key=True),
+      Column('score', Integer, nullable=False),
+      Column('received', Integer, nullable=False),
+      Column('given', Integer, nullable=False),
+      Index('ix_daily_stat_team_day', 'team_name', 'day'))
+
+_notification(old_meta, Column('receiver', String(50), ForeignKey('user.user_name', ondelete='CASCADE')))
+
+#Statements that fill each new table from the renamed old one, which has the suffix _old.
+UPGRADE = [
+    'INSERT INTO team (name, admin_id) SELECT t.name, u.id FROM team_old t '
+    'LEFT JOIN user u ON u.user_name = t.admin ORDER BY t.name',
+    'INSERT INTO members (team_id, user_id) SELECT t.id, u.id FROM members_old m '
+    'JOIN team t ON t.name = m.team JOIN user u ON u.id = m.user',
+    'INSERT INTO high5 (id, receiver_id, giver_id, message, time_posted, level, team_id) '
+    'SELECT h.id, r.id, g.id, h.message, h.time_posted, h.level, t.id FROM high5_old h '
+    'LEFT JOIN user r ON r.user_name = h.receiver LEFT JOIN user g ON g.user_name = h.giver '
+    'LEFT JOIN team t ON t.name = h.team_name',
+    'INSERT INTO member_stat (team_id, user_id, score, received, given) '
+    'SELECT t.id, u.id, s.score, s.received, s.given FROM member_stat_old s '
+    'JOIN team t ON t.name = s.team_name JOIN user u ON u.user_name = s.user_name',
+    'INSERT INTO daily_stat (team_id, user_id, day, score, received, given) '
+    'SELECT t.id, u.id, s.day, s.score, s.received, s.given FROM daily_stat_old s '
+    'JOIN team t ON t.name = s.team_name JOIN user u ON u.user_name = s.user_name',
+    'INSERT INTO notification (id, receiver_id, giver, message, team_name, mode, status, attempts, next_attempt, '
+    'last_error, created, sent) SELECT n.id, u.id, n.giver, n.message, n.team_name, n.mode, n.status, n.attempts, '
+    'n.next_attempt, n.last_error, n.created, n.sent FROM notification_old n '
+    'LEFT JOIN user u ON u.user_name = n.receiver']
+
+DOWNGRADE = [
+    'INSERT INTO team (name, admin) SELECT t.name, u.user_name FROM team_old t '
+    'LEFT JOIN user u ON u.id = t.admin_id',
+    'INSERT INTO members (team, user) SELECT t.name, m.user_id FROM members_old m '
+    'JOIN team_old t ON t.id = m.team_id',
+    'INSERT INTO high5 (id, receiver, giver, message, time_posted, level, team_name) '
+    'SELECT h.id, r.user_name, g.user_name, h.message, h.time_posted, h.level, t.name FROM high5_old h '
+    'LEFT JOIN user r ON r.id = h.receiver_id LEFT JOIN user g ON g.id = h.giver_id '
+    'LEFT JOIN team_old t ON t.id = h.team_id',
+    'INSERT INTO member_stat (team_name, user_name, score, received, given) '
+    'SELECT t.name, u.user_name, s.score, s.received, s.given FROM member_stat_old s '
+    'JOIN team_old t ON t.id = s.team_id JOIN user u ON u.id = s.user_id',
+    'INSERT INTO daily_stat (team_name, user_name, day, score, received, given) '
+    'SELECT t.name, u.user_name, s.day, s.score, s.received, s.given FROM daily_stat_old s '
+    'JOIN team_old t ON t.id = s.team_id JOIN user u ON u.id = s.user_id',
+    'INSERT INTO notification (id, receiver, giver, message, team_name, mode, status, attempts, next_attempt, '
+    'last_error, created, sent) SELECT n.id, u.user_name, n.giver, n.message, n.team_name, n.mode, n.status, '
+    'n.attempts, n.next_attempt, n.last_error, n.created, n.sent FROM notification_old n '
+    'LEFT JOIN user u ON u.id = n.receiver_id']
+
+
+#Rename the tables out of the way, make them again from meta, copy the rows over with the statements and drop the
+#renamed tables, all in one transaction, so a statement that fails leaves the database as it was. Indexes keep their
+#names when their table is renamed, so they are dropped first. pysqlite commits on its own before each DDL statement, so
+#on SQLite it is told to leave the transaction to us and the transaction is begun with an explicit BEGIN.
+def _rebuild(migrate_engine, meta, statements):
+    connection = migrate_engine.connect()
+    sqlite = connection.connection.connection if migrate_engine.name == 'sqlite' else None
+    try:
+        if sqlite is not None:
+            isolation_level, sqlite.isolation_level = sqlite.isolation_level, None
+        with connection.begin():
+            if sqlite is not None:
+                connection.execute('BEGIN')
+            inspector = Inspector.from_engine(connection)
+            for name in TABLES:
+                for index in inspector.get_indexes(name):
+                    connection.execute('DROP INDEX "%s"' % index['name'])
+                connection.execute('ALTER TABLE "%s" RENAME TO "%s_old"' % (name, name))
+            for name in TABLES:
+                meta.tables[name].create(connection)
+            for statement in statements:
+                connection.execute(statement)
+            for name in reversed(TABLES):
+                connection.execute('DROP TABLE "%s_old"' % name)
+    finally:
+        if sqlite is not None:
+            sqlite.isolation_level = isolation_level
+        connection.close()
+
+
+def upgrade(migrate_engine):
+    _rebuild(migrate_engine, new_meta, UPGRADE)
+
+
+def downgrade(migrate_engine):
+    _rebuild(migrate_engine, old_meta, DOWNGRADE)
@@ -0,0 +1,36 @@
+from sqlalchemy import *
+from migrate import *
+
+'''
+Give every team a version, which goes up by one on each write that changes what its pages show, and the time of the
+last such write. The page cache in app/page_cache.py keys rendered fragments and ETags by the version and sends the
+time as Last-Modified. Existing teams start at version 1, modified when their newest High5 was posted, or now when
+they have none.'''
+
+meta = MetaData()
+
+Table('user', meta,
+      Column('id', Integer, primary_key=True))
+
+team = Table('team', meta,
+             Column('id', Integer, primary_key=True),
+             Column('name', String(100), unique=True, nullable=False),
+             Column('admin_id', Integer, ForeignKey('user.id', ondelete='CASCADE')))
+
+version = Column('version', Integer, nullable=False, server_default='1')
+modified = Column('modified', DateTime)
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    version.create(team)
+    modified.create(team)
+    migrate_engine.execute('UPDATE team SET modified = '
+                           '(SELECT max(time_posted) FROM high5 WHERE high5.team_id = team.id)')
+    migrate_engine.execute('UPDATE team SET modified = CURRENT_TIMESTAMP WHERE modified IS NULL')
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    team.c.modified.drop()
+    team.c.version.drop()
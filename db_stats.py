@@ -0,0 +1,39 @@
+#!flask/bin/python
+import sys
+from app import app_db
+from app.models import Team
+from app.stats import rebuild_member_stats, verify_member_stats, rebuild_daily_stats, verify_daily_stats
+
+'''
+Maintenance command for the member_stat and daily_stat tables behind the team leaderboards.
+    python db_stats.py rebuild [team_name]   recompute (backfill) both tables from the members and High5 tables
+    python db_stats.py verify [team_name]    report any rows that drifted, exits 1 if there are any'''
+
+def main(args):
+    if not args or args[0] not in ('rebuild', 'verify'):
+        print('usage: db_stats.py rebuild|verify [team_name]')
+        return 2
+    team_id = None
+    if len(args) > 1:
+        team = Team.query.filter(Team.name == args[1]).first()
+        if team is None:
+            print('No team named %s' % args[1])
+            return 1
+        team_id = team.id
+    if args[0] == 'rebuild':
+        count = rebuild_member_stats(team_id)
+        days = rebuild_daily_stats(team_id)
+        app_db.session.commit()
+        print('Rebuilt %d member stat rows and %d daily stat rows.' % (count, days))
+        return 0
+    mismatches = verify_member_stats(team_id)
+    for team, user_id, stored, expected in mismatches:
+        print('team %s / user %s: stored %r, expected %r' % (team, user_id, stored, expected))
+    day_mismatches = verify_daily_stats(team_id)
+    for team, user_id, day, stored, expected in day_mismatches:
+        print('team %s / user %s / %s: stored %r, expected %r' % (team, user_id, day, stored, expected))
+    print('%d member stat rows and %d daily stat rows differ.' % (len(mismatches), len(day_mismatches)))
+    return 1 if mismatches or day_mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
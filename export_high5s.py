@@ -0,0 +1,54 @@
+#!flask/bin/python
+import sys
+from app.models import Team
+from app.search import parse_day
+from app.export import FORMATS, export_chunks
+
+'''
+Export the High5 history as CSV or newline delimited JSON, streamed so any number of High5's fits in memory.
+    python export_high5s.py [--team name] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--format csv|ndjson] [--gzip]
+                            [output]
+Exports every team unless one is named, from the start day to the end day inclusive when given, to the output file or
+standard output.'''
+
+USAGE = 'usage: export_high5s.py [--team name] [--start day] [--end day] [--format csv|ndjson] [--gzip] [output]'
+
+def main(args):
+    options = dict(team=None, start=None, end=None, format='csv')
+    compress = False
+    output = None
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--gzip':
+            compress = True
+        elif arg.startswith('--') and arg[2:] in options and args:
+            options[arg[2:]] = args.pop(0)
+        elif output is None and not arg.startswith('--'):
+            output = arg
+        else:
+            print(USAGE)
+            return 2
+    start = parse_day(options['start'])
+    end = parse_day(options['end'], end=True)
+    if options['format'] not in FORMATS or (options['start'] and start is None) or (options['end'] and end is None):
+        print(USAGE)
+        return 2
+    team_id = None
+    if options['team']:
+        team = Team.query.filter(Team.name == options['team']).first()
+        if team is None:
+            print('No team named %s' % options['team'])
+            return 1
+        team_id = team.id
+    stream = open(output, 'wb') if output else getattr(sys.stdout, 'buffer', sys.stdout)
+    try:
+        for chunk in export_chunks(options['format'], team_id, start, end, compress):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
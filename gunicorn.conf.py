@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+
+'''
+gunicorn settings for the web process, see the Procfile. The app is imported once in the master process and the
+workers are forked from it, so a worker starts without importing anything and shares the memory of the imported code
+and the compiled templates with the others. The master closes its database connections before each fork and each
+worker opens its own connections, caches and threads after it, see before_fork and after_fork in app/__init__.py.
+bench/startup_bench.py measures the import, the first requests and the memory each worker adds, for sizing workers.
+
+There is a worker per core, or fewer when the memory the workers may use, half of what the host or the container has
+available, does not fit that many of WORKER_KB each. A worker runs Python on one core at a time, so more workers than
+cores only queue for the CPU, and waiting on the database or the network is covered by the threads of each worker
+instead. WEB_CONCURRENCY overrides the count.
+
+Workers are gthread workers, each serving up to threads requests at once. A login waits on the worker's password
+hashing threads (see app/passwords.py) while its other request threads keep serving, which a sync worker could not do:
+it would sit idle for the whole hash. The hashing threads of all the workers together are about one per core, so
+logins cannot crowd out the rest of the host. bench/password_bench.py measures logins and another page served by a
+worker at once.
+
+A worker that takes longer than timeout over a request is killed and the request fails. The slowest request is an
+/api/import of users, which hashes every password on the worker's hash_threads threads, so IMPORT_MAX_USERS
+in config.py is sized to finish well within it; raise both together, and import larger files with import_csv.py.'''
+
+#Most KB a worker forked from the preloaded app holds on its own: the worker_kb budget bench/startup_bench.py checks
+#the measured memory against, so change them together.
+WORKER_KB = 24576
+
+#KB of memory available to this process: the host's available memory, or the container's limit if that is lower.
+def available_kb():
+    limits = []
+    with open('/proc/meminfo') as meminfo:
+        limits += [int(line.split()[1]) for line in meminfo if line.startswith('MemAvailable:')]
+    for path in ['/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes']:
+        if os.path.exists(path):
+            with open(path) as limit:
+                value = limit.read().strip()
+            if value.isdigit():
+                limits.append(int(value) // 1024)
+    return min(limits) if limits else None
+
+#A worker per core, as many as fit in half the available memory.
+def default_workers():
+    workers = multiprocessing.cpu_count()
+    memory = available_kb()
+    if memory is not None:
+        workers = min(workers, memory // 2 // WORKER_KB)
+    return max(1, workers)
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '5000')
+workers = int(os.environ.get('WEB_CONCURRENCY') or default_workers())
+worker_class = 'gunicorn.workers.gthread.ThreadWorker'  # gthread, which gunicorn 19.1 has no short name for
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+timeout = 30
+
+#Password hashing threads per worker, about one per core across all workers.
+hash_threads = max(1, multiprocessing.cpu_count() // workers)
+
+def pre_fork(server, worker):
+    from app import app, before_fork
+    before_fork(app)
+
+def post_fork(server, worker):
+    from app import app, after_fork
+    app.config['PASSWORD_HASH_THREADS'] = hash_threads
+    after_fork(app)
@@ -0,0 +1,35 @@
+#!flask/bin/python
+import multiprocessing
+import sys
+from app import app, app_db
+from app.bulk_import import COLUMNS, read_csv, import_rows
+
+'''
+Bulk import of users, teams or team members from a CSV file, see app/bulk_import.py for the columns of each kind.
+    python import_csv.py users|teams|members file.csv [processes]
+Passwords of imported users are hashed on the given number of processes, IMPORT_HASH_PROCESSES by default. The rows
+that are valid are imported and committed together, and every other row is listed with its problems.'''
+
+def main(args):
+    if len(args) < 2 or args[0] not in COLUMNS:
+        print('usage: import_csv.py users|teams|members file.csv [processes]')
+        return 2
+    with open(args[1], 'rb') as stream:
+        data = stream.read()
+    try:
+        rows = read_csv(args[0], data)
+    except ValueError as error:
+        print(error)
+        return 1
+    processes = int(args[2]) if len(args) > 2 else app.config['IMPORT_HASH_PROCESSES'] or multiprocessing.cpu_count()
+    report = import_rows(args[0], rows, processes)
+    app_db.session.commit()
+    for line in sorted(report.errors):
+        print('line %d: %s' % (line, '; '.join('%s: %s' % (field, message) for field, message in
+                                               sorted(report.errors[line].items()))))
+    print('Imported %d of %d %s in %.1f seconds, %.0f rows per second.' %
+          (report.created, report.rows, args[0], report.seconds, report.rows_per_second()))
+    return 1 if report.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
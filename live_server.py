@@ -0,0 +1,8 @@
+#!flask/bin/python
+from app import app
+from app.live import LiveServer
+
+#Start the live team feed server, which streams the High5's given, edited and deleted by the web app to the browsers.
+server = LiveServer(app.config['LIVE_ADDRESS'], app.config['LIVE_PUBLISH_ADDRESS'])
+app.logger.info('Live team feeds on %s:%d' % server.address)
+server.serve_forever()
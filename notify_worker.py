@@ -0,0 +1,5 @@
+#!flask/bin/python
+from app.outbox import run_worker
+
+#Start the email outbox worker, which sends the High5 notifications queued by the web app.
+run_worker()
@@ -0,0 +1,29 @@
+#!flask/bin/python
+import sys
+import time
+from app.models import Team
+from app.search import rebuild_index
+
+'''
+Maintenance command for the Whoosh index behind the High5 search page (WHOOSH_BASE in config.py).
+    python search_index.py rebuild [team_name]   rebuild the index, or one team's part of it, from the High5 table
+The index is otherwise kept up to date as High5's are given, edited and deleted.'''
+
+def main(args):
+    if not args or args[0] != 'rebuild':
+        print('usage: search_index.py rebuild [team_name]')
+        return 2
+    team_id = None
+    if len(args) > 1:
+        team = Team.query.filter(Team.name == args[1]).first()
+        if team is None:
+            print('No team named %s' % args[1])
+            return 1
+        team_id = team.id
+    start = time.time()
+    count = rebuild_index(team_id)
+    print('Indexed %d High5\'s in %.1f seconds.' % (count, time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))